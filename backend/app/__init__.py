@@ -25,10 +25,12 @@ def create_app():
     from .database import init_db
     from .auth import load_current_user, current_user
     from .services.auth_service import bootstrap_admin_users_from_env
+    from .services.file_tasks import recover_file_tasks
 
     # Initialize the database
     init_db()
     bootstrap_admin_users_from_env()
+    recover_file_tasks()
 
     @app.before_request
     def enforce_authentication():
@@ -55,6 +57,7 @@ def create_app():
     from .api.tools.routes import tools_bp
     from .api.parameter_fill.routes import parameter_fill_bp
     from .api.jobs.routes import jobs_bp
+    from .api.jobs.events import register_job_events
     
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(filemanager_bp, url_prefix='/api/filemanager')
@@ -67,5 +70,8 @@ def create_app():
     
     # Register terminal routes
     register_terminal_routes(app)
+
+    # Push job status, workflow progress and log chunks to subscribed clients
+    register_job_events(app)
     
     return app
@@ -0,0 +1,187 @@
+import mimetypes
+import os
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from flask import Response, current_app, request
+from werkzeug.http import is_resource_modified
+from werkzeug.utils import send_file
+
+from app import paths
+
+
+READ_BLOCK_BYTES = 1024 * 1024
+# Like nginx's max_ranges: requests asking for more get the whole file.
+MAX_RANGES = 64
+
+
+def _accel_prefix() -> str:
+    return os.getenv('APPAM_ACCEL_REDIRECT_PREFIX', '').strip()
+
+
+def _etag(stat_result) -> str:
+    return f'{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}'
+
+
+def _content_disposition(filename: str) -> str:
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _accel_redirect(abs_path: str, mimetype: str, as_attachment: bool):
+    """Hand the transfer to the proxy (nginx X-Accel-Redirect) when it asked for that.
+
+    nginx announces support with ``X-Sendfile-Type: X-Accel-Redirect``;
+    direct requests to the backend are still served here.
+    """
+    prefix = _accel_prefix()
+    if not prefix or request.headers.get('X-Sendfile-Type') != 'X-Accel-Redirect':
+        return None
+    root = str(paths.PROJECTS_ROOT)
+    if os.path.commonpath([root, abs_path]) != root:
+        return None
+    relative = os.path.relpath(abs_path, root).replace(os.sep, '/')
+    response = Response(mimetype=mimetype)
+    response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(relative)
+    if as_attachment:
+        response.headers['Content-Disposition'] = _content_disposition(os.path.basename(abs_path))
+    return response
+
+
+def _parse_ranges(header: str | None, size: int):
+    """``(requested, ranges)`` for a bytes Range header, or None if absent or malformed.
+
+    ``ranges`` holds the satisfiable (start, stop) pairs sorted and
+    coalesced; unlike werkzeug, overlapping and out-of-order ranges are
+    accepted, as RFC 9110 allows.
+    """
+    if not header:
+        return None
+    units, _, spec = header.partition('=')
+    items = [item.strip() for item in spec.split(',') if item.strip()]
+    if units.strip().lower() != 'bytes' or not items or len(items) > MAX_RANGES:
+        return None
+    ranges = []
+    for item in items:
+        first, dash, last = item.partition('-')
+        if not dash:
+            return None
+        try:
+            if not first:
+                start, stop = max(0, size - int(last)), size
+            else:
+                start = int(first)
+                stop = min(int(last) + 1, size) if last else size
+                if last and int(last) < start:
+                    return None
+        except ValueError:
+            return None
+        if start < stop:
+            ranges.append((start, stop))
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return len(items), merged
+
+
+def _multipart_ranges(abs_path: str, mimetype: str, size: int, ranges: list) -> Response:
+    boundary = uuid.uuid4().hex
+    headers = [
+        f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\nContent-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n'.encode()
+        for start, stop in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode()
+
+    def generate():
+        fd = os.open(abs_path, os.O_RDONLY)
+        try:
+            for header, (start, stop) in zip(headers, ranges):
+                yield header
+                position = start
+                while position < stop:
+                    block = os.pread(fd, min(READ_BLOCK_BYTES, stop - position), position)
+                    if not block:
+                        return
+                    position += len(block)
+                    yield block
+            yield closing
+        finally:
+            os.close(fd)
+
+    response = Response(
+        generate(),
+        status=206,
+        mimetype=f'multipart/byteranges; boundary={boundary}',
+        direct_passthrough=True,
+    )
+    response.content_length = sum(len(header) for header in headers) + sum(stop - start for start, stop in ranges) + len(closing)
+    return response
+
+
+def _range_applies(environ, etag: str, stat_result) -> bool:
+    """False when the request is answered with 304 or, after a failed If-Range, the whole file."""
+    last_modified = datetime.fromtimestamp(int(stat_result.st_mtime), tz=timezone.utc)
+    if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        return False
+    return 'HTTP_IF_RANGE' not in environ or not is_resource_modified(
+        environ, etag=etag, last_modified=last_modified, ignore_if_range=False
+    )
+
+
+def send_project_file(abs_path: str, as_attachment: bool = False, mimetype: str | None = None) -> Response:
+    """Serve a project file with full HTTP caching and range semantics.
+
+    Conditional GETs (ETag / Last-Modified), single ranges and If-Range go
+    through ``send_file``, which uses the server's ``wsgi.file_wrapper``
+    (sendfile under gunicorn and similar). Multi-range requests, which
+    werkzeug rejects, are answered as multipart/byteranges. Behind nginx
+    the transfer is delegated with X-Accel-Redirect so the kernel copies
+    the file.
+    """
+    stat_result = os.stat(abs_path)
+    mimetype = mimetype or mimetypes.guess_type(abs_path)[0] or 'application/octet-stream'
+    etag = _etag(stat_result)
+
+    accelerated = _accel_redirect(abs_path, mimetype, as_attachment)
+    if accelerated is not None:
+        return accelerated
+
+    # werkzeug handles conditionals, If-Range and single ranges; it gets a
+    # normalized Range header, or none at all for anything else.
+    environ = {key: value for key, value in request.environ.items() if key != 'HTTP_RANGE'}
+    parsed = _parse_ranges(request.environ.get('HTTP_RANGE'), stat_result.st_size)
+    if parsed is not None:
+        requested, ranges = parsed
+        if requested == 1 and ranges:
+            environ['HTTP_RANGE'] = f'bytes={ranges[0][0]}-{ranges[0][1] - 1}'
+        elif _range_applies(request.environ, etag, stat_result):
+            if not ranges:
+                response = Response(status=416)
+                response.headers['Content-Range'] = f'bytes */{stat_result.st_size}'
+                return response
+            response = _multipart_ranges(abs_path, mimetype, stat_result.st_size, ranges)
+            response.set_etag(etag)
+            response.last_modified = stat_result.st_mtime
+            response.accept_ranges = 'bytes'
+            if as_attachment:
+                response.headers['Content-Disposition'] = _content_disposition(os.path.basename(abs_path))
+            return response
+
+    return send_file(
+        abs_path,
+        environ,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=etag,
+        last_modified=stat_result.st_mtime,
+        response_class=current_app.response_class,
+    )
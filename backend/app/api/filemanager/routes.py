@@ -1,15 +1,22 @@
-from flask import Blueprint, request, jsonify, send_from_directory, Response, g
-from app.auth import get_project_for_user
+from flask import Blueprint, request, jsonify, send_file, Response, g
+from app.auth import current_user, get_project_for_user
 from app.services import file_manager as services
 from app.services import download_manager
+from app.services import upload_sessions
+from app.services import file_tasks
+from app.api.filemanager.file_responses import send_project_file
+import json
 import os
-import shutil
 from urllib.parse import quote
 
 filemanager_bp = Blueprint('filemanager_bp', __name__)
 
 EDITOR_FILEMANAGER_ENDPOINTS = {
     'filemanager_bp.upload_chunk',
+    'filemanager_bp.create_upload_session',
+    'filemanager_bp.get_upload_session',
+    'filemanager_bp.upload_session_chunk',
+    'filemanager_bp.abort_upload_session',
     'filemanager_bp.make_directory',
     'filemanager_bp.rename_item',
     'filemanager_bp.delete_items',
@@ -17,6 +24,8 @@ EDITOR_FILEMANAGER_ENDPOINTS = {
     'filemanager_bp.save_file',
     'filemanager_bp.copy_items',
     'filemanager_bp.cut_items',
+    'filemanager_bp.submit_file_task',
+    'filemanager_bp.cancel_file_task',
 }
 
 
@@ -41,8 +50,20 @@ def ensure_project_access():
 def list_files(project_id):
     try:
         path = request.args.get('path', '.')
-        items = services.list_files(project_id, path)
-        return jsonify({'items': items})
+        limit = request.args.get('limit', type=int)
+        page = services.list_files_page(
+            project_id,
+            path,
+            sort=request.args.get('sort', 'name'),
+            order=request.args.get('order', 'asc'),
+            cursor=request.args.get('cursor') or None,
+            limit=limit,
+            query=request.args.get('q', ''),
+            extensions=[value for value in request.args.get('ext', '').split(',') if value],
+            types=[value for value in request.args.get('type', '').split(',') if value],
+            probe_permissions=request.args.get('permissions', 'probe') != 'mode',
+        )
+        return jsonify(page)
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
     except ValueError as e:
@@ -63,6 +84,54 @@ def upload_chunk(project_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@filemanager_bp.route('/<project_id>/upload-sessions', methods=['POST'])
+def create_upload_session(project_id):
+    try:
+        data = request.json or {}
+        session = upload_sessions.create_upload_session(
+            project_id,
+            data.get('path') or '',
+            data['filename'],
+            data['size'],
+            chunk_size=data.get('chunk_size'),
+            created_by=(current_user() or {}).get('id'),
+        )
+        return jsonify(session), 201
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@filemanager_bp.route('/<project_id>/upload-sessions/<session_id>', methods=['GET'])
+def get_upload_session(project_id, session_id):
+    try:
+        return jsonify(upload_sessions.get_upload_session(project_id, session_id))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+@filemanager_bp.route('/<project_id>/upload-sessions/<session_id>/chunks/<int:index>', methods=['PUT'])
+def upload_session_chunk(project_id, session_id, index):
+    try:
+        stream = request.files['file'].stream if 'file' in request.files else request.stream
+        session = upload_sessions.write_upload_chunk(project_id, session_id, index, stream)
+        # The full missing list is only needed when resuming; keep chunk replies small.
+        session.pop('missing_chunks', None)
+        return jsonify(session)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@filemanager_bp.route('/<project_id>/upload-sessions/<session_id>', methods=['DELETE'])
+def abort_upload_session(project_id, session_id):
+    try:
+        upload_sessions.abort_upload_session(project_id, session_id)
+        return jsonify({'message': 'Upload aborted'})
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
 @filemanager_bp.route('/<project_id>/mkdir', methods=['POST'])
 def make_directory(project_id):
     try:
@@ -88,35 +157,77 @@ def rename_item(project_id):
 @filemanager_bp.route('/<project_id>/download-zip', methods=['POST'])
 def download_zip(project_id):
     try:
-        items = request.json['items']
-        zip_path, temp_dir = services.download_zip(project_id, items)
-        
-        response = send_from_directory(
-            os.path.dirname(zip_path),
-            os.path.basename(zip_path),
-            as_attachment=True
+        # Plain form posts let the browser stream the archive straight to disk.
+        payload = request.get_json(silent=True)
+        items = payload['items'] if payload else json.loads(request.form['items'])
+        filename, chunks = services.download_zip(project_id, items)
+        return Response(
+            chunks,
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
         )
-        
-        @response.call_on_close
-        def cleanup():
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
-        
-        return response
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _submit_task(project_id, kind, items, destination=None, options=None):
+    task = file_tasks.submit_file_task(
+        project_id,
+        kind,
+        items,
+        destination,
+        options,
+        created_by=(current_user() or {}).get('id'),
+    )
+    return jsonify(task), 202
+
+@filemanager_bp.route('/<project_id>/file-tasks', methods=['POST'])
+def submit_file_task(project_id):
+    try:
+        data = request.json or {}
+        return _submit_task(
+            project_id,
+            data['kind'],
+            data['items'],
+            data.get('destination'),
+            {key: data[key] for key in ('link', 'name') if key in data},
+        )
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@filemanager_bp.route('/<project_id>/file-tasks', methods=['GET'])
+def list_file_tasks(project_id):
+    return jsonify({'tasks': file_tasks.list_file_tasks(project_id, request.args.get('limit', type=int))})
+
+@filemanager_bp.route('/<project_id>/file-tasks/<task_id>', methods=['GET'])
+def get_file_task(project_id, task_id):
+    try:
+        return jsonify(file_tasks.get_file_task(project_id, task_id))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+@filemanager_bp.route('/<project_id>/file-tasks/<task_id>/cancel', methods=['POST'])
+def cancel_file_task(project_id, task_id):
+    try:
+        return jsonify(file_tasks.cancel_file_task(project_id, task_id))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
 @filemanager_bp.route('/<project_id>/delete', methods=['POST'])
 def delete_items(project_id):
     try:
         items = request.json['items']
-        services.delete_items(project_id, items)
-        return jsonify({'message': 'Items deleted'})
-    except ValueError as e:
+        return _submit_task(project_id, 'delete', items)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except (KeyError, ValueError) as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -158,7 +269,7 @@ def serve_image(project_id):
         path = request.args.get('path')
         result = services.preview_file(project_id, path)
         if result['type'] == 'image':
-            return send_from_directory(os.path.dirname(result['path']), os.path.basename(result['path']))
+            return send_project_file(result['path'])
         else:
             return jsonify({'error': 'Not an image file'}), 400
     except FileNotFoundError as e:
@@ -179,11 +290,7 @@ def download_file(project_id):
         if not os.path.exists(abs_path) or os.path.isdir(abs_path):
             return jsonify({'error': 'File not found'}), 404
 
-        return send_from_directory(
-            os.path.dirname(abs_path),
-            os.path.basename(abs_path),
-            as_attachment=True
-        )
+        return send_project_file(abs_path, as_attachment=True)
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -210,9 +317,10 @@ def copy_items(project_id):
         data = request.json
         items = data['items']
         destination = data['destination']
-        result = services.copy_items(project_id, items, destination)
-        return jsonify(result)
-    except ValueError as e:
+        return _submit_task(project_id, 'copy', items, destination, {'link': data.get('link', 'auto')})
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except (KeyError, ValueError) as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -223,9 +331,10 @@ def cut_items(project_id):
         data = request.json
         items = data['items']
         destination = data['destination']
-        result = services.cut_items(project_id, items, destination)
-        return jsonify(result)
-    except ValueError as e:
+        return _submit_task(project_id, 'move', items, destination, {'link': data.get('link', 'auto')})
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except (KeyError, ValueError) as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -234,16 +343,28 @@ def cut_items(project_id):
 def get_thumbnail(project_id):
     try:
         path = request.args.get('path')
-        size = request.args.get('size', '128')
-        result = services.generate_thumbnail(project_id, path, int(size))
-        if result['success']:
-            return send_from_directory(
-                os.path.dirname(result['path']),
-                os.path.basename(result['path']),
-                mimetype='image/jpeg'
-            )
+        size = int(request.args.get('size', '128'))
+        # Revalidating an unchanged image costs one stat of the source.
+        version = services.thumbnail_version(project_id, path, size)
+        if request.if_none_match.contains(version['etag']):
+            response = Response(status=304)
         else:
-            return jsonify({'error': result['error']}), 400
+            result = services.generate_thumbnail(project_id, path, size)
+            if not result['success']:
+                return jsonify({'error': result['error']}), 400
+            response = send_file(
+                result['path'],
+                mimetype='image/jpeg',
+                etag=result['etag'],
+                last_modified=result['last_modified'],
+            )
+        response.set_etag(version['etag'])
+        response.cache_control.no_cache = True
+        return response
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -268,7 +389,24 @@ def preview_file_sample(project_id):
     try:
         path = request.args.get('path')
         samples = int(request.args.get('samples', 100))
-        result = services.preview_file_sample(project_id, path, samples)
+        mode = request.args.get('mode', 'spread')
+        result = services.preview_file_sample(project_id, path, samples, mode)
+        return jsonify(result)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@filemanager_bp.route('/<project_id>/preview-region', methods=['GET'])
+def preview_file_region(project_id):
+    """Preview the records of an indexed file overlapping a region"""
+    try:
+        path = request.args.get('path')
+        region = request.args.get('region', '')
+        limit = int(request.args.get('limit', 1000))
+        result = services.preview_file_region(project_id, path, region, limit)
         return jsonify(result)
     except FileNotFoundError as e:
         return jsonify({'error': str(e)}), 404
@@ -291,6 +429,7 @@ def start_url_download(project_id):
         path = data.get('path', '/')
         concurrent = data.get('concurrent', True)
         task_id = data.get('task_id')
+        priority = int(data.get('priority', 0))
         
         # Validate URL format
         if not url.startswith(('http://', 'https://', 'ftp://')):
@@ -302,7 +441,10 @@ def start_url_download(project_id):
             filename=filename,
             path=path,
             concurrent=concurrent,
-            task_id=task_id
+            task_id=task_id,
+            priority=priority,
+            checksum=data.get('checksum'),
+            check_gzip=bool(data.get('check_gzip', False))
         )
         
         return jsonify({
@@ -311,6 +453,8 @@ def start_url_download(project_id):
             'message': 'Download task started'
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -318,7 +462,7 @@ def start_url_download(project_id):
 def get_download_progress(project_id, task_id):
     """获取下载进度"""
     try:
-        progress = download_manager.get_download_progress(task_id)
+        progress = download_manager.get_download_progress(task_id, project_id)
         if progress is None:
             return jsonify({'error': 'Download task not found'}), 404
         
@@ -331,7 +475,7 @@ def get_download_progress(project_id, task_id):
 def pause_download(project_id, task_id):
     """暂停下载任务"""
     try:
-        success = download_manager.pause_download(task_id)
+        success = download_manager.pause_download(task_id, project_id)
         if success:
             return jsonify({'success': True, 'message': 'Download paused'})
         else:
@@ -344,7 +488,7 @@ def pause_download(project_id, task_id):
 def resume_download(project_id, task_id):
     """继续下载任务"""
     try:
-        success = download_manager.resume_download(task_id)
+        success = download_manager.resume_download(task_id, project_id)
         if success:
             return jsonify({'success': True, 'message': 'Download resumed'})
         else:
@@ -357,7 +501,7 @@ def resume_download(project_id, task_id):
 def cancel_download(project_id, task_id):
     """取消下载任务"""
     try:
-        success = download_manager.cancel_download(task_id)
+        success = download_manager.cancel_download(task_id, project_id)
         if success:
             return jsonify({'success': True, 'message': 'Download cancelled'})
         else:
@@ -380,7 +524,7 @@ def list_downloads(project_id):
 def cleanup_downloads(project_id):
     """清理已完成的下载任务"""
     try:
-        count = download_manager.cleanup_completed_downloads()
+        count = download_manager.cleanup_completed_downloads(project_id)
         return jsonify({
             'success': True, 
             'message': f'Cleaned up {count} completed download tasks'
@@ -0,0 +1,101 @@
+import logging
+import threading
+
+from flask import request
+from flask_socketio import emit, join_room, leave_room
+
+from app import socketio
+from app.auth import get_project_for_user, session_user
+from app.services.job_events import (
+    events_enabled,
+    job_room,
+    open_event_bus_listener,
+    project_room,
+    set_local_sink,
+)
+from app.services.job_store import get_job
+
+
+JOBS_NAMESPACE = '/jobs'
+logger = logging.getLogger(__name__)
+
+_BUS_LOCK = threading.Lock()
+_BUS_LISTENER = None
+
+
+def _emit_to_rooms(event, payload, rooms):
+    socketio.emit(event, payload, to=list(rooms), namespace=JOBS_NAMESPACE)
+
+
+def start_job_event_bus():
+    """Route job events from this process and from standalone workers to Socket.IO rooms."""
+    global _BUS_LISTENER
+    with _BUS_LOCK:
+        if _BUS_LISTENER is not None:
+            return _BUS_LISTENER
+        listener = open_event_bus_listener(_emit_to_rooms)
+        set_local_sink(_emit_to_rooms, listener_path=str(listener.path) if listener else None)
+        if listener:
+            socketio.start_background_task(listener.serve_forever)
+        _BUS_LISTENER = listener
+        return listener
+
+
+def _resolve_rooms(data):
+    user = session_user()
+    if not user:
+        return None, 'Authentication required'
+
+    data = data or {}
+    rooms = []
+    project_id = data.get('project_id')
+    if project_id:
+        if not get_project_for_user(project_id, user=user, min_role='viewer'):
+            return None, 'Project not found'
+        rooms.append(project_room(project_id))
+
+    job_id = data.get('job_id')
+    if job_id:
+        job = get_job(job_id)
+        if not job or not get_project_for_user(job.get('project_id'), user=user, min_role='viewer'):
+            return None, 'Job not found'
+        rooms.append(job_room(job_id))
+
+    if not rooms:
+        return None, 'project_id or job_id is required'
+    return rooms, None
+
+
+def handle_connect(auth=None):
+    # With events off nothing would ever be pushed; refusing the connection
+    # keeps clients on full-rate polling instead of waiting on a silent socket.
+    if not events_enabled():
+        return False
+
+
+def handle_subscribe(data):
+    rooms, error = _resolve_rooms(data)
+    if error:
+        emit('job_events_error', {'error': error})
+        return
+    for room in rooms:
+        join_room(room)
+    emit('subscribed', {'rooms': rooms})
+
+
+def handle_unsubscribe(data):
+    data = data or {}
+    if data.get('project_id'):
+        leave_room(project_room(data['project_id']))
+    if data.get('job_id'):
+        leave_room(job_room(data['job_id']))
+    logger.debug('Client %s left job event rooms', request.sid)
+
+
+def register_job_events(app):
+    # Bound per app: socketio.init_app() replaces the server, and decorator
+    # registration only reaches the server that existed at import time.
+    socketio.on_event('connect', handle_connect, namespace=JOBS_NAMESPACE)
+    socketio.on_event('subscribe', handle_subscribe, namespace=JOBS_NAMESPACE)
+    socketio.on_event('unsubscribe', handle_unsubscribe, namespace=JOBS_NAMESPACE)
+    start_job_event_bus()
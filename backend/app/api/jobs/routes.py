@@ -1,9 +1,11 @@
 import os
+import re
 
 from flask import Blueprint, jsonify, request
 
 from app.auth import get_project_for_user, project_role_at_least
 from app.services.job_queue import cancel_enqueued_job
+from app.services.log_index import MARK_KINDS, LogIndex, query_max_lines
 from app.services.job_store import (
     get_job,
     list_jobs,
@@ -45,6 +47,48 @@ def get_job_endpoint(job_id):
     return jsonify(job)
 
 
+_LINE_QUERY_ARGS = ('tail', 'start_line', 'rule', 'grep', 'kind')
+_ACTIVE_STATUSES = ('queued', 'starting', 'running')
+
+
+def _query_indexed_log(job_id, job, log_path):
+    """Answer line-oriented log queries from the log's sidecar index."""
+    args = request.args
+    # Only the runner writes the sidecar while a job is active.
+    index = LogIndex.load(log_path, persist=job.get('status') not in _ACTIVE_STATUSES)
+    limit = args.get('limit', query_max_lines(), type=int)
+    payload = {'job_id': job_id, 'status': job.get('status'), 'total_lines': index.total_lines}
+
+    kind = args.get('kind')
+    if kind:
+        if kind not in MARK_KINDS:
+            return jsonify({'error': f'kind must be one of: {", ".join(MARK_KINDS)}'}), 400
+        payload['markers'] = index.list_marks(kind=kind, name=args.get('rule'), limit=limit)
+        return jsonify(payload)
+
+    pattern = args.get('grep')
+    if pattern:
+        try:
+            result = index.grep(
+                pattern,
+                start_line=args.get('start_line', 1, type=int),
+                limit=limit,
+                ignore_case=args.get('ignore_case', 'false').lower() == 'true',
+                rule=args.get('rule'),
+                regex=args.get('regex', 'false').lower() == 'true',
+            )
+        except (re.error, ValueError) as exc:
+            return jsonify({'error': f'Invalid grep pattern: {exc}'}), 400
+    elif args.get('rule'):
+        result = index.rule_lines(args['rule'], limit)
+    elif args.get('tail') is not None:
+        result = index.tail(args.get('tail', 100, type=int))
+    else:
+        result = index.read_lines(args.get('start_line', 1, type=int), args.get('count', limit, type=int))
+    payload.update(result)
+    return jsonify(payload)
+
+
 @jobs_bp.route('/jobs/<job_id>/logs', methods=['GET'])
 def get_job_logs(job_id):
     job = get_job(job_id)
@@ -56,7 +100,10 @@ def get_job_logs(job_id):
     offset = request.args.get('offset', 0, type=int)
     limit = request.args.get('limit', 65536, type=int)
     log_path = job.get('log_path')
+    line_query = any(name in request.args for name in _LINE_QUERY_ARGS)
     if not log_path or not os.path.exists(log_path):
+        if line_query:
+            return jsonify({'job_id': job_id, 'status': job.get('status'), 'total_lines': 0, 'lines': []})
         return jsonify({
             'job_id': job_id,
             'offset': offset,
@@ -64,6 +111,9 @@ def get_job_logs(job_id):
             'status': job.get('status')
         })
 
+    if line_query:
+        return _query_indexed_log(job_id, job, log_path)
+
     with open(log_path, 'rb') as log_file:
         log_file.seek(offset)
         data = log_file.read(limit)
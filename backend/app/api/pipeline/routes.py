@@ -1,13 +1,12 @@
 import os
 import uuid
-import zipfile
-from io import BytesIO
 from pathlib import Path
 
 from flask import Blueprint, Response, g, jsonify, request
 
-from app.auth import can, current_user, get_project_for_user
+from app.auth import can, current_user, get_project_for_user, user_is_admin
 from app.services.database_manifest import load_database_manifest
+from app.services.zip_stream import stream_zip
 from app.services.pipeline_execution import (
     build_job_request,
     build_job_request_from_workflow_run,
@@ -23,6 +22,7 @@ from app.services.sample_validator import (
     write_paleoproteomics_manifest,
 )
 from app.services.job_queue import enqueue_pipeline_job
+from app.services.job_scheduler import clamp_priority
 from app.services.job_store import (
     build_workflow_run_provenance,
     compare_workflow_runs,
@@ -73,7 +73,7 @@ def require_project_editor():
     return require_project_action('run_workflow')
 
 
-def _queue_job_from_request(project_id: str, display_tool_name: str, job_request: dict, job_id: str):
+def _queue_job_from_request(project_id: str, display_tool_name: str, job_request: dict, job_id: str, priority: int = 0):
     enqueue_pipeline_job(
         project_id,
         display_tool_name,
@@ -89,9 +89,18 @@ def _queue_job_from_request(project_id: str, display_tool_name: str, job_request
         workflow_run_id=job_request.get('workflow_run_id'),
         is_dry_run=bool(job_request.get('is_dry_run')),
         workflow_run_spec=job_request.get('workflow_run_spec'),
+        priority=priority,
     )
 
 
+def _requested_priority(params: dict):
+    """Pop ``_priority`` from request params; only admins may raise it above 0."""
+    priority = clamp_priority(params.pop('_priority', 0))
+    if priority > 0 and not user_is_admin():
+        return None, (jsonify({'error': 'Only administrators can raise job priority.'}), 403)
+    return priority, None
+
+
 def validate_tool_params(tool_info: dict, params: dict) -> list[str]:
     validation_errors = []
     for p in tool_info['parameters']:
@@ -270,6 +279,9 @@ def run_tool_endpoint(project_id, tool_name):
         return editor_error
 
     params = request.get_json() or {}
+    priority, priority_error = _requested_priority(params)
+    if priority_error:
+        return priority_error
     limit_error = _enforce_queue_limits(project_id, current_user()['id'], bool(params.get('dry_run')))
     if limit_error:
         return limit_error
@@ -341,7 +353,7 @@ def run_tool_endpoint(project_id, tool_name):
         return jsonify({'error': f'Failed to prepare execution: {exc}'}), 500
 
     try:
-        _queue_job_from_request(project_id, display_tool_name, job_request, job_id)
+        _queue_job_from_request(project_id, display_tool_name, job_request, job_id, priority=priority)
     except Exception as exc:
         return jsonify({'error': f'Failed to enqueue job: {exc}'}), 502
 
@@ -441,38 +453,33 @@ def workflow_run_provenance_bundle(project_id, run_id):
     if not provenance or provenance['run'].get('project_id') != project_id:
         return jsonify({'error': 'Workflow run not found'}), 404
 
-    buffer = BytesIO()
-    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
-        archive.writestr('provenance.json', jsonify_safe_json(provenance))
-        archive.writestr('database-manifest.json', jsonify_safe_json(load_database_manifest()))
-        metrics = provenance.get('metrics') or []
-        if metrics:
-            archive.writestr('metrics.tsv', workflow_metrics_tsv(metrics))
-        run = provenance.get('run') or {}
-        for label, value in (
+    run = provenance.get('run') or {}
+    manifest = provenance.get('manifest') or {}
+    params = manifest.get('params') or {}
+    entries = [
+        ('provenance.json', jsonify_safe_json(provenance).encode('utf-8')),
+        ('database-manifest.json', jsonify_safe_json(load_database_manifest()).encode('utf-8')),
+    ]
+    metrics = provenance.get('metrics') or []
+    if metrics:
+        entries.append(('metrics.tsv', workflow_metrics_tsv(metrics).encode('utf-8')))
+    for prefix, files in (
+        ('run', (
             ('config.yaml', run.get('config_path')),
             ('manifest.json', run.get('manifest_path')),
             ('run.log', run.get('log_path')),
-        ):
-            if not value:
-                continue
-            path = Path(value)
-            if path.is_file():
-                archive.write(path, f'run/{label}')
-        manifest = provenance.get('manifest') or {}
-        params = manifest.get('params') or {}
-        for label, value in (
+        )),
+        ('inputs', (
             ('samples.tsv', params.get('sample_manifest') or params.get('sample_table')),
-        ):
-            if not value:
-                continue
-            path = Path(value)
-            if path.is_file():
-                archive.write(path, f'inputs/{label}')
-    buffer.seek(0)
+        )),
+    ):
+        for label, value in files:
+            if value and Path(value).is_file():
+                entries.append((f'{prefix}/{label}', str(value)))
+
     filename = f'{run_id}-provenance.zip'
     return Response(
-        buffer.getvalue(),
+        stream_zip(entries),
         mimetype='application/zip',
         headers={'Content-Disposition': f'attachment; filename="{filename}"'},
     )
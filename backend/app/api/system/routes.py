@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from app.auth import admin_required
+from app.services.job_scheduler import list_share_weights, set_share_weight
 from app.services.local_executor import get_worker_status
 from app.services.system_info import system_info_service
 import traceback
@@ -62,6 +63,31 @@ def get_worker_runtime_status():
             'error': str(e)
         }), 500
 
+@system_bp.route('/scheduler/shares', methods=['GET'])
+@admin_required
+def get_scheduler_shares():
+    return jsonify({
+        'success': True,
+        'data': list_share_weights(),
+    })
+
+
+@system_bp.route('/scheduler/shares/<scope>/<entity_id>', methods=['PUT'])
+@admin_required
+def update_scheduler_share(scope, entity_id):
+    payload = request.get_json() or {}
+    try:
+        share = set_share_weight(scope, entity_id, payload.get('weight'))
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    return jsonify({
+        'success': True,
+        'data': share,
+    })
+
 @system_bp.route('/recommendations', methods=['GET'])
 def get_bioinformatics_recommendations():
     """获取生物信息学分析建议"""
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import os
 import sqlite3
+import threading
+import weakref
 
 
 DATABASE_FILE = os.getenv('APPAM_DB_PATH', 'app_database.db')
@@ -101,10 +103,34 @@ CREATE TABLE IF NOT EXISTS jobs (
     workflow_id TEXT,
     workflow_run_id TEXT,
     is_dry_run INTEGER NOT NULL DEFAULT 0,
+    cpu_request INTEGER NOT NULL DEFAULT 1,
+    mem_request_mb INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    lane INTEGER NOT NULL DEFAULT 1,
+    fair_tag REAL NOT NULL DEFAULT 0,
+    queue_seq INTEGER,
+    failure_category TEXT,
+    failure_label TEXT,
+    failure_suggestion TEXT,
+    failure_classified INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE,
     FOREIGN KEY (submitted_by) REFERENCES users (id) ON DELETE SET NULL
 );
 
+CREATE TABLE IF NOT EXISTS scheduler_shares (
+    scope TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    weight REAL NOT NULL DEFAULT 1.0,
+    finish_tag REAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (scope, entity_id)
+);
+
+CREATE TABLE IF NOT EXISTS scheduler_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS workflow_runs (
     id TEXT PRIMARY KEY,
     job_id TEXT UNIQUE,
@@ -134,6 +160,10 @@ CREATE TABLE IF NOT EXISTS workflow_runs (
     current_stage_id TEXT,
     current_stage_title TEXT,
     current_rule TEXT,
+    failure_category TEXT,
+    failure_label TEXT,
+    failure_suggestion TEXT,
+    failure_classified INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE,
     FOREIGN KEY (submitted_by) REFERENCES users (id) ON DELETE SET NULL,
     FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE SET NULL,
@@ -208,10 +238,108 @@ CREATE TABLE IF NOT EXISTS workflow_artifacts (
     FOREIGN KEY (run_id) REFERENCES workflow_runs (id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS file_metadata (
+    project_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    file_format TEXT,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    sample_key TEXT,
+    read_mate TEXT,
+    stats TEXT,
+    analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (project_id, path),
+    FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    total_chunks INTEGER NOT NULL,
+    received BLOB NOT NULL,
+    received_chunks INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'uploading',
+    created_by TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS file_tasks (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    phase TEXT,
+    items TEXT NOT NULL,
+    destination TEXT,
+    options TEXT,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    total_files INTEGER NOT NULL DEFAULT 0,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    files_done INTEGER NOT NULL DEFAULT 0,
+    elapsed_seconds REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    worker_id TEXT,
+    heartbeat_at TIMESTAMP,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_by TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS downloads (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    filename TEXT,
+    path TEXT NOT NULL DEFAULT '',
+    concurrent INTEGER NOT NULL DEFAULT 1,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'preparing',
+    total_size INTEGER NOT NULL DEFAULT 0,
+    downloaded_size INTEGER NOT NULL DEFAULT 0,
+    supports_ranges INTEGER NOT NULL DEFAULT 0,
+    etag TEXT,
+    last_modified TEXT,
+    expected_checksum TEXT,
+    checksum TEXT,
+    check_gzip INTEGER NOT NULL DEFAULT 0,
+    speed REAL NOT NULL DEFAULT 0,
+    time_remaining REAL,
+    error TEXT,
+    worker_id TEXT,
+    heartbeat_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS download_segments (
+    download_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER,
+    done_bytes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (download_id, idx),
+    FOREIGN KEY (download_id) REFERENCES downloads (id) ON DELETE CASCADE
+);
+
 CREATE INDEX IF NOT EXISTS idx_project_members_user ON project_members (user_id);
 CREATE INDEX IF NOT EXISTS idx_auth_audit_username_created_at ON auth_audit_log (username, created_at);
 CREATE INDEX IF NOT EXISTS idx_auth_audit_ip_created_at ON auth_audit_log (ip_address, created_at);
 CREATE INDEX IF NOT EXISTS idx_jobs_project_created_at ON jobs (project_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs (status, created_at);
 CREATE INDEX IF NOT EXISTS idx_process_history_project_start_time ON process_history (project_id, start_time);
 CREATE INDEX IF NOT EXISTS idx_workflow_runs_project_created_at ON workflow_runs (project_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_workflow_runs_project_status ON workflow_runs (project_id, workflow_id, status);
@@ -220,17 +348,157 @@ CREATE INDEX IF NOT EXISTS idx_workflow_metrics_run_group ON workflow_metrics (r
 CREATE INDEX IF NOT EXISTS idx_workflow_stage_states_run_order ON workflow_stage_states (run_id, stage_order);
 CREATE INDEX IF NOT EXISTS idx_workflow_run_events_run_created_at ON workflow_run_events (run_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_workflow_artifacts_run_created_at ON workflow_artifacts (run_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_file_metadata_project_inode ON file_metadata (project_id, inode);
+CREATE INDEX IF NOT EXISTS idx_file_metadata_project_sample ON file_metadata (project_id, sample_key);
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_status_updated_at ON upload_sessions (status, updated_at);
 '''
 
 
-def get_db_connection():
-    """Creates a database connection."""
-    conn = sqlite3.connect(DATABASE_FILE, timeout=30)
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose ``close()`` hands it back to the per-thread pool.
+
+    Callers keep the usual ``conn = get_db_connection() ... conn.close()``
+    pattern; the underlying handle, its PRAGMA setup and its prepared
+    statement cache survive between calls on the same thread.
+    """
+
+    def close(self) -> None:
+        _release_connection(self)
+
+    def dispose(self) -> None:
+        """Really close the underlying SQLite handle."""
+        _POOL_REGISTRY.discard(self)
+        super().close()
+
+
+_POOL_LOCAL = threading.local()
+_POOL_REGISTRY: 'weakref.WeakSet[PooledConnection]' = weakref.WeakSet()
+_POOL_LOCK = threading.Lock()
+_POOL_GENERATION = 0
+# Connections inherited through fork() must never be closed by the child:
+# closing them could checkpoint or unlink the parent's WAL files.
+_FORKED_CONNECTIONS: list = []
+
+
+def _pool_size() -> int:
+    try:
+        return max(0, int(os.getenv('APPAM_DB_POOL_SIZE', '4')))
+    except Exception:
+        return 4
+
+
+def _journal_mode() -> str:
+    mode = os.getenv('APPAM_DB_JOURNAL_MODE', 'WAL').strip().upper()
+    return mode if mode in {'WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY'} else 'WAL'
+
+
+def _synchronous_mode() -> str:
+    mode = os.getenv('APPAM_DB_SYNCHRONOUS', 'NORMAL').strip().upper()
+    return mode if mode in {'OFF', 'NORMAL', 'FULL', 'EXTRA'} else 'NORMAL'
+
+
+def _int_setting(env_name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(env_name, str(default))))
+    except Exception:
+        return default
+
+
+def _open_connection() -> PooledConnection:
+    conn = sqlite3.connect(
+        DATABASE_FILE,
+        timeout=30,
+        factory=PooledConnection,
+        check_same_thread=False,
+        cached_statements=_int_setting('APPAM_DB_STATEMENT_CACHE', 256),
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA journal_mode = {_journal_mode()}')
+    conn.execute(f'PRAGMA synchronous = {_synchronous_mode()}')
+    conn.execute(f"PRAGMA cache_size = -{_int_setting('APPAM_DB_CACHE_SIZE_KB', 16384)}")
+    conn.execute(f"PRAGMA mmap_size = {_int_setting('APPAM_DB_MMAP_SIZE', 268435456)}")
+    conn.execute('PRAGMA temp_store = MEMORY')
     conn.execute('PRAGMA foreign_keys = ON')
+    conn._appam_pid = os.getpid()
+    conn._appam_generation = _POOL_GENERATION
+    conn._appam_in_use = True
+    with _POOL_LOCK:
+        _POOL_REGISTRY.add(conn)
     return conn
 
 
+def _thread_idle_connections() -> list:
+    state = _POOL_LOCAL
+    pid = os.getpid()
+    if getattr(state, 'pid', None) != pid:
+        if getattr(state, 'idle', None):
+            _FORKED_CONNECTIONS.extend(state.idle)
+        state.idle = []
+        state.pid = pid
+    return state.idle
+
+
+def get_db_connection():
+    """Check out a pooled database connection for the current thread.
+
+    Connections are opened in WAL mode with tuned PRAGMAs and reused across
+    calls; ``close()`` returns them to the pool. Set ``APPAM_DB_POOL_SIZE=0``
+    to open a fresh connection per call.
+    """
+    idle = _thread_idle_connections()
+    while idle:
+        conn = idle.pop()
+        if conn._appam_generation == _POOL_GENERATION:
+            conn._appam_in_use = True
+            return conn
+        conn.dispose()
+    return _open_connection()
+
+
+def _release_connection(conn: PooledConnection) -> None:
+    if not getattr(conn, '_appam_in_use', False):
+        return
+    conn._appam_in_use = False
+    if conn._appam_pid != os.getpid():
+        _FORKED_CONNECTIONS.append(conn)
+        return
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+    except sqlite3.Error:
+        conn.dispose()
+        return
+
+    idle = _thread_idle_connections()
+    if conn._appam_generation != _POOL_GENERATION or len(idle) >= _pool_size():
+        conn.dispose()
+        return
+    idle.append(conn)
+
+
+def reset_connection_pool() -> None:
+    """Close every idle pooled connection and retire the ones still in use.
+
+    Must run before the database file is recreated so stale handles do not
+    checkpoint into (or unlink the WAL of) the new file.
+    """
+    global _POOL_GENERATION
+    with _POOL_LOCK:
+        _POOL_GENERATION += 1
+        connections = list(_POOL_REGISTRY)
+    pid = os.getpid()
+    for conn in connections:
+        if conn._appam_in_use or conn._appam_pid != pid:
+            continue
+        try:
+            conn.dispose()
+        except sqlite3.Error:
+            pass
+    _POOL_LOCAL.idle = []
+    _POOL_LOCAL.pid = pid
+
+
 def table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
     row = conn.execute(
         "SELECT name FROM sqlite_master WHERE type='table' AND name = ?",
@@ -257,6 +525,7 @@ def init_db():
     else:
         print("Database already exists, running migrations...")
 
+    reset_connection_pool()
     conn = get_db_connection()
     try:
         conn.executescript(DB_SCHEMA)
@@ -284,6 +553,10 @@ def migrate_db(conn: sqlite3.Connection | None = None):
         _migrate_workflow_stage_states_table(connection)
         _migrate_workflow_run_events_table(connection)
         _migrate_workflow_artifacts_table(connection)
+        _migrate_file_metadata_table(connection)
+        _migrate_upload_sessions_table(connection)
+        _migrate_file_tasks_table(connection)
+        _migrate_downloads_tables(connection)
         _backfill_owner_memberships(connection)
         _backfill_process_history_submitters(connection)
         connection.commit()
@@ -481,6 +754,16 @@ def _migrate_jobs_table(conn: sqlite3.Connection) -> None:
                 workflow_id TEXT,
                 workflow_run_id TEXT,
                 is_dry_run INTEGER NOT NULL DEFAULT 0,
+                cpu_request INTEGER NOT NULL DEFAULT 1,
+                mem_request_mb INTEGER NOT NULL DEFAULT 0,
+                priority INTEGER NOT NULL DEFAULT 0,
+                lane INTEGER NOT NULL DEFAULT 1,
+                fair_tag REAL NOT NULL DEFAULT 0,
+                queue_seq INTEGER,
+                failure_category TEXT,
+                failure_label TEXT,
+                failure_suggestion TEXT,
+                failure_classified INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE,
                 FOREIGN KEY (submitted_by) REFERENCES users (id) ON DELETE SET NULL
             )
@@ -506,11 +789,27 @@ def _migrate_jobs_table(conn: sqlite3.Connection) -> None:
         ('workflow_id', "ALTER TABLE jobs ADD COLUMN workflow_id TEXT"),
         ('workflow_run_id', "ALTER TABLE jobs ADD COLUMN workflow_run_id TEXT"),
         ('is_dry_run', "ALTER TABLE jobs ADD COLUMN is_dry_run INTEGER NOT NULL DEFAULT 0"),
+        ('cpu_request', "ALTER TABLE jobs ADD COLUMN cpu_request INTEGER NOT NULL DEFAULT 1"),
+        ('mem_request_mb', "ALTER TABLE jobs ADD COLUMN mem_request_mb INTEGER NOT NULL DEFAULT 0"),
+        ('priority', "ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0"),
+        ('lane', "ALTER TABLE jobs ADD COLUMN lane INTEGER NOT NULL DEFAULT 1"),
+        ('fair_tag', "ALTER TABLE jobs ADD COLUMN fair_tag REAL NOT NULL DEFAULT 0"),
+        ('queue_seq', "ALTER TABLE jobs ADD COLUMN queue_seq INTEGER"),
+        ('failure_category', "ALTER TABLE jobs ADD COLUMN failure_category TEXT"),
+        ('failure_label', "ALTER TABLE jobs ADD COLUMN failure_label TEXT"),
+        ('failure_suggestion', "ALTER TABLE jobs ADD COLUMN failure_suggestion TEXT"),
+        ('failure_classified', "ALTER TABLE jobs ADD COLUMN failure_classified INTEGER NOT NULL DEFAULT 0"),
     ):
         if not column_exists(conn, 'jobs', column_name):
             conn.execute(column_sql)
 
     conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_project_created_at ON jobs (project_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs (status, created_at)")
+    # Jobs queued before the scheduler existed keep their submission order.
+    conn.execute("UPDATE jobs SET queue_seq = rowid WHERE queue_seq IS NULL")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_schedule ON jobs (status, lane, priority DESC, fair_tag, queue_seq)"
+    )
 
 
 def _migrate_workflow_runs_table(conn: sqlite3.Connection) -> None:
@@ -543,6 +842,10 @@ def _migrate_workflow_runs_table(conn: sqlite3.Connection) -> None:
                 current_stage_id TEXT,
                 current_stage_title TEXT,
                 current_rule TEXT,
+                failure_category TEXT,
+                failure_label TEXT,
+                failure_suggestion TEXT,
+                failure_classified INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE,
                 FOREIGN KEY (submitted_by) REFERENCES users (id) ON DELETE SET NULL,
                 FOREIGN KEY (job_id) REFERENCES jobs (id) ON DELETE SET NULL
@@ -578,6 +881,10 @@ def _migrate_workflow_runs_table(conn: sqlite3.Connection) -> None:
             ('current_stage_id', "ALTER TABLE workflow_runs ADD COLUMN current_stage_id TEXT"),
             ('current_stage_title', "ALTER TABLE workflow_runs ADD COLUMN current_stage_title TEXT"),
             ('current_rule', "ALTER TABLE workflow_runs ADD COLUMN current_rule TEXT"),
+            ('failure_category', "ALTER TABLE workflow_runs ADD COLUMN failure_category TEXT"),
+            ('failure_label', "ALTER TABLE workflow_runs ADD COLUMN failure_label TEXT"),
+            ('failure_suggestion', "ALTER TABLE workflow_runs ADD COLUMN failure_suggestion TEXT"),
+            ('failure_classified', "ALTER TABLE workflow_runs ADD COLUMN failure_classified INTEGER NOT NULL DEFAULT 0"),
         ):
             if not column_exists(conn, 'workflow_runs', column_name):
                 conn.execute(column_sql)
@@ -756,6 +1063,161 @@ def _migrate_workflow_artifacts_table(conn: sqlite3.Connection) -> None:
     conn.execute("CREATE INDEX IF NOT EXISTS idx_workflow_artifacts_run_created_at ON workflow_artifacts (run_id, created_at)")
 
 
+def _migrate_file_metadata_table(conn: sqlite3.Connection) -> None:
+    if not table_exists(conn, 'file_metadata'):
+        conn.execute(
+            '''
+            CREATE TABLE file_metadata (
+                project_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                inode INTEGER NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                file_format TEXT,
+                compressed INTEGER NOT NULL DEFAULT 0,
+                sample_key TEXT,
+                read_mate TEXT,
+                stats TEXT,
+                analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (project_id, path),
+                FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+            )
+            '''
+        )
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_metadata_project_inode ON file_metadata (project_id, inode)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_metadata_project_sample ON file_metadata (project_id, sample_key)")
+
+
+def _migrate_upload_sessions_table(conn: sqlite3.Connection) -> None:
+    if not table_exists(conn, 'upload_sessions'):
+        conn.execute(
+            '''
+            CREATE TABLE upload_sessions (
+                id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                total_chunks INTEGER NOT NULL,
+                received BLOB NOT NULL,
+                received_chunks INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'uploading',
+                created_by TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+            )
+            '''
+        )
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_sessions_status_updated_at ON upload_sessions (status, updated_at)")
+
+
+def _migrate_file_tasks_table(conn: sqlite3.Connection) -> None:
+    if not table_exists(conn, 'file_tasks'):
+        conn.execute(
+            '''
+            CREATE TABLE file_tasks (
+                id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                phase TEXT,
+                items TEXT NOT NULL,
+                destination TEXT,
+                options TEXT,
+                total_bytes INTEGER NOT NULL DEFAULT 0,
+                total_files INTEGER NOT NULL DEFAULT 0,
+                bytes_done INTEGER NOT NULL DEFAULT 0,
+                files_done INTEGER NOT NULL DEFAULT 0,
+                elapsed_seconds REAL NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                worker_id TEXT,
+                heartbeat_at TIMESTAMP,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_by TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+            )
+            '''
+        )
+    else:
+        if not column_exists(conn, 'file_tasks', 'worker_id'):
+            conn.execute("ALTER TABLE file_tasks ADD COLUMN worker_id TEXT")
+        if not column_exists(conn, 'file_tasks', 'heartbeat_at'):
+            conn.execute("ALTER TABLE file_tasks ADD COLUMN heartbeat_at TIMESTAMP")
+        if not column_exists(conn, 'file_tasks', 'cancel_requested'):
+            conn.execute("ALTER TABLE file_tasks ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_file_tasks_project_created_at ON file_tasks (project_id, created_at)")
+
+
+def _migrate_downloads_tables(conn: sqlite3.Connection) -> None:
+    if not table_exists(conn, 'downloads'):
+        conn.execute(
+            '''
+            CREATE TABLE downloads (
+                id TEXT PRIMARY KEY,
+                project_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                filename TEXT,
+                path TEXT NOT NULL DEFAULT '',
+                concurrent INTEGER NOT NULL DEFAULT 1,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'preparing',
+                total_size INTEGER NOT NULL DEFAULT 0,
+                downloaded_size INTEGER NOT NULL DEFAULT 0,
+                supports_ranges INTEGER NOT NULL DEFAULT 0,
+                etag TEXT,
+                last_modified TEXT,
+                expected_checksum TEXT,
+                checksum TEXT,
+                check_gzip INTEGER NOT NULL DEFAULT 0,
+                speed REAL NOT NULL DEFAULT 0,
+                time_remaining REAL,
+                error TEXT,
+                worker_id TEXT,
+                heartbeat_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP,
+                FOREIGN KEY (project_id) REFERENCES projects (id) ON DELETE CASCADE
+            )
+            '''
+        )
+    else:
+        if not column_exists(conn, 'downloads', 'priority'):
+            conn.execute("ALTER TABLE downloads ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        if not column_exists(conn, 'downloads', 'expected_checksum'):
+            conn.execute("ALTER TABLE downloads ADD COLUMN expected_checksum TEXT")
+        if not column_exists(conn, 'downloads', 'checksum'):
+            conn.execute("ALTER TABLE downloads ADD COLUMN checksum TEXT")
+        if not column_exists(conn, 'downloads', 'check_gzip'):
+            conn.execute("ALTER TABLE downloads ADD COLUMN check_gzip INTEGER NOT NULL DEFAULT 0")
+    if not table_exists(conn, 'download_segments'):
+        conn.execute(
+            '''
+            CREATE TABLE download_segments (
+                download_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                start_offset INTEGER NOT NULL,
+                end_offset INTEGER,
+                done_bytes INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (download_id, idx),
+                FOREIGN KEY (download_id) REFERENCES downloads (id) ON DELETE CASCADE
+            )
+            '''
+        )
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_project_created_at ON downloads (project_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (status)")
+
+
 def _backfill_owner_memberships(conn: sqlite3.Connection) -> None:
     rows = conn.execute(
         '''
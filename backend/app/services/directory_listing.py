@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from .file_metadata import get_file_format
+
+
+SORT_FIELDS = ('name', 'size', 'mtime', 'type')
+HIDDEN_PREFIXES = ('.tmp_',)
+
+_SNAPSHOTS: OrderedDict = OrderedDict()
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def _cache_entries() -> int:
+    try:
+        return max(0, int(os.getenv('APPAM_LISTING_CACHE_ENTRIES', '16')))
+    except Exception:
+        return 16
+
+
+def _cache_seconds() -> float:
+    try:
+        return max(0.0, float(os.getenv('APPAM_LISTING_CACHE_SECONDS', '30')))
+    except Exception:
+        return 30.0
+
+
+def max_page_size() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_LISTING_MAX_PAGE', '5000')))
+    except Exception:
+        return 5000
+
+
+def _item_type(name: str, is_dir: bool) -> str:
+    if is_dir:
+        return 'folder'
+    return get_file_format(os.path.splitext(name)[1].lower()) or 'file'
+
+
+def _matches(name: str, is_dir: bool, query: str, extensions: tuple, types: tuple) -> bool:
+    if query and query not in name.lower():
+        return False
+    if extensions and (is_dir or not name.lower().endswith(extensions)):
+        return False
+    if types and _item_type(name, is_dir) not in types:
+        return False
+    return True
+
+
+def _scan(abs_path: str, sort: str, query: str, extensions: tuple, types: tuple) -> list[tuple]:
+    """Sort keys ``(group, primary, name)`` for every visible entry; directories are group 0.
+
+    Types come from the dirent (no syscall); entries are only stat'ed when
+    sorting by size or mtime needs it.
+    """
+    keys = []
+    with os.scandir(abs_path) as iterator:
+        for entry in iterator:
+            name = entry.name
+            if name.startswith(HIDDEN_PREFIXES):
+                continue
+            try:
+                is_dir = entry.is_dir()
+                if not _matches(name, is_dir, query, extensions, types):
+                    continue
+                if sort == 'size':
+                    primary = entry.stat().st_size
+                elif sort == 'mtime':
+                    primary = entry.stat().st_mtime
+                elif sort == 'type':
+                    primary = _item_type(name, is_dir)
+                else:
+                    primary = name.lower()
+            except OSError:
+                continue
+            keys.append((0 if is_dir else 1, primary, name))
+    return keys
+
+
+def _snapshot(abs_path: str, sort: str, descending: bool, query: str, extensions: tuple, types: tuple) -> list[tuple]:
+    signature = os.stat(abs_path).st_mtime_ns
+    cache_key = (abs_path, sort, descending, query, extensions, types)
+    now = time.monotonic()
+    with _SNAPSHOT_LOCK:
+        cached = _SNAPSHOTS.get(cache_key)
+        if cached and cached[0] == signature and now - cached[1] <= _cache_seconds():
+            _SNAPSHOTS.move_to_end(cache_key)
+            return cached[2]
+
+    keys = _scan(abs_path, sort, query, extensions, types)
+    # Directories first in either direction, matching the file manager.
+    keys.sort(key=lambda key: (key[1], key[2]), reverse=descending)
+    keys.sort(key=lambda key: key[0])
+    if _cache_entries():
+        with _SNAPSHOT_LOCK:
+            _SNAPSHOTS[cache_key] = (signature, now, keys)
+            _SNAPSHOTS.move_to_end(cache_key)
+            while len(_SNAPSHOTS) > _cache_entries():
+                _SNAPSHOTS.popitem(last=False)
+    return keys
+
+
+def _precedes_or_equals(key: tuple, cursor: tuple, descending: bool) -> bool:
+    if key[0] != cursor[0]:
+        return key[0] < cursor[0]
+    if descending:
+        return (key[1], key[2]) >= (cursor[1], cursor[2])
+    return (key[1], key[2]) <= (cursor[1], cursor[2])
+
+
+def _position_after(keys: list[tuple], cursor: tuple, descending: bool) -> int:
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if _precedes_or_equals(keys[middle], cursor, descending):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        group, primary, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    numeric = sort in ('size', 'mtime')
+    if group not in (0, 1) or not isinstance(name, str) or isinstance(primary, str) == numeric:
+        raise ValueError('Cursor does not match the requested sort')
+    return group, primary, name
+
+
+def _permissions(path: str, stat_info, probe: bool) -> dict:
+    if probe:
+        return {
+            'readable': os.access(path, os.R_OK),
+            'writable': os.access(path, os.W_OK),
+            'executable': os.access(path, os.X_OK),
+        }
+    # Cheap mode: owner bits of the mode already in hand, no access() calls.
+    mode = stat_info.st_mode
+    return {
+        'readable': bool(mode & stat.S_IRUSR),
+        'writable': bool(mode & stat.S_IWUSR),
+        'executable': bool(mode & stat.S_IXUSR),
+    }
+
+
+def describe_entry(abs_path: str, name: str, probe_permissions: bool = True) -> dict:
+    item_path = os.path.join(abs_path, name)
+    stat_info = os.stat(item_path)
+    is_dir = stat.S_ISDIR(stat_info.st_mode)
+    return {
+        'name': name,
+        'is_dir': is_dir,
+        'size': stat_info.st_size,
+        'mtime': stat_info.st_mtime,          # 修改时间
+        'ctime': stat_info.st_ctime,          # 创建时间 (Windows) / 状态改变时间 (Unix)
+        'atime': stat_info.st_atime,          # 访问时间
+        'mode': stat_info.st_mode,            # 文件权限模式
+        'type': _item_type(name, is_dir),     # 文件类型
+        'extension': os.path.splitext(name)[1].lower() if not is_dir else '',
+        'permissions': _permissions(item_path, stat_info, probe_permissions),
+    }
+
+
+def list_directory(
+    abs_path: str,
+    sort: str = 'name',
+    order: str = 'asc',
+    cursor: str | None = None,
+    limit: int | None = None,
+    query: str = '',
+    extensions=None,
+    types=None,
+    probe_permissions: bool = True,
+) -> dict:
+    """One page of a directory, sorted and filtered on the server.
+
+    The sorted key list of a directory is cached (APPAM_LISTING_CACHE_*)
+    until the directory's mtime changes, so later pages only stat their
+    own entries. ``cursor`` is the opaque ``next_cursor`` of the previous
+    page; it names the last entry returned, so entries created or removed
+    in between do not shift later pages.
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f'Unsupported sort field: {sort}')
+    if order not in ('asc', 'desc'):
+        raise ValueError(f'Unsupported sort order: {order}')
+    if not os.path.isdir(abs_path):
+        raise FileNotFoundError('Directory not found')
+    descending = order == 'desc'
+    extensions = tuple(sorted(
+        ext.lower() if ext.startswith('.') else f'.{ext.lower()}'
+        for ext in (extensions or ()) if ext
+    ))
+    types = tuple(sorted(value.lower() for value in (types or ()) if value))
+    keys = _snapshot(abs_path, sort, descending, (query or '').lower(), extensions, types)
+
+    start = _position_after(keys, decode_cursor(cursor, sort), descending) if cursor else 0
+    end = len(keys) if limit is None else start + max(1, min(int(limit), max_page_size()))
+    items = []
+    for key in keys[start:end]:
+        try:
+            items.append(describe_entry(abs_path, key[2], probe_permissions))
+        except OSError:
+            continue
+    page_end = min(end, len(keys))
+    return {
+        'items': items,
+        'total': len(keys),
+        'next_cursor': encode_cursor(keys[page_end - 1]) if page_end < len(keys) else None,
+    }
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import zlib
+
+
+# Hex digest length -> algorithm, for checksums given without a prefix.
+_ALGORITHMS_BY_LENGTH = {32: 'md5', 40: 'sha1', 64: 'sha256', 128: 'sha512'}
+# Sidecar files tried next to the download URL, in order.
+SIDECAR_SUFFIXES = ('.md5', '.sha256')
+SIDECAR_MAX_BYTES = 64 * 1024
+CATCH_UP_BLOCK_BYTES = 1024 * 1024
+_HEX = re.compile(r'^[0-9a-fA-F]+$')
+
+
+class IntegrityError(Exception):
+    """Downloaded content failed its checksum or compression check."""
+
+
+def parse_checksum(value: str | None) -> str | None:
+    """Normalize ``md5:<hex>``, ``sha256=<hex>`` or a bare hex digest to ``algorithm:hex``."""
+    if not value or not value.strip():
+        return None
+    algorithm, separator, digest = value.strip().replace('=', ':', 1).partition(':')
+    if not separator:
+        algorithm, digest = None, value.strip()
+    digest = digest.strip().lower()
+    if not _HEX.match(digest):
+        raise ValueError('Checksum must be a hex digest')
+    algorithm = (algorithm or _ALGORITHMS_BY_LENGTH.get(len(digest), '')).strip().lower().replace('-', '')
+    if algorithm not in _ALGORITHMS_BY_LENGTH.values() or len(digest) != hashlib.new(algorithm).digest_size * 2:
+        raise ValueError('Unsupported checksum; use an md5, sha1, sha256 or sha512 hex digest')
+    return f'{algorithm}:{digest}'
+
+
+def parse_sidecar(text: str, filename: str, suffix: str) -> str | None:
+    """The digest for ``filename`` from ``md5sum`` / ``sha256sum`` style output, if present."""
+    algorithm = suffix.lstrip('.')
+    candidates = []
+    for line in text.splitlines():
+        fields = line.strip().split(None, 1)
+        if not fields:
+            continue
+        digest = fields[0].lower()
+        if len(digest) != hashlib.new(algorithm).digest_size * 2 or not _HEX.match(digest):
+            continue
+        name = fields[1].lstrip('*').strip() if len(fields) > 1 else ''
+        if os.path.basename(name) == filename:
+            return f'{algorithm}:{digest}'
+        candidates.append(digest)
+    # A sidecar for a single file often omits the name.
+    return f'{algorithm}:{candidates[0]}' if len(candidates) == 1 else None
+
+
+class _GzipStream:
+    """Inflates concatenated gzip members (which covers BGZF) and discards the output."""
+
+    def __init__(self):
+        self._inflater = zlib.decompressobj(wbits=31)
+        self._pending = False
+
+    def feed(self, data) -> None:
+        data = bytes(data)
+        while data:
+            self._pending = True
+            output = self._inflater.decompress(data, CATCH_UP_BLOCK_BYTES)
+            while self._inflater.unconsumed_tail:
+                output = self._inflater.decompress(self._inflater.unconsumed_tail, CATCH_UP_BLOCK_BYTES)
+            del output
+            if not self._inflater.eof:
+                return
+            data = self._inflater.unused_data
+            self._inflater = zlib.decompressobj(wbits=31)
+            self._pending = False
+
+    def finish(self) -> None:
+        if self._pending:
+            raise IntegrityError('gzip stream is truncated')
+
+
+class StreamVerifier:
+    """Hashes, and optionally inflates, a download in file order while it is written.
+
+    Bytes arriving at the verified position are checked straight from the
+    write buffer; with one connection that is every byte. Ranges other
+    connections wrote ahead of it are read back once the gap before them
+    closes, while they are still in the page cache.
+    """
+
+    def __init__(self, expected: str | None, check_gzip: bool):
+        self.expected = expected
+        self.algorithm = expected.partition(':')[0] if expected else None
+        self._hash = hashlib.new(self.algorithm) if self.algorithm else None
+        self._gzip = _GzipStream() if check_gzip else None
+        self.position = 0
+        self._lock = threading.Lock()
+
+    def _feed(self, data) -> None:
+        if self._hash is not None:
+            self._hash.update(data)
+        if self._gzip is not None:
+            try:
+                self._gzip.feed(data)
+            except zlib.error as e:
+                raise IntegrityError(f'gzip stream is corrupt near byte {self.position}: {e}') from e
+
+    def advance(self, fd: int, frontier: int, block=None, offset: int = 0, wait: bool = False) -> None:
+        """Verify up to ``frontier``, the end of the contiguously written prefix.
+
+        ``block`` is the data just written at ``offset``. Unless ``wait``,
+        a writer finding another connection already verifying leaves the
+        work to it.
+        """
+        if not self._lock.acquire(blocking=wait):
+            return
+        try:
+            while self.position < frontier:
+                if block is not None and offset <= self.position < offset + len(block):
+                    stop = min(frontier, offset + len(block))
+                    piece = memoryview(block)[self.position - offset:stop - offset]
+                else:
+                    stop = min(frontier, self.position + CATCH_UP_BLOCK_BYTES)
+                    if block is not None and self.position < offset:
+                        stop = min(stop, offset)
+                    piece = os.pread(fd, stop - self.position, self.position)
+                    if not piece:
+                        raise IntegrityError(f'Downloaded data ends early at byte {self.position}')
+                self._feed(piece)
+                self.position += len(piece)
+        finally:
+            self._lock.release()
+
+    def finish(self, fd: int, size: int) -> str | None:
+        """Verify the rest of the file; returns the computed ``algorithm:hex`` checksum."""
+        self.advance(fd, size, wait=True)
+        if self._gzip is not None:
+            self._gzip.finish()
+        if self._hash is None:
+            return None
+        actual = f'{self.algorithm}:{self._hash.hexdigest()}'
+        if actual != self.expected:
+            raise IntegrityError(f'Checksum mismatch: expected {self.expected}, got {actual}')
+        return actual
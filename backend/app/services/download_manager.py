@@ -3,60 +3,261 @@ import requests
 import threading
 import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urlparse, unquote
-from concurrent.futures import ThreadPoolExecutor
-import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import ftplib
 import socket
 from ..database import get_db_connection
 from ..paths import resolve_project_path as resolve_project_workspace_path
+from .download_integrity import (
+    CATCH_UP_BLOCK_BYTES,
+    SIDECAR_MAX_BYTES,
+    SIDECAR_SUFFIXES,
+    IntegrityError,
+    StreamVerifier,
+    parse_checksum,
+    parse_sidecar,
+)
+from .download_scheduler import ThroughputProbe, bandwidth, ftp_connect, ftp_release, host_key, session_for, slots
+from .file_metadata import schedule_file_metadata
+from .upload_sessions import preallocate_file
+
+# Download state lives in the downloads / download_segments tables so any API
+# process can report it and a restarted process can pick up where the last
+# one stopped. A worker owns a download while its heartbeat is fresh.
+ACTIVE_STATUSES = ('preparing', 'downloading')
+PROGRESS_INTERVAL_SECONDS = 1.0
+STREAM_BLOCK_BYTES = 64 * 1024
+# An idle connection splits the largest unfinished segment in half, but only
+# while both halves stay at least this large.
+MIN_SPLIT_BYTES = 1024 * 1024
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+# SIZE / MDTM answers are reused for this long, e.g. across retries.
+FTP_INFO_TTL_SECONDS = 30
+
+_WORKER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+_ACTIVE_LOCK = threading.Lock()
+_ACTIVE_THREADS = {}
+_ACTIVE_TASKS = {}
+_SUPERVISOR = None
+_FTP_INFO_CACHE = {}
+
+
+class DownloadStopped(Exception):
+    """The download was paused, cancelled or taken over by another process."""
+
+
+class RemoteChanged(Exception):
+    """The remote file no longer matches the validators the partial data was fetched with."""
+
+
+def _stale_seconds():
+    try:
+        return max(5, int(os.getenv('APPAM_DOWNLOAD_STALE_SECONDS', '60')))
+    except Exception:
+        return 60
+
+
+def _resume_interval():
+    try:
+        return max(1.0, float(os.getenv('APPAM_DOWNLOAD_RESUME_INTERVAL', '15')))
+    except Exception:
+        return 15.0
+
+
+def _timestamp(delta_seconds=0):
+    moment = datetime.now(timezone.utc) + timedelta(seconds=delta_seconds)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
 
-# 全局下载任务存储
-download_tasks = {}
-download_threads = {}
 
 class DownloadTask:
-    def __init__(self, task_id, url, filename, project_id, path, concurrent=True):
-        self.task_id = task_id
-        self.url = url
-        self.filename = filename
-        self.project_id = project_id
-        self.path = path
-        self.concurrent = concurrent
-        self.status = 'preparing'
-        self.progress = 0
-        self.downloaded_size = 0
-        self.total_size = 0
+    """In-process view of one persisted download while a worker runs it."""
+
+    def __init__(self, row, segments):
+        self.task_id = row['id']
+        self.url = row['url']
+        self.filename = row['filename']
+        self.project_id = row['project_id']
+        self.path = row['path']
+        self.concurrent = bool(row['concurrent'])
+        self.priority = row['priority'] or 0
+        self.status = row['status']
+        self.total_size = row['total_size'] or 0
+        self.supports_ranges = bool(row['supports_ranges'])
+        self.etag = row['etag']
+        self.last_modified = row['last_modified']
+        self.expected_checksum = row['expected_checksum']
+        self.check_gzip = bool(row['check_gzip'])
+        self.checksum = None
+        self.segments = segments
         self.speed = 0
-        self.time_remaining = None
-        self.start_time = time.time()
-        self.last_update_time = time.time()
-        self.last_downloaded_size = 0
-        self.error = None
-        self.paused = False
-        self.cancelled = False
-        self.file_path = None
-        self.resume_headers = {}
-        
-    def to_dict(self):
-        return {
-            'task_id': self.task_id,
-            'url': self.url,
-            'filename': self.filename,
-            'status': self.status,
-            'progress': self.progress,
-            'downloaded_size': self.downloaded_size,
-            'total_size': self.total_size,
-            'speed': self.speed,
-            'time_remaining': self.time_remaining,
-            'error': self.error
-        }
+        # Guards segment offsets, which connections read and split concurrently.
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.fd = None
+        # Measures throughput for the adaptive connection count (HTTP only).
+        self.probe = None
+        # Checks content in file order as it is written, when there is something to check.
+        self.verifier = None
+        # Set to stop every segment thread at its next block.
+        self.abort = threading.Event()
+        self.last_flush = time.monotonic()
+        self.last_flushed_size = self.downloaded_size
+
+    @property
+    def downloaded_size(self):
+        return sum(segment['done'] for segment in self.segments)
+
+    @property
+    def save_dir(self):
+        return get_project_path(self.project_id, self.path)
+
+    @property
+    def file_path(self):
+        return os.path.join(self.save_dir, self.filename)
+
+    @property
+    def part_path(self):
+        return _part_path(self.save_dir, self.task_id)
+
+    def write(self, segment, block):
+        """Write ``block`` in place at the segment's current offset; returns False once the segment is full.
+
+        The segment's end may move down at any time when another connection
+        steals its tail, so the room left is read under the lock.
+        """
+        with self.lock:
+            start = segment['start'] + segment['done']
+            if segment['end'] is not None:
+                block = block[:max(0, segment['end'] - start)]
+        bandwidth.consume(len(block))
+        if self.probe is not None:
+            self.probe.record(len(block))
+        view = memoryview(block)
+        offset = start
+        while view:
+            written = os.pwrite(self.fd, view, offset)
+            offset += written
+            view = view[written:]
+        with self.lock:
+            segment['done'] += len(block)
+            full = segment['end'] is not None and segment['start'] + segment['done'] >= segment['end']
+            frontier = self.contiguous_size() if self.verifier is not None else 0
+        if self.verifier is not None:
+            self.verifier.advance(self.fd, frontier, block, start)
+        self.flush()
+        return not full
+
+    def contiguous_size(self):
+        """Bytes from the start of the file that are all written; the caller holds ``self.lock``."""
+        frontier = 0
+        for segment in sorted(self.segments, key=lambda segment: segment['start']):
+            if segment['start'] > frontier:
+                break
+            frontier = max(frontier, segment['start'] + segment['done'])
+            if segment['end'] is None or segment['start'] + segment['done'] < segment['end']:
+                break
+        return frontier
+
+    def next_segment(self):
+        """Hand an idle connection an unclaimed segment, or half of the largest one still running."""
+        with self.lock:
+            for segment in self.segments:
+                if not segment.get('active') and (segment['end'] is None or segment['start'] + segment['done'] < segment['end']):
+                    segment['active'] = True
+                    return segment
+            running = [
+                segment for segment in self.segments
+                if segment.get('active') and segment['end'] is not None
+            ]
+            if not running:
+                return None
+            victim = max(running, key=lambda segment: segment['end'] - segment['start'] - segment['done'])
+            position = victim['start'] + victim['done']
+            remaining = victim['end'] - position
+            if remaining < 2 * MIN_SPLIT_BYTES:
+                return None
+            # The victim may have one block in flight past ``position``; a
+            # block is far smaller than MIN_SPLIT_BYTES, so it stays below the cut.
+            middle = position + remaining // 2
+            stolen = {
+                'idx': max(segment['idx'] for segment in self.segments) + 1,
+                'start': middle,
+                'end': victim['end'],
+                'done': 0,
+                'active': True,
+            }
+            victim['end'] = middle
+            self.segments.append(stolen)
+            return stolen
+
+    def flush(self, force=False):
+        """Persist progress and heartbeat; raise DownloadStopped if the row says to stop.
+
+        Called after every block, but only touches the database every
+        PROGRESS_INTERVAL_SECONDS unless forced.
+        """
+        if self.abort.is_set() and not force:
+            raise DownloadStopped()
+        if not force and time.monotonic() - self.last_flush < PROGRESS_INTERVAL_SECONDS:
+            return
+        with self.flush_lock:
+            now = time.monotonic()
+            elapsed = now - self.last_flush
+            if not force and elapsed < PROGRESS_INTERVAL_SECONDS:
+                return
+            with self.lock:
+                downloaded = self.downloaded_size
+                rows = [(self.task_id, segment['idx'], segment['start'], segment['end'], segment['done']) for segment in self.segments]
+            if elapsed > 0:
+                current = (downloaded - self.last_flushed_size) / elapsed
+                self.speed = current if not self.speed else 0.7 * self.speed + 0.3 * current
+            remaining = None
+            if self.total_size and self.speed > 0:
+                remaining = max(0, self.total_size - downloaded) / self.speed
+            self.last_flush = now
+            self.last_flushed_size = downloaded
+            conn = get_db_connection()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                cursor = conn.execute(
+                    '''
+                    UPDATE downloads
+                    SET downloaded_size = ?, speed = ?, time_remaining = ?,
+                        heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND worker_id = ? AND status = 'downloading'
+                    ''',
+                    (downloaded, self.speed, remaining, self.task_id, _WORKER_ID),
+                )
+                owned = cursor.rowcount == 1
+                if owned:
+                    conn.executemany(
+                        '''
+                        INSERT INTO download_segments (download_id, idx, start_offset, end_offset, done_bytes)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT (download_id, idx) DO UPDATE
+                        SET end_offset = excluded.end_offset, done_bytes = excluded.done_bytes
+                        ''',
+                        rows,
+                    )
+                conn.commit()
+            finally:
+                conn.close()
+        if not owned:
+            raise DownloadStopped()
+
 
 def get_project_path(project_id, path=''):
     """Get absolute path for project files"""
     return str(resolve_project_workspace_path(project_id, path))
 
+
+def _part_path(save_dir, task_id):
+    # list_files hides .tmp_* entries.
+    return os.path.join(save_dir, f'.tmp_{task_id}.part')
+
+
 def extract_filename_from_url(url):
     """从URL中提取文件名"""
     try:
@@ -70,37 +271,41 @@ def extract_filename_from_url(url):
     except:
         return f"download_{int(time.time())}"
 
-def get_ftp_file_info(url):
-    """获取FTP文件信息"""
+def get_ftp_file_info(url, fresh=False):
+    """获取FTP文件信息 (SIZE / MDTM), cached for FTP_INFO_TTL_SECONDS unless ``fresh``"""
+    now = time.monotonic()
+    cached = _FTP_INFO_CACHE.get(url)
+    if cached and not fresh and now - cached[0] < FTP_INFO_TTL_SECONDS:
+        return dict(cached[1])
     try:
-        parsed = urlparse(url)
-        host = parsed.hostname
-        port = parsed.port or 21
-        path = parsed.path
-        username = parsed.username or 'anonymous'
-        password = parsed.password or 'anonymous@'
-        
-        ftp = ftplib.FTP()
-        ftp.connect(host, port, timeout=30)
-        ftp.login(username, password)
-        
-        # 获取文件大小
-        file_size = ftp.size(path)
-        
-        # 获取文件名
-        filename = os.path.basename(path)
-        
-        ftp.quit()
-        
-        return {
-            'supports_resume': True,  # FTP支持断点续传
+        path = unquote(urlparse(url).path)
+        ftp = ftp_connect(url)
+        try:
+            # 获取文件大小
+            file_size = ftp.size(path)
+            try:
+                # MDTM is the only validator FTP has; it detects a replaced file on resume.
+                last_modified = ftp.sendcmd(f'MDTM {path}')[4:].strip()
+            except ftplib.error_perm:
+                last_modified = None
+        except BaseException:
+            ftp.close()
+            raise
+        ftp_release(url, ftp)
+
+        info = {
+            'supports_resume': True,  # FTP支持断点续传 (REST)
             'content_length': file_size or 0,
             'content_type': '',
-            'filename': filename
+            'filename': os.path.basename(path),
+            'etag': None,
+            'last_modified': last_modified,
         }
+        _FTP_INFO_CACHE[url] = (now, info)
+        return dict(info)
     except Exception as e:
         print(f"Error getting FTP info: {e}")
-        return {'supports_resume': False, 'content_length': 0, 'content_type': '', 'filename': None}
+        return {'supports_resume': False, 'content_length': 0, 'content_type': '', 'filename': None, 'etag': None, 'last_modified': None}
 
 def get_content_info(url):
     """获取远程文件信息"""
@@ -108,475 +313,819 @@ def get_content_info(url):
         parsed = urlparse(url)
         if parsed.scheme.lower() == 'ftp':
             return get_ftp_file_info(url)
-        
+
         # HTTP/HTTPS处理
-        response = requests.head(url, allow_redirects=True, timeout=30)
-        
+        response = session_for(url).head(url, allow_redirects=True, timeout=30)
+
         info = {
             'supports_resume': 'accept-ranges' in response.headers and response.headers.get('accept-ranges') == 'bytes',
             'content_length': int(response.headers.get('content-length', 0)),
             'content_type': response.headers.get('content-type', ''),
-            'filename': None
+            'filename': None,
+            # Validators let a resumed range request detect a changed file (If-Range).
+            'etag': response.headers.get('etag') if not response.headers.get('etag', '').startswith('W/') else None,
+            'last_modified': response.headers.get('last-modified'),
         }
-        
+
         # 尝试从Content-Disposition获取文件名
         content_disposition = response.headers.get('content-disposition', '')
         if 'filename=' in content_disposition:
             filename = content_disposition.split('filename=')[1].strip('"\'')
             info['filename'] = unquote(filename)
-        
+
         return info
     except Exception as e:
         print(f"Error getting content info: {e}")
-        return {'supports_resume': False, 'content_length': 0, 'content_type': '', 'filename': None}
-
-def download_chunk(url, start, end, chunk_file, headers=None, max_retries=3):
-    """下载文件片段 - 增强错误处理和重试机制"""
-    if headers is None:
-        headers = {}
-    
-    headers['Range'] = f'bytes={start}-{end}'
-    headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    headers['Connection'] = 'keep-alive'
-    
-    for attempt in range(max_retries):
+        return {'supports_resume': False, 'content_length': 0, 'content_type': '', 'filename': None, 'etag': None, 'last_modified': None}
+
+
+def _read_small(url, limit=SIDECAR_MAX_BYTES):
+    """Body of a small remote file, or None if it is missing or larger than ``limit``."""
+    if urlparse(url).scheme.lower() == 'ftp':
+        chunks = []
+
+        def collect(data):
+            chunks.append(data)
+            if sum(len(chunk) for chunk in chunks) > limit:
+                raise OverflowError()
+
+        ftp = ftp_connect(url)
         try:
-            response = requests.get(
-                url, 
-                headers=headers, 
-                stream=True, 
-                timeout=60,  # 增加超时时间
-                allow_redirects=True
-            )
-            
-            if response.status_code in [206, 200]:  # 206 Partial Content, 200 OK
-                with open(chunk_file, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=32768):  # 增大块大小
-                        if chunk:
-                            f.write(chunk)
-                return True
-            else:
-                print(f"HTTP {response.status_code} for chunk {start}-{end}")
-                
-        except requests.exceptions.RequestException as e:
-            print(f"Attempt {attempt + 1} failed for chunk {start}-{end}: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)  # 指数退避
-            else:
-                print(f"Final failure downloading chunk {start}-{end}: {e}")
-        except Exception as e:
-            print(f"Unexpected error downloading chunk {start}-{end}: {e}")
-            break
-    
-    return False
+            ftp.retrbinary(f'RETR {unquote(urlparse(url).path)}', collect)
+        except ftplib.error_perm:
+            ftp_release(url, ftp)
+            return None
+        except BaseException:
+            ftp.close()
+            raise
+        ftp_release(url, ftp)
+        return b''.join(chunks)
+    with session_for(url).get(url, headers={'User-Agent': USER_AGENT}, stream=True, timeout=30) as response:
+        body = b''
+        for block in response.iter_content(chunk_size=STREAM_BLOCK_BYTES):
+            body += block
+            if len(body) > limit:
+                return None
+        # Reading even an error page to the end keeps the connection reusable.
+        return body if response.status_code == 200 else None
+
 
-def merge_chunks(chunk_files, output_file):
-    """合并文件片段"""
+def find_sidecar_checksum(url):
+    """Checksum published next to the file as ``<name>.md5`` or ``<name>.sha256``, as on NCBI/ENA mirrors."""
+    parsed = urlparse(url)
+    remote_name = unquote(os.path.basename(parsed.path))
+    for suffix in SIDECAR_SUFFIXES:
+        try:
+            body = _read_small(parsed._replace(path=parsed.path + suffix).geturl())
+        except Exception:
+            continue
+        checksum = parse_sidecar(body.decode('utf-8', 'replace'), remote_name, suffix) if body else None
+        if checksum:
+            return checksum
+    return None
+
+
+def _prepare_verifier(task):
+    """Verify against the user's checksum, else a sidecar's; the sidecar is looked up on every start."""
+    expected = task.expected_checksum or find_sidecar_checksum(task.url)
+    task.verifier = StreamVerifier(expected, task.check_gzip) if expected or task.check_gzip else None
+
+
+def _catch_up_verifier(task):
+    """Verify the part already on disk before any connection opens.
+
+    On a resumed download that can be most of the file, so the heartbeat
+    is renewed between blocks; otherwise another process would take the
+    download over while this one is still hashing.
+    """
+    if task.verifier is None:
+        return
+    with task.lock:
+        frontier = task.contiguous_size()
+    while task.verifier.position < frontier:
+        task.verifier.advance(task.fd, min(frontier, task.verifier.position + CATCH_UP_BLOCK_BYTES), wait=True)
+        task.flush()
+
+
+def _discard_partial(task):
+    """Drop bad data so a retry fetches the file from scratch."""
+    conn = get_db_connection()
     try:
-        with open(output_file, 'wb') as outfile:
-            for chunk_file in chunk_files:
-                if os.path.exists(chunk_file):
-                    with open(chunk_file, 'rb') as infile:
-                        outfile.write(infile.read())
-                    os.remove(chunk_file)  # 删除临时片段文件
-        return True
-    except Exception as e:
-        print(f"Error merging chunks: {e}")
-        return False
+        conn.execute('DELETE FROM download_segments WHERE download_id = ?', (task.task_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    try:
+        os.unlink(task.part_path)
+    except OSError:
+        pass
 
-def single_thread_download(task):
-    """单线程下载"""
+
+def _segment_count(total_size, num_threads=8):
+    # 为大文件动态调整线程数
+    if total_size > 1024 * 1024 * 1024:  # 1GB+
+        num_threads = min(32, num_threads * 4)
+    elif total_size > 100 * 1024 * 1024:  # 100MB+
+        num_threads = min(16, num_threads * 2)
+    # 最小1MB块
+    return max(1, min(num_threads, total_size // (1024 * 1024)))
+
+
+def _plan_segments(task, info):
+    """Fetch remote metadata and split the file into persisted byte ranges."""
+    task.total_size = info['content_length'] or 0
+    task.supports_ranges = bool(info['supports_resume'] and task.total_size)
+    task.etag, task.last_modified = info.get('etag'), info.get('last_modified')
+    if not task.filename:
+        task.filename = info.get('filename') or extract_filename_from_url(task.url)
+
+    count = _segment_count(task.total_size) if task.concurrent and task.supports_ranges else 1
+    chunk_size = -(-task.total_size // count) if task.total_size else 0
+    task.segments = []
+    for idx in range(count):
+        start = idx * chunk_size
+        end = min(task.total_size, start + chunk_size) if task.total_size else None
+        task.segments.append({'idx': idx, 'start': start, 'end': end, 'done': 0})
+
+    # Every connection writes its range straight into this file; it is
+    # renamed into place at the end, with no merge pass.
+    os.makedirs(task.save_dir, exist_ok=True)
+    preallocate_file(task.part_path, task.total_size)
+    conn = get_db_connection()
     try:
-        headers = task.resume_headers.copy()
-        
-        # 检查是否支持断点续传
-        if task.downloaded_size > 0:
-            headers['Range'] = f'bytes={task.downloaded_size}-'
-        
-        response = requests.get(task.url, headers=headers, stream=True, timeout=30)
-        
-        if response.status_code not in [200, 206]:
-            task.status = 'error'
-            task.error = f"HTTP error: {response.status_code}"
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM download_segments WHERE download_id = ?', (task.task_id,))
+        conn.executemany(
+            'INSERT INTO download_segments (download_id, idx, start_offset, end_offset, done_bytes) VALUES (?, ?, ?, ?, 0)',
+            [(task.task_id, segment['idx'], segment['start'], segment['end']) for segment in task.segments],
+        )
+        cursor = conn.execute(
+            '''
+            UPDATE downloads
+            SET filename = ?, total_size = ?, supports_ranges = ?, etag = ?, last_modified = ?,
+                downloaded_size = 0, status = 'downloading', heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND worker_id = ? AND status IN ('preparing', 'downloading')
+            ''',
+            (task.filename, task.total_size, int(task.supports_ranges), task.etag, task.last_modified, task.task_id, _WORKER_ID),
+        )
+        if cursor.rowcount != 1:
+            conn.rollback()
+            raise DownloadStopped()
+        conn.commit()
+    finally:
+        conn.close()
+    task.status = 'downloading'
+
+
+def _reconcile_segments(task):
+    """Continue from persisted offsets if the part file survived, otherwise from zero.
+
+    Offsets are only recorded after their bytes were written, so they never
+    run ahead of the data in the file.
+    """
+    exists = os.path.exists(task.part_path)
+    on_disk = os.path.getsize(task.part_path) if exists else 0
+    for segment in task.segments:
+        if not exists or (not task.supports_ranges and segment['end'] != segment['start'] + segment['done']):
+            # Without range support an unfinished stream can only start over.
+            segment['done'] = 0
+        elif segment['end'] is None:
+            segment['done'] = min(segment['done'], max(0, on_disk - segment['start']))
+    if not exists:
+        os.makedirs(task.save_dir, exist_ok=True)
+        preallocate_file(task.part_path, task.total_size)
+
+
+def download_segment(task, segment, max_retries=3):
+    """下载文件片段 - 从已完成的偏移处续传，带重试"""
+    for attempt in range(max_retries):
+        try:
+            _fetch_segment(task, segment)
             return
-        
-        # 获取总大小
-        if task.total_size == 0:
+        except (DownloadStopped, RemoteChanged):
+            raise
+        except requests.exceptions.RequestException as e:
+            print(f"Attempt {attempt + 1} failed for segment {segment['idx']} of {task.task_id}: {e}")
+            if attempt == max_retries - 1:
+                raise
+            time.sleep(2 ** attempt)  # 指数退避
+
+
+def _fetch_segment(task, segment):
+    position = segment['start'] + segment['done']
+    if segment['end'] is not None and position >= segment['end']:
+        return
+    headers = {'User-Agent': USER_AGENT, 'Connection': 'keep-alive'}
+    ranged = task.supports_ranges and (position > 0 or segment['end'] not in (None, task.total_size))
+    if ranged:
+        last = '' if segment['end'] is None else segment['end'] - 1
+        headers['Range'] = f'bytes={position}-{last}'
+        # Every range must come from the version the segments were planned for.
+        validator = task.etag or task.last_modified
+        if validator:
+            headers['If-Range'] = validator
+
+    with session_for(task.url).get(task.url, headers=headers, stream=True, timeout=60, allow_redirects=True) as response:
+        if ranged and response.status_code == 200:
+            # The server ignored the range or If-Range failed: the file changed.
+            raise RemoteChanged()
+        if response.status_code not in (200, 206):
+            raise RuntimeError(f'HTTP error: {response.status_code}')
+        if task.total_size == 0 and not ranged:
             content_length = response.headers.get('content-length')
-            if content_length:
-                if response.status_code == 206:
-                    # 部分内容响应
-                    task.total_size = task.downloaded_size + int(content_length)
-                else:
-                    task.total_size = int(content_length)
-        
-        # 打开文件进行写入
-        mode = 'ab' if task.downloaded_size > 0 else 'wb'
-        with open(task.file_path, mode) as f:
-            chunk_size = 8192
-            last_update = time.time()
-            
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                if task.cancelled:
-                    task.status = 'cancelled'
-                    return
-                
-                if task.paused:
-                    task.status = 'paused'
-                    return
-                
-                if chunk:
-                    f.write(chunk)
-                    task.downloaded_size += len(chunk)
-                    
-                    # 更新进度和速度
-                    current_time = time.time()
-                    if current_time - last_update >= 1.0:  # 每秒更新一次
-                        elapsed = current_time - task.last_update_time
-                        if elapsed > 0:
-                            bytes_per_second = (task.downloaded_size - task.last_downloaded_size) / elapsed
-                            task.speed = bytes_per_second
-                            
-                            # 计算剩余时间
-                            if task.total_size > 0 and bytes_per_second > 0:
-                                remaining_bytes = task.total_size - task.downloaded_size
-                                task.time_remaining = remaining_bytes / bytes_per_second
-                        
-                        # 计算进度
-                        if task.total_size > 0:
-                            task.progress = (task.downloaded_size / task.total_size) * 100
-                        
-                        task.last_update_time = current_time
-                        task.last_downloaded_size = task.downloaded_size
-                        last_update = current_time
-        
-        task.status = 'completed'
-        task.progress = 100
-        
-    except Exception as e:
-        task.status = 'error'
-        task.error = str(e)
+            task.total_size = int(content_length) if content_length else 0
+
+        for block in response.iter_content(chunk_size=STREAM_BLOCK_BYTES):
+            if block and not task.write(segment, block):
+                break
+
+    if segment['end'] is None:
+        segment['end'] = segment['start'] + segment['done']
+        task.total_size = segment['end']
+    elif segment['start'] + segment['done'] < segment['end']:
+        raise requests.exceptions.ConnectionError(f"Segment {segment['idx']} ended early at byte {segment['start'] + segment['done']}")
+
+
+class _HttpChannel:
+    """Segments fetched through the host's pooled keep-alive session."""
+
+    def __init__(self, task):
+        self.task = task
+
+    def fetch(self, segment):
+        download_segment(self.task, segment)
+
+    def close(self):
+        pass
+
+
+class _FtpChannel:
+    """One logged-in control connection; each segment is a RETR after REST at its offset."""
+
+    def __init__(self, task):
+        self.task = task
+        self.path = unquote(urlparse(task.url).path)
+        self.ftp = None
+
+    def fetch(self, segment, max_retries=3):
+        for attempt in range(max_retries):
+            try:
+                self._retrieve(segment)
+                return
+            except (DownloadStopped, RemoteChanged):
+                raise
+            except ftplib.all_errors as e:
+                self._discard()
+                print(f"Attempt {attempt + 1} failed for segment {segment['idx']} of {self.task.task_id}: {e}")
+                if attempt == max_retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def _retrieve(self, segment):
+        task = self.task
+        position = segment['start'] + segment['done']
+        if segment['end'] is not None and position >= segment['end']:
+            return
+        if self.ftp is None:
+            self.ftp = ftp_connect(task.url)
+        data = self.ftp.transfercmd(f'RETR {self.path}', rest=position or None)
+        try:
+            while True:
+                block = data.recv(STREAM_BLOCK_BYTES)
+                if not block or not task.write(segment, block):
+                    break
+        except BaseException:
+            # The control connection is mid-transfer; it cannot be reused.
+            data.close()
+            self._discard()
+            raise
+        data.close()
+        self._end_transfer()
+
+        if segment['end'] is None:
+            segment['end'] = segment['start'] + segment['done']
+            task.total_size = segment['end']
+        elif segment['start'] + segment['done'] < segment['end']:
+            raise EOFError(f"Segment {segment['idx']} ended early at byte {segment['start'] + segment['done']}")
+
+    def _end_transfer(self):
+        """Consume the transfer's closing replies so the connection can be reused.
+
+        A segment usually stops before the end of the file; servers answer
+        the closed data connection with 426, 226 or both, so a NOOP marks
+        where those replies end.
+        """
+        self.ftp.putcmd('NOOP')
+        for _ in range(4):
+            if self.ftp.getmultiline()[:3] == '200':
+                return
+        raise ftplib.error_proto('Unexpected replies after an interrupted transfer')
 
-def multi_thread_download(task, num_threads=8):
-    """多线程下载 - 优化大文件下载"""
+    def _discard(self):
+        if self.ftp is not None:
+            self.ftp.close()
+            self.ftp = None
+
+    def close(self):
+        if self.ftp is not None:
+            ftp_release(self.task.url, self.ftp)
+            self.ftp = None
+
+
+def _acquire_slot(task, host):
+    """Wait for a connection slot, keeping the heartbeat fresh while queued."""
+    while not slots.acquire(host, task.priority, timeout=PROGRESS_INTERVAL_SECONDS):
+        task.flush()
+
+
+def _connection_worker(task, host, channel_class):
+    """Drain segments over one connection; owns a slot acquired by the caller."""
+    channel = channel_class(task)
     try:
-        # 获取文件信息
-        info = get_content_info(task.url)
-        if not info['supports_resume'] or info['content_length'] == 0:
-            # 不支持断点续传，使用单线程
-            return single_thread_download(task)
-        
-        task.total_size = info['content_length']
-        
-        # 为大文件动态调整线程数
-        if task.total_size > 100 * 1024 * 1024:  # 100MB+
-            num_threads = min(16, num_threads * 2)
-        elif task.total_size > 1024 * 1024 * 1024:  # 1GB+
-            num_threads = min(32, num_threads * 4)
-        
-        chunk_size = max(1024 * 1024, task.total_size // num_threads)  # 最小1MB块
-        
-        # 创建临时目录
-        temp_dir = os.path.join(os.path.dirname(task.file_path), f'.tmp_{task.task_id}')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 创建下载任务
-        chunk_files = []
-        download_futures = []
-        
-        # 限制并发数以避免过度消耗资源
-        max_workers = min(num_threads, os.cpu_count() * 2)
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            for i in range(num_threads):
-                start = i * chunk_size
-                end = start + chunk_size - 1 if i < num_threads - 1 else task.total_size - 1
-                
-                chunk_file = os.path.join(temp_dir, f'chunk_{i}')
-                chunk_files.append(chunk_file)
-                
-                future = executor.submit(download_chunk, task.url, start, end, chunk_file)
-                download_futures.append(future)
-            
-            # 监控下载进度
-            while not all(future.done() for future in download_futures):
-                if task.cancelled:
-                    # 取消所有下载
-                    for future in download_futures:
-                        future.cancel()
-                    task.status = 'cancelled'
-                    return
-                
-                if task.paused:
-                    task.status = 'paused'
-                    return
-                
-                # 计算总下载大小
-                total_downloaded = 0
-                for chunk_file in chunk_files:
-                    if os.path.exists(chunk_file):
-                        total_downloaded += os.path.getsize(chunk_file)
-                
-                task.downloaded_size = total_downloaded
-                if task.total_size > 0:
-                    task.progress = (task.downloaded_size / task.total_size) * 100
-                
-                # 计算速度
-                current_time = time.time()
-                elapsed = current_time - task.last_update_time
-                if elapsed >= 1.0:
-                    bytes_per_second = (task.downloaded_size - task.last_downloaded_size) / elapsed
-                    task.speed = bytes_per_second
-                    
-                    if task.total_size > 0 and bytes_per_second > 0:
-                        remaining_bytes = task.total_size - task.downloaded_size
-                        task.time_remaining = remaining_bytes / bytes_per_second
-                    
-                    task.last_update_time = current_time
-                    task.last_downloaded_size = task.downloaded_size
-                
-                time.sleep(0.5)
-            
-            # 检查所有下载是否成功
-            if all(future.result() for future in download_futures):
-                # 合并文件片段
-                if merge_chunks(chunk_files, task.file_path):
-                    task.status = 'completed'
-                    task.progress = 100
-                else:
-                    task.status = 'error'
-                    task.error = 'Failed to merge file chunks'
-            else:
-                task.status = 'error'
-                task.error = 'Some file chunks failed to download'
-        
-        # 清理临时目录
+        while True:
+            segment = task.next_segment()
+            if segment is None:
+                return
+            try:
+                channel.fetch(segment)
+            finally:
+                with task.lock:
+                    segment['active'] = False
+    finally:
+        channel.close()
+        slots.release(host)
+
+
+def _run_connections(task, channel_class):
+    """Fetch the unfinished ranges over several connections writing into one file.
+
+    Connections come from the process-wide scheduler: the first waits its
+    turn by priority, further ones are added while each extra connection
+    still raises this host's throughput. A connection that runs out of work
+    takes the second half of the range with the most bytes left, so a slow
+    mirror connection does not hold the whole download back.
+    """
+    host = host_key(task.url)
+    ceiling = _segment_count(task.total_size) if task.concurrent and task.supports_ranges else 1
+    task.probe = ThroughputProbe(host, ceiling)
+    _acquire_slot(task, host)
+    with ThreadPoolExecutor(max_workers=ceiling) as executor:
+        pending = {executor.submit(_connection_worker, task, host, channel_class)}
+        connections = 1
+        start = task.probe.initial()
+        while connections < start and slots.try_acquire(host, task.priority):
+            pending.add(executor.submit(_connection_worker, task, host, channel_class))
+            connections += 1
         try:
-            os.rmdir(temp_dir)
-        except:
-            pass
-            
-    except Exception as e:
-        task.status = 'error'
-        task.error = str(e)
+            while pending:
+                done, pending = wait(pending, timeout=ThroughputProbe.SAMPLE_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+                # Once a connection has run out of work, more would not help.
+                if len(pending) == connections and task.probe.should_grow(connections) and slots.try_acquire(host, task.priority):
+                    pending.add(executor.submit(_connection_worker, task, host, channel_class))
+                    connections += 1
+        except BaseException:
+            # Stop the remaining connections at their next block.
+            task.abort.set()
+            raise
+    if not task.probe.settled and connections > start:
+        task.probe.remember(connections)
+
 
-def download_worker(task):
-    """下载工作线程"""
+def http_download(task):
+    _run_connections(task, _HttpChannel)
+
+
+def ftp_download(task):
+    """FTP下载 - 多个控制/数据连接, 各自通过 REST 从自己的偏移读取"""
+    if task.downloaded_size and (task.total_size or task.last_modified):
+        # FTP has no If-Range: compare SIZE / MDTM before appending to old data.
+        info = get_ftp_file_info(task.url, fresh=True)
+        if info['content_length'] != task.total_size or info['last_modified'] != task.last_modified:
+            raise RemoteChanged()
+    _run_connections(task, _FtpChannel)
+
+
+def _finalize(task):
+    # Confirms this worker still owns the download before touching the target.
+    task.flush(force=True)
+    if task.total_size:
+        os.truncate(task.part_path, task.total_size)
+    os.replace(task.part_path, task.file_path)
+    conn = get_db_connection()
     try:
-        task.status = 'downloading'
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(task.file_path), exist_ok=True)
-        
-        # 检查协议类型
-        parsed = urlparse(task.url)
-        if parsed.scheme.lower() == 'ftp':
-            # FTP下载（目前只支持单线程）
-            single_thread_ftp_download(task)
-        else:
-            # HTTP/HTTPS下载
-            if task.concurrent:
-                multi_thread_download(task)
-            else:
-                single_thread_download(task)
-            
-    except Exception as e:
-        task.status = 'error'
-        task.error = str(e)
+        conn.execute(
+            '''
+            UPDATE downloads
+            SET status = 'completed', total_size = ?, downloaded_size = ?, checksum = ?, time_remaining = NULL,
+                worker_id = NULL, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            ''',
+            (task.downloaded_size, task.downloaded_size, task.checksum, task.task_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _mark_error(task_id, error):
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            '''
+            UPDATE downloads
+            SET status = 'error', error = ?, speed = 0, time_remaining = NULL, worker_id = NULL,
+                finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND worker_id = ? AND status IN ('preparing', 'downloading')
+            ''',
+            (error, task_id, _WORKER_ID),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _load_task(task_id):
+    conn = get_db_connection()
+    try:
+        row = conn.execute('SELECT * FROM downloads WHERE id = ?', (task_id,)).fetchone()
+        segments = conn.execute(
+            'SELECT idx, start_offset, end_offset, done_bytes FROM download_segments WHERE download_id = ? ORDER BY idx',
+            (task_id,),
+        ).fetchall()
     finally:
-        # 清理下载线程记录
-        if task.task_id in download_threads:
-            del download_threads[task.task_id]
+        conn.close()
+    if not row:
+        return None
+    return DownloadTask(row, [
+        {'idx': segment['idx'], 'start': segment['start_offset'], 'end': segment['end_offset'], 'done': segment['done_bytes']}
+        for segment in segments
+    ])
+
 
-def single_thread_ftp_download(task):
-    """单线程FTP下载"""
+def download_worker(task_id):
+    """下载工作线程: 规划分段（首次）或从数据库记录的偏移续传"""
+    task = None
     try:
-        parsed = urlparse(task.url)
-        host = parsed.hostname
-        port = parsed.port or 21
-        path = parsed.path
-        username = parsed.username or 'anonymous'
-        password = parsed.password or 'anonymous@'
-        
-        ftp = ftplib.FTP()
-        ftp.connect(host, port, timeout=60)
-        ftp.login(username, password)
-        ftp.set_pasv(True)
-        
-        # 获取文件大小
-        if task.total_size == 0:
+        task = _load_task(task_id)
+        if task is None:
+            return
+        with _ACTIVE_LOCK:
+            _ACTIVE_TASKS[task_id] = task
+        for attempt in range(2):
+            task.abort.clear()
             try:
-                task.total_size = ftp.size(path)
-            except:
-                pass
-        
-        # 打开文件进行写入
-        mode = 'ab' if task.downloaded_size > 0 else 'wb'
-        
-        with open(task.file_path, mode) as f:
-            last_update = time.time()
-            
-            def callback(data):
-                nonlocal last_update
-                
-                if task.cancelled:
-                    raise Exception("Download cancelled")
-                if task.paused:
-                    raise Exception("Download paused")
-                
-                f.write(data)
-                task.downloaded_size += len(data)
-                
-                # 更新进度
-                current_time = time.time()
-                if current_time - last_update >= 1.0:
-                    elapsed = current_time - task.last_update_time
-                    if elapsed > 0:
-                        bytes_per_second = (task.downloaded_size - task.last_downloaded_size) / elapsed
-                        task.speed = bytes_per_second
-                        
-                        if task.total_size > 0 and bytes_per_second > 0:
-                            remaining_bytes = task.total_size - task.downloaded_size
-                            task.time_remaining = remaining_bytes / bytes_per_second
-                    
-                    if task.total_size > 0:
-                        task.progress = (task.downloaded_size / task.total_size) * 100
-                    
-                    task.last_update_time = current_time
-                    task.last_downloaded_size = task.downloaded_size
-                    last_update = current_time
-            
-            # 支持断点续传
-            if task.downloaded_size > 0:
+                if task.status == 'preparing' or not task.segments:
+                    _plan_segments(task, get_content_info(task.url))
+                else:
+                    _reconcile_segments(task)
+                _prepare_verifier(task)
+                # Read access lets the verifier pick up ranges written ahead of it.
+                task.fd = os.open(task.part_path, os.O_RDWR | os.O_CREAT, 0o644)
                 try:
-                    ftp.voidcmd(f'REST {task.downloaded_size}')
-                except:
-                    # 如果不支持断点续传，重新开始
-                    task.downloaded_size = 0
-                    f.seek(0)
-                    f.truncate()
-            
-            ftp.retrbinary(f'RETR {path}', callback)
-        
-        ftp.quit()
-        task.status = 'completed'
-        task.progress = 100
-        
+                    _catch_up_verifier(task)
+                    if urlparse(task.url).scheme.lower() == 'ftp':
+                        ftp_download(task)
+                    else:
+                        http_download(task)
+                    if task.verifier is not None:
+                        task.checksum = task.verifier.finish(task.fd, task.downloaded_size)
+                finally:
+                    os.close(task.fd)
+                break
+            except RemoteChanged:
+                if attempt:
+                    raise RuntimeError('Remote file changed during download')
+                # Partial data belongs to an older version; start over once.
+                task.status = 'preparing'
+        _finalize(task)
+        schedule_file_metadata(task.project_id, os.path.join(task.path, task.filename))
+    except DownloadStopped:
+        # Paused, cancelled or claimed elsewhere; the row already says which.
+        pass
+    except IntegrityError as e:
+        _discard_partial(task)
+        _mark_error(task_id, str(e))
     except Exception as e:
-        if "cancelled" in str(e):
-            task.status = 'cancelled'
-        elif "paused" in str(e):
-            task.status = 'paused'
-        else:
-            task.status = 'error'
-            task.error = str(e)
-        
-        # 确保关闭FTP连接
-        try:
-            ftp.quit()
-        except:
-            pass
-
-def start_download(project_id, url, filename, path, concurrent=True, task_id=None):
-    """开始下载任务"""
-    if not task_id:
-        task_id = str(uuid.uuid4())
-    
-    # 如果没有提供文件名，从URL提取
-    if not filename:
-        info = get_content_info(url)
-        filename = info.get('filename') or extract_filename_from_url(url)
-    
-    # 构建文件保存路径
-    save_dir = get_project_path(project_id, path)
-    file_path = os.path.join(save_dir, filename)
-    
-    # 创建下载任务
-    task = DownloadTask(task_id, url, filename, project_id, path, concurrent)
-    task.file_path = file_path
-    
-    # 检查文件是否已存在，如果存在则支持断点续传
-    if os.path.exists(file_path):
-        task.downloaded_size = os.path.getsize(file_path)
-    
-    download_tasks[task_id] = task
-    
-    # 启动下载线程
-    thread = threading.Thread(target=download_worker, args=(task,))
-    thread.daemon = True
-    thread.start()
-    
-    download_threads[task_id] = thread
-    
-    return task_id
+        # Keep the offsets reached so far; a download still preparing has none.
+        if task is not None and task.status == 'downloading':
+            try:
+                task.flush(force=True)
+            except DownloadStopped:
+                return
+        _mark_error(task_id, str(e))
+    finally:
+        with _ACTIVE_LOCK:
+            if _ACTIVE_THREADS.get(task_id) is threading.current_thread():
+                _ACTIVE_THREADS.pop(task_id, None)
+                _ACTIVE_TASKS.pop(task_id, None)
+
+
+def _stop_local(task_id, timeout=5.0):
+    """Stop this process's worker for ``task_id``, if any; True once no worker is left."""
+    with _ACTIVE_LOCK:
+        thread = _ACTIVE_THREADS.get(task_id)
+        task = _ACTIVE_TASKS.get(task_id)
+    if task is not None:
+        task.abort.set()
+    if thread is not None and thread is not threading.current_thread():
+        thread.join(timeout)
+        return not thread.is_alive()
+    return True
 
-def pause_download(task_id):
-    """暂停下载"""
-    if task_id in download_tasks:
-        task = download_tasks[task_id]
-        task.paused = True
+
+def _owner_is_gone(worker_id):
+    """True when ``worker_id`` belongs to a dead process on this host."""
+    if not worker_id:
         return True
-    return False
-
-def resume_download(task_id):
-    """继续下载"""
-    if task_id in download_tasks:
-        task = download_tasks[task_id]
-        if task.status == 'paused':
-            task.paused = False
-            
-            # 重新启动下载线程
-            thread = threading.Thread(target=download_worker, args=(task,))
-            thread.daemon = True
-            thread.start()
-            
-            download_threads[task_id] = thread
-            return True
-    return False
-
-def cancel_download(task_id):
-    """取消下载"""
-    if task_id in download_tasks:
-        task = download_tasks[task_id]
-        task.cancelled = True
-        task.status = 'cancelled'
-        
-        # 删除部分下载的文件
-        if task.file_path and os.path.exists(task.file_path):
-            try:
-                os.remove(task.file_path)
-            except:
-                pass
-        
-        # 清理任务记录
-        del download_tasks[task_id]
-        if task_id in download_threads:
-            del download_threads[task_id]
-        
+    host, _, rest = worker_id.partition(':')
+    pid, _, token = rest.partition(':')
+    if host != socket.gethostname():
+        return False
+    if worker_id == _WORKER_ID:
+        return False
+    if pid == str(os.getpid()):
+        # Same pid, other token: a previous process (e.g. in a restarted container).
+        return True
+    try:
+        os.kill(int(pid), 0)
+        return False
+    except (OSError, ValueError):
+        return True
+
+
+def _launch(task_id, expected_owner=None):
+    """Claim the download for this process and run it on a daemon thread."""
+    if expected_owner is None and not _stop_local(task_id):
+        # A stopped worker is still blocked on the network; the supervisor retries later.
+        return False
+    with _ACTIVE_LOCK:
+        thread = _ACTIVE_THREADS.get(task_id)
+        if thread and thread.is_alive():
+            return False
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute(
+                '''
+                UPDATE downloads
+                SET worker_id = ?, heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status IN ('preparing', 'downloading') AND worker_id IS ?
+                ''',
+                (_WORKER_ID, task_id, expected_owner),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        if cursor.rowcount != 1:
+            return False
+        thread = threading.Thread(target=download_worker, args=(task_id,), name=f'appam-download-{task_id[:8]}', daemon=True)
+        _ACTIVE_THREADS[task_id] = thread
+        thread.start()
         return True
-    return False
 
-def get_download_progress(task_id):
+
+def resume_stale_downloads():
+    """Take over active downloads whose worker died or stopped heart-beating.
+
+    They continue from the byte offsets last recorded for each segment.
+    """
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT id, worker_id, heartbeat_at FROM downloads WHERE status IN ('preparing', 'downloading') ORDER BY created_at",
+        ).fetchall()
+    finally:
+        conn.close()
+    threshold = _timestamp(-_stale_seconds())
+    resumed = 0
+    for row in rows:
+        if row['worker_id'] == _WORKER_ID:
+            with _ACTIVE_LOCK:
+                thread = _ACTIVE_THREADS.get(row['id'])
+            if thread and thread.is_alive():
+                continue
+        elif row['worker_id'] and not _owner_is_gone(row['worker_id']) and (row['heartbeat_at'] or '') >= threshold:
+            continue
+        resumed += _launch(row['id'], row['worker_id'])
+    return resumed
+
+
+def _supervise():
+    while True:
+        try:
+            resume_stale_downloads()
+        except Exception as e:
+            print(f"Download resume check failed: {e}")
+        time.sleep(_resume_interval())
+
+
+def start_download_supervisor():
+    """Resume interrupted downloads now and keep adopting orphaned ones every APPAM_DOWNLOAD_RESUME_INTERVAL."""
+    global _SUPERVISOR
+    with _ACTIVE_LOCK:
+        if _SUPERVISOR and _SUPERVISOR.is_alive():
+            return _SUPERVISOR
+        _SUPERVISOR = threading.Thread(target=_supervise, name='appam-download-supervisor', daemon=True)
+        _SUPERVISOR.start()
+        return _SUPERVISOR
+
+
+def _serialize(row):
+    total = row['total_size'] or 0
+    downloaded = row['downloaded_size'] or 0
+    if row['status'] == 'completed':
+        progress = 100
+    else:
+        progress = (downloaded / total) * 100 if total else 0
+    return {
+        'task_id': row['id'],
+        'project_id': row['project_id'],
+        'url': row['url'],
+        'filename': row['filename'] or extract_filename_from_url(row['url']),
+        'path': row['path'],
+        'status': row['status'],
+        'priority': row['priority'],
+        'progress': progress,
+        'downloaded_size': downloaded,
+        'total_size': total,
+        'speed': row['speed'] if row['status'] == 'downloading' else 0,
+        'time_remaining': row['time_remaining'] if row['status'] == 'downloading' else None,
+        'error': row['error'],
+        'etag': row['etag'],
+        'last_modified': row['last_modified'],
+        'expected_checksum': row['expected_checksum'],
+        'checksum': row['checksum'],
+        'check_gzip': bool(row['check_gzip']),
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+
+
+def _project_clause(project_id):
+    return ('', ()) if project_id is None else (' AND project_id = ?', (project_id,))
+
+
+def start_download(project_id, url, filename, path, concurrent=True, task_id=None, priority=0, checksum=None, check_gzip=False):
+    """开始下载任务
+
+    Re-submitting an existing ``task_id`` (retry) continues from the bytes
+    already fetched instead of starting over. Downloads with a higher
+    ``priority`` get connection slots first when the scheduler is saturated.
+    Content is checked while it streams against ``checksum`` (``md5:<hex>``,
+    ``sha256:<hex>`` or a bare digest), or else a ``.md5`` / ``.sha256``
+    sidecar next to the URL; ``check_gzip`` also inflates gzip/BGZF data
+    on the fly so truncation or corruption fails the download.
+    """
+    # Raises ValueError for paths outside the project.
+    get_project_path(project_id, path)
+    if filename and ('/' in filename or filename in ('.', '..')):
+        raise ValueError('Invalid file name')
+    checksum = parse_checksum(checksum)
+    task_id = task_id or str(uuid.uuid4())
+    launch = True
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        existing = conn.execute('SELECT * FROM downloads WHERE id = ?', (task_id,)).fetchone()
+        if existing and existing['project_id'] != project_id:
+            conn.rollback()
+            raise ValueError('Download task id is already in use')
+        if existing:
+            has_segments = conn.execute(
+                'SELECT 1 FROM download_segments WHERE download_id = ? LIMIT 1', (task_id,)
+            ).fetchone()
+            # A retry of a running download is a no-op.
+            launch = existing['status'] not in ACTIVE_STATUSES
+            if launch:
+                conn.execute(
+                    '''
+                    UPDATE downloads
+                    SET status = ?, error = NULL, worker_id = NULL, finished_at = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                    ''',
+                    ('downloading' if has_segments and existing['status'] != 'completed' else 'preparing', task_id),
+                )
+        else:
+            conn.execute(
+                '''
+                INSERT INTO downloads (id, project_id, url, filename, path, concurrent, priority, expected_checksum, check_gzip, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'preparing')
+                ''',
+                (task_id, project_id, url, filename or None, path, int(bool(concurrent)), int(priority), checksum, int(bool(check_gzip))),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    if launch:
+        _launch(task_id)
+    return task_id
+
+
+def pause_download(task_id, project_id=None):
+    """暂停下载 - 运行中的工作线程在下一次进度写入时停止"""
+    clause, params = _project_clause(project_id)
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            f'''
+            UPDATE downloads
+            SET status = 'paused', speed = 0, time_remaining = NULL, worker_id = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status IN ('preparing', 'downloading'){clause}
+            ''',
+            (task_id, *params),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    if cursor.rowcount != 1:
+        return False
+    _stop_local(task_id, timeout=0)
+    return True
+
+
+def resume_download(task_id, project_id=None):
+    """继续下载 - 从记录的偏移处续传"""
+    clause, params = _project_clause(project_id)
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            f'''
+            UPDATE downloads
+            SET status = CASE
+                    WHEN EXISTS (SELECT 1 FROM download_segments WHERE download_id = downloads.id) THEN 'downloading'
+                    ELSE 'preparing'
+                END,
+                worker_id = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'paused'{clause}
+            ''',
+            (task_id, *params),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    if cursor.rowcount != 1:
+        return False
+    _launch(task_id)
+    return True
+
+
+def cancel_download(task_id, project_id=None):
+    """取消下载 - 删除任务记录和未完成的临时数据（已完成的文件保留）"""
+    clause, params = _project_clause(project_id)
+    conn = get_db_connection()
+    try:
+        row = conn.execute(f'SELECT * FROM downloads WHERE id = ?{clause}', (task_id, *params)).fetchone()
+        if not row:
+            return False
+        # Segments go with the row (ON DELETE CASCADE); a running worker
+        # notices at its next progress write.
+        conn.execute('DELETE FROM downloads WHERE id = ?', (task_id,))
+        conn.commit()
+    finally:
+        conn.close()
+    _stop_local(task_id)
+    try:
+        os.unlink(_part_path(get_project_path(row['project_id'], row['path']), task_id))
+    except (OSError, ValueError):
+        pass
+    return True
+
+
+def get_download_progress(task_id, project_id=None):
     """获取下载进度"""
-    if task_id in download_tasks:
-        return download_tasks[task_id].to_dict()
-    return None
+    clause, params = _project_clause(project_id)
+    conn = get_db_connection()
+    try:
+        row = conn.execute(f'SELECT * FROM downloads WHERE id = ?{clause}', (task_id, *params)).fetchone()
+        return _serialize(row) if row else None
+    finally:
+        conn.close()
+
 
 def get_all_downloads(project_id=None):
     """获取所有下载任务"""
-    if project_id:
-        return [task.to_dict() for task in download_tasks.values() if task.project_id == project_id]
-    return [task.to_dict() for task in download_tasks.values()]
+    conn = get_db_connection()
+    try:
+        if project_id:
+            rows = conn.execute('SELECT * FROM downloads WHERE project_id = ? ORDER BY created_at DESC', (project_id,)).fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM downloads ORDER BY created_at DESC').fetchall()
+        return [_serialize(row) for row in rows]
+    finally:
+        conn.close()
 
-def cleanup_completed_downloads():
+
+def cleanup_completed_downloads(project_id=None):
     """清理已完成的下载任务"""
-    completed_tasks = [task_id for task_id, task in download_tasks.items() 
-                      if task.status in ['completed', 'error', 'cancelled']]
-    
-    for task_id in completed_tasks:
-        if task_id in download_tasks:
-            del download_tasks[task_id]
-        if task_id in download_threads:
-            del download_threads[task_id]
-    
-    return len(completed_tasks) 
+    clause, params = _project_clause(project_id)
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            f"DELETE FROM downloads WHERE status IN ('completed', 'error', 'cancelled'){clause}",
+            params,
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
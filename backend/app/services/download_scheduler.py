@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import ftplib
+import heapq
+import itertools
+import os
+import threading
+import time
+from urllib.parse import unquote, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+_LOCK = threading.Lock()
+_SESSIONS: dict[tuple[str, str], requests.Session] = {}
+# Connections per host that gave the best throughput on the last download from it.
+_HOST_CONNECTIONS: dict[str, int] = {}
+# Logged-in FTP control connections waiting for their next transfer.
+_FTP_IDLE: dict[tuple, list[tuple[float, ftplib.FTP]]] = {}
+# Servers commonly drop control connections idle for a few minutes.
+FTP_IDLE_SECONDS = 60
+
+
+def _max_connections() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_DOWNLOAD_MAX_CONNECTIONS', '16')))
+    except Exception:
+        return 16
+
+
+def _max_connections_per_host() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_DOWNLOAD_MAX_CONNECTIONS_PER_HOST', '8')))
+    except Exception:
+        return 8
+
+
+def _initial_connections() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_DOWNLOAD_INITIAL_CONNECTIONS', '2')))
+    except Exception:
+        return 2
+
+
+def _max_bytes_per_second() -> int:
+    try:
+        return max(0, int(os.getenv('APPAM_DOWNLOAD_MAX_BYTES_PER_SECOND', '0')))
+    except Exception:
+        return 0
+
+
+def host_key(url: str) -> str:
+    parsed = urlparse(url)
+    return f'{parsed.scheme.lower()}://{parsed.hostname}:{parsed.port or ""}'
+
+
+def session_for(url: str) -> requests.Session:
+    """A keep-alive session shared by every download from the same host.
+
+    Segments and later downloads reuse its pooled TCP/TLS connections
+    instead of handshaking again for each request.
+    """
+    parsed = urlparse(url)
+    key = (parsed.scheme.lower(), parsed.netloc.lower())
+    with _LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_max_connections_per_host())
+            session.mount(f'{key[0]}://', adapter)
+            _SESSIONS[key] = session
+        return session
+
+
+def _ftp_key(url: str) -> tuple:
+    parsed = urlparse(url)
+    return (parsed.hostname, parsed.port or 21, unquote(parsed.username or 'anonymous'), unquote(parsed.password or 'anonymous@'))
+
+
+def ftp_connect(url: str) -> ftplib.FTP:
+    """A logged-in, binary-mode passive FTP connection to the URL's server.
+
+    Connections handed back with ``ftp_release`` are reused, so segments
+    and later downloads skip the connect and login round trips.
+    """
+    key = _ftp_key(url)
+    while True:
+        with _LOCK:
+            idle = _FTP_IDLE.get(key)
+            released_at, ftp = idle.pop() if idle else (None, None)
+        if ftp is None:
+            break
+        if time.monotonic() - released_at < FTP_IDLE_SECONDS:
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp
+            except ftplib.all_errors:
+                pass
+        ftp.close()
+    ftp = ftplib.FTP()
+    try:
+        ftp.connect(key[0], key[1], timeout=60)
+        ftp.login(key[2], key[3])
+        ftp.set_pasv(True)
+        ftp.voidcmd('TYPE I')
+    except BaseException:
+        ftp.close()
+        raise
+    return ftp
+
+
+def ftp_release(url: str, ftp: ftplib.FTP) -> None:
+    """Return an idle connection (no transfer in progress) for reuse."""
+    key = _ftp_key(url)
+    with _LOCK:
+        idle = _FTP_IDLE.setdefault(key, [])
+        if len(idle) < _max_connections_per_host():
+            idle.append((time.monotonic(), ftp))
+            return
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
+
+
+class ConnectionSlots:
+    """Global and per-host caps on open download connections.
+
+    Blocked callers are served highest ``priority`` first, then in arrival
+    order, skipping those whose host is at its cap so one busy mirror does
+    not hold up the others.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._per_host: dict[str, int] = {}
+        self._waiting: list[tuple[int, int, str]] = []
+        self._sequence = itertools.count()
+
+    def _has_room(self, host: str) -> bool:
+        return self._in_use < _max_connections() and self._per_host.get(host, 0) < _max_connections_per_host()
+
+    def _take(self, host: str) -> None:
+        self._in_use += 1
+        self._per_host[host] = self._per_host.get(host, 0) + 1
+
+    def _first_eligible(self):
+        for entry in sorted(self._waiting):
+            if self._has_room(entry[2]):
+                return entry
+        return None
+
+    def acquire(self, host: str, priority: int = 0, timeout: float | None = None) -> bool:
+        entry = (-priority, next(self._sequence), host)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._first_eligible() != entry:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                self._take(host)
+                return True
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def try_acquire(self, host: str, priority: int = 0) -> bool:
+        """An extra connection, granted only when nobody more urgent is waiting for room."""
+        with self._condition:
+            if not self._has_room(host):
+                return False
+            if any(-entry[0] >= priority and self._has_room(entry[2]) for entry in self._waiting):
+                return False
+            self._take(host)
+            return True
+
+    def release(self, host: str) -> None:
+        with self._condition:
+            self._in_use -= 1
+            self._per_host[host] -= 1
+            if not self._per_host[host]:
+                del self._per_host[host]
+            self._condition.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._condition:
+            return {'in_use': self._in_use, 'per_host': dict(self._per_host), 'waiting': len(self._waiting)}
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all downloads; APPAM_DOWNLOAD_MAX_BYTES_PER_SECOND=0 disables it."""
+
+    # Unused allowance carried over while idle, in seconds of traffic.
+    BURST_SECONDS = 0.25
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    def consume(self, nbytes: int) -> None:
+        rate = _max_bytes_per_second()
+        if not rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            burst = rate * self.BURST_SECONDS
+            self._tokens = min(burst, self._tokens + (now - self._updated) * rate) - nbytes
+            self._updated = now
+            delay = -self._tokens / rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+
+
+class ThroughputProbe:
+    """Decides when one more connection to a host is still paying off.
+
+    Connections are added one at a time while each addition raised the
+    measured throughput by at least GAIN_THRESHOLD; the count that stopped
+    helping is remembered for the host and used as the next starting point.
+    """
+
+    GAIN_THRESHOLD = 1.1
+    SAMPLE_SECONDS = 1.0
+
+    def __init__(self, host: str, ceiling: int):
+        self.host = host
+        self.ceiling = max(1, ceiling)
+        self.best_rate = 0.0
+        self.settled = False
+        self._bytes = 0
+        self._since = time.monotonic()
+        self._lock = threading.Lock()
+
+    def initial(self) -> int:
+        with _LOCK:
+            remembered = _HOST_CONNECTIONS.get(self.host)
+        return min(self.ceiling, remembered or _initial_connections())
+
+    def record(self, nbytes: int) -> None:
+        with self._lock:
+            self._bytes += nbytes
+
+    def should_grow(self, connections: int) -> bool:
+        """Called about once per SAMPLE_SECONDS with the current connection count."""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._since
+            if elapsed < self.SAMPLE_SECONDS:
+                return False
+            rate = self._bytes / elapsed
+            self._bytes, self._since = 0, now
+        if self.settled or connections >= self.ceiling:
+            return False
+        if self.best_rate and rate < self.best_rate * self.GAIN_THRESHOLD:
+            # The last connection did not help: stay at the count before it.
+            self.settled = True
+            self.remember(max(1, connections - 1))
+            return False
+        self.best_rate = max(self.best_rate, rate)
+        return True
+
+    def remember(self, connections: int) -> None:
+        with _LOCK:
+            _HOST_CONNECTIONS[self.host] = max(1, min(connections, _max_connections_per_host()))
+
+
+slots = ConnectionSlots()
+bandwidth = BandwidthLimiter()
@@ -1,8 +1,22 @@
 from __future__ import annotations
 
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 
+_FAILURE_CACHE: OrderedDict = OrderedDict()
+_FAILURE_CACHE_LOCK = threading.Lock()
+
+
+def _failure_cache_size() -> int:
+    try:
+        return max(0, int(os.getenv('APPAM_FAILURE_CACHE_SIZE', '2048')))
+    except Exception:
+        return 2048
+
+
 def _read_log_tail(log_path: str | None, limit_bytes: int = 16384) -> str:
     if not log_path:
         return ''
@@ -42,3 +56,36 @@ def classify_failure(error_message: str | None = None, exit_code: int | None = N
     if exit_code not in (None, 0):
         return {'category': 'tool_exit_nonzero', 'label': 'Tool exited non-zero', 'suggestion': 'Open logs, check the last tool command, and verify runtime resources.'}
     return {'category': 'unknown', 'label': 'Unknown failure', 'suggestion': 'Review the run log tail and compare against the last successful preflight.'}
+
+
+def _log_signature(log_path: str | None):
+    if not log_path:
+        return None
+    try:
+        stat = os.stat(str(log_path))
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def classify_failure_cached(error_message: str | None = None, exit_code: int | None = None, log_path: str | None = None):
+    """``classify_failure`` memoized on the log's size and mtime.
+
+    A log that has not changed since the last call is not re-read, so
+    repeated listings of running jobs cost one ``stat`` per record.
+    """
+    size = _failure_cache_size()
+    if size <= 0:
+        return classify_failure(error_message, exit_code, log_path)
+    key = (error_message, exit_code, str(log_path or ''), _log_signature(log_path))
+    with _FAILURE_CACHE_LOCK:
+        cached = _FAILURE_CACHE.get(key)
+        if cached is not None:
+            _FAILURE_CACHE.move_to_end(key)
+            return dict(cached)
+    failure = classify_failure(error_message, exit_code, log_path)
+    with _FAILURE_CACHE_LOCK:
+        _FAILURE_CACHE[key] = dict(failure)
+        while len(_FAILURE_CACHE) > size:
+            _FAILURE_CACHE.popitem(last=False)
+    return failure
@@ -9,16 +9,27 @@ import json
 import xml.etree.ElementTree as ET
 from ..database import get_db_connection
 from ..paths import resolve_project_path as resolve_project_workspace_path
-
-# File extension mappings - centralized configuration
-BIO_EXTENSIONS = {
-    'fasta': ['.fasta', '.fa', '.fas', '.fna', '.faa', '.ffn'],
-    'fastq': ['.fastq', '.fq'],
-    'vcf': ['.vcf'],
-    'gff': ['.gff', '.gff3', '.gtf'],
-    'bed': ['.bed'],
-    'sam': ['.sam', '.bam']
-}
+from .directory_listing import list_directory
+from .file_metadata import (
+    BIO_EXTENSIONS,
+    cached_file_metadata,
+    get_file_format,
+    get_file_metadata,
+    move_file_metadata,
+    parse_sample_key,
+    schedule_file_metadata,
+)
+from .file_sampling import sample_file
+from .indexed_files import describe_index, query_region
+from .sequence_stats import is_gzip, read_text_head, sequence_stats, strip_compression_suffix
+from .thumbnails import ensure_thumbnail, schedule_thumbnail, thumbnail_version
+from .zip_stream import stream_zip, walk_entries
+
+
+# Sequence files up to this size are analyzed inside the preview request;
+# larger ones get stats from this much of their head while the full scan
+# runs in the background.
+INLINE_STATS_BYTES = 1024 * 1024
 
 TEXT_EXTENSIONS = {
     '.txt', '.md', '.markdown', '.log', '.conf', '.cfg', '.ini',
@@ -50,14 +61,6 @@ def get_project_path(project_id, path=''):
     """Safely constructs a path within a project directory."""
     return str(resolve_project_workspace_path(project_id, path))
 
-def get_file_format(file_ext):
-    """Determine file format from extension."""
-    file_ext = file_ext.lower()
-    for format_type, extensions in BIO_EXTENSIONS.items():
-        if file_ext in extensions:
-            return format_type
-    return None
-
 def detect_language(file_ext, filename):
     """Detect programming language from file extension and filename."""
     # Check filename patterns first
@@ -100,42 +103,15 @@ def process_sequence_info(header, sequence, quality=None):
 
 # File management functions
 def list_files(project_id, path):
+    """Every entry of a project directory, sorted by name (directories first)."""
+    return list_files_page(project_id, path)['items']
+
+def list_files_page(project_id, path, **options):
+    """A sorted, filtered page of a project directory; see directory_listing.list_directory."""
     abs_path = get_project_path(project_id, path)
     if not os.path.exists(abs_path) or not os.path.isdir(abs_path):
         raise FileNotFoundError("Directory not found")
-
-    items = []
-    for item_name in os.listdir(abs_path):
-        item_path = os.path.join(abs_path, item_name)
-        if item_name.startswith('.tmp_'):
-            continue
-        try:
-            stat_info = os.stat(item_path)
-            is_dir = os.path.isdir(item_path)
-            
-            # Get file extension and type
-            file_ext = os.path.splitext(item_name)[1].lower() if not is_dir else ''
-            file_type = 'folder' if is_dir else get_file_format(file_ext) or 'file'
-            
-            items.append({
-                'name': item_name,
-                'is_dir': is_dir,
-                'size': stat_info.st_size,
-                'mtime': stat_info.st_mtime,          # 修改时间
-                'ctime': stat_info.st_ctime,          # 创建时间 (Windows) / 状态改变时间 (Unix)
-                'atime': stat_info.st_atime,          # 访问时间
-                'mode': stat_info.st_mode,            # 文件权限模式
-                'type': file_type,                    # 文件类型
-                'extension': file_ext,                # 文件扩展名
-                'permissions': {                      # 权限信息
-                    'readable': os.access(item_path, os.R_OK),
-                    'writable': os.access(item_path, os.W_OK),
-                    'executable': os.access(item_path, os.X_OK)
-                }
-            })
-        except (FileNotFoundError, PermissionError, OSError):
-            continue
-    return items
+    return list_directory(abs_path, **options)
 
 def upload_chunk(project_id, file, path, filename, chunk_number, total_chunks):
     temp_dir = get_project_path(project_id, os.path.join(path, f'.tmp_{filename}'))
@@ -148,143 +124,58 @@ def upload_chunk(project_id, file, path, filename, chunk_number, total_chunks):
             for i in range(1, total_chunks + 1):
                 chunk_path = os.path.join(temp_dir, str(i))
                 with open(chunk_path, 'rb') as infile:
-                    outfile.write(infile.read())
+                    shutil.copyfileobj(infile, outfile, 1024 * 1024)
                 os.remove(chunk_path)
         os.rmdir(temp_dir)
+        schedule_file_metadata(project_id, os.path.join(path, filename))
+        schedule_thumbnail(project_id, os.path.join(path, filename))
 
 def make_directory(project_id, path):
     os.makedirs(get_project_path(project_id, path), exist_ok=True)
 
 def rename_item(project_id, old_path, new_path):
     os.rename(get_project_path(project_id, old_path), get_project_path(project_id, new_path))
-
-def delete_items(project_id, items):
-    for item_rel_path in items:
-        abs_path = get_project_path(project_id, item_rel_path)
-        if os.path.isdir(abs_path):
-            shutil.rmtree(abs_path)
-        else:
-            os.remove(abs_path)
-
-def copy_items(project_id, items, destination):
-    """Copy items to destination directory."""
-    try:
-        copied_items = []
-        for item_rel_path in items:
-            source_path = get_project_path(project_id, item_rel_path)
-            item_name = os.path.basename(item_rel_path)
-            dest_path = get_project_path(project_id, os.path.join(destination, item_name))
-            
-            # Handle name conflicts
-            if os.path.exists(dest_path):
-                base_name, ext = os.path.splitext(item_name)
-                counter = 1
-                while os.path.exists(dest_path):
-                    new_name = f"{base_name}_copy_{counter}{ext}"
-                    dest_path = get_project_path(project_id, os.path.join(destination, new_name))
-                    counter += 1
-            
-            if os.path.isdir(source_path):
-                shutil.copytree(source_path, dest_path)
-            else:
-                shutil.copy2(source_path, dest_path)
-            
-            copied_items.append(os.path.basename(dest_path))
-        
-        return {'success': True, 'copied_items': copied_items}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
-
-def cut_items(project_id, items, destination):
-    """Cut (move) items to destination directory."""
-    try:
-        moved_items = []
-        for item_rel_path in items:
-            source_path = get_project_path(project_id, item_rel_path)
-            item_name = os.path.basename(item_rel_path)
-            dest_path = get_project_path(project_id, os.path.join(destination, item_name))
-            
-            # Handle name conflicts
-            if os.path.exists(dest_path):
-                base_name, ext = os.path.splitext(item_name)
-                counter = 1
-                while os.path.exists(dest_path):
-                    new_name = f"{base_name}_moved_{counter}{ext}"
-                    dest_path = get_project_path(project_id, os.path.join(destination, new_name))
-                    counter += 1
-            
-            shutil.move(source_path, dest_path)
-            moved_items.append(os.path.basename(dest_path))
-        
-        return {'success': True, 'moved_items': moved_items}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
+    move_file_metadata(project_id, old_path, new_path)
 
 def download_zip(project_id, items):
+    """Validate a selection and return ``(zip_filename, chunk_iterator)``.
+
+    The archive is generated while it is sent, straight from the project
+    files; nothing is copied or staged on disk.
+    """
     if not items:
         raise ValueError("No items selected for download.")
 
-    temp_zip_dir_name = f".tmp_zip_{int(time.time())}_{os.getpid()}"
-    temp_zip_dir_path = get_project_path(project_id, temp_zip_dir_name)
-    os.makedirs(temp_zip_dir_path)
-
-    project_abs_path = get_project_path(project_id)
-
+    sources = []
     for item_rel_path in items:
+        # get_project_path raises ValueError for paths outside the project.
         full_item_path = get_project_path(project_id, item_rel_path)
-        if not full_item_path.startswith(project_abs_path):
-            raise ValueError(f"Attempted to download item outside project: {item_rel_path}")
+        if not os.path.exists(full_item_path):
+            raise FileNotFoundError(f"File not found: {item_rel_path}")
+        sources.append((full_item_path, os.path.basename(full_item_path)))
 
-        dest_path = os.path.join(temp_zip_dir_path, os.path.basename(full_item_path))
-        
-        if os.path.isdir(full_item_path):
-            shutil.copytree(full_item_path, dest_path)
-        else:
-            shutil.copy(full_item_path, dest_path)
+    def entries():
+        for full_item_path, arcname in sources:
+            yield from walk_entries(full_item_path, arcname)
 
-    zip_base_name = f"selected_files_{int(time.time())}"
-    zip_output_path = os.path.join(get_project_path(project_id), zip_base_name)
-    shutil.make_archive(zip_output_path, 'zip', temp_zip_dir_path)
-    
-    return f'{zip_output_path}.zip', temp_zip_dir_path
+    return f"selected_files_{int(time.time())}.zip", stream_zip(entries())
 
 def generate_thumbnail(project_id, path, size=128):
-    """Generate thumbnail for image files."""
+    """Generate thumbnail for image files, reusing the cached one while the image is unchanged."""
     try:
-        from PIL import Image
-        
-        abs_path = get_project_path(project_id, path)
-        if not os.path.exists(abs_path):
-            return {'success': False, 'error': 'File not found'}
-        
-        # Check if it's an image file
-        try:
-            with Image.open(abs_path) as img:
-                # Create thumbnail
-                img.thumbnail((size, size), Image.LANCZOS)
-                
-                # Save thumbnail
-                thumb_dir = get_project_path(project_id, '.thumbnails')
-                os.makedirs(thumb_dir, exist_ok=True)
-                
-                thumb_filename = f"{os.path.basename(path)}_{size}.jpg"
-                thumb_path = os.path.join(thumb_dir, thumb_filename)
-                
-                # Convert to RGB if necessary (for PNG with transparency)
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                
-                img.save(thumb_path, 'JPEG', quality=85)
-                
-                return {'success': True, 'path': thumb_path}
-        except Exception as e:
-            return {'success': False, 'error': f'Cannot create thumbnail: {str(e)}'}
+        result = ensure_thumbnail(project_id, path, size)
+        return {
+            'success': True,
+            'path': str(result['path']),
+            'etag': result['etag'],
+            'last_modified': result['last_modified'],
+        }
+    except FileNotFoundError:
+        return {'success': False, 'error': 'File not found'}
     except ImportError:
         return {'success': False, 'error': 'PIL/Pillow not installed'}
     except Exception as e:
-        return {'success': False, 'error': str(e)}
+        return {'success': False, 'error': f'Cannot create thumbnail: {str(e)}'}
 
 def fetch_from_url(project_id, url, path):
     filename = url.split('/')[-1] or 'downloaded_file'
@@ -295,6 +186,7 @@ def fetch_from_url(project_id, url, path):
         with open(save_path, 'wb') as f:
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
+    schedule_file_metadata(project_id, os.path.join(path, filename))
     return f'Downloaded {filename} from URL.'
 
 def save_file(project_id, path, content):
@@ -320,16 +212,11 @@ def preview_file_head(project_id, path, lines=1000):
         raise FileNotFoundError("File not found or is a directory")
     
     try:
-        content_lines = []
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for i, line in enumerate(f):
-                if i >= lines:
-                    break
-                content_lines.append(line.rstrip())
-        
+        # Gzip/BGZF files are decompressed lazily, only as far as the head.
+        content = read_text_head(abs_path, lines)
         return {
-            'content': '\n'.join(content_lines),
-            'lines_count': len(content_lines),
+            'content': content,
+            'lines_count': content.count('\n') + 1 if content else 0,
             'preview_type': 'head'
         }
     except Exception as e:
@@ -339,51 +226,40 @@ def preview_file_head(project_id, path, lines=1000):
             'preview_type': 'error'
         }
 
-def preview_file_sample(project_id, path, samples=100):
-    """Preview sample lines from a file"""
+def preview_file_sample(project_id, path, samples=100, mode='spread'):
+    """Preview whole records sampled across a file (or its middle or tail).
+
+    Only a few windows of the file are read; totals are estimates unless
+    exact counts are already in the metadata cache.
+    """
     abs_path = get_project_path(project_id, path)
-    
+
     if not os.path.exists(abs_path) or os.path.isdir(abs_path):
         raise FileNotFoundError("File not found or is a directory")
-    
-    try:
-        # First, count total lines
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            total_lines = sum(1 for _ in f)
-        
-        if total_lines <= samples:
-            # If file is small enough, return all lines
-            with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            return {
-                'content': content,
-                'lines_count': total_lines,
-                'preview_type': 'full'
-            }
-        
-        # Sample lines evenly throughout the file
-        sample_interval = max(1, total_lines // samples)
-        content_lines = []
-        
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            for i, line in enumerate(f):
-                if i % sample_interval == 0:
-                    content_lines.append(f"Line {i+1}: {line.rstrip()}")
-                if len(content_lines) >= samples:
-                    break
-        
-        return {
-            'content': '\n'.join(content_lines),
-            'lines_count': len(content_lines),
-            'preview_type': 'sample',
-            'total_lines': total_lines
-        }
-    except Exception as e:
-        return {
-            'content': f'Error reading file: {str(e)}',
-            'lines_count': 0,
-            'preview_type': 'error'
-        }
+
+    result = sample_file(abs_path, samples, mode)
+    cached = cached_file_metadata(project_id, path)
+    stats = (cached or {}).get('stats') or {}
+    if stats.get('complete') and stats.get('sequence_count') is not None:
+        result['total_records'] = stats['sequence_count']
+        result['total_records_exact'] = True
+        if cached['file_format'] == 'fastq':
+            result['total_lines'] = stats['sequence_count'] * 4
+            result['total_lines_exact'] = True
+    return result
+
+def preview_file_region(project_id, path, region, limit=1000):
+    """Records overlapping ``region`` (``contig:start-end``) of an indexed file.
+
+    Uses the .tbi/.csi/.fai/.gzi index next to the file, so only the
+    blocks holding the region are read and decompressed.
+    """
+    abs_path = get_project_path(project_id, path)
+
+    if not os.path.exists(abs_path) or os.path.isdir(abs_path):
+        raise FileNotFoundError("File not found or is a directory")
+
+    return query_region(abs_path, region, limit)
 
 # Project management functions
 def _sanitize_project(project):
@@ -636,13 +512,16 @@ def remove_project_member(project_id, user_id):
         conn.close()
 
 # Analysis functions
-def analyze_bio_file(abs_path, file_ext, file_size):
-    """Analyze bioinformatics files and return structured data"""
+def analyze_bio_file(abs_path, file_ext, file_size, project_id=None, path=None):
+    """Analyze bioinformatics files and return structured data.
+
+    With ``project_id`` and ``path`` the sequence statistics come from the
+    project's file metadata cache instead of a fresh scan.
+    """
     try:
-        # Quick analysis for bio files
-        filename = os.path.basename(abs_path)
         file_format = file_ext.lstrip('.')
-        
+        sequence_format = get_file_format(file_ext)
+
         # Basic file info
         result = {
             'type': 'bioinformatics',
@@ -655,27 +534,30 @@ def analyze_bio_file(abs_path, file_ext, file_size):
                 'sequence_type': file_format.upper()
             }
         }
-        
-        # For smaller files, do actual analysis
-        if file_size < 5 * 1024 * 1024:  # 5MB limit for analysis
-            if file_format in ['fasta', 'fa', 'fas']:
-                result['bio_analysis'] = analyze_fasta_file(abs_path)
-            elif file_format in ['fastq', 'fq']:
-                result['bio_analysis'] = analyze_fastq_file(abs_path)
-            elif file_format == 'vcf':
-                result['bio_analysis'] = analyze_vcf_file(abs_path)
-        
+
+        # Cached FASTA/FASTQ statistics are used as they are; an uncached
+        # large file shows head-only estimates marked ``pending``.
+        if sequence_format in ('fasta', 'fastq'):
+            result['bio_analysis'] = _sequence_analysis(abs_path, sequence_format, project_id, path)
+
+        try:
+            index = describe_index(abs_path)
+        except Exception:
+            # A corrupt or foreign index should not hide the preview itself.
+            index = None
+        if index:
+            result['index'] = index
+        if file_format == 'vcf' and index and index['record_count'] is not None:
+            # tabix keeps per-contig record counts; no need to read the file.
+            result['bio_analysis']['sequence_count'] = index['record_count']
+        elif file_format == 'vcf' and file_size < 5 * 1024 * 1024 and not is_gzip(abs_path):
+            result['bio_analysis'] = analyze_vcf_file(abs_path)
+
         # Read small sample of content for display
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content_lines = []
-            for i, line in enumerate(f):
-                if i >= 50:  # Only read first 50 lines
-                    break
-                content_lines.append(line.rstrip())
-            result['content'] = '\n'.join(content_lines)
-        
+        result['content'] = read_text_head(abs_path, lines=50)
+
         return result
-        
+
     except Exception as e:
         return {
             'type': 'bioinformatics',
@@ -684,80 +566,45 @@ def analyze_bio_file(abs_path, file_ext, file_size):
             'bio_analysis': None
         }
 
-def analyze_fasta_file(abs_path):
-    """Analyze FASTA file and return statistics"""
-    sequence_count = 0
-    total_length = 0
-    gc_count = 0
-    
+def _sequence_analysis(abs_path, sequence_format, project_id=None, path=None):
+    sequence_type = sequence_format.upper()
+    sample = {}
     try:
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            current_seq = ''
-            for line in f:
-                line = line.strip()
-                if line.startswith('>'):
-                    if current_seq:
-                        total_length += len(current_seq)
-                        gc_count += current_seq.upper().count('G') + current_seq.upper().count('C')
-                    sequence_count += 1
-                    current_seq = ''
-                else:
-                    current_seq += line
-            
-            # Process last sequence
-            if current_seq:
-                total_length += len(current_seq)
-                gc_count += current_seq.upper().count('G') + current_seq.upper().count('C')
-        
-        gc_content = (gc_count / total_length * 100) if total_length > 0 else 0
-        
-        return {
-            'sequence_count': sequence_count,
-            'total_length': total_length,
-            'gc_content': gc_content,
-            'sequence_type': 'FASTA'
-        }
+        if project_id is None:
+            stats = sequence_stats(abs_path, sequence_format)
+        else:
+            metadata = cached_file_metadata(project_id, path)
+            if (metadata is None or metadata['stats'] is None) and os.path.getsize(abs_path) <= INLINE_STATS_BYTES:
+                metadata = get_file_metadata(project_id, path)
+            if metadata is not None and metadata['stats'] is not None:
+                stats = metadata['stats']
+                sample = {'sample_key': metadata['sample_key'], 'read_mate': metadata['read_mate']}
+            else:
+                # Never block the request on a full scan; the cache fills in the background.
+                schedule_file_metadata(project_id, path)
+                stats = {**sequence_stats(abs_path, sequence_format, max_bytes=INLINE_STATS_BYTES), 'pending': True}
+                sample = parse_sample_key(abs_path)
     except Exception:
         return {
             'sequence_count': 0,
             'total_length': 0,
             'gc_content': 0,
-            'sequence_type': 'FASTA'
+            'sequence_type': sequence_type
         }
+    return {
+        **stats,
+        **sample,
+        'total_length': stats['total_bases'],
+        'sequence_type': sequence_type
+    }
+
+def analyze_fasta_file(abs_path):
+    """Analyze FASTA file and return statistics"""
+    return _sequence_analysis(abs_path, 'fasta')
 
 def analyze_fastq_file(abs_path):
     """Analyze FASTQ file and return statistics"""
-    sequence_count = 0
-    total_length = 0
-    gc_count = 0
-    
-    try:
-        with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            
-            # FASTQ format: 4 lines per sequence
-            for i in range(0, len(lines), 4):
-                if i + 3 < len(lines):
-                    sequence_count += 1
-                    seq_line = lines[i + 1].strip()
-                    total_length += len(seq_line)
-                    gc_count += seq_line.upper().count('G') + seq_line.upper().count('C')
-        
-        gc_content = (gc_count / total_length * 100) if total_length > 0 else 0
-        
-        return {
-            'sequence_count': sequence_count,
-            'total_length': total_length,
-            'gc_content': gc_content,
-            'sequence_type': 'FASTQ'
-        }
-    except Exception:
-        return {
-            'sequence_count': 0,
-            'total_length': 0,
-            'gc_content': 0,
-            'sequence_type': 'FASTQ'
-        }
+    return _sequence_analysis(abs_path, 'fastq')
 
 def analyze_vcf_file(abs_path):
     """Analyze VCF file and return statistics"""
@@ -803,6 +650,14 @@ def preview_file(project_id, path):
         # Check if it's a bioinformatics file
         bio_format = get_file_format(file_ext)
         is_bio_file = bio_format is not None
+        sequence_ext, compressed = strip_compression_suffix(filename)
+        if get_file_format(sequence_ext) in ('fasta', 'fastq'):
+            # Sequence statistics stream (and decompress) in constant memory.
+            return analyze_bio_file(abs_path, sequence_ext, file_size, project_id, path)
+        if compressed and get_file_format(sequence_ext):
+            # Compressed VCF/GFF/BED: only the head is decompressed, and any
+            # tabix index is offered for region queries.
+            return analyze_bio_file(abs_path, sequence_ext, file_size)
         is_html = file_ext in {'.html', '.htm'}
         is_markdown = file_ext in {'.md', '.markdown'}
 
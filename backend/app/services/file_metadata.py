@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from ..database import get_db_connection
+from ..paths import get_project_dir, resolve_project_path
+from .sample_validator import fastq_sample_key
+from .sequence_stats import sequence_stats, strip_compression_suffix
+
+
+# File extension mappings - centralized configuration
+BIO_EXTENSIONS = {
+    'fasta': ['.fasta', '.fa', '.fas', '.fna', '.faa', '.ffn'],
+    'fastq': ['.fastq', '.fq'],
+    'vcf': ['.vcf'],
+    'gff': ['.gff', '.gff3', '.gtf'],
+    'bed': ['.bed'],
+    'sam': ['.sam', '.bam']
+}
+
+SEQUENCE_FORMATS = ('fasta', 'fastq')
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+_PENDING: set[tuple[str, str]] = set()
+
+
+def get_file_format(file_ext):
+    """Determine file format from extension."""
+    file_ext = file_ext.lower()
+    for format_type, extensions in BIO_EXTENSIONS.items():
+        if file_ext in extensions:
+            return format_type
+    return None
+
+
+def detect_file_format(filename: str) -> tuple[str | None, bool]:
+    """Bio format of ``filename`` looking through any .gz/.bgz suffix."""
+    ext, compressed = strip_compression_suffix(os.path.basename(filename))
+    return get_file_format(ext), compressed
+
+
+def parse_sample_key(filename: str) -> dict:
+    """Sample name and read mate (R1/R2) of a paired FASTQ file name."""
+    key = fastq_sample_key(os.path.basename(filename))
+    if key is None:
+        return {'sample_key': None, 'read_mate': None}
+    sample_key, read = key
+    return {'sample_key': sample_key, 'read_mate': f'R{read}'}
+
+
+def _workers() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_FILE_METADATA_WORKERS', '1')))
+    except Exception:
+        return 1
+
+
+def _relative_path(project_id: str, abs_path: Path) -> str:
+    return PurePosixPath(abs_path.relative_to(get_project_dir(project_id).resolve())).as_posix()
+
+
+def _row_to_record(row) -> dict:
+    record = dict(row)
+    record['compressed'] = bool(record['compressed'])
+    record['stats'] = json.loads(record['stats']) if record.get('stats') else None
+    return record
+
+
+def _signature(stat_result) -> tuple[int, int, int]:
+    return stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns
+
+
+def get_file_metadata(project_id: str, path: str, analyze: bool = True) -> dict:
+    """Cached format, sample key and sequence statistics for a project file.
+
+    Rows are keyed on the project-relative path and are valid only while
+    the file's (inode, size, mtime) signature is unchanged, so edits and
+    replacements invalidate them without any hooks. A renamed or moved
+    file keeps its inode and signature and reuses the stats computed
+    under its old path.
+    """
+    abs_path = resolve_project_path(project_id, path)
+    stat_result = abs_path.stat()
+    if not abs_path.is_file():
+        raise FileNotFoundError('File not found or is a directory')
+    relative = _relative_path(project_id, abs_path)
+    inode, size, mtime_ns = _signature(stat_result)
+    file_format, compressed = detect_file_format(abs_path.name)
+    wants_stats = analyze and file_format in SEQUENCE_FORMATS
+
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            'SELECT * FROM file_metadata WHERE project_id = ? AND path = ?',
+            (project_id, relative),
+        ).fetchone()
+        if row and (row['inode'], row['size_bytes'], row['mtime_ns']) == (inode, size, mtime_ns):
+            if row['stats'] is not None or not wants_stats:
+                return _row_to_record(row)
+        stats_json = None
+        if wants_stats:
+            moved = conn.execute(
+                '''
+                SELECT stats FROM file_metadata
+                WHERE project_id = ? AND inode = ? AND size_bytes = ? AND mtime_ns = ? AND stats IS NOT NULL
+                LIMIT 1
+                ''',
+                (project_id, inode, size, mtime_ns),
+            ).fetchone()
+            stats_json = moved['stats'] if moved else None
+    finally:
+        conn.close()
+
+    if wants_stats and stats_json is None:
+        stats_json = json.dumps(sequence_stats(str(abs_path), file_format))
+
+    sample = parse_sample_key(abs_path.name)
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            '''
+            INSERT INTO file_metadata (
+                project_id, path, inode, size_bytes, mtime_ns, file_format, compressed,
+                sample_key, read_mate, stats, analyzed_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(project_id, path) DO UPDATE SET
+                inode = excluded.inode,
+                size_bytes = excluded.size_bytes,
+                mtime_ns = excluded.mtime_ns,
+                file_format = excluded.file_format,
+                compressed = excluded.compressed,
+                sample_key = excluded.sample_key,
+                read_mate = excluded.read_mate,
+                stats = excluded.stats,
+                analyzed_at = CURRENT_TIMESTAMP
+            ''',
+            (
+                project_id, relative, inode, size, mtime_ns, file_format, int(compressed),
+                sample['sample_key'], sample['read_mate'], stats_json,
+            ),
+        )
+        conn.commit()
+        row = conn.execute(
+            'SELECT * FROM file_metadata WHERE project_id = ? AND path = ?',
+            (project_id, relative),
+        ).fetchone()
+    finally:
+        conn.close()
+    return _row_to_record(row)
+
+
+def cached_file_metadata(project_id: str, path: str) -> dict | None:
+    """The cached row for ``path`` if it is still current, without computing anything."""
+    abs_path = resolve_project_path(project_id, path)
+    inode, size, mtime_ns = _signature(abs_path.stat())
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            'SELECT * FROM file_metadata WHERE project_id = ? AND path = ?',
+            (project_id, _relative_path(project_id, abs_path)),
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row or (row['inode'], row['size_bytes'], row['mtime_ns']) != (inode, size, mtime_ns):
+        return None
+    return _row_to_record(row)
+
+
+def forget_file_metadata(project_id: str, paths: list[str]) -> None:
+    """Drop cached rows for deleted files, or for everything under deleted directories."""
+    conn = get_db_connection()
+    try:
+        for path in paths:
+            try:
+                relative = _relative_path(project_id, resolve_project_path(project_id, path))
+            except ValueError:
+                continue
+            conn.execute(
+                '''
+                DELETE FROM file_metadata
+                WHERE project_id = ? AND (path = ? OR substr(path, 1, ?) = ?)
+                ''',
+                (project_id, relative, len(relative) + 1, relative + '/'),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def move_file_metadata(project_id: str, old_path: str, new_path: str) -> None:
+    """Carry cached rows along with a renamed or moved file or directory."""
+    try:
+        old_relative = _relative_path(project_id, resolve_project_path(project_id, old_path))
+        new_relative = _relative_path(project_id, resolve_project_path(project_id, new_path))
+    except ValueError:
+        return
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            'DELETE FROM file_metadata WHERE project_id = ? AND (path = ? OR substr(path, 1, ?) = ?)',
+            (project_id, new_relative, len(new_relative) + 1, new_relative + '/'),
+        )
+        conn.execute(
+            '''
+            UPDATE file_metadata
+            SET path = ? || substr(path, ?)
+            WHERE project_id = ? AND (path = ? OR substr(path, 1, ?) = ?)
+            ''',
+            (
+                new_relative, len(old_relative) + 1,
+                project_id, old_relative, len(old_relative) + 1, old_relative + '/',
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _warm(project_id: str, path: str) -> None:
+    try:
+        get_file_metadata(project_id, path)
+    except Exception:
+        pass
+    finally:
+        with _EXECUTOR_LOCK:
+            _PENDING.discard((project_id, path))
+
+
+def schedule_file_metadata(project_id: str, path: str) -> bool:
+    """Fill the cache for a newly written file on a background thread."""
+    global _EXECUTOR
+    file_format, _ = detect_file_format(path)
+    if file_format not in SEQUENCE_FORMATS:
+        return False
+    with _EXECUTOR_LOCK:
+        if (project_id, path) in _PENDING:
+            return False
+        _PENDING.add((project_id, path))
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='appam-file-metadata')
+        executor = _EXECUTOR
+    executor.submit(_warm, project_id, path)
+    return True
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import os
+
+from .file_metadata import detect_file_format
+from .sequence_stats import is_gzip, open_sequence_file
+
+
+SAMPLE_MODES = ('spread', 'middle', 'tail')
+RECORD_FORMATS = ('fastq', 'fasta', 'vcf')
+LINES_PER_RECORD = {'fastq': 4, 'vcf': 1, 'line': 1}
+# FASTA records are cut to this many bytes so one chromosome cannot fill a preview.
+MAX_RECORD_BYTES = 4096
+
+
+def _window_bytes() -> int:
+    try:
+        return max(4096, int(os.getenv('APPAM_PREVIEW_WINDOW_BYTES', '16384')))
+    except Exception:
+        return 16384
+
+
+def _max_window_bytes() -> int:
+    try:
+        return max(_window_bytes(), int(os.getenv('APPAM_PREVIEW_MAX_WINDOW_BYTES', str(4 * 1024 * 1024))))
+    except Exception:
+        return 4 * 1024 * 1024
+
+
+def _line_end(buf: bytes, start: int) -> int:
+    """Index just past the newline ending the line at ``start``, or -1 if the line is cut off."""
+    newline = buf.find(b'\n', start)
+    return -1 if newline < 0 else newline + 1
+
+
+def _align(buf: bytes, record_format: str, at_file_start: bool) -> int:
+    """Offset of the first whole record in ``buf``, or -1 if none starts in it."""
+    position = 0
+    if not at_file_start:
+        position = _line_end(buf, 0)
+        if position < 0:
+            return -1
+    while position < len(buf):
+        if record_format == 'fastq':
+            # '@' also starts quality lines; a real header has '+' two lines
+            # down and a quality line as long as the sequence line.
+            if buf[position:position + 1] == b'@':
+                ends = [position]
+                for _ in range(4):
+                    end = _line_end(buf, ends[-1])
+                    if end < 0:
+                        return -1
+                    ends.append(end)
+                sequence = buf[ends[1]:ends[2]].rstrip(b'\r\n')
+                quality = buf[ends[3]:ends[4]].rstrip(b'\r\n')
+                if buf[ends[2]:ends[2] + 1] == b'+' and len(sequence) == len(quality):
+                    return position
+        elif record_format == 'fasta':
+            if buf[position:position + 1] == b'>':
+                return position
+        elif record_format == 'vcf':
+            if buf[position:position + 1] != b'#':
+                return position
+        else:
+            return position
+        position = _line_end(buf, position)
+        if position < 0:
+            return -1
+    return -1
+
+
+def _record_end(buf: bytes, start: int, record_format: str, at_eof: bool) -> int:
+    """End of the record starting at ``start``, or -1 if it continues past ``buf``."""
+    if record_format == 'fastq':
+        end = start
+        for _ in range(4):
+            end = _line_end(buf, end)
+            if end < 0:
+                return len(buf) if at_eof else -1
+        return end
+    if record_format == 'fasta':
+        following = buf.find(b'\n>', start + 1)
+        if following >= 0:
+            return following + 1
+        return len(buf) if at_eof else -1
+    end = _line_end(buf, start)
+    if end < 0:
+        return len(buf) if at_eof and start < len(buf) else -1
+    return end
+
+
+def _records(buf: bytes, start: int, record_format: str, at_eof: bool):
+    """(start, end) of consecutive whole records from an aligned ``start``."""
+    position = start
+    while position < len(buf):
+        end = _record_end(buf, position, record_format, at_eof)
+        if end < 0:
+            return
+        if not (record_format == 'vcf' and buf[position:position + 1] == b'#'):
+            yield position, end
+        position = end
+
+
+def _text(record: bytes) -> str:
+    text = record.decode('utf-8', errors='replace').rstrip('\r\n')
+    if len(record) > MAX_RECORD_BYTES:
+        text = record[:MAX_RECORD_BYTES].decode('utf-8', errors='replace').rstrip('\r\n') + ' …'
+    return text
+
+
+class _Reader:
+    def __init__(self, handle, size: int):
+        self.handle = handle
+        self.size = size
+        self.bytes_read = 0
+        self.newlines = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        self.handle.seek(offset)
+        data = self.handle.read(length)
+        self.bytes_read += len(data)
+        self.newlines += data.count(b'\n')
+        return data
+
+    def record_at(self, offset: int, record_format: str):
+        """First whole record at or after ``offset``: (absolute start, absolute end, bytes) or None.
+
+        The window grows until a record fits, up to the maximum window.
+        FASTA is read with one window only: records that do not fit are cut
+        at its end, and an offset inside a long contig, with no header in
+        reach, yields a labelled fragment of the sequence there.
+        """
+        window = _window_bytes()
+        while True:
+            buf = self.read(offset, window)
+            at_eof = offset + len(buf) >= self.size
+            start = _align(buf, record_format, offset == 0)
+            if start >= 0:
+                end = _record_end(buf, start, record_format, at_eof)
+                if end >= 0:
+                    return offset + start, offset + end, buf[start:end]
+                if record_format == 'fasta':
+                    return offset + start, offset + len(buf), buf[start:]
+            elif record_format == 'fasta':
+                return self._fasta_fragment(offset, buf)
+            if at_eof or window >= _max_window_bytes():
+                return None
+            window *= 4
+
+    def _fasta_fragment(self, offset: int, buf: bytes):
+        start = _line_end(buf, 0) if offset else 0
+        if start < 0 or start >= len(buf):
+            return None
+        body = buf[start:start + MAX_RECORD_BYTES]
+        # Whole lines only, unless a single line is longer than the cut.
+        cut = body.rfind(b'\n')
+        body = body[:cut + 1] if cut >= 0 else body
+        label = f'>(sequence fragment at byte {offset + start})\n'.encode()
+        return offset + start, offset + start + len(body), label + body
+
+    def records_in(self, offset: int, length: int, record_format: str) -> list[tuple[int, bytes]]:
+        buf = self.read(offset, length)
+        at_eof = offset + len(buf) >= self.size
+        start = _align(buf, record_format, offset == 0)
+        if start < 0:
+            return []
+        return [(offset + first, buf[first:last]) for first, last in _records(buf, start, record_format, at_eof)]
+
+
+def _record_format(path: str) -> str:
+    file_format, _ = detect_file_format(path)
+    return file_format if file_format in RECORD_FORMATS else 'line'
+
+
+def _head_records(path: str, record_format: str, samples: int) -> tuple[list[tuple[int, bytes]], int]:
+    with open_sequence_file(path) as (stream, _):
+        buf = stream.read(_max_window_bytes())
+        at_eof = not stream.read(1)
+    start = _align(buf, record_format, True)
+    if start < 0:
+        return [], len(buf)
+    records = []
+    for first, last in _records(buf, start, record_format, at_eof):
+        records.append((first, buf[first:last]))
+        if len(records) >= samples:
+            break
+    return records, len(buf)
+
+
+def sample_file(path: str, samples: int = 100, mode: str = 'spread') -> dict:
+    """Up to ``samples`` whole records without reading the whole file.
+
+    ``spread`` seeks to evenly spaced byte offsets, ``middle`` and ``tail``
+    read consecutive records around the middle or at the end. Each read
+    is realigned to a record boundary (four-line FASTQ records, FASTA
+    headers, VCF data lines, plain lines elsewhere), so the cost depends
+    on ``samples`` and the window size, not on the file size. Gzip files
+    cannot be seeked and are sampled from the start.
+    """
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f'Unsupported sample mode: {mode}')
+    samples = max(1, int(samples))
+    size = os.path.getsize(path)
+    record_format = _record_format(path)
+
+    if is_gzip(path):
+        records, bytes_read = _head_records(path, record_format, samples)
+        return _result(records, record_format, 'head', size, bytes_read, compressed=True)
+
+    with open(path, 'rb') as handle:
+        reader = _Reader(handle, size)
+        if size <= _window_bytes():
+            data = reader.read(0, size)
+            records = reader.records_in(0, size, record_format)
+            if len(records) <= samples:
+                result = _result(records, record_format, 'full', size, reader.bytes_read)
+                result['content'] = data.decode('utf-8', errors='replace')
+                result['lines_count'] = result['total_lines'] = (
+                    data.count(b'\n') + (0 if data.endswith(b'\n') or not data else 1)
+                )
+                result['total_lines_exact'] = True
+                result['total_records'] = len(records)
+                result['total_records_exact'] = True
+                return result
+
+        records = []
+        if mode == 'spread':
+            last_end = -1
+            for index in range(samples):
+                offset = size * index // samples
+                # Offsets inside a record already returned add nothing; skip them unread.
+                if offset < last_end:
+                    continue
+                found = reader.record_at(offset, record_format)
+                if found is None:
+                    continue
+                start, end, record = found
+                # Small files can realign two offsets onto the same record.
+                if start < last_end:
+                    continue
+                records.append((start, record))
+                last_end = end
+        else:
+            window = _window_bytes()
+            while True:
+                offset = max(0, size - window) if mode == 'tail' else max(0, size // 2 - window // 2)
+                found = reader.records_in(offset, window, record_format)
+                if len(found) >= samples or window >= _max_window_bytes() or window >= size:
+                    break
+                window *= 4
+            records = found[-samples:] if mode == 'tail' else found[:samples]
+    return _result(records, record_format, mode, size, reader.bytes_read, newlines=reader.newlines)
+
+
+def _result(records, record_format, preview_type, size, bytes_read, compressed=False, newlines=None) -> dict:
+    content = '\n'.join(_text(record) for _, record in records)
+    result = {
+        'content': content,
+        'lines_count': content.count('\n') + 1 if content else 0,
+        'records_count': len(records),
+        'record_offsets': [offset for offset, _ in records],
+        'record_format': record_format,
+        'preview_type': preview_type,
+        'file_size': size,
+        'bytes_read': bytes_read,
+        'compressed': compressed,
+    }
+    if newlines and bytes_read:
+        # Line density of the windows read, scaled to the whole file.
+        result['total_lines'] = int(newlines * size / bytes_read)
+        result['total_lines_exact'] = False
+        if record_format in LINES_PER_RECORD:
+            result['total_records'] = result['total_lines'] // LINES_PER_RECORD[record_format]
+            result['total_records_exact'] = False
+    return result
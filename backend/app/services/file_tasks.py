@@ -0,0 +1,667 @@
+from __future__ import annotations
+
+import errno
+import json
+import os
+import shutil
+import socket
+import stat
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from ..database import get_db_connection
+from ..paths import get_project_dir, resolve_project_path
+from .file_metadata import forget_file_metadata, move_file_metadata, schedule_file_metadata
+from .zip_stream import stream_zip, walk_entries
+
+
+TASK_KINDS = ('copy', 'move', 'delete', 'zip')
+LINK_MODES = ('auto', 'hardlink', 'none')
+# list_files already hides .tmp_* entries.
+TEMP_PREFIX = '.tmp_task_'
+COPY_BLOCK_BYTES = 8 * 1024 * 1024
+# copy_file_range is asked for this much per call so cancellation and
+# progress stay responsive on multi-gigabyte files.
+COPY_RANGE_BYTES = 64 * 1024 * 1024
+PROGRESS_INTERVAL_SECONDS = 0.5
+# Linux FICLONE ioctl: share extents with the source (btrfs, XFS with reflink).
+FICLONE = 0x40049409
+
+# Each API process runs its own pool; a task belongs to the process whose
+# worker_id is on its row, and stays alive while that worker heart-beats.
+_WORKER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+_CANCEL_EVENTS: dict[str, threading.Event] = {}
+
+
+class TaskCanceled(Exception):
+    pass
+
+
+def _workers() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_FILE_TASK_WORKERS', '2')))
+    except Exception:
+        return 2
+
+
+def _history_limit() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_FILE_TASK_HISTORY', '50')))
+    except Exception:
+        return 50
+
+
+def _stale_seconds() -> int:
+    try:
+        return max(5, int(os.getenv('APPAM_FILE_TASK_STALE_SECONDS', '60')))
+    except Exception:
+        return 60
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='appam-file-tasks')
+        return _EXECUTOR
+
+
+def _serialize(row) -> dict:
+    elapsed = row['elapsed_seconds'] or 0.0
+    throughput = row['bytes_done'] / elapsed if elapsed > 0 else None
+    eta = None
+    if row['status'] == 'running' and throughput and row['total_bytes']:
+        eta = max(0.0, (row['total_bytes'] - row['bytes_done']) / throughput)
+    return {
+        'id': row['id'],
+        'project_id': row['project_id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'phase': row['phase'],
+        'items': json.loads(row['items'] or '[]'),
+        'destination': row['destination'],
+        'options': json.loads(row['options'] or '{}'),
+        'total_bytes': row['total_bytes'],
+        'total_files': row['total_files'],
+        'bytes_done': row['bytes_done'],
+        'files_done': row['files_done'],
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_bytes_per_second': round(throughput, 1) if throughput is not None else None,
+        'eta_seconds': round(eta, 1) if eta is not None else None,
+        'result': json.loads(row['result']) if row['result'] else None,
+        'error': row['error'],
+        'created_by': row['created_by'],
+        'created_at': row['created_at'],
+        'started_at': row['started_at'],
+        'finished_at': row['finished_at'],
+    }
+
+
+def _load_row(conn, project_id: str, task_id: str):
+    row = conn.execute(
+        'SELECT * FROM file_tasks WHERE id = ? AND project_id = ?',
+        (task_id, project_id),
+    ).fetchone()
+    if not row:
+        raise FileNotFoundError('File task not found')
+    return row
+
+
+def _owner_is_gone(worker_id: str | None) -> bool:
+    """True when ``worker_id`` is missing or names a process on this host that has exited."""
+    if not worker_id:
+        return True
+    host, _, rest = worker_id.partition(':')
+    pid, _, _ = rest.partition(':')
+    if host != socket.gethostname():
+        return False
+    if pid == str(os.getpid()):
+        # Same pid, other token: a previous process (e.g. in a restarted container).
+        return True
+    try:
+        os.kill(int(pid), 0)
+        return False
+    except (OSError, ValueError):
+        return True
+
+
+def recover_file_tasks() -> int:
+    """Fail tasks whose process died with them still queued or running.
+
+    A running task is also given up once its heartbeat is older than
+    APPAM_FILE_TASK_STALE_SECONDS, which covers processes on other hosts.
+    Tasks owned by live processes are left alone.
+    """
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            '''
+            SELECT id, status, worker_id, COALESCE(heartbeat_at < datetime('now', ?), 1) AS stale
+            FROM file_tasks
+            WHERE status IN ('queued', 'running')
+            ''',
+            (f'-{_stale_seconds()} seconds',),
+        ).fetchall()
+        recovered = 0
+        for row in rows:
+            if row['worker_id'] == _WORKER_ID:
+                continue
+            if not _owner_is_gone(row['worker_id']) and not (row['status'] == 'running' and row['stale']):
+                continue
+            cursor = conn.execute(
+                '''
+                UPDATE file_tasks
+                SET status = 'failed', error = 'Interrupted: the server running this task stopped',
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = ? AND worker_id IS ?
+                ''',
+                (row['id'], row['status'], row['worker_id']),
+            )
+            recovered += cursor.rowcount
+        conn.commit()
+        return recovered
+    finally:
+        conn.close()
+
+
+def _relative(project_id: str, path: str | Path) -> str:
+    return PurePosixPath(Path(path).relative_to(get_project_dir(project_id).resolve())).as_posix()
+
+
+def _item_path(project_id: str, item: str) -> Path:
+    """Path of a selected item with its parent resolved, but not the item itself.
+
+    A selected symlink is then copied, moved or deleted as a link, the same
+    way links nested inside a directory are.
+    """
+    relative = PurePosixPath(str(item or '').strip('/'))
+    if relative.name in ('', '.', '..'):
+        return resolve_project_path(project_id, str(item or ''))
+    return resolve_project_path(project_id, str(relative.parent)) / relative.name
+
+
+def _validate(project_id: str, kind: str, items: list, destination: str | None, options: dict) -> None:
+    if kind not in TASK_KINDS:
+        raise ValueError(f'Unknown file task: {kind}')
+    if not items or not isinstance(items, list):
+        raise ValueError('No items selected.')
+    project_dir = get_project_dir(project_id).resolve()
+    sources = []
+    for item in items:
+        source = _item_path(project_id, item)
+        if source == project_dir:
+            raise ValueError('The project root cannot be used as an item')
+        if not os.path.lexists(source):
+            raise FileNotFoundError(f'File not found: {item}')
+        sources.append(source)
+    if kind == 'delete':
+        return
+    target = resolve_project_path(project_id, destination or '')
+    if not target.is_dir():
+        raise FileNotFoundError(f'Destination directory not found: {destination}')
+    if kind in ('copy', 'move'):
+        for source in sources:
+            if not os.path.islink(source) and source.is_dir() and (target == source or source in target.parents):
+                raise ValueError(f'Cannot {kind} a directory into itself: {_relative(project_id, source)}')
+    if options.get('link', 'auto') not in LINK_MODES:
+        raise ValueError(f"link must be one of: {', '.join(LINK_MODES)}")
+
+
+def submit_file_task(
+    project_id: str,
+    kind: str,
+    items: list,
+    destination: str | None = None,
+    options: dict | None = None,
+    created_by: str | None = None,
+) -> dict:
+    """Queue a copy, move, delete or zip of ``items`` and return the task at once.
+
+    The work runs on a pool of APPAM_FILE_TASK_WORKERS threads; callers poll
+    ``get_file_task`` for bytes and files done, throughput and ETA, and may
+    cancel with ``cancel_file_task``.
+    """
+    options = dict(options or {})
+    _validate(project_id, kind, items, destination, options)
+    task_id = uuid.uuid4().hex
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            '''
+            INSERT INTO file_tasks (id, project_id, kind, items, destination, options, created_by, worker_id, heartbeat_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''',
+            (task_id, project_id, kind, json.dumps(items), destination, json.dumps(options), created_by, _WORKER_ID),
+        )
+        conn.commit()
+        task = _serialize(_load_row(conn, project_id, task_id))
+    finally:
+        conn.close()
+    with _EXECUTOR_LOCK:
+        _CANCEL_EVENTS[task_id] = threading.Event()
+    _executor().submit(_run, project_id, task_id)
+    return task
+
+
+def get_file_task(project_id: str, task_id: str) -> dict:
+    conn = get_db_connection()
+    try:
+        return _serialize(_load_row(conn, project_id, task_id))
+    finally:
+        conn.close()
+
+
+def list_file_tasks(project_id: str, limit: int | None = None) -> list[dict]:
+    """Active tasks first, then the most recent finished ones."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            '''
+            SELECT * FROM file_tasks
+            WHERE project_id = ?
+            ORDER BY status IN ('queued', 'running') DESC, created_at DESC, rowid DESC
+            LIMIT ?
+            ''',
+            (project_id, min(limit or _history_limit(), _history_limit())),
+        ).fetchall()
+        return [_serialize(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def cancel_file_task(project_id: str, task_id: str) -> dict:
+    """Cancel a queued task outright, or ask a running one to stop at its next block.
+
+    The request is recorded on the row, so it reaches a task running in
+    another process at its next progress write.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = _load_row(conn, project_id, task_id)
+        if row['status'] == 'queued':
+            conn.execute(
+                '''
+                UPDATE file_tasks
+                SET status = 'canceled', finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                ''',
+                (task_id,),
+            )
+        elif row['status'] == 'running':
+            conn.execute(
+                'UPDATE file_tasks SET cancel_requested = 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                (task_id,),
+            )
+        conn.commit()
+        with _EXECUTOR_LOCK:
+            event = _CANCEL_EVENTS.get(task_id)
+        if event is not None:
+            event.set()
+        return _serialize(_load_row(conn, project_id, task_id))
+    finally:
+        conn.close()
+
+
+class _Progress:
+    """Counters for one task, written back at most every PROGRESS_INTERVAL_SECONDS.
+
+    Each write also renews the heartbeat and picks up a cancel requested
+    from any process. A row no longer running under this worker stops
+    the task the same way.
+    """
+
+    def __init__(self, task_id: str, cancel_event: threading.Event):
+        self.task_id = task_id
+        self.cancel_event = cancel_event
+        self.started = time.monotonic()
+        self.last_flush = 0.0
+        self.total_bytes = 0
+        self.total_files = 0
+        self.bytes_done = 0
+        self.files_done = 0
+
+    def check(self) -> None:
+        if time.monotonic() - self.last_flush >= PROGRESS_INTERVAL_SECONDS:
+            self.flush()
+        if self.cancel_event.is_set():
+            raise TaskCanceled()
+
+    def advance(self, nbytes: int = 0, files: int = 0) -> None:
+        self.bytes_done += nbytes
+        self.files_done += files
+        self.check()
+
+    def flush(self, **fields) -> None:
+        self.last_flush = time.monotonic()
+        values = {
+            'total_bytes': self.total_bytes,
+            'total_files': self.total_files,
+            'bytes_done': self.bytes_done,
+            'files_done': self.files_done,
+            'elapsed_seconds': self.last_flush - self.started,
+            **fields,
+        }
+        assignments = ', '.join(f'{column} = ?' for column in values)
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute(
+                f'''
+                UPDATE file_tasks SET {assignments}, heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker_id = ? AND status = 'running'
+                ''',
+                (*values.values(), self.task_id, _WORKER_ID),
+            )
+            row = conn.execute('SELECT cancel_requested FROM file_tasks WHERE id = ?', (self.task_id,)).fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        if cursor.rowcount != 1 or (row and row['cancel_requested']):
+            self.cancel_event.set()
+
+
+def _measure(path: Path, progress: _Progress) -> None:
+    """Add the bytes and entries under ``path`` to the task totals without reading data."""
+    progress.check()
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        progress.total_files += 1
+        progress.total_bytes += info.st_size if stat.S_ISREG(info.st_mode) else 0
+        return
+    for root, dirs, files in os.walk(path):
+        progress.check()
+        for name in files + [name for name in dirs if os.path.islink(os.path.join(root, name))]:
+            progress.total_files += 1
+            try:
+                entry = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(entry.st_mode):
+                progress.total_bytes += entry.st_size
+
+
+def _free_name(target_dir: Path, name: str, suffix: str) -> Path:
+    candidate = target_dir / name
+    if not os.path.lexists(candidate):
+        return candidate
+    base_name, ext = os.path.splitext(name)
+    counter = 1
+    while os.path.lexists(candidate):
+        candidate = target_dir / f'{base_name}_{suffix}_{counter}{ext}'
+        counter += 1
+    return candidate
+
+
+def _same_filesystem(source: Path, target_dir: Path) -> bool:
+    try:
+        return os.lstat(source).st_dev == os.stat(target_dir).st_dev
+    except OSError:
+        return False
+
+
+def _clone(src_fd: int, dst_fd: int) -> bool:
+    try:
+        import fcntl
+
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def _copy_file(source: Path, target: Path, progress: _Progress, link: str) -> None:
+    """Copy one regular file, cheapest way first.
+
+    A hard link (only with ``link='hardlink'``, since both names then share
+    later writes) or a reflink costs no data I/O on the same filesystem.
+    Otherwise ``copy_file_range`` lets the kernel copy (or offload to the
+    file server), falling back to a plain read/write loop.
+    """
+    size = os.stat(source).st_size
+    if link == 'hardlink':
+        try:
+            os.link(source, target)
+            progress.advance(size, 1)
+            return
+        except OSError:
+            pass
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dst_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if link != 'none' and size and _clone(src_fd, dst_fd):
+                progress.advance(size, 0)
+            else:
+                _copy_data(src_fd, dst_fd, progress)
+        finally:
+            os.close(dst_fd)
+    except BaseException:
+        target.unlink(missing_ok=True)
+        raise
+    finally:
+        os.close(src_fd)
+    shutil.copystat(source, target)
+    progress.advance(0, 1)
+
+
+def _copy_data(src_fd: int, dst_fd: int, progress: _Progress) -> None:
+    use_range = hasattr(os, 'copy_file_range')
+    offset = 0
+    while True:
+        if use_range:
+            try:
+                count = os.copy_file_range(src_fd, dst_fd, COPY_RANGE_BYTES)
+            except OSError as exc:
+                if exc.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP) or offset:
+                    raise
+                use_range = False
+                continue
+        else:
+            block = os.read(src_fd, COPY_BLOCK_BYTES)
+            count = len(block)
+            view = memoryview(block)
+            while view:
+                view = view[os.write(dst_fd, view):]
+        if not count:
+            return
+        offset += count
+        progress.advance(count, 0)
+
+
+def _copy_tree(source: Path, target: Path, progress: _Progress, link: str) -> None:
+    """Copy a file or directory tree; symlinks are recreated, never followed."""
+    if os.path.islink(source):
+        os.symlink(os.readlink(source), target)
+        progress.advance(0, 1)
+        return
+    if not source.is_dir():
+        _copy_file(source, target, progress, link)
+        return
+    target.mkdir()
+    for entry in sorted(os.scandir(source), key=lambda entry: entry.name):
+        _copy_tree(Path(entry.path), target / entry.name, progress, link)
+    shutil.copystat(source, target)
+
+
+def _remove_tree(path: Path, progress: _Progress) -> None:
+    """Delete bottom-up, one entry at a time, so progress and cancellation work mid-tree."""
+    if os.path.islink(path) or not path.is_dir():
+        size = os.lstat(path).st_size if os.path.isfile(path) and not os.path.islink(path) else 0
+        os.unlink(path)
+        progress.advance(size, 1)
+        return
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            entry = os.path.join(root, name)
+            size = os.lstat(entry).st_size
+            os.unlink(entry)
+            progress.advance(size, 1)
+        for name in dirs:
+            entry = os.path.join(root, name)
+            if os.path.islink(entry):
+                os.unlink(entry)
+                progress.advance(0, 1)
+            else:
+                os.rmdir(entry)
+    os.rmdir(path)
+
+
+def _discard(path: Path) -> None:
+    if os.path.islink(path) or path.is_file():
+        path.unlink(missing_ok=True)
+    elif path.exists():
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _run_copy(project_id: str, sources: list[Path], target_dir: Path, progress: _Progress, options: dict) -> dict:
+    for source in sources:
+        _measure(source, progress)
+    progress.flush(phase='copying')
+    copied = []
+    for source in sources:
+        target = _free_name(target_dir, source.name, 'copy')
+        try:
+            _copy_tree(source, target, progress, options.get('link', 'auto'))
+        except BaseException:
+            _discard(target)
+            raise
+        copied.append(target.name)
+        if target.is_file():
+            schedule_file_metadata(project_id, _relative(project_id, target))
+    return {'copied_items': copied}
+
+
+def _run_move(project_id: str, sources: list[Path], target_dir: Path, progress: _Progress, options: dict) -> dict:
+    # Renames within a filesystem are instant; only the rest needs measuring.
+    renames = [source for source in sources if _same_filesystem(source, target_dir)]
+    for source in sources:
+        if source not in renames:
+            _measure(source, progress)
+    progress.total_files += len(renames)
+    progress.flush(phase='moving')
+    moved = []
+    for source in sources:
+        target = _free_name(target_dir, source.name, 'moved')
+        old_relative = _relative(project_id, source)
+        if source in renames:
+            try:
+                os.rename(source, target)
+                progress.advance(0, 1)
+            except OSError as exc:
+                if exc.errno != errno.EXDEV:
+                    raise
+                renames.remove(source)
+                progress.total_files -= 1
+                _measure(source, progress)
+        if source not in renames:
+            try:
+                _copy_tree(source, target, progress, options.get('link', 'auto'))
+            except BaseException:
+                _discard(target)
+                raise
+            _discard(source)
+        move_file_metadata(project_id, old_relative, _relative(project_id, target))
+        moved.append(target.name)
+    return {'moved_items': moved}
+
+
+def _run_delete(project_id: str, sources: list[Path], target_dir, progress: _Progress, options: dict) -> dict:
+    for source in sources:
+        _measure(source, progress)
+    progress.flush(phase='deleting')
+    deleted = []
+    try:
+        for source in sources:
+            _remove_tree(source, progress)
+            deleted.append(_relative(project_id, source))
+    finally:
+        # A canceled delete may have emptied part of a directory; the cache refills on demand.
+        forget_file_metadata(project_id, [_relative(project_id, source) for source in sources])
+    return {'deleted_items': deleted}
+
+
+def _run_zip(project_id: str, sources: list[Path], target_dir: Path, progress: _Progress, options: dict) -> dict:
+    for source in sources:
+        _measure(source, progress)
+    progress.flush(phase='archiving')
+    name = options.get('name') or f'selected_files_{int(time.time())}.zip'
+    if '/' in name or name in ('.', '..'):
+        raise ValueError('Invalid archive name')
+    if not name.endswith('.zip'):
+        name += '.zip'
+    partial = target_dir / f'{TEMP_PREFIX}{progress.task_id}.zip.part'
+
+    def entries():
+        for source in sources:
+            for arcname, path in walk_entries(str(source), source.name):
+                if path == str(partial):
+                    continue
+                yield arcname, path
+                if not arcname.endswith('/'):
+                    progress.advance(os.path.getsize(path), 1)
+
+    try:
+        with open(partial, 'wb') as handle:
+            for chunk in stream_zip(entries()):
+                handle.write(chunk)
+                progress.check()
+        target = _free_name(target_dir, name, 'copy')
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+    return {'archive': _relative(project_id, target), 'archive_bytes': target.stat().st_size}
+
+
+_RUNNERS = {'copy': _run_copy, 'move': _run_move, 'delete': _run_delete, 'zip': _run_zip}
+
+
+def _run(project_id: str, task_id: str) -> None:
+    with _EXECUTOR_LOCK:
+        cancel_event = _CANCEL_EVENTS.setdefault(task_id, threading.Event())
+    try:
+        conn = get_db_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = _load_row(conn, project_id, task_id)
+            if row['status'] != 'queued':
+                conn.commit()
+                return
+            conn.execute(
+                '''
+                UPDATE file_tasks
+                SET status = 'running', phase = 'scanning', worker_id = ?, started_at = CURRENT_TIMESTAMP,
+                    heartbeat_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                ''',
+                (_WORKER_ID, task_id),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        progress = _Progress(task_id, cancel_event)
+        status, result, error = 'completed', None, None
+        try:
+            items = json.loads(row['items'])
+            sources = [_item_path(project_id, item) for item in items]
+            target_dir = None if row['kind'] == 'delete' else resolve_project_path(project_id, row['destination'] or '')
+            result = _RUNNERS[row['kind']](project_id, sources, target_dir, progress, json.loads(row['options'] or '{}'))
+        except TaskCanceled:
+            status = 'canceled'
+        except Exception as exc:
+            status, error = 'failed', str(exc)
+        progress.flush(
+            status=status,
+            phase=None,
+            result=json.dumps(result) if result is not None else None,
+            error=error,
+            finished_at=time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+        )
+    finally:
+        with _EXECUTOR_LOCK:
+            _CANCEL_EVENTS.pop(task_id, None)
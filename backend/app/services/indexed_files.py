@@ -0,0 +1,454 @@
+from __future__ import annotations
+
+import bisect
+import gzip
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from .sequence_stats import GZIP_MAGIC
+
+
+INDEX_SUFFIXES = ('.tbi', '.csi', '.fai', '.gzi')
+MAX_REGION_RECORDS = 10000
+MAX_REGION_BASES = 1024 * 1024
+MAX_LISTED_CONTIGS = 5000
+FASTA_LINE_WIDTH = 60
+# tabix presets (low 16 bits of the format field) and the zero-based flag.
+PRESET_VCF = 2
+ZERO_BASED = 0x10000
+
+_INDEXES: OrderedDict = OrderedDict()
+_INDEX_LOCK = threading.Lock()
+_INDEX_CACHE_ENTRIES = 8
+
+
+def is_bgzf(path: str) -> bool:
+    """Whether ``path`` starts with a BGZF block (gzip with a 'BC' extra subfield)."""
+    try:
+        with open(path, 'rb') as handle:
+            header = handle.read(12)
+            if len(header) < 12 or header[:2] != GZIP_MAGIC or not header[3] & 4:
+                return False
+            return _block_size(handle.read(struct.unpack_from('<H', header, 10)[0])) is not None
+    except OSError:
+        return False
+
+
+def _block_size(extra: bytes) -> int | None:
+    position = 0
+    while position + 4 <= len(extra):
+        length = struct.unpack_from('<H', extra, position + 2)[0]
+        if extra[position:position + 2] == b'BC' and length == 2:
+            return struct.unpack_from('<H', extra, position + 4)[0]
+        position += 4 + length
+    return None
+
+
+class BgzfReader:
+    """Random access into a BGZF file, decompressing one block at a time.
+
+    Positions are virtual offsets: the compressed offset of a block shifted
+    left 16 bits, plus the offset inside its decompressed data.
+    """
+
+    def __init__(self, path: str):
+        self.handle = open(path, 'rb')
+        self.size = os.fstat(self.handle.fileno()).st_size
+        self.block_offset = -1
+        self.next_offset = 0
+        self.data = b''
+        self.within = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.handle.close()
+
+    def _load(self, block_offset: int) -> None:
+        self.handle.seek(block_offset)
+        header = self.handle.read(12)
+        self.block_offset = block_offset
+        self.within = 0
+        if len(header) < 12:
+            self.data, self.next_offset = b'', self.size
+            return
+        extra = self.handle.read(struct.unpack_from('<H', header, 10)[0])
+        size = _block_size(extra) if header[:2] == GZIP_MAGIC and header[3] & 4 else None
+        if size is None:
+            raise ValueError('File is not BGZF-compressed (use bgzip, not gzip)')
+        payload = self.handle.read(size + 1 - 12 - len(extra))
+        self.data = zlib.decompress(payload[:-8], -15)
+        self.next_offset = block_offset + size + 1
+
+    def _advance(self) -> bool:
+        while self.within >= len(self.data):
+            if self.next_offset >= self.size:
+                return False
+            self._load(self.next_offset)
+        return True
+
+    def seek(self, virtual_offset: int) -> None:
+        block_offset = virtual_offset >> 16
+        if block_offset != self.block_offset:
+            self._load(block_offset)
+        self.within = virtual_offset & 0xFFFF
+
+    def seek_uncompressed(self, offset: int, gzi: list[tuple[int, int]]) -> None:
+        """Seek to an offset in the decompressed stream using a .gzi block map."""
+        index = bisect.bisect_right(gzi, offset, key=lambda entry: entry[1]) - 1
+        compressed, uncompressed = gzi[max(0, index)]
+        self.seek(compressed << 16)
+        remaining = offset - uncompressed
+        while remaining > 0 and self._advance():
+            step = min(remaining, len(self.data) - self.within)
+            self.within += step
+            remaining -= step
+
+    def tell(self) -> int:
+        self._advance()
+        return (self.block_offset << 16) | self.within
+
+    def read(self, length: int) -> bytes:
+        parts = []
+        while length > 0 and self._advance():
+            part = self.data[self.within:self.within + length]
+            self.within += len(part)
+            length -= len(part)
+            parts.append(part)
+        return b''.join(parts)
+
+    def readline(self) -> bytes:
+        parts = []
+        while self._advance():
+            newline = self.data.find(b'\n', self.within)
+            if newline >= 0:
+                parts.append(self.data[self.within:newline + 1])
+                self.within = newline + 1
+                break
+            parts.append(self.data[self.within:])
+            self.within = len(self.data)
+        return b''.join(parts)
+
+
+def _region_bins(begin: int, end: int, min_shift: int, depth: int) -> list[int]:
+    """Bins that may hold records overlapping [begin, end), as in the SAM spec's reg2bins."""
+    bins = []
+    end -= 1
+    shift = min_shift + depth * 3
+    first_bin = 0
+    for level in range(depth + 1):
+        bins.extend(range(first_bin + (begin >> shift), first_bin + (end >> shift) + 1))
+        shift -= 3
+        first_bin += 1 << (level * 3)
+    return bins
+
+
+class TabixIndex:
+    """A parsed .tbi or .csi index. References are decoded on first use."""
+
+    def __init__(self, data: bytes):
+        magic = data[:4]
+        if magic == b'TBI\x01':
+            self.kind = 'tbi'
+            self.min_shift, self.depth = 14, 5
+            n_ref = struct.unpack_from('<i', data, 4)[0]
+            header, position = data[8:36], 36 + struct.unpack_from('<i', data, 32)[0]
+        elif magic == b'CSI\x01':
+            self.kind = 'csi'
+            self.min_shift, self.depth, aux_length = struct.unpack_from('<3i', data, 4)
+            if aux_length < 28:
+                raise ValueError('CSI index has no sequence names (not a tabix-style index)')
+            header = data[16:44]
+            position = 16 + aux_length
+            n_ref = struct.unpack_from('<i', data, position)[0]
+            position += 4
+        else:
+            raise ValueError('Unsupported index format')
+        fmt, self.col_seq, self.col_beg, self.col_end, meta, self.skip, names_length = struct.unpack('<7i', header)
+        self.preset = fmt & 0xFFFF
+        self.zero_based = bool(fmt & ZERO_BASED)
+        self.meta = chr(meta) if meta else ''
+        names_start = 36 if self.kind == 'tbi' else 44
+        self.names = [
+            name.decode('utf-8', errors='replace')
+            for name in data[names_start:names_start + names_length].split(b'\0')[:n_ref]
+        ]
+        self.pseudo_bin = ((1 << (3 * (self.depth + 1))) - 1) // 7 + 1
+        self.data = data
+        self.ref_offsets = []
+        bin_header = 8 if self.kind == 'tbi' else 16
+        for _ in range(n_ref):
+            self.ref_offsets.append(position)
+            n_bin = struct.unpack_from('<i', data, position)[0]
+            position += 4
+            for _ in range(n_bin):
+                n_chunk = struct.unpack_from('<i', data, position + bin_header - 4)[0]
+                position += bin_header + 16 * n_chunk
+            if self.kind == 'tbi':
+                position += 4 + 8 * struct.unpack_from('<i', data, position)[0]
+        self._refs: dict[int, tuple[dict, list, tuple | None]] = {}
+
+    def _ref(self, tid: int) -> tuple[dict, list, tuple | None]:
+        if tid not in self._refs:
+            data, position = self.data, self.ref_offsets[tid]
+            bin_header = 8 if self.kind == 'tbi' else 16
+            bins, counts = {}, None
+            n_bin = struct.unpack_from('<i', data, position)[0]
+            position += 4
+            for _ in range(n_bin):
+                bin_id = struct.unpack_from('<I', data, position)[0]
+                n_chunk = struct.unpack_from('<i', data, position + bin_header - 4)[0]
+                position += bin_header
+                chunks = [struct.unpack_from('<QQ', data, position + 16 * index) for index in range(n_chunk)]
+                position += 16 * n_chunk
+                if bin_id == self.pseudo_bin:
+                    # Second pseudo-chunk holds (mapped, unmapped) record counts.
+                    counts = chunks[1] if len(chunks) > 1 else None
+                else:
+                    bins[bin_id] = chunks
+            linear = []
+            if self.kind == 'tbi':
+                n_intervals = struct.unpack_from('<i', data, position)[0]
+                linear = list(struct.unpack_from(f'<{n_intervals}Q', data, position + 4))
+            self._refs[tid] = (bins, linear, counts)
+        return self._refs[tid]
+
+    def max_position(self) -> int:
+        return 1 << (self.min_shift + self.depth * 3)
+
+    def record_count(self) -> int | None:
+        total = 0
+        for tid in range(len(self.names)):
+            counts = self._ref(tid)[2]
+            if counts is None:
+                return None
+            total += counts[0]
+        return total
+
+    def chunks(self, tid: int, begin: int, end: int) -> list[tuple[int, int]]:
+        """Merged (start, end) virtual offset ranges that may hold records in [begin, end)."""
+        bins, linear, _ = self._ref(tid)
+        min_offset = linear[min(begin >> self.min_shift, len(linear) - 1)] if linear else 0
+        chunks = sorted(
+            chunk
+            for bin_id in _region_bins(begin, end, self.min_shift, self.depth)
+            for chunk in bins.get(bin_id, ())
+            if chunk[1] > min_offset
+        )
+        merged = []
+        for start, stop in chunks:
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        return merged
+
+    def interval(self, fields: list[str]) -> tuple[int, int]:
+        """Zero-based half-open span of a record."""
+        start = int(fields[self.col_beg - 1])
+        if not self.zero_based:
+            start -= 1
+        if self.preset == PRESET_VCF:
+            end = start + max(1, len(fields[3]) if len(fields) > 3 else 1)
+        elif self.col_end and len(fields) >= self.col_end:
+            end = int(fields[self.col_end - 1])
+        else:
+            end = start + 1
+        return start, end
+
+
+def _load_fai(data: bytes) -> dict[str, tuple[int, int, int, int]]:
+    entries = {}
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        fields = line.split('\t')
+        if len(fields) >= 5:
+            entries[fields[0]] = tuple(int(value) for value in fields[1:5])
+    return entries
+
+
+def _load_gzi(data: bytes) -> list[tuple[int, int]]:
+    count = struct.unpack_from('<Q', data, 0)[0]
+    values = struct.unpack_from(f'<{count * 2}Q', data, 8)
+    return [(0, 0)] + list(zip(values[0::2], values[1::2]))
+
+
+_LOADERS = {
+    '.tbi': lambda data: TabixIndex(gzip.decompress(data)),
+    '.csi': lambda data: TabixIndex(gzip.decompress(data)),
+    '.fai': _load_fai,
+    '.gzi': _load_gzi,
+}
+
+
+def _load_index(index_path: str):
+    """Parsed index, cached until the index file changes."""
+    stat_result = os.stat(index_path)
+    signature = (stat_result.st_mtime_ns, stat_result.st_size)
+    with _INDEX_LOCK:
+        cached = _INDEXES.get(index_path)
+        if cached and cached[0] == signature:
+            _INDEXES.move_to_end(index_path)
+            return cached[1]
+    with open(index_path, 'rb') as handle:
+        index = _LOADERS[os.path.splitext(index_path)[1]](handle.read())
+    with _INDEX_LOCK:
+        _INDEXES[index_path] = (signature, index)
+        _INDEXES.move_to_end(index_path)
+        while len(_INDEXES) > _INDEX_CACHE_ENTRIES:
+            _INDEXES.popitem(last=False)
+    return index
+
+
+def find_indexes(path: str) -> dict[str, str]:
+    """Index files sitting next to ``path``, keyed by suffix."""
+    return {suffix: path + suffix for suffix in INDEX_SUFFIXES if os.path.isfile(path + suffix)}
+
+
+def describe_index(path: str) -> dict | None:
+    """Contigs and index kind for a tabix/CSI-indexed or faidx-indexed file, or None."""
+    indexes = find_indexes(path)
+    data_mtime = os.path.getmtime(path)
+    for suffix in ('.tbi', '.csi'):
+        if suffix in indexes and is_bgzf(path):
+            index = _load_index(indexes[suffix])
+            contigs = [{'name': name, 'length': None} for name in index.names[:MAX_LISTED_CONTIGS]]
+            return {
+                'kind': index.kind,
+                'contigs': contigs,
+                'contig_count': len(index.names),
+                'record_count': index.record_count(),
+                'stale': os.path.getmtime(indexes[suffix]) < data_mtime,
+            }
+    if '.fai' in indexes and (not is_bgzf(path) or '.gzi' in indexes):
+        entries = _load_index(indexes['.fai'])
+        contigs = [{'name': name, 'length': entry[0]} for name, entry in list(entries.items())[:MAX_LISTED_CONTIGS]]
+        return {
+            'kind': 'fai',
+            'contigs': contigs,
+            'contig_count': len(entries),
+            'record_count': len(entries),
+            'stale': os.path.getmtime(indexes['.fai']) < data_mtime,
+        }
+    return None
+
+
+def parse_region(region: str) -> tuple[str, int, int | None]:
+    """``contig``, ``contig:start`` or ``contig:start-end`` (1-based, inclusive) to a zero-based half-open span."""
+    region = (region or '').strip()
+    if not region:
+        raise ValueError('Region is required')
+    contig, separator, span = region.rpartition(':')
+    if not separator or not re.fullmatch(r'[\d,]+(-[\d,]*)?', span):
+        return region, 0, None
+    start_text, _, end_text = span.partition('-')
+    start = int(start_text.replace(',', ''))
+    end = int(end_text.replace(',', '')) if end_text else None
+    if start < 1 or (end is not None and end < start):
+        raise ValueError(f'Invalid region: {region}')
+    return contig, start - 1, end
+
+
+def _tabix_query(path: str, index: TabixIndex, contig: str, begin: int, end: int, limit: int) -> dict:
+    try:
+        tid = index.names.index(contig)
+    except ValueError:
+        raise ValueError(f'Unknown contig: {contig}')
+    records, truncated = [], False
+    with BgzfReader(path) as reader:
+        header = None
+        if index.meta:
+            reader.seek(0)
+            while True:
+                line = reader.readline()
+                if not line.startswith(index.meta.encode()):
+                    break
+                header = line
+        for chunk_start, chunk_end in index.chunks(tid, begin, end):
+            reader.seek(chunk_start)
+            while reader.tell() < chunk_end:
+                line = reader.readline()
+                if not line:
+                    break
+                text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+                if not text or (index.meta and text.startswith(index.meta)):
+                    continue
+                fields = text.split('\t')
+                if fields[index.col_seq - 1] != contig:
+                    continue
+                start, stop = index.interval(fields)
+                if start >= end:
+                    break
+                if stop > begin:
+                    records.append(text)
+                    if len(records) >= limit:
+                        truncated = True
+                        break
+            if truncated:
+                break
+    lines = ([header.decode('utf-8', errors='replace').rstrip('\r\n')] if header else []) + records
+    return {'content': '\n'.join(lines), 'records_count': len(records), 'truncated': truncated}
+
+
+def _fasta_query(path: str, entries: dict, gzi, contig: str, begin: int, end: int | None) -> dict:
+    if contig not in entries:
+        raise ValueError(f'Unknown contig: {contig}')
+    length, offset, line_bases, line_width = entries[contig]
+    end = length if end is None else min(end, length)
+    begin = min(begin, end)
+    truncated = end - begin > MAX_REGION_BASES
+    if truncated:
+        end = begin + MAX_REGION_BASES
+
+    def byte_offset(position: int) -> int:
+        return offset + position // line_bases * line_width + position % line_bases
+
+    first = byte_offset(begin)
+    size = byte_offset(end - 1) + 1 - first if end > begin else 0
+    if gzi is None:
+        with open(path, 'rb') as handle:
+            handle.seek(first)
+            raw = handle.read(size)
+    else:
+        with BgzfReader(path) as reader:
+            reader.seek_uncompressed(first, gzi)
+            raw = reader.read(size)
+    sequence = raw.replace(b'\n', b'').replace(b'\r', b'').decode('ascii', errors='replace')
+    lines = [f'>{contig}:{begin + 1}-{end}']
+    lines.extend(sequence[start:start + FASTA_LINE_WIDTH] for start in range(0, len(sequence), FASTA_LINE_WIDTH))
+    return {'content': '\n'.join(lines), 'records_count': 1, 'bases': len(sequence), 'truncated': truncated}
+
+
+def query_region(path: str, region: str, limit: int = 1000) -> dict:
+    """Records overlapping ``region`` read through the file's index.
+
+    BGZF files with a .tbi/.csi index are read from the index's chunks
+    only; FASTA files with a .fai (plus .gzi when bgzip-compressed) are
+    read from the computed byte range. Nothing else is decompressed.
+    """
+    contig, begin, end = parse_region(region)
+    limit = max(1, min(int(limit), MAX_REGION_RECORDS))
+    indexes = find_indexes(path)
+    for suffix in ('.tbi', '.csi'):
+        if suffix in indexes:
+            index = _load_index(indexes[suffix])
+            result = _tabix_query(path, index, contig, begin, index.max_position() if end is None else end, limit)
+            result['index'] = index.kind
+            break
+    else:
+        if '.fai' not in indexes:
+            raise ValueError('File has no .tbi, .csi or .fai index')
+        gzi = None
+        if is_bgzf(path):
+            if '.gzi' not in indexes:
+                raise ValueError('Compressed FASTA needs a .gzi index (samtools faidx creates it)')
+            gzi = _load_index(indexes['.gzi'])
+        result = _fasta_query(path, _load_index(indexes['.fai']), gzi, contig, begin, end)
+        result['index'] = 'fai'
+    result['region'] = region.strip()
+    result['lines_count'] = result['content'].count('\n') + 1 if result['content'] else 0
+    return result
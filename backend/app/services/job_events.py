@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+import os
+import select
+import socket
+import threading
+import uuid
+from pathlib import Path
+from typing import Callable
+
+from .. import database
+from .worker_doorbell import doorbell_supported
+
+
+# Keep datagrams well under the default AF_UNIX socket buffer (~208 KiB).
+MAX_DATAGRAM_BYTES = 60 * 1024
+
+EventSink = Callable[[str, dict, list], None]
+
+_LOCAL_SINK: EventSink | None = None
+_LISTENER_PATH: str | None = None
+_SENDER: socket.socket | None = None
+_SENDER_LOCK = threading.Lock()
+
+
+def events_enabled() -> bool:
+    return os.getenv('APPAM_JOB_EVENTS', 'true').strip().lower() != 'false'
+
+
+def event_bus_dir() -> Path:
+    configured = os.getenv('APPAM_EVENT_BUS_DIR', '').strip()
+    if configured:
+        return Path(configured)
+    return Path(os.path.abspath(database.DATABASE_FILE)).parent / '.appam-events'
+
+
+def project_room(project_id: str) -> str:
+    return f'project:{project_id}'
+
+
+def job_room(job_id: str) -> str:
+    return f'job:{job_id}'
+
+
+def set_local_sink(sink: EventSink | None, listener_path: str | None = None) -> None:
+    """Deliver events published in this process straight to ``sink``.
+
+    ``listener_path`` is this process's own bus socket, which broadcasts
+    then skip so local events are not delivered twice.
+    """
+    global _LOCAL_SINK, _LISTENER_PATH
+    _LOCAL_SINK = sink
+    _LISTENER_PATH = listener_path
+
+
+def publish(event: str, payload: dict, *, project_id: str | None = None, job_id: str | None = None) -> None:
+    """Push an event to the rooms of ``project_id`` and ``job_id``.
+
+    Delivery is best effort: subscribers that miss an event resynchronise
+    through the REST endpoints, so failures here are never raised.
+    """
+    if not events_enabled():
+        return
+    rooms = []
+    if project_id:
+        rooms.append(project_room(project_id))
+    if job_id:
+        rooms.append(job_room(job_id))
+    if not rooms:
+        return
+
+    sink = _LOCAL_SINK
+    if sink is not None:
+        try:
+            sink(event, payload, rooms)
+        except Exception:
+            pass
+    _broadcast({'event': event, 'payload': payload, 'rooms': rooms})
+
+
+def publish_log_chunk(job_id: str, project_id: str, offset: int, data: bytes) -> None:
+    payload = {
+        'job_id': job_id,
+        'offset': offset,
+        'next_offset': offset + len(data),
+        'content': data.decode('utf-8', errors='replace'),
+        'truncated': False,
+    }
+    if len(json.dumps(payload['content'])) > MAX_DATAGRAM_BYTES - 1024:
+        # Too large to ship in one datagram; clients fetch the range instead.
+        payload['content'] = ''
+        payload['truncated'] = True
+    publish('job_log', payload, project_id=project_id, job_id=job_id)
+
+
+def _sender() -> socket.socket:
+    global _SENDER
+    if _SENDER is None:
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sender.setblocking(False)
+        _SENDER = sender
+    return _SENDER
+
+
+def _broadcast(message: dict) -> int:
+    if not doorbell_supported():
+        return 0
+    try:
+        entries = [entry for entry in os.scandir(event_bus_dir()) if entry.name.endswith('.sock')]
+    except OSError:
+        return 0
+    entries = [entry for entry in entries if entry.path != _LISTENER_PATH]
+    if not entries:
+        return 0
+
+    data = json.dumps(message, separators=(',', ':'), default=str).encode('utf-8')
+    if len(data) > MAX_DATAGRAM_BYTES:
+        return 0
+
+    delivered = 0
+    with _SENDER_LOCK:
+        sender = _sender()
+        for entry in entries:
+            try:
+                sender.sendto(data, entry.path)
+                delivered += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+            except OSError:
+                # Listener backlog is full; drop rather than stall the job.
+                continue
+    return delivered
+
+
+class EventBusListener:
+    """Receives events broadcast by other processes and hands them to a sink.
+
+    Each web process binds one datagram socket in the shared bus
+    directory; standalone workers publish to every socket there, so
+    progress reaches all Socket.IO servers without an external broker.
+    """
+
+    def __init__(self, sink: EventSink, directory: Path | None = None):
+        self.sink = sink
+        self.directory = directory or event_bus_dir()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f'events-{os.getpid()}-{uuid.uuid4().hex[:8]}.sock'
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(str(self.path))
+        self._closed = threading.Event()
+
+    def poll(self, timeout: float | None = 1.0) -> int:
+        """Deliver every queued event; return how many were delivered."""
+        ready, _, _ = select.select([self._socket], [], [], timeout)
+        if not ready:
+            return 0
+        delivered = 0
+        while True:
+            try:
+                data = self._socket.recv(MAX_DATAGRAM_BYTES + 1024)
+            except (BlockingIOError, InterruptedError):
+                return delivered
+            except OSError:
+                return delivered
+            try:
+                message = json.loads(data.decode('utf-8'))
+                self.sink(message['event'], message.get('payload') or {}, message.get('rooms') or [])
+                delivered += 1
+            except Exception:
+                continue
+
+    def serve_forever(self) -> None:
+        while not self._closed.is_set():
+            try:
+                self.poll(timeout=1.0)
+            except (OSError, ValueError):
+                if self._closed.is_set():
+                    return
+                raise
+
+    def close(self) -> None:
+        self._closed.set()
+        try:
+            self._socket.close()
+        finally:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+def open_event_bus_listener(sink: EventSink) -> EventBusListener | None:
+    if not events_enabled() or not doorbell_supported():
+        return None
+    try:
+        return EventBusListener(sink)
+    except OSError:
+        return None
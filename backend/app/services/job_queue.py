@@ -4,8 +4,7 @@ import os
 import socket
 import uuid
 
-from ..database import get_db_connection
-from .job_store import create_job, get_job, mark_job_claimed
+from .job_store import create_job, get_job, get_queue_positions, mark_job_claimed
 from .local_executor import (
     notify_new_job,
     start_embedded_worker as _start_embedded_worker,
@@ -80,33 +79,8 @@ def stop_embedded_worker(timeout: float = 5.0) -> None:
 
 
 def get_queue_position(job_id: str) -> int | None:
-    conn = get_db_connection()
-    try:
-        row = conn.execute(
-            '''
-            SELECT created_at, id, status
-            FROM jobs
-            WHERE id = ?
-            ''',
-            (job_id,),
-        ).fetchone()
-        if not row or row['status'] != 'queued':
-            return None
-        count_row = conn.execute(
-            '''
-            SELECT COUNT(*) AS count
-            FROM jobs
-            WHERE status = 'queued'
-              AND (
-                created_at < ?
-                OR (created_at = ? AND id <= ?)
-              )
-            ''',
-            (row['created_at'], row['created_at'], row['id']),
-        ).fetchone()
-        return int(count_row['count']) if count_row else None
-    finally:
-        conn.close()
+    """1-based position of a queued job in the local scheduler's claim order."""
+    return get_queue_positions([job_id]).get(job_id)
 
 
 def cancel_enqueued_job(job_id: str) -> bool:
@@ -136,6 +110,7 @@ def enqueue_pipeline_job(
     workflow_run_id: str | None = None,
     is_dry_run: bool = False,
     workflow_run_spec: dict | None = None,
+    priority: int = 0,
 ) -> str:
     job_id = job_id or uuid.uuid4().hex
     create_job(
@@ -155,6 +130,8 @@ def enqueue_pipeline_job(
         is_dry_run=is_dry_run,
         workflow_run_spec=workflow_run_spec,
         backend='rq' if _queue_backend() == 'rq' else 'local',
+        resources=(command_spec or {}).get('resources'),
+        priority=priority,
     )
     if _queue_backend() == 'rq':
         _rq_queue().enqueue(run_queued_rq_job, job_id, job_id=job_id)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import os
+
+
+# Parameter names that conventionally carry a thread count for command-line tools.
+THREAD_PARAM_NAMES = (
+    '--threads',
+    '-t',
+    '--cpus',
+    '--cpu',
+    '--num-threads',
+    '-threads',
+    '--cores',
+    '-p',
+    '-@',
+    'threads',
+    'cores',
+)
+
+
+def _positive_int(value, default: int = 0) -> int:
+    try:
+        parsed = int(float(value))
+    except (TypeError, ValueError):
+        return default
+    return parsed if parsed > 0 else default
+
+
+def normalize_resources(resources: dict | None) -> dict:
+    resources = resources or {}
+    return {
+        'cpus': max(1, _positive_int(resources.get('cpus'), 1)),
+        'mem_mb': _positive_int(resources.get('mem_mb'), 0),
+    }
+
+
+def command_resource_request(tool_info: dict, params: dict) -> dict:
+    """CPU/memory a command-mode tool job is expected to use.
+
+    ``execution.resources`` on the tool definition provides the defaults; a
+    thread-count parameter supplied by the user overrides the CPU figure.
+    """
+    declared = normalize_resources((tool_info.get('execution') or {}).get('resources'))
+    declared_names = {param.get('name') for param in tool_info.get('parameters', [])}
+    for name in THREAD_PARAM_NAMES:
+        if name in declared_names and params.get(name) not in (None, ''):
+            threads = _positive_int(params.get(name))
+            if threads:
+                declared['cpus'] = threads
+                break
+    return declared
+
+
+def parse_snakemake_resources(argv: list[str]) -> dict:
+    """Read ``--cores``/``--jobs`` and ``--resources mem_mb=`` from a Snakemake argv."""
+    cpus = 0
+    mem_mb = 0
+    index = 0
+    while index < len(argv):
+        token = str(argv[index])
+        value = None
+        if '=' in token and token.startswith('--'):
+            token, value = token.split('=', 1)
+        if token in {'--cores', '-c', '--jobs', '-j'}:
+            if value is None and index + 1 < len(argv):
+                value = argv[index + 1]
+                index += 1
+            cpus = _positive_int(value, os.cpu_count() or 1) if value != 'all' else (os.cpu_count() or 1)
+        elif token == '--resources':
+            values = [value] if value is not None else []
+            while index + 1 < len(argv) and '=' in str(argv[index + 1]) and not str(argv[index + 1]).startswith('-'):
+                values.append(argv[index + 1])
+                index += 1
+            for item in values:
+                key, _, amount = str(item).partition('=')
+                if key.strip() == 'mem_mb':
+                    mem_mb = _positive_int(amount)
+        index += 1
+    return normalize_resources({'cpus': cpus, 'mem_mb': mem_mb})
+
+
+def workflow_resource_request(argv: list[str], *, profile: str | None = None, backend: str | None = None, dry_run: bool = False) -> dict:
+    """CPU/memory the local host needs for a Snakemake workflow job.
+
+    Dry runs and cluster submissions (slurm profile or backend) only run the
+    Snakemake driver locally, so they reserve a single CPU.
+    """
+    resources = parse_snakemake_resources(argv)
+    if dry_run or str(profile or '').lower() == 'slurm' or str(backend or '').lower() == 'slurm':
+        return {'cpus': 1, 'mem_mb': 0}
+    return resources
+
+
+def effective_request(request: dict, capacity: dict) -> dict:
+    """Clamp a request to the host budget so oversized jobs can still run alone."""
+    request = normalize_resources(request)
+    cpus_total = capacity.get('cpus_total') or request['cpus']
+    mem_total = capacity.get('mem_mb_total') or 0
+    return {
+        'cpus': min(request['cpus'], cpus_total),
+        'mem_mb': min(request['mem_mb'], mem_total) if mem_total else request['mem_mb'],
+    }
+
+
+def fits_capacity(request: dict, capacity: dict) -> bool:
+    """Whether ``request`` fits in the free part of ``capacity``.
+
+    ``capacity`` carries ``cpus_total``/``cpus_free`` and
+    ``mem_mb_total``/``mem_mb_free``; a zero memory total disables the
+    memory check.
+    """
+    wanted = effective_request(request, capacity)
+    if wanted['cpus'] > capacity.get('cpus_free', wanted['cpus']):
+        return False
+    if capacity.get('mem_mb_total') and wanted['mem_mb'] > capacity.get('mem_mb_free', 0):
+        return False
+    return True
@@ -4,17 +4,13 @@ import os
 import json
 import socket
 import subprocess
+import threading
 import time
 import signal
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
 
-try:
-    import select
-except ImportError:  # pragma: no cover - Windows fallback
-    select = None
-
 from .job_store import (
     append_workflow_run_event,
     attach_process_info,
@@ -26,11 +22,14 @@ from .job_store import (
     replace_workflow_artifacts,
     replace_workflow_metrics,
     update_job_heartbeat,
-    update_workflow_run,
-    update_workflow_stage,
+    write_workflow_progress,
 )
+from .job_events import events_enabled, publish, publish_log_chunk
+from .log_index import open_indexed_log
+from .log_pump import LineFeed, LogPump, enlarge_pipe
+from .thumbnails import schedule_directory_thumbnails
 from .workflow_results import build_result_metrics, collect_workflow_artifacts
-from .workflow_runtime import detect_rule_name, get_rule_to_stage_map
+from .workflow_runtime import RULE_LINE_MARKERS, detect_rule_name, get_rule_to_stage_map
 
 
 def _backend_dir() -> str:
@@ -49,12 +48,68 @@ def _ensure_directory(path: str) -> None:
 
 
 def _write_log_line(log_file, line: str) -> None:
-    log_file.write(line)
     if not line.endswith('\n'):
-        log_file.write('\n')
+        line += '\n'
+    log_file.write(line.encode('utf-8', errors='replace'))
     log_file.flush()
 
 
+def _cancel_poll_interval() -> float:
+    try:
+        return max(0.1, float(os.getenv('APPAM_JOB_CANCEL_POLL_SECONDS', '1.0')))
+    except Exception:
+        return 1.0
+
+
+def _heartbeat_interval() -> float:
+    try:
+        return max(1.0, float(os.getenv('APPAM_JOB_HEARTBEAT_SECONDS', '5')))
+    except Exception:
+        return 5.0
+
+
+class JobMonitor:
+    """Polls for cancellation and refreshes the heartbeat on a timer thread.
+
+    Keeps both database round-trips off the log-pump path; the runner only
+    checks ``cancel_requested`` between reads.
+    """
+
+    def __init__(self, job_id: str, cancel_interval: float | None = None, heartbeat_interval: float | None = None):
+        self.job_id = job_id
+        self.cancel_interval = _cancel_poll_interval() if cancel_interval is None else cancel_interval
+        self.heartbeat_interval = _heartbeat_interval() if heartbeat_interval is None else heartbeat_interval
+        self.cancel_requested = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f'appam-job-monitor-{job_id[:12]}',
+            daemon=True,
+        )
+
+    def start(self) -> 'JobMonitor':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        last_heartbeat = time.monotonic()
+        while not self._stop.wait(self.cancel_interval):
+            try:
+                if is_cancel_requested(self.job_id):
+                    self.cancel_requested.set()
+                    return
+                if time.monotonic() - last_heartbeat >= self.heartbeat_interval:
+                    update_job_heartbeat(self.job_id)
+                    last_heartbeat = time.monotonic()
+            except Exception:
+                continue
+
+
 def _terminate_process(process: subprocess.Popen, log_file) -> None:
     if os.name != 'nt':
         try:
@@ -76,9 +131,96 @@ def _terminate_process(process: subprocess.Popen, log_file) -> None:
             process.kill()
 
 
+def _progress_flush_interval() -> float:
+    try:
+        return max(0.0, float(os.getenv('APPAM_WORKFLOW_PROGRESS_FLUSH_SECONDS', '1.0')))
+    except Exception:
+        return 1.0
+
+
+def _progress_batch_size() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_WORKFLOW_PROGRESS_BATCH_SIZE', '50')))
+    except Exception:
+        return 50
+
+
+class WorkflowProgressBuffer:
+    """Coalesces workflow run/stage updates and batches event inserts.
+
+    Field updates for the run and each stage are merged so only the latest
+    value is written, and events keep the timestamp they were recorded at.
+    Everything pending is written in a single transaction by ``flush()``,
+    which callers trigger on stage transitions and at finalize;
+    ``flush_if_due()`` covers the time and size thresholds in between.
+    """
+
+    def __init__(self, run_id: str | None, flush_interval: float | None = None, batch_size: int | None = None):
+        self.run_id = run_id
+        self.flush_interval = _progress_flush_interval() if flush_interval is None else flush_interval
+        self.batch_size = _progress_batch_size() if batch_size is None else batch_size
+        self.run_fields: dict = {}
+        self.stage_fields: dict[str, dict] = {}
+        self.events: list[dict] = []
+        self.last_flush = time.monotonic()
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.run_fields or self.stage_fields or self.events)
+
+    def update_run(self, **fields) -> None:
+        self.run_fields.update(fields)
+
+    def update_stage(self, stage_id: str, **fields) -> None:
+        if stage_id:
+            self.stage_fields.setdefault(stage_id, {}).update(fields)
+
+    def add_event(
+        self,
+        event_type: str,
+        stage_id: str | None = None,
+        rule_name: str | None = None,
+        message: str | None = None,
+        payload: dict | None = None,
+    ) -> None:
+        self.events.append({
+            'event_type': event_type,
+            'stage_id': stage_id,
+            'rule_name': rule_name,
+            'message': message,
+            'payload': payload,
+            'created_at': _now_str(),
+        })
+
+    def flush_if_due(self) -> bool:
+        if not self.pending:
+            return False
+        if len(self.events) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+            return True
+        return False
+
+    def flush(self) -> None:
+        if not self.run_id or not self.pending:
+            self.last_flush = time.monotonic()
+            return
+        write_workflow_progress(
+            self.run_id,
+            run_fields=self.run_fields,
+            stage_fields=self.stage_fields,
+            events=self.events,
+        )
+        self.run_fields = {}
+        self.stage_fields = {}
+        self.events = []
+        self.last_flush = time.monotonic()
+
+
 class WorkflowExecutionTracker:
-    def __init__(self, workflow_context: dict | None):
+    def __init__(self, workflow_context: dict | None, job_id: str | None = None, project_id: str | None = None):
         workflow_context = workflow_context or {}
+        self.job_id = job_id
+        self.project_id = project_id
         self.run_id = workflow_context.get('run_id')
         self.workflow_id = workflow_context.get('workflow_id')
         self.stages = workflow_context.get('stages') or []
@@ -88,6 +230,7 @@ class WorkflowExecutionTracker:
         self.seen_rules: dict[str, set[str]] = {stage['id']: set() for stage in self.stages}
         self.current_stage_id: str | None = None
         self.current_rule: str | None = None
+        self.progress = WorkflowProgressBuffer(self.run_id)
 
     @property
     def enabled(self) -> bool:
@@ -103,15 +246,15 @@ class WorkflowExecutionTracker:
         if not stage:
             return
 
-        if self.current_stage_id and self.current_stage_id != stage['id']:
+        stage_changed = self.current_stage_id != stage['id']
+        if self.current_stage_id and stage_changed:
             self._mark_stage_completed(self.current_stage_id)
 
-        if self.current_stage_id != stage['id']:
+        if stage_changed:
             self.current_stage_id = stage['id']
             if stage['id'] not in self.seen_stage_ids:
                 self.seen_stage_ids.append(stage['id'])
-            append_workflow_run_event(
-                self.run_id,
+            self.progress.add_event(
                 'stage_started',
                 stage_id=stage['id'],
                 message=f"Stage started: {stage['title']}",
@@ -124,15 +267,13 @@ class WorkflowExecutionTracker:
         total_rules = len(stage.get('rules', []))
         completed_rules = max(0, min(len(seen) - 1, total_rules))
 
-        update_workflow_run(
-            self.run_id,
+        self.progress.update_run(
             current_stage_id=stage['id'],
             current_stage_title=stage['title'],
             current_rule=rule_name,
             status='running',
         )
-        update_workflow_stage(
-            self.run_id,
+        self.progress.update_stage(
             stage['id'],
             status='running',
             started_at=started_at,
@@ -140,13 +281,38 @@ class WorkflowExecutionTracker:
             completed_rules=completed_rules,
             total_rules=total_rules,
         )
-        append_workflow_run_event(
-            self.run_id,
+        self.progress.add_event(
             'rule_started',
             stage_id=stage['id'],
             rule_name=rule_name,
             message=f'Rule started: {rule_name}',
         )
+        self._publish(
+            stage_id=stage['id'],
+            stage_title=stage['title'],
+            stage_status='running',
+            current_rule=rule_name,
+            completed_rules=completed_rules,
+            total_rules=total_rules,
+            status='running',
+        )
+        if stage_changed:
+            self.progress.flush()
+        else:
+            self.progress.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        if self.enabled:
+            self.progress.flush_if_due()
+
+    def _publish(self, **fields) -> None:
+        # Pushed as soon as the rule line is seen, ahead of the buffered DB write.
+        publish(
+            'workflow_progress',
+            {'run_id': self.run_id, 'job_id': self.job_id, 'workflow_id': self.workflow_id, **fields},
+            project_id=self.project_id,
+            job_id=self.job_id,
+        )
 
     def finalize(self, final_status: str, error_message: str | None = None) -> None:
         if not self.enabled:
@@ -159,34 +325,38 @@ class WorkflowExecutionTracker:
                 if final_status == 'completed':
                     self._mark_stage_completed(self.current_stage_id, finished_at=finished_at)
                 else:
-                    update_workflow_stage(
-                        self.run_id,
+                    self.progress.update_stage(
                         self.current_stage_id,
                         status=final_status,
                         finished_at=finished_at,
                         current_rule=None,
                     )
-        update_workflow_run(
-            self.run_id,
+        self.progress.update_run(
             current_rule=None,
             status=final_status,
             error_message=error_message,
         )
-        append_workflow_run_event(
-            self.run_id,
+        self.progress.add_event(
             'stage_finished',
             stage_id=self.current_stage_id,
             rule_name=self.current_rule,
             message=f'Stage finished with status {final_status}',
             payload={'status': final_status, 'error_message': error_message},
         )
+        self.progress.flush()
+        self._publish(
+            stage_id=self.current_stage_id,
+            stage_status=final_status,
+            current_rule=None,
+            status=final_status,
+            error_message=error_message,
+        )
 
     def _mark_stage_completed(self, stage_id: str, finished_at: str | None = None) -> None:
         stage = self.stage_lookup.get(stage_id)
         if not stage:
             return
-        update_workflow_stage(
-            self.run_id,
+        self.progress.update_stage(
             stage_id,
             status='completed',
             finished_at=finished_at or _now_str(),
@@ -194,8 +364,7 @@ class WorkflowExecutionTracker:
             completed_rules=len(stage.get('rules', [])),
             total_rules=len(stage.get('rules', [])),
         )
-        append_workflow_run_event(
-            self.run_id,
+        self.progress.add_event(
             'stage_completed',
             stage_id=stage_id,
             message=f"Stage completed: {stage['title']}",
@@ -286,11 +455,13 @@ def run_pipeline_job(
     env['PYTHONUNBUFFERED'] = '1'
 
     process: Optional[subprocess.Popen] = None
+    monitor: Optional[JobMonitor] = None
+    line_feed: Optional[LineFeed] = None
     workflow_context = (command_spec or {}).get('workflow_context') or {}
-    workflow_tracker = WorkflowExecutionTracker(workflow_context)
+    workflow_tracker = WorkflowExecutionTracker(workflow_context, job_id=job_id, project_id=project_id)
     _update_manifest_after_run(workflow_context, status='running')
     try:
-        with open(log_path, 'a', encoding='utf-8') as log_file:
+        with open_indexed_log(log_path) as log_file:
             _write_log_line(log_file, f"[SYSTEM] Starting command: {command}")
 
             argv = (command_spec or {}).get('argv') or []
@@ -304,9 +475,7 @@ def run_pipeline_job(
                 argv,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
+                bufsize=0,
                 env=env,
                 cwd=cwd,
                 shell=False,
@@ -318,49 +487,57 @@ def run_pipeline_job(
                 pgid=(process.pid if os.name != 'nt' else None),
                 host=socket.gethostname(),
             )
-            last_heartbeat = time.monotonic()
-
-            while True:
-                if is_cancel_requested(job_id):
-                    _write_log_line(log_file, "[SYSTEM] Cancellation requested. Stopping process...")
-                    _terminate_process(process, log_file)
-                    _run_cleanup_commands((command_spec or {}).get('cleanup_commands') or [], env, log_file)
-                    end_time = time.time()
-                    workflow_tracker.finalize('canceled', error_message='Canceled by user')
-                    artifacts = _collect_workflow_artifacts(workflow_context)
-                    metrics = _collect_workflow_metrics(workflow_context)
-                    if workflow_context.get('run_id'):
-                        replace_workflow_artifacts(workflow_context['run_id'], artifacts)
-                        replace_workflow_metrics(workflow_context['run_id'], metrics)
-                    _update_manifest_after_run(workflow_context, status='canceled', error_message='Canceled by user', artifacts=artifacts)
-                    mark_job_finished(job_id, 'canceled', None, 'Canceled by user', end_time - start_time)
-                    return {'status': 'canceled'}
-
-                if process.stdout is None:
-                    break
-
-                if select and os.name != 'nt':
-                    ready, _, _ = select.select([process.stdout], [], [], 0.5)
-                    if not ready:
-                        if time.monotonic() - last_heartbeat >= 5:
-                            update_job_heartbeat(job_id)
-                            last_heartbeat = time.monotonic()
-                        if process.poll() is not None:
-                            break
-                        continue
-                    output = process.stdout.readline()
-                else:
-                    output = process.stdout.readline()
-
-                if output == '' and process.poll() is not None:
-                    break
-                if output:
-                    line = output.rstrip('\n')
-                    _write_log_line(log_file, line)
-                    workflow_tracker.handle_line(line)
-                if time.monotonic() - last_heartbeat >= 5:
-                    update_job_heartbeat(job_id)
-                    last_heartbeat = time.monotonic()
+            monitor = JobMonitor(job_id).start()
+            if workflow_tracker.enabled:
+                line_feed = LineFeed(
+                    workflow_tracker.handle_line,
+                    idle=workflow_tracker.flush_if_due,
+                    name=f'appam-tracker-{job_id[:12]}',
+                )
+
+            if process.stdout is not None:
+                stdout_fd = process.stdout.fileno()
+                enlarge_pipe(stdout_fd)
+                pump = LogPump(
+                    stdout_fd,
+                    log_file,
+                    line_sink=line_feed.put if line_feed else None,
+                    line_markers=RULE_LINE_MARKERS,
+                    chunk_sink=(
+                        (lambda offset, data: publish_log_chunk(job_id, project_id, offset, data))
+                        if events_enabled() else None
+                    ),
+                )
+                while True:
+                    if monitor.cancel_requested.is_set():
+                        pump.end_line()
+                        if line_feed:
+                            line_feed.close()
+                            line_feed = None
+                        _write_log_line(log_file, "[SYSTEM] Cancellation requested. Stopping process...")
+                        _terminate_process(process, log_file)
+                        _run_cleanup_commands((command_spec or {}).get('cleanup_commands') or [], env, log_file)
+                        end_time = time.time()
+                        workflow_tracker.finalize('canceled', error_message='Canceled by user')
+                        artifacts = _collect_workflow_artifacts(workflow_context)
+                        metrics = _collect_workflow_metrics(workflow_context)
+                        if workflow_context.get('run_id'):
+                            replace_workflow_artifacts(workflow_context['run_id'], artifacts)
+                            replace_workflow_metrics(workflow_context['run_id'], metrics)
+                        _update_manifest_after_run(workflow_context, status='canceled', error_message='Canceled by user', artifacts=artifacts)
+                        mark_job_finished(job_id, 'canceled', None, 'Canceled by user', end_time - start_time)
+                        return {'status': 'canceled'}
+
+                    if pump.pump(timeout=0.25) == 0 and (pump.eof or process.poll() is not None):
+                        break
+                pump.finish()
+
+            if line_feed:
+                line_feed.close()
+                error = line_feed.error
+                line_feed = None
+                if error is not None:
+                    raise error
 
             return_code = process.wait()
             end_time = time.time()
@@ -380,6 +557,7 @@ def run_pipeline_job(
                         payload={'artifact_count': len(artifacts)},
                     )
                 _update_manifest_after_run(workflow_context, status='completed', exit_code=return_code, artifacts=artifacts)
+                schedule_directory_thumbnails(project_id, [workflow_context.get('results_dir'), workflow_context.get('reports_dir')])
                 mark_job_finished(job_id, 'completed', return_code, None, end_time - start_time)
                 return {'status': 'completed', 'exit_code': return_code}
 
@@ -397,8 +575,11 @@ def run_pipeline_job(
     except Exception as exc:
         end_time = time.time()
         error_message = f"Exception occurred: {exc}"
+        if line_feed:
+            line_feed.close()
+            line_feed = None
         try:
-            with open(log_path, 'a', encoding='utf-8') as log_file:
+            with open_indexed_log(log_path) as log_file:
                 _write_log_line(log_file, f"[SYSTEM] {error_message}")
         except Exception:
             pass
@@ -412,6 +593,8 @@ def run_pipeline_job(
         mark_job_finished(job_id, 'failed', None, error_message, end_time - start_time)
         return {'status': 'failed', 'error': error_message}
     finally:
+        if monitor:
+            monitor.stop()
         if process and process.stdout:
             try:
                 process.stdout.close()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import os
+
+from ..database import get_db_connection
+
+
+# Lanes are served in ascending order, ahead of priority and fair share.
+LANE_EXPRESS = 0
+LANE_NORMAL = 1
+
+SHARE_SCOPES = ('user', 'project')
+
+# Ordering used both to claim jobs and to report queue positions; it matches
+# idx_jobs_schedule so the next job is found with a single index seek.
+SCHEDULE_ORDER_SQL = 'lane ASC, priority DESC, fair_tag ASC, queue_seq ASC'
+
+
+def _priority_bounds() -> tuple[int, int]:
+    try:
+        limit = max(0, int(os.getenv('APPAM_JOB_PRIORITY_LIMIT', '10')))
+    except Exception:
+        limit = 10
+    return -limit, limit
+
+
+def clamp_priority(value) -> int:
+    try:
+        priority = int(value or 0)
+    except (TypeError, ValueError):
+        priority = 0
+    low, high = _priority_bounds()
+    return max(low, min(high, priority))
+
+
+def scheduling_lane(is_dry_run: bool) -> int:
+    """Dry runs only build the DAG, so they take the short-job express lane."""
+    return LANE_EXPRESS if is_dry_run else LANE_NORMAL
+
+
+def _state_value(conn, key: str) -> float:
+    row = conn.execute('SELECT value FROM scheduler_state WHERE key = ?', (key,)).fetchone()
+    return float(row['value']) if row else 0.0
+
+
+def _set_state_value(conn, key: str, value: float) -> None:
+    conn.execute(
+        '''
+        INSERT INTO scheduler_state (key, value)
+        VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        ''',
+        (key, value),
+    )
+
+
+def _share_row(conn, scope: str, entity_id: str):
+    return conn.execute(
+        'SELECT weight, finish_tag FROM scheduler_shares WHERE scope = ? AND entity_id = ?',
+        (scope, entity_id),
+    ).fetchone()
+
+
+def assign_schedule(conn, *, project_id: str, submitted_by: str | None, cost: float) -> dict:
+    """Give a new job its queue sequence and fair-share tag.
+
+    Start-time fair queuing: the job starts at the later of the scheduler's
+    virtual time and the finish tags of its user and project, and each of
+    those flows then advances by ``cost / weight``. A user or project that
+    queues many jobs therefore pushes its own later jobs back without
+    delaying anyone else's. Must run inside the caller's write transaction.
+    """
+    cost = max(1.0, float(cost or 1))
+    flows = [('project', project_id)]
+    if submitted_by:
+        flows.append(('user', submitted_by))
+
+    start = _state_value(conn, 'virtual_time')
+    weights = {}
+    for scope, entity_id in flows:
+        row = _share_row(conn, scope, entity_id)
+        weights[(scope, entity_id)] = float(row['weight']) if row and row['weight'] else 1.0
+        if row:
+            start = max(start, float(row['finish_tag']))
+
+    for (scope, entity_id), weight in weights.items():
+        conn.execute(
+            '''
+            INSERT INTO scheduler_shares (scope, entity_id, finish_tag, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(scope, entity_id) DO UPDATE SET
+                finish_tag = excluded.finish_tag,
+                updated_at = CURRENT_TIMESTAMP
+            ''',
+            (scope, entity_id, start + cost / max(weight, 0.01)),
+        )
+
+    queue_seq = int(_state_value(conn, 'queue_seq')) + 1
+    _set_state_value(conn, 'queue_seq', queue_seq)
+    return {'fair_tag': start, 'queue_seq': queue_seq}
+
+
+def advance_virtual_time(conn, fair_tag: float | None) -> None:
+    """Move the virtual clock up to the tag of the job just claimed."""
+    if fair_tag is None:
+        return
+    if float(fair_tag) > _state_value(conn, 'virtual_time'):
+        _set_state_value(conn, 'virtual_time', float(fair_tag))
+
+
+def set_share_weight(scope: str, entity_id: str, weight: float) -> dict:
+    if scope not in SHARE_SCOPES:
+        raise ValueError(f'Unknown fair-share scope: {scope}')
+    weight = float(weight)
+    if weight <= 0:
+        raise ValueError('Fair-share weight must be positive')
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            '''
+            INSERT INTO scheduler_shares (scope, entity_id, weight, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(scope, entity_id) DO UPDATE SET
+                weight = excluded.weight,
+                updated_at = CURRENT_TIMESTAMP
+            ''',
+            (scope, entity_id, weight),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return {'scope': scope, 'entity_id': entity_id, 'weight': weight}
+
+
+def list_share_weights() -> list[dict]:
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            '''
+            SELECT scope, entity_id, weight, finish_tag, updated_at
+            FROM scheduler_shares
+            ORDER BY scope, entity_id
+            '''
+        ).fetchall()
+        virtual_time = _state_value(conn, 'virtual_time')
+    finally:
+        conn.close()
+    return [
+        dict(row, backlog=max(0.0, float(row['finish_tag']) - virtual_time))
+        for row in rows
+    ]
@@ -9,13 +9,44 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional
 
 from ..database import get_db_connection
-from .execution_insights import classify_failure
+from .execution_insights import classify_failure, classify_failure_cached
+from .job_events import events_enabled, publish
+from .job_resources import fits_capacity, normalize_resources
+from .job_scheduler import (
+    SCHEDULE_ORDER_SQL,
+    advance_virtual_time,
+    assign_schedule,
+    clamp_priority,
+    scheduling_lane,
+)
 
 
 def _now_str() -> str:
     return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
 
 
+def _publish_job_status(job_id: str) -> None:
+    """Push the job's current status to its project and job rooms."""
+    if not events_enabled():
+        return
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            '''
+            SELECT id AS job_id, project_id, tool_name, status, workflow_run_id, exit_code,
+                   error_message, failure_category, failure_label, cancel_requested,
+                   started_at, finished_at, duration
+            FROM jobs
+            WHERE id = ?
+            ''',
+            (job_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+    if row:
+        publish('job_status', dict(row), project_id=row['project_id'], job_id=row['job_id'])
+
+
 def create_job(
     job_id: str,
     project_id: str,
@@ -33,9 +64,19 @@ def create_job(
     is_dry_run: bool = False,
     workflow_run_spec: Optional[dict] = None,
     backend: Optional[str] = None,
+    resources: Optional[dict] = None,
+    priority: int = 0,
 ) -> None:
+    resources = normalize_resources(resources)
     conn = get_db_connection()
     try:
+        conn.execute('BEGIN IMMEDIATE')
+        schedule = assign_schedule(
+            conn,
+            project_id=project_id,
+            submitted_by=submitted_by,
+            cost=resources['cpus'],
+        )
         conn.execute(
             '''
             INSERT INTO jobs
@@ -55,9 +96,15 @@ def create_job(
                 backend,
                 workflow_id,
                 workflow_run_id,
-                is_dry_run
+                is_dry_run,
+                cpu_request,
+                mem_request_mb,
+                priority,
+                lane,
+                fair_tag,
+                queue_seq
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''',
             (
                 job_id,
@@ -75,6 +122,12 @@ def create_job(
                 workflow_id,
                 workflow_run_id,
                 1 if is_dry_run else 0,
+                resources['cpus'],
+                resources['mem_mb'],
+                clamp_priority(priority),
+                scheduling_lane(is_dry_run),
+                schedule['fair_tag'],
+                schedule['queue_seq'],
             )
         )
         conn.execute(
@@ -92,6 +145,7 @@ def create_job(
         conn.commit()
     finally:
         conn.close()
+    _publish_job_status(job_id)
 
 
 def _insert_workflow_run(conn, workflow_run_spec: dict) -> None:
@@ -321,6 +375,57 @@ def append_workflow_run_event(
         conn.close()
 
 
+def write_workflow_progress(
+    run_id: str,
+    run_fields: Optional[dict] = None,
+    stage_fields: Optional[Dict[str, dict]] = None,
+    events: Optional[List[dict]] = None,
+) -> None:
+    """Apply coalesced run/stage updates and append events in one transaction."""
+    if not run_id or not (run_fields or stage_fields or events):
+        return
+    conn = get_db_connection()
+    try:
+        if run_fields:
+            keys = [f"{key} = ?" for key in run_fields]
+            conn.execute(
+                f"UPDATE workflow_runs SET {', '.join(keys)} WHERE id = ?",
+                [*run_fields.values(), run_id],
+            )
+        for stage_id, fields in (stage_fields or {}).items():
+            if not stage_id or not fields:
+                continue
+            keys = [f"{key} = ?" for key in fields]
+            conn.execute(
+                f"UPDATE workflow_stage_states SET {', '.join(keys)} WHERE run_id = ? AND stage_id = ?",
+                [*fields.values(), run_id, stage_id],
+            )
+        if events:
+            conn.executemany(
+                '''
+                INSERT INTO workflow_run_events
+                (run_id, event_type, stage_id, rule_name, message, payload, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+                ''',
+                [
+                    (
+                        run_id,
+                        event['event_type'],
+                        event.get('stage_id'),
+                        event.get('rule_name'),
+                        event.get('message'),
+                        json.dumps(event['payload']) if event.get('payload') is not None else None,
+                        event.get('created_at'),
+                    )
+                    for event in events
+                    if event.get('event_type')
+                ],
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def replace_workflow_artifacts(run_id: str, artifacts: list[dict]) -> None:
     conn = get_db_connection()
     try:
@@ -488,6 +593,7 @@ def mark_job_started(job_id: str) -> None:
     if run_id:
         update_workflow_run(run_id, status='running', started_at=timestamp)
         append_workflow_run_event(run_id, 'run_started', message='Workflow execution started')
+    _publish_job_status(job_id)
 
 
 def mark_job_claimed(job_id: str, worker_id: str, host: str | None = None, backend: str = 'local') -> bool:
@@ -539,20 +645,38 @@ def mark_job_claimed(job_id: str, worker_id: str, host: str | None = None, backe
                 (row['workflow_run_id'],),
             )
         conn.commit()
-        return True
     finally:
         conn.close()
+    _publish_job_status(job_id)
+    return True
 
 
 def mark_job_finished(job_id: str, status: str, exit_code: Optional[int], error_message: Optional[str], duration: Optional[float]) -> None:
     finished_at = _now_str()
+    conn = get_db_connection()
+    try:
+        paths = conn.execute(
+            '''
+            SELECT jobs.log_path, jobs.workflow_run_id, workflow_runs.log_path AS run_log_path
+            FROM jobs
+            LEFT JOIN workflow_runs ON workflow_runs.id = jobs.workflow_run_id
+            WHERE jobs.id = ?
+            ''',
+            (job_id,),
+        ).fetchone()
+    finally:
+        conn.close()
+    log_path = paths['log_path'] if paths else None
+    # Classify once here; listings reuse the stored result instead of re-reading logs.
+    failure = _failure_fields(classify_failure(error_message, exit_code, log_path))
     update_job(
         job_id,
         status=status,
         finished_at=finished_at,
         exit_code=exit_code,
         error_message=error_message,
-        duration=duration
+        duration=duration,
+        **failure,
     )
     update_process_history(
         job_id,
@@ -563,9 +687,12 @@ def mark_job_finished(job_id: str, status: str, exit_code: Optional[int], error_
         duration=duration
     )
 
-    job = get_job(job_id)
-    run_id = job.get('workflow_run_id') if job else None
+    run_id = paths['workflow_run_id'] if paths else None
     if run_id:
+        run_log_path = paths['run_log_path']
+        run_failure = failure
+        if run_log_path and run_log_path != log_path:
+            run_failure = _failure_fields(classify_failure(error_message, exit_code, run_log_path))
         update_workflow_run(
             run_id,
             status=status,
@@ -573,6 +700,7 @@ def mark_job_finished(job_id: str, status: str, exit_code: Optional[int], error_
             exit_code=exit_code,
             error_message=error_message,
             duration=duration,
+            **run_failure,
         )
         append_workflow_run_event(
             run_id,
@@ -580,10 +708,12 @@ def mark_job_finished(job_id: str, status: str, exit_code: Optional[int], error_
             message=f'Workflow finished with status {status}',
             payload={'status': status, 'exit_code': exit_code, 'error_message': error_message},
         )
+    _publish_job_status(job_id)
 
 
 def request_cancel(job_id: str) -> None:
     update_job(job_id, cancel_requested=1)
+    _publish_job_status(job_id)
 
 
 def clear_cancel(job_id: str) -> None:
@@ -662,38 +792,115 @@ def _parse_timestamp(value: str | None) -> datetime | None:
         return None
 
 
+_TERMINAL_STATUSES = ('completed', 'failed', 'canceled')
+
+
+def _failure_fields(failure: dict) -> dict:
+    return {
+        'failure_category': failure['category'],
+        'failure_label': failure['label'],
+        'failure_suggestion': failure.get('suggestion'),
+        'failure_classified': 1,
+    }
+
+
+def _attach_failure(record: Dict, table: str) -> None:
+    """Fill the failure_* fields, reading the log tail only when it may have changed.
+
+    Finished records carry the classification stored by ``mark_job_finished``;
+    older finished records are classified once and stored. Queued records
+    have no log yet, and running ones are memoized on log size and mtime.
+    """
+    if record.get('failure_classified'):
+        return
+    status = record.get('status')
+    if status == 'queued':
+        failure = classify_failure(record.get('error_message'), record.get('exit_code'))
+    else:
+        failure = classify_failure_cached(record.get('error_message'), record.get('exit_code'), record.get('log_path'))
+    fields = _failure_fields(failure)
+    if status in _TERMINAL_STATUSES and record.get('id'):
+        _store_failure_fields(table, record['id'], fields)
+    else:
+        fields['failure_classified'] = 0
+    record.update(fields)
+
+
+def _store_failure_fields(table: str, record_id: str, fields: dict) -> None:
+    assignments = ', '.join(f'{key} = ?' for key in fields)
+    conn = get_db_connection()
+    try:
+        conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?', (*fields.values(), record_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def _enrich_job_record(record: Dict) -> Dict:
     if not record:
         return record
     record['command_spec'] = _decode_json(record.get('command_spec_json'))
-    failure = classify_failure(record.get('error_message'), record.get('exit_code'), record.get('log_path'))
-    record['failure_category'] = failure['category']
-    record['failure_label'] = failure['label']
-    record['failure_suggestion'] = failure.get('suggestion')
-    record['queue_position'] = _get_queue_position_safe(record.get('id')) if record.get('status') == 'queued' else None
+    _attach_failure(record, 'jobs')
+    record.setdefault('queue_position', None)
     return record
 
 
 def _enrich_workflow_run_record(record: Dict) -> Dict:
     if not record:
         return record
-    failure = classify_failure(record.get('error_message'), record.get('exit_code'), record.get('log_path'))
-    record['failure_category'] = failure['category']
-    record['failure_label'] = failure['label']
-    record['failure_suggestion'] = failure.get('suggestion')
-    record['queue_position'] = _get_queue_position_safe(record.get('job_id')) if record.get('status') == 'queued' and record.get('job_id') else None
+    _attach_failure(record, 'workflow_runs')
+    record.setdefault('queue_position', None)
     return record
 
 
-def _get_queue_position_safe(job_id: str | None):
-    if not job_id:
-        return None
+def _enrich_job_records(rows, conn=None) -> List[Dict]:
+    records = [_enrich_job_record(dict(row)) for row in rows]
+    _attach_queue_positions(records, 'id', conn=conn)
+    return records
+
+
+def _enrich_workflow_run_records(rows, conn=None) -> List[Dict]:
+    records = [_enrich_workflow_run_record(dict(row)) for row in rows]
+    _attach_queue_positions(records, 'job_id', conn=conn)
+    return records
+
+
+def get_queue_positions(job_ids: Optional[List[str]] = None, conn=None) -> Dict[str, int]:
+    """1-based claim-order positions of queued jobs, computed in a single query.
+
+    The window runs over the queued rows in ``SCHEDULE_ORDER_SQL`` order
+    (an index scan); ``job_ids`` restricts which positions are returned.
+    """
+    owns_connection = conn is None
+    conn = conn or get_db_connection()
     try:
-        from .job_queue import get_queue_position
+        ranked = f'''
+            SELECT id, ROW_NUMBER() OVER (ORDER BY {SCHEDULE_ORDER_SQL}) AS position
+            FROM jobs
+            WHERE status = 'queued'
+        '''
+        if job_ids is None:
+            rows = conn.execute(ranked).fetchall()
+        else:
+            job_ids = list(dict.fromkeys(job_id for job_id in job_ids if job_id))
+            if not job_ids:
+                return {}
+            placeholders = ', '.join('?' for _ in job_ids)
+            rows = conn.execute(
+                f'SELECT id, position FROM ({ranked}) WHERE id IN ({placeholders})',
+                job_ids,
+            ).fetchall()
+        return {row['id']: int(row['position']) for row in rows}
+    finally:
+        if owns_connection:
+            conn.close()
 
-        return get_queue_position(job_id)
-    except Exception:
-        return None
+
+def _attach_queue_positions(records: List[Dict], id_key: str, conn=None) -> None:
+    queued_ids = [record.get(id_key) for record in records if record.get('status') == 'queued' and record.get(id_key)]
+    positions = get_queue_positions(queued_ids, conn=conn) if queued_ids else {}
+    for record in records:
+        record['queue_position'] = positions.get(record.get(id_key)) if record.get('status') == 'queued' else None
 
 
 def get_job(job_id: str) -> Optional[Dict]:
@@ -703,7 +910,7 @@ def get_job(job_id: str) -> Optional[Dict]:
             f"{_job_select_sql()} WHERE jobs.id = ?",
             (job_id,)
         ).fetchone()
-        return _enrich_job_record(dict(row)) if row else None
+        return _enrich_job_records([row], conn=conn)[0] if row else None
     finally:
         conn.close()
 
@@ -731,7 +938,7 @@ def list_jobs(project_id: str, limit: int = 20, status: Optional[str] = None) ->
                 ''',
                 (project_id, limit)
             ).fetchall()
-        return [_enrich_job_record(dict(row)) for row in rows]
+        return _enrich_job_records(rows, conn=conn)
     finally:
         conn.close()
 
@@ -771,7 +978,7 @@ def get_latest_job(project_id: str) -> Optional[Dict]:
             ''',
             (project_id,)
         ).fetchone()
-        return _enrich_job_record(dict(row)) if row else None
+        return _enrich_job_records([row], conn=conn)[0] if row else None
     finally:
         conn.close()
 
@@ -788,7 +995,7 @@ def get_active_job(project_id: str) -> Optional[Dict]:
             ''',
             (project_id,)
         ).fetchone()
-        return _enrich_job_record(dict(row)) if row else None
+        return _enrich_job_records([row], conn=conn)[0] if row else None
     finally:
         conn.close()
 
@@ -839,7 +1046,7 @@ def get_workflow_run(run_id: str) -> Optional[Dict]:
         ).fetchone()
         if not row:
             return None
-        data = _enrich_workflow_run_record(dict(row))
+        data = _enrich_workflow_run_records([row], conn=conn)[0]
         data['params'] = _decode_json(data.get('params_json'))
         data['stage_states'] = list_workflow_stage_states(run_id, conn=conn)
         data['events'] = list_workflow_run_events(run_id, limit=200, conn=conn)
@@ -862,7 +1069,7 @@ def get_workflow_run_by_job(job_id: str) -> Optional[Dict]:
         ).fetchone()
         if not row:
             return None
-        data = _enrich_workflow_run_record(dict(row))
+        data = _enrich_workflow_run_records([row], conn=conn)[0]
         data['params'] = _decode_json(data.get('params_json'))
         data['stage_states'] = list_workflow_stage_states(data['id'], conn=conn)
         data['events'] = list_workflow_run_events(data['id'], limit=200, conn=conn)
@@ -982,7 +1189,7 @@ def list_workflow_runs(project_id: str, workflow_id: Optional[str] = None, limit
                 (project_id, limit)
             ).fetchall()
 
-        runs = [_enrich_workflow_run_record(dict(row)) for row in rows]
+        runs = _enrich_workflow_run_records(rows, conn=conn)
         for run in runs:
             run['params'] = _decode_json(run.get('params_json'))
             run['stage_states'] = list_workflow_stage_states(run['id'], conn=conn)
@@ -1020,7 +1227,7 @@ def get_active_workflow_run(project_id: str, workflow_id: Optional[str] = None)
         ).fetchone()
         if not row:
             return None
-        run = _enrich_workflow_run_record(dict(row))
+        run = _enrich_workflow_run_records([row], conn=conn)[0]
         run['params'] = _decode_json(run.get('params_json'))
         run['stage_states'] = list_workflow_stage_states(run['id'], conn=conn)
         run['artifacts'] = list_workflow_artifacts(run['id'], conn=conn)
@@ -1094,21 +1301,71 @@ def compare_workflow_runs(left_run_id: str, right_run_id: str) -> Optional[Dict]
     }
 
 
-def claim_next_job(worker_id: str, host: str | None = None) -> Optional[Dict]:
-    host = host or socket.gethostname()
-    claimed_at = _now_str()
+def has_queued_jobs() -> bool:
     conn = get_db_connection()
     try:
-        conn.execute('BEGIN IMMEDIATE')
-        row = conn.execute(
-            '''
-            SELECT id, workflow_run_id
+        row = conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone()
+        return row is not None
+    finally:
+        conn.close()
+
+
+def _select_claimable_job(conn, capacity: dict | None):
+    if capacity is None:
+        return conn.execute(
+            f'''
+            SELECT id, workflow_run_id, fair_tag
             FROM jobs
             WHERE status = 'queued'
-            ORDER BY created_at ASC, id ASC
+            ORDER BY {SCHEDULE_ORDER_SQL}
             LIMIT 1
             '''
         ).fetchone()
+
+    rows = conn.execute(
+        f'''
+        SELECT id, workflow_run_id, fair_tag, cpu_request, mem_request_mb, created_at
+        FROM jobs
+        WHERE status = 'queued'
+        ORDER BY {SCHEDULE_ORDER_SQL}
+        LIMIT ?
+        ''',
+        (int(capacity.get('scan_limit') or 200),),
+    ).fetchall()
+    reserve_after = capacity.get('reserve_after_seconds')
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        request = {'cpus': row['cpu_request'], 'mem_mb': row['mem_request_mb']}
+        if fits_capacity(request, capacity):
+            return row
+        # Smaller jobs may backfill around one that does not fit yet, until it
+        # has waited long enough that capacity must be held for it.
+        created_at = _parse_timestamp(row['created_at'])
+        if reserve_after is not None and created_at and (now - created_at).total_seconds() >= reserve_after:
+            return None
+    return None
+
+
+def claim_next_job(worker_id: str, host: str | None = None, capacity: dict | None = None) -> Optional[Dict]:
+    """Claim the next queued job in scheduling order.
+
+    Jobs are ordered by lane (dry runs first), priority, then fair-share tag
+    (see ``job_scheduler.assign_schedule``) and submission order.
+
+    ``capacity`` is the worker's free CPU/memory budget (see
+    ``job_resources.fits_capacity``); queued jobs that do not fit are skipped
+    so smaller ones can run alongside, unless they have waited longer than
+    ``capacity['reserve_after_seconds']``.
+    """
+    # Read-only probe first so idle workers never take the write lock.
+    if not has_queued_jobs():
+        return None
+    host = host or socket.gethostname()
+    claimed_at = _now_str()
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = _select_claimable_job(conn, capacity)
         if not row:
             conn.rollback()
             return None
@@ -1146,9 +1403,11 @@ def claim_next_job(worker_id: str, host: str | None = None) -> Optional[Dict]:
                 ''',
                 (row['workflow_run_id'],)
             )
+        advance_virtual_time(conn, row['fair_tag'])
         conn.commit()
     finally:
         conn.close()
+    _publish_job_status(row['id'])
     return get_job(row['id'])
 
 
@@ -1183,6 +1442,6 @@ def list_stale_jobs(timeout_seconds: int = 600) -> List[Dict]:
             ''',
             (threshold,),
         ).fetchall()
-        return [_enrich_job_record(dict(row)) for row in rows]
+        return _enrich_job_records(rows, conn=conn)
     finally:
         conn.close()
@@ -5,6 +5,7 @@ import time
 from typing import Optional
 
 from ..database import get_db_connection
+from .job_resources import normalize_resources
 from .job_runner import run_pipeline_job
 from .job_store import (
     claim_next_job,
@@ -12,12 +13,17 @@ from .job_store import (
     list_stale_jobs,
     mark_job_finished,
 )
+from .worker_doorbell import WorkerDoorbell, open_worker_doorbell, ring_doorbells
 
 
 _WORKER_LOCK = threading.Lock()
 _WORKER_THREAD: threading.Thread | None = None
 _WORKER_STOP = threading.Event()
 _WORKER_WAKE = threading.Event()
+_WORKER_DOORBELL: WorkerDoorbell | None = None
+_SLOT_LOCK = threading.Lock()
+_SLOTS: dict[int, dict] = {}
+_SLOT_THREADS: set[threading.Thread] = set()
 _WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
 _WORKER_STATE = {
     'worker_id': _WORKER_ID,
@@ -29,6 +35,8 @@ _WORKER_STATE = {
     'last_error': None,
     'current_job_id': None,
     'recovered_jobs': 0,
+    'wakeup_mode': None,
+    'doorbell_path': None,
 }
 
 
@@ -39,6 +47,49 @@ def _poll_interval() -> float:
         return 1.0
 
 
+def _idle_recheck_interval() -> float:
+    try:
+        return max(1.0, float(os.getenv('APPAM_WORKER_IDLE_RECHECK_INTERVAL', '60')))
+    except Exception:
+        return 60.0
+
+
+def _slot_count() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_WORKER_SLOTS', '1')))
+    except Exception:
+        return 1
+
+
+def _cpu_budget() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_WORKER_CPU_BUDGET', str(os.cpu_count() or 1))))
+    except Exception:
+        return os.cpu_count() or 1
+
+
+def _memory_budget_mb() -> int:
+    configured = os.getenv('APPAM_WORKER_MEMORY_BUDGET_MB', '').strip()
+    if configured:
+        try:
+            return max(0, int(configured))
+        except Exception:
+            return 0
+    try:
+        import psutil
+
+        return int(psutil.virtual_memory().total // (1024 * 1024))
+    except Exception:
+        return 0
+
+
+def _reserve_after_seconds() -> float:
+    try:
+        return max(0.0, float(os.getenv('APPAM_WORKER_RESERVE_AFTER_SECONDS', '600')))
+    except Exception:
+        return 600.0
+
+
 def _stale_timeout() -> int:
     try:
         return max(30, int(os.getenv('APPAM_WORKER_STALE_TIMEOUT', '900')))
@@ -48,6 +99,7 @@ def _stale_timeout() -> int:
 
 def notify_new_job() -> None:
     _WORKER_WAKE.set()
+    ring_doorbells()
 
 
 def _timestamp() -> str:
@@ -83,17 +135,66 @@ def _recover_stale_jobs() -> None:
         _WORKER_STATE['recovered_jobs'] += 1
 
 
-def run_worker_once(worker_id: str | None = None) -> bool:
-    worker_id = worker_id or _WORKER_ID
-    job = claim_next_job(worker_id, host=socket.gethostname())
+def _capacity() -> dict:
+    """Free slots, CPUs and memory (MB) left for newly claimed jobs."""
+    slots_total = _slot_count()
+    cpus_total = _cpu_budget()
+    mem_total = _memory_budget_mb()
+    with _SLOT_LOCK:
+        busy = list(_SLOTS.values())
+    cpus_used = sum(slot['cpus'] for slot in busy)
+    mem_used = sum(slot['mem_mb'] for slot in busy)
+    free_slots = [index for index in range(slots_total) if index not in {slot['slot'] for slot in busy}]
+    return {
+        'slots_total': slots_total,
+        'slots_free': len(free_slots),
+        'free_slot': free_slots[0] if free_slots else None,
+        'cpus_total': cpus_total,
+        'cpus_used': cpus_used,
+        'cpus_free': max(0, cpus_total - cpus_used),
+        'mem_mb_total': mem_total,
+        'mem_mb_used': mem_used,
+        'mem_mb_free': max(0, mem_total - mem_used) if mem_total else 0,
+        'reserve_after_seconds': _reserve_after_seconds(),
+    }
+
+
+def _claim_into_slot(worker_id: str) -> dict | None:
+    capacity = _capacity()
+    slot = capacity['free_slot']
+    if slot is None:
+        return None
+    job = claim_next_job(f'{worker_id}/slot-{slot}', host=socket.gethostname(), capacity=capacity)
     if not job:
-        _WORKER_STATE['current_job_id'] = None
-        _WORKER_STATE['last_idle_at'] = _timestamp()
-        return False
+        return None
 
+    resources = normalize_resources({'cpus': job.get('cpu_request'), 'mem_mb': job.get('mem_request_mb')})
+    entry = {
+        'slot': slot,
+        'job_id': job['id'],
+        'project_id': job['project_id'],
+        'tool_name': job['tool_name'],
+        'cpus': min(resources['cpus'], capacity['cpus_total']),
+        'mem_mb': min(resources['mem_mb'], capacity['mem_mb_total']) if capacity['mem_mb_total'] else resources['mem_mb'],
+        'started_at': _timestamp(),
+    }
+    with _SLOT_LOCK:
+        _SLOTS[slot] = entry
     _WORKER_STATE['current_job_id'] = job['id']
-    _WORKER_STATE['last_claimed_at'] = _timestamp()
-    command_spec = job.get('command_spec')
+    _WORKER_STATE['last_claimed_at'] = entry['started_at']
+    return job
+
+
+def _release_slot(job: dict) -> None:
+    with _SLOT_LOCK:
+        for slot, entry in list(_SLOTS.items()):
+            if entry['job_id'] == job['id']:
+                del _SLOTS[slot]
+        remaining = [entry['job_id'] for entry in _SLOTS.values()]
+    _WORKER_STATE['current_job_id'] = remaining[-1] if remaining else None
+
+
+def _execute_job(job: dict) -> None:
     try:
         run_pipeline_job(
             job['id'],
@@ -101,27 +202,107 @@ def run_worker_once(worker_id: str | None = None) -> bool:
             job['tool_name'],
             job['command'],
             job['log_path'],
-            command_spec=command_spec,
+            command_spec=job.get('command_spec'),
         )
     except Exception as exc:
         _WORKER_STATE['last_error'] = str(exc)
         raise
     finally:
-        _WORKER_STATE['current_job_id'] = None
+        _release_slot(job)
+
+
+def _run_slot(job: dict) -> None:
+    try:
+        _execute_job(job)
+    except Exception:
+        pass
+    finally:
+        with _SLOT_LOCK:
+            _SLOT_THREADS.discard(threading.current_thread())
+        # A freed slot may let a queued job fit, so re-check the queue now.
+        _WORKER_WAKE.set()
+        if _WORKER_DOORBELL:
+            _WORKER_DOORBELL.wake()
+
+
+def run_worker_once(worker_id: str | None = None) -> bool:
+    """Claim one job that fits the free budget and run it in the calling thread."""
+    worker_id = worker_id or _WORKER_ID
+    job = _claim_into_slot(worker_id)
+    if not job:
+        _WORKER_STATE['last_idle_at'] = _timestamp()
+        return False
+    _execute_job(job)
     return True
 
 
+def dispatch_once(worker_id: str | None = None) -> bool:
+    """Claim one job that fits the free budget and start it on its own slot thread."""
+    worker_id = worker_id or _WORKER_ID
+    job = _claim_into_slot(worker_id)
+    if not job:
+        _WORKER_STATE['last_idle_at'] = _timestamp()
+        return False
+    thread = threading.Thread(
+        target=_run_slot,
+        args=(job,),
+        name=f"appam-slot-{job['id'][:8]}",
+        daemon=True,
+    )
+    with _SLOT_LOCK:
+        _SLOT_THREADS.add(thread)
+    thread.start()
+    return True
+
+
+def _join_slot_threads() -> None:
+    """Wait for every running slot, so stopping the worker never cuts a job short."""
+    with _SLOT_LOCK:
+        threads = list(_SLOT_THREADS)
+    for thread in threads:
+        thread.join()
+
+
+def _wait_for_work(doorbell: WorkerDoorbell | None) -> None:
+    if doorbell is None:
+        _WORKER_WAKE.wait(timeout=_poll_interval())
+        _WORKER_WAKE.clear()
+        return
+    doorbell.wait(timeout=_idle_recheck_interval())
+    _WORKER_WAKE.clear()
+
+
 def run_worker_forever(stop_event: Optional[threading.Event] = None) -> None:
+    """Claim and run jobs until stopped.
+
+    Up to APPAM_WORKER_SLOTS jobs run concurrently, each on its own thread,
+    as long as their declared CPUs and memory fit within
+    APPAM_WORKER_CPU_BUDGET and APPAM_WORKER_MEMORY_BUDGET_MB. Idle workers block on a UNIX-socket doorbell that enqueuers ring, and
+    only re-check the queue every APPAM_WORKER_IDLE_RECHECK_INTERVAL as a
+    safety net. Without doorbell support they poll every
+    APPAM_WORKER_POLL_INTERVAL instead. Once stopped, no new job is
+    claimed and the call returns after the running ones finish.
+    """
+    global _WORKER_DOORBELL
     stop_event = stop_event or _WORKER_STOP
+    doorbell = open_worker_doorbell()
+    _WORKER_DOORBELL = doorbell
+    _WORKER_STATE['wakeup_mode'] = 'doorbell' if doorbell else 'poll'
+    _WORKER_STATE['doorbell_path'] = str(doorbell.path) if doorbell else None
     _WORKER_STATE['started_at'] = _timestamp()
-    _recover_stale_jobs()
-    while not stop_event.is_set():
-        _WORKER_STATE['last_heartbeat_at'] = _timestamp()
-        claimed = run_worker_once(_WORKER_ID)
-        if claimed:
-            continue
-        _WORKER_WAKE.wait(timeout=_poll_interval())
-        _WORKER_WAKE.clear()
+    try:
+        _recover_stale_jobs()
+        while not stop_event.is_set():
+            _WORKER_STATE['last_heartbeat_at'] = _timestamp()
+            claimed = dispatch_once(_WORKER_ID)
+            if claimed:
+                continue
+            _wait_for_work(doorbell)
+    finally:
+        _join_slot_threads()
+        _WORKER_DOORBELL = None
+        if doorbell:
+            doorbell.close()
 
 
 def start_embedded_worker() -> threading.Thread | None:
@@ -150,6 +331,8 @@ def stop_embedded_worker(timeout: float = 5.0) -> None:
             return
         _WORKER_STOP.set()
         _WORKER_WAKE.set()
+        if _WORKER_DOORBELL:
+            _WORKER_DOORBELL.wake()
         _WORKER_THREAD.join(timeout=timeout)
         _WORKER_THREAD = None
 
@@ -171,7 +354,8 @@ def get_worker_status() -> dict:
         ).fetchall()
         recent_active = conn.execute(
             '''
-            SELECT id, project_id, tool_name, status, created_at, started_at, heartbeat_at, pid, claimed_by
+            SELECT id, project_id, tool_name, status, created_at, started_at, heartbeat_at, pid, claimed_by,
+                   cpu_request, mem_request_mb
             FROM jobs
             WHERE status IN ('queued', 'starting', 'running')
             ORDER BY created_at DESC
@@ -183,12 +367,24 @@ def get_worker_status() -> dict:
 
     count_map = {row['status']: int(row['count']) for row in counts}
     stale_jobs = list_stale_jobs(timeout_seconds=_stale_timeout())
+    capacity = _capacity()
+    with _SLOT_LOCK:
+        busy = {slot: dict(entry) for slot, entry in _SLOTS.items()}
+    slots = [
+        busy.get(index, {'slot': index, 'job_id': None})
+        for index in range(max(capacity['slots_total'], max(busy, default=-1) + 1))
+    ]
+    for slot in slots:
+        slot['state'] = 'busy' if slot.get('job_id') else 'idle'
     return {
         'mode': 'local-db',
         'embedded_worker_running': embedded_worker_running(),
         'poll_interval_seconds': _poll_interval(),
+        'idle_recheck_interval_seconds': _idle_recheck_interval(),
         'stale_timeout_seconds': _stale_timeout(),
         'worker': dict(_WORKER_STATE),
+        'capacity': {key: value for key, value in capacity.items() if key != 'free_slot'},
+        'slots': slots,
         'counts': {
             'queued': count_map.get('queued', 0),
             'starting': count_map.get('starting', 0),
@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import bisect
+import json
+import os
+import re
+import struct
+from pathlib import Path
+
+
+# Sidecar checkpoint record: (0-based line number, byte offset where it starts).
+_CHECKPOINT = struct.Struct('<QQ')
+_READ_BLOCK = 1024 * 1024
+# Marker lines only need their prefix; cap what is kept of a line still being written.
+_HEAD_LIMIT = 64 * 1024
+_MARK_TEXT_LIMIT = 500
+
+# Anchored like workflow_runtime.RULE_PATTERNS, plus the runner's [SYSTEM] lines.
+_MARK_PATTERN = re.compile(
+    rb'^(?:(?P<rule>(?:(?:local)?rule|checkpoint)\s+(?P<name>[A-Za-z0-9_:-]+):)|\[SYSTEM\])',
+    re.M,
+)
+
+MARK_KINDS = ('rule', 'system')
+# Regex greps run on request threads; keep patterns short and without the
+# nested repetition that backtracks exponentially.
+MAX_GREP_PATTERN_LENGTH = 200
+
+
+def _checkpoint_span() -> int:
+    try:
+        return max(4096, int(os.getenv('APPAM_LOG_INDEX_SPAN_BYTES', str(64 * 1024))))
+    except Exception:
+        return 64 * 1024
+
+
+def query_max_lines() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_LOG_QUERY_MAX_LINES', '2000')))
+    except Exception:
+        return 2000
+
+
+def _grep_scan_bytes() -> int:
+    try:
+        return max(_READ_BLOCK, int(os.getenv('APPAM_LOG_GREP_SCAN_BYTES', str(64 * 1024 * 1024))))
+    except Exception:
+        return 64 * 1024 * 1024
+
+
+def _check_grep_regex(pattern: str) -> None:
+    """Raise ValueError for patterns that can backtrack catastrophically.
+
+    Rejects back-references and any group repeated with ``*``, ``+`` or
+    ``{}`` that itself contains a repetition or an alternation, such as
+    ``(a+)+`` or ``(a|aa)*``.
+    """
+    if len(pattern) > MAX_GREP_PATTERN_LENGTH:
+        raise ValueError(f'Regex patterns are limited to {MAX_GREP_PATTERN_LENGTH} characters')
+    # One flag per open group: does its body repeat or branch?
+    groups = [False]
+    position = 0
+    in_class = False
+    while position < len(pattern):
+        char = pattern[position]
+        if char == '\\':
+            if pattern[position + 1:position + 2].isdigit() or pattern[position + 1:position + 2] == 'g':
+                raise ValueError('Back-references are not supported in grep patterns')
+            position += 2
+            continue
+        if in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if pattern[position + 1:position + 2] == ']':
+                position += 1
+        elif char == '(':
+            groups.append(False)
+            if pattern[position + 1:position + 2] == '?' and pattern[position + 2:position + 3] == 'P' and pattern[position + 3:position + 4] == '=':
+                raise ValueError('Back-references are not supported in grep patterns')
+        elif char == ')' and len(groups) > 1:
+            risky = groups.pop()
+            repeated = pattern[position + 1:position + 2] in ('*', '+', '{')
+            if risky and repeated:
+                raise ValueError('Nested repetition is not supported in grep patterns')
+            groups[-1] = groups[-1] or risky or repeated
+        elif char in '*+{|':
+            groups[-1] = True
+        position += 1
+
+
+def index_paths(log_path: str | os.PathLike) -> tuple[Path, Path]:
+    path = Path(log_path)
+    return path.with_name(f'.{path.name}.lines'), path.with_name(f'.{path.name}.marks')
+
+
+def _decode(line: bytes) -> str:
+    return line.decode('utf-8', errors='replace').rstrip('\r')
+
+
+class LogIndexer:
+    """Incrementally indexes bytes appended to a log.
+
+    Records a line checkpoint roughly every ``span`` bytes and a mark for
+    every Snakemake rule start and ``[SYSTEM]`` line. New entries collect in
+    ``checkpoints``/``marks`` until the owner drains them.
+    """
+
+    def __init__(self, span: int, offset: int = 0, lines: int = 0):
+        self.span = span
+        self.offset = offset
+        self.lines = lines
+        self.checkpoints: list[tuple[int, int]] = []
+        self.marks: list[dict] = []
+        self._next_checkpoint = offset + span
+        self._head = b''
+        self._head_offset = offset
+        self._head_line = lines
+
+    @property
+    def at_line_start(self) -> bool:
+        return self._head_offset == self.offset
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        base = self.offset
+        newlines = data.count(b'\n')
+
+        while self._next_checkpoint < base + len(data):
+            cut = data.find(b'\n', max(0, self._next_checkpoint - base))
+            if cut < 0:
+                break
+            line_start = base + cut + 1
+            self.checkpoints.append((self.lines + data.count(b'\n', 0, cut + 1), line_start))
+            self._next_checkpoint = line_start + self.span
+
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            if len(self._head) < _HEAD_LIMIT:
+                self._head += data[:_HEAD_LIMIT - len(self._head)]
+        else:
+            self._scan_marks(self._head + data[:cut + 1], len(self._head), base)
+            self._head = data[cut + 1:cut + 1 + _HEAD_LIMIT]
+            self._head_offset = base + cut + 1
+            self._head_line = self.lines + newlines
+
+        self.lines += newlines
+        self.offset += len(data)
+
+    def _scan_marks(self, block: bytes, head_length: int, base: int) -> None:
+        line = self._head_line
+        counted = 0
+        for match in _MARK_PATTERN.finditer(block):
+            position = match.start()
+            line += block.count(b'\n', counted, position)
+            counted = position
+            end = block.find(b'\n', position)
+            mark = {
+                'line': line,
+                # The carried head holds no newline, so a match inside it is at its start.
+                'offset': self._head_offset if position < head_length else base + position - head_length,
+                'kind': 'rule' if match.group('rule') else 'system',
+                'text': _decode(block[position:min(end, position + _MARK_TEXT_LIMIT)]),
+            }
+            if match.group('rule'):
+                mark['name'] = match.group('name').decode('utf-8', errors='replace')
+            self.marks.append(mark)
+
+    def drain(self) -> tuple[list[tuple[int, int]], list[dict]]:
+        checkpoints, marks = self.checkpoints, self.marks
+        self.checkpoints, self.marks = [], []
+        return checkpoints, marks
+
+
+class LogIndex:
+    """Seekable view of a job log backed by its sidecar index.
+
+    Line lookups start from the nearest checkpoint, so reading a line range,
+    the last N lines or one rule's output costs O(result + span) rather than
+    a scan of the whole log. Content appended after the sidecar was last
+    written is indexed in memory when the index is loaded. The marks
+    sidecar is only read by the queries that need marks.
+    """
+
+    def __init__(self, log_path: str | os.PathLike):
+        self.log_path = Path(log_path)
+        self.lines_path, self.marks_path = index_paths(self.log_path)
+        self.checkpoints: list[tuple[int, int]] = [(0, 0)]
+        # None until first used; stored marks from before ``_marks_from``
+        # plus those found while catching up.
+        self._marks: list[dict] | None = None
+        self._new_marks: list[dict] = []
+        self._marks_from = 0
+        self.size = 0
+        self.indexer: LogIndexer | None = None
+
+    @classmethod
+    def load(cls, log_path: str | os.PathLike, persist: bool = False) -> 'LogIndex':
+        """Open the index for ``log_path``, catching up on unindexed content.
+
+        With ``persist`` the caught-up index is written back, which turns the
+        one-off scan of a log that predates indexing into a sidecar.
+        """
+        index = cls(log_path)
+        stored = index._read_sidecars()
+        index.size = index.log_path.stat().st_size if index.log_path.exists() else 0
+        if index.checkpoints[-1][1] > index.size:
+            # The log was truncated or replaced; rebuild from scratch.
+            index.checkpoints, index._marks, stored = [(0, 0)], [], False
+        caught_up = index._catch_up()
+        if persist and (caught_up or not stored):
+            index.save()
+        return index
+
+    def _read_sidecars(self) -> bool:
+        try:
+            raw = self.lines_path.read_bytes()
+        except OSError:
+            return False
+        raw = raw[:len(raw) - len(raw) % _CHECKPOINT.size]
+        for line, offset in _CHECKPOINT.iter_unpack(raw):
+            if line > self.checkpoints[-1][0] and offset > self.checkpoints[-1][1]:
+                self.checkpoints.append((line, offset))
+        return True
+
+    @property
+    def marks(self) -> list[dict]:
+        if self._marks is None:
+            self._marks = []
+            try:
+                with open(self.marks_path, 'r', encoding='utf-8') as handle:
+                    for entry in handle:
+                        try:
+                            mark = json.loads(entry)
+                        except ValueError:
+                            continue
+                        if mark.get('offset', 0) < self._marks_from:
+                            self._marks.append(mark)
+            except OSError:
+                pass
+            self._marks.extend(self._new_marks)
+            self._new_marks = []
+        return self._marks
+
+    def _catch_up(self) -> bool:
+        """Index the log past the last checkpoint; True if that added checkpoints."""
+        line, offset = self.checkpoints[-1]
+        # Marks from the last checkpoint on are found again by the scan below.
+        self._marks_from = offset
+        if self._marks is not None:
+            self._marks = [mark for mark in self._marks if mark.get('offset', 0) < offset]
+        self.indexer = LogIndexer(_checkpoint_span(), offset=offset, lines=line)
+        if offset >= self.size:
+            return False
+        with open(self.log_path, 'rb') as handle:
+            handle.seek(offset)
+            remaining = self.size - offset
+            while remaining > 0:
+                block = handle.read(min(_READ_BLOCK, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                self.indexer.feed(block)
+        self.size = self.indexer.offset
+        return self._absorb()
+
+    def _absorb(self) -> bool:
+        checkpoints, marks = self.indexer.drain()
+        self.checkpoints.extend(checkpoints)
+        (self._new_marks if self._marks is None else self._marks).extend(marks)
+        return bool(checkpoints)
+
+    def save(self) -> None:
+        lines_tmp = self.lines_path.with_name(self.lines_path.name + '.tmp')
+        marks_tmp = self.marks_path.with_name(self.marks_path.name + '.tmp')
+        with open(lines_tmp, 'wb') as handle:
+            handle.write(b''.join(_CHECKPOINT.pack(line, offset) for line, offset in self.checkpoints[1:]))
+        with open(marks_tmp, 'w', encoding='utf-8') as handle:
+            handle.writelines(json.dumps(mark) + '\n' for mark in self.marks)
+        os.replace(lines_tmp, self.lines_path)
+        os.replace(marks_tmp, self.marks_path)
+
+    @property
+    def total_lines(self) -> int:
+        if self.indexer is None:
+            return 0
+        return self.indexer.lines + (0 if self.indexer.at_line_start else 1)
+
+    def _iter_lines(self, start_line: int = 0, start: tuple[int, int] | None = None, end_offset: int | None = None):
+        """Yield ``(line, offset, bytes)`` from ``start_line`` up to ``end_offset``."""
+        if start is None:
+            position = bisect.bisect_right(self.checkpoints, (start_line, float('inf'))) - 1
+            start = self.checkpoints[max(0, position)]
+        line, offset = start
+        end = self.size if end_offset is None else min(end_offset, self.size)
+        if offset >= end:
+            return
+        with open(self.log_path, 'rb') as handle:
+            handle.seek(offset)
+            pending = b''
+            while offset < end:
+                block = handle.read(min(_READ_BLOCK, end - offset))
+                if not block:
+                    break
+                pending_offset = offset - len(pending)
+                offset += len(block)
+                data = pending + block
+                cursor = 0
+                while True:
+                    cut = data.find(b'\n', cursor)
+                    if cut < 0:
+                        break
+                    if line >= start_line:
+                        yield line, pending_offset + cursor, data[cursor:cut]
+                    line += 1
+                    cursor = cut + 1
+                pending = data[cursor:]
+            if pending and line >= start_line:
+                yield line, offset - len(pending), pending
+
+    @staticmethod
+    def _entry(line: int, data: bytes) -> dict:
+        return {'line': line + 1, 'text': _decode(data)}
+
+    def read_lines(self, start_line: int, count: int) -> dict:
+        """Lines ``start_line`` (1-based) onwards, at most ``count`` of them."""
+        count = max(0, min(count, query_max_lines()))
+        first = max(0, start_line - 1)
+        lines = []
+        if count:
+            for line, _, data in self._iter_lines(first):
+                lines.append(self._entry(line, data))
+                if len(lines) >= count:
+                    break
+        next_line = first + len(lines) + 1
+        return {
+            'lines': lines,
+            'next_line': next_line if next_line <= self.total_lines else None,
+        }
+
+    def tail(self, count: int) -> dict:
+        count = max(0, min(count, query_max_lines()))
+        return self.read_lines(max(1, self.total_lines - count + 1), count)
+
+    def list_marks(self, kind: str | None = None, name: str | None = None, limit: int | None = None) -> list[dict]:
+        marks = [
+            mark for mark in self.marks
+            if (kind is None or mark.get('kind') == kind) and (name is None or mark.get('name') == name)
+        ]
+        limit = query_max_lines() if limit is None else limit
+        return [dict(mark, line=mark['line'] + 1) for mark in marks[:limit]]
+
+    def rule_lines(self, name: str, limit: int) -> dict:
+        """Output of every run of rule ``name``, each up to the next rule start."""
+        limit = max(0, min(limit, query_max_lines()))
+        rule_marks = [mark for mark in self.marks if mark.get('kind') == 'rule']
+        lines, sections = [], []
+        for position, mark in enumerate(rule_marks):
+            if mark.get('name') != name:
+                continue
+            if len(lines) >= limit:
+                return {'lines': lines, 'sections': sections, 'truncated': True}
+            end = rule_marks[position + 1]['offset'] if position + 1 < len(rule_marks) else None
+            section = {'name': name, 'start_line': mark['line'] + 1, 'end_line': mark['line'] + 1}
+            for line, _, data in self._iter_lines(mark['line'], start=(mark['line'], mark['offset']), end_offset=end):
+                if len(lines) >= limit:
+                    sections.append(section)
+                    return {'lines': lines, 'sections': sections, 'truncated': True}
+                lines.append(self._entry(line, data))
+                section['end_line'] = line + 1
+            sections.append(section)
+        return {'lines': lines, 'sections': sections, 'truncated': False}
+
+    def grep(
+        self,
+        pattern: str,
+        start_line: int = 1,
+        limit: int | None = None,
+        ignore_case: bool = False,
+        rule: str | None = None,
+        regex: bool = False,
+    ) -> dict:
+        """Lines containing ``pattern`` from ``start_line`` on.
+
+        ``pattern`` is a literal substring unless ``regex``; regular
+        expressions are screened by ``_check_grep_regex`` first. Stops after
+        ``limit`` matches or APPAM_LOG_GREP_SCAN_BYTES scanned; ``next_line``
+        resumes the search from where it stopped.
+        """
+        if regex:
+            _check_grep_regex(pattern)
+        else:
+            pattern = re.escape(pattern)
+        compiled = re.compile(pattern.encode('utf-8'), re.IGNORECASE if ignore_case else 0)
+        limit = max(1, min(limit or query_max_lines(), query_max_lines()))
+        ranges = self._rule_ranges(rule) if rule else [(None, None)]
+        budget = _grep_scan_bytes()
+        scanned = 0
+        matches = []
+        first = max(0, start_line - 1)
+        for start, end_offset in ranges:
+            if start is not None and start[0] >= first:
+                lines = self._iter_lines(start[0], start=start, end_offset=end_offset)
+            else:
+                lines = self._iter_lines(first, end_offset=end_offset)
+            for line, _, data in lines:
+                scanned += len(data) + 1
+                if compiled.search(data):
+                    matches.append(self._entry(line, data))
+                if len(matches) >= limit or scanned >= budget:
+                    next_line = line + 2
+                    return {
+                        'lines': matches,
+                        'next_line': next_line if next_line <= self.total_lines else None,
+                    }
+        return {'lines': matches, 'next_line': None}
+
+    def _rule_ranges(self, name: str) -> list[tuple[tuple[int, int], int | None]]:
+        rule_marks = [mark for mark in self.marks if mark.get('kind') == 'rule']
+        ranges = []
+        for position, mark in enumerate(rule_marks):
+            if mark.get('name') == name:
+                end = rule_marks[position + 1]['offset'] if position + 1 < len(rule_marks) else None
+                ranges.append(((mark['line'], mark['offset']), end))
+        return ranges
+
+
+class IndexedLogFile:
+    """Binary log file that keeps its sidecar index current as it is written.
+
+    Wraps the file opened by the runner; every write is fed to the indexer
+    and new checkpoints and marks are appended to the sidecars on flush.
+    """
+
+    def __init__(self, raw, log_path: str | os.PathLike):
+        self.raw = raw
+        self.log_path = Path(log_path)
+        raw.flush()
+        try:
+            index = LogIndex.load(self.log_path)
+            index.save()
+            self.indexer = index.indexer
+            self._lines_handle = open(index.lines_path, 'ab')
+            self._marks_handle = open(index.marks_path, 'a', encoding='utf-8')
+        except OSError:
+            # Indexing is an optimisation; never let it break the job log.
+            self.indexer = None
+            self._lines_handle = self._marks_handle = None
+
+    def write(self, data: bytes) -> int:
+        written = self.raw.write(data)
+        if self.indexer is not None:
+            self.indexer.feed(data)
+        return written
+
+    def flush(self) -> None:
+        self.raw.flush()
+        if self.indexer is None:
+            return
+        checkpoints, marks = self.indexer.drain()
+        try:
+            if checkpoints:
+                self._lines_handle.write(b''.join(_CHECKPOINT.pack(line, offset) for line, offset in checkpoints))
+                self._lines_handle.flush()
+            if marks:
+                self._marks_handle.writelines(json.dumps(mark) + '\n' for mark in marks)
+                self._marks_handle.flush()
+        except OSError:
+            self.indexer = None
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def fileno(self) -> int:
+        return self.raw.fileno()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            for handle in (self._lines_handle, self._marks_handle):
+                if handle is not None:
+                    handle.close()
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_indexed_log(log_path: str | os.PathLike) -> IndexedLogFile:
+    return IndexedLogFile(open(log_path, 'ab'), log_path)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+try:
+    import select
+except ImportError:  # pragma: no cover - Windows fallback
+    select = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows fallback
+    fcntl = None
+
+
+_F_SETPIPE_SZ = 1031
+
+
+def _block_size() -> int:
+    try:
+        return max(4096, int(os.getenv('APPAM_LOG_PUMP_BLOCK_SIZE', str(1024 * 1024))))
+    except Exception:
+        return 1024 * 1024
+
+
+def _flush_interval() -> float:
+    try:
+        return max(0.0, float(os.getenv('APPAM_LOG_FLUSH_SECONDS', '0.5')))
+    except Exception:
+        return 0.5
+
+
+def _push_max_bytes() -> int:
+    try:
+        return max(1024, int(os.getenv('APPAM_LOG_PUSH_MAX_BYTES', str(32 * 1024))))
+    except Exception:
+        return 32 * 1024
+
+
+def enlarge_pipe(fd: int, size: int | None = None) -> None:
+    """Grow a Linux pipe buffer so each read drains more output per syscall."""
+    if fcntl is None:
+        return
+    try:
+        fcntl.fcntl(fd, _F_SETPIPE_SZ, size or _block_size())
+    except OSError:
+        pass
+
+
+class LogPump:
+    """Copies child output to the job log in large blocks.
+
+    Output is read straight from the pipe file descriptor without line
+    buffering and appended to a binary log file whose flushes are rate
+    limited. Only lines containing one of ``line_markers`` are extracted
+    and handed to ``line_sink``; incomplete trailing lines are carried over
+    to the next block.
+
+    ``chunk_sink(offset, data)`` receives the bytes appended since the
+    previous flush together with their log file offset, capped to the
+    newest APPAM_LOG_PUSH_MAX_BYTES so live viewers never fall behind.
+    """
+
+    def __init__(
+        self,
+        fd: int,
+        log_file,
+        line_sink: Callable[[list[str]], None] | None = None,
+        line_markers: Iterable[bytes] = (),
+        block_size: int | None = None,
+        flush_interval: float | None = None,
+        chunk_sink: Callable[[int, bytes], None] | None = None,
+    ):
+        self.fd = fd
+        self.log_file = log_file
+        self.line_sink = line_sink
+        self.line_markers = tuple(line_markers)
+        self.block_size = block_size or _block_size()
+        self.flush_interval = _flush_interval() if flush_interval is None else flush_interval
+        self.bytes_read = 0
+        self.eof = False
+        self._at_line_start = True
+        self._partial = b''
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self.chunk_sink = chunk_sink
+        self.push_max_bytes = _push_max_bytes()
+        self._push_pending = bytearray()
+        self._push_offset = 0
+
+    def pump(self, timeout: float = 0.25) -> int:
+        """Read one block if output arrives within ``timeout``.
+
+        Returns the number of bytes consumed; 0 means the pipe was idle or
+        reached EOF (check ``eof``).
+        """
+        if self.eof:
+            return 0
+        if select is not None and os.name != 'nt':
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            if not ready:
+                self.flush_if_due()
+                return 0
+        data = os.read(self.fd, self.block_size)
+        if not data:
+            self.finish()
+            return 0
+        self.feed(data)
+        return len(data)
+
+    def feed(self, data: bytes) -> None:
+        self.bytes_read += len(data)
+        self.log_file.write(data)
+        if self.chunk_sink is not None:
+            self._queue_push(data)
+        self._at_line_start = data.endswith(b'\n')
+        self._dirty = True
+        if self.line_sink is not None:
+            self._split_lines(data)
+        self.flush_if_due()
+
+    def _split_lines(self, data: bytes) -> None:
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            self._partial += data
+            return
+        complete = self._partial + data[:cut]
+        self._partial = data[cut + 1:]
+        lines = self._marked_lines(complete) if self.line_markers else complete.split(b'\n')
+        if lines:
+            self.line_sink([line.decode('utf-8', errors='replace').rstrip('\r') for line in lines])
+
+    def _marked_lines(self, data: bytes) -> list[bytes]:
+        spans = set()
+        for marker in self.line_markers:
+            position = data.find(marker)
+            while position >= 0:
+                start = data.rfind(b'\n', 0, position) + 1
+                end = data.find(b'\n', position)
+                if end < 0:
+                    end = len(data)
+                spans.add((start, end))
+                position = data.find(marker, end)
+        return [data[start:end] for start, end in sorted(spans)]
+
+    def flush_if_due(self) -> None:
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _queue_push(self, data: bytes) -> None:
+        if not self._push_pending:
+            self._push_offset = self.log_file.tell() - len(data)
+        self._push_pending += data
+        overflow = len(self._push_pending) - self.push_max_bytes
+        if overflow > 0:
+            del self._push_pending[:overflow]
+            self._push_offset += overflow
+
+    def flush(self) -> None:
+        if self._dirty:
+            self.log_file.flush()
+            self._dirty = False
+        self._last_flush = time.monotonic()
+        if self.chunk_sink is not None and self._push_pending:
+            offset, data = self._push_offset, bytes(self._push_pending)
+            self._push_pending.clear()
+            self.chunk_sink(offset, data)
+
+    def end_line(self) -> None:
+        """Terminate a trailing partial line so later log writes start fresh."""
+        if not self._at_line_start:
+            self.log_file.write(b'\n')
+            if self.chunk_sink is not None:
+                self._queue_push(b'\n')
+            self._at_line_start = True
+            self._dirty = True
+        self.flush()
+
+    def finish(self) -> None:
+        self.eof = True
+        if self._partial and self.line_sink is not None:
+            if not self.line_markers or any(marker in self._partial for marker in self.line_markers):
+                self.line_sink([self._partial.decode('utf-8', errors='replace').rstrip('\r')])
+        self._partial = b''
+        self.end_line()
+
+
+class LineFeed:
+    """Hands batches of log lines to a consumer on its own thread.
+
+    ``idle`` is called whenever no lines arrived for ``idle_interval``
+    seconds, which lets buffered consumers honour their flush deadlines.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        consumer: Callable[[str], None],
+        idle: Callable[[], None] | None = None,
+        idle_interval: float = 0.5,
+        maxsize: int = 1024,
+        name: str = 'appam-log-feed',
+    ):
+        self.consumer = consumer
+        self.idle = idle
+        self.idle_interval = idle_interval
+        self.error: BaseException | None = None
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, lines: list[str]) -> None:
+        if lines:
+            self._queue.put(lines)
+
+    def close(self, timeout: float | None = None) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                batch = self._queue.get(timeout=self.idle_interval)
+            except queue.Empty:
+                self._call_idle()
+                continue
+            if batch is self._STOP:
+                return
+            if self.error is not None:
+                continue
+            try:
+                for line in batch:
+                    self.consumer(line)
+            except BaseException as exc:  # surfaced by the runner after close()
+                self.error = exc
+
+    def _call_idle(self) -> None:
+        if self.idle is None or self.error is not None:
+            return
+        try:
+            self.idle()
+        except BaseException as exc:
+            self.error = exc
@@ -10,6 +10,7 @@ from pathlib import Path
 import yaml
 
 from .execution_backends import build_backend_command_spec, resolve_backend_name
+from .job_resources import command_resource_request, workflow_resource_request
 from .runtime_resources import (
     collect_appam_smk_runtime_metadata,
     get_appam_smk_runtime_checks,
@@ -289,6 +290,7 @@ def _build_command_job(project_id: str, job_id: str, tool_info: dict, params: di
         'command_spec': {
             'argv': argv,
             'cwd': str(project_dir),
+            'resources': command_resource_request(tool_info, params),
         },
     }
 
@@ -437,6 +439,7 @@ def _appam_smk_context(project_id: str, job_id: str, params: dict, run_id: str,
         argv.extend(['--cores', str(cores)])
     else:
         argv.extend(['--jobs', str(cores)])
+    _append_memory_resource(argv, params)
 
     if params.get('dry_run'):
         argv.append('-n')
@@ -582,6 +585,7 @@ def _paleoproteomics_context(project_id: str, job_id: str, params: dict, run_id:
         str(cores),
         '--printshellcmds',
     ]
+    _append_memory_resource(argv, params)
     if params.get('dry_run'):
         argv.append('-n')
     if mode == 'resume':
@@ -619,6 +623,13 @@ def _paleoproteomics_context(project_id: str, job_id: str, params: dict, run_id:
     }
 
 
+def _append_memory_resource(argv: list[str], params: dict) -> None:
+    mem_mb = params.get('mem_mb')
+    if mem_mb in (None, ''):
+        return
+    argv.extend(['--resources', f'mem_mb={int(mem_mb)}'])
+
+
 def _build_workflow_request(project_id: str, job_id: str, run_id: str, tool_info: dict, params: dict, context: dict, submitted_by: str | None, *, source_run: dict | None = None, mode: str = 'run') -> dict:
     workflow_id = context['workflow_id']
     dry_run = bool(params.get('dry_run'))
@@ -655,6 +666,12 @@ def _build_workflow_request(project_id: str, job_id: str, run_id: str, tool_info
             'reports_dir': str(context['run_paths']['reports_dir']),
         },
     )
+    command_spec['resources'] = workflow_resource_request(
+        context['argv'],
+        profile=context.get('profile'),
+        backend=context['backend'],
+        dry_run=dry_run,
+    )
 
     return {
         'display_command': command_spec.get('backend_display_command') or command_to_string(context['argv']),
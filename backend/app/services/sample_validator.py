@@ -165,7 +165,7 @@ def validate_paleoproteomics_table(project_id: str, sample_table: str) -> dict:
     return {'ok': ok, 'workflow_id': 'appam-paleoproteomics', 'checks': checks, 'samples': samples}
 
 
-def _fastq_sample_key(filename: str):
+def fastq_sample_key(filename: str):
     if not filename.lower().endswith(FASTQ_EXTENSIONS):
         return None
     patterns = [
@@ -191,7 +191,7 @@ def scan_project_data(project_id: str, path: str = '.') -> dict:
     bruker_dirs = []
     for item in sorted(root.rglob('*')):
         if item.is_file():
-            key = _fastq_sample_key(item.name)
+            key = fastq_sample_key(item.name)
             if key:
                 sample_key, read = key
                 record = fastq_pairs.setdefault(sample_key, {'sample_id': sample_key, 'forward_reads': None, 'reverse_reads': None})
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import gzip
+import io
+import os
+from collections import Counter
+from contextlib import contextmanager
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+COMPRESSED_SUFFIXES = ('.gz', '.bgz')
+PHRED_OFFSET = 33
+HISTOGRAM_BINS = 50
+
+
+def _block_size() -> int:
+    try:
+        return max(64 * 1024, int(os.getenv('APPAM_SEQ_STATS_BLOCK_BYTES', str(4 * 1024 * 1024))))
+    except Exception:
+        return 4 * 1024 * 1024
+
+
+def default_scan_bytes() -> int:
+    """Uncompressed bytes scanned per analysis; 0 scans whole files."""
+    try:
+        return max(0, int(os.getenv('APPAM_SEQ_STATS_MAX_BYTES', str(512 * 1024 * 1024))))
+    except Exception:
+        return 512 * 1024 * 1024
+
+
+def is_gzip(path: str) -> bool:
+    try:
+        with open(path, 'rb') as handle:
+            return handle.read(2) == GZIP_MAGIC
+    except OSError:
+        return False
+
+
+def strip_compression_suffix(filename: str) -> tuple[str, bool]:
+    """Return the extension under any .gz/.bgz suffix and whether one was present."""
+    stem, ext = os.path.splitext(filename.lower())
+    if ext in COMPRESSED_SUFFIXES:
+        return os.path.splitext(stem)[1], True
+    return ext, False
+
+
+@contextmanager
+def open_sequence_file(path: str):
+    """Open a sequence file for binary reading, decompressing gzip/BGZF.
+
+    Yields ``(stream, raw)`` where ``raw`` is the underlying file, whose
+    position tracks progress through the file as stored on disk.
+    """
+    raw = open(path, 'rb')
+    try:
+        if raw.read(2) == GZIP_MAGIC:
+            raw.seek(0)
+            # GzipFile reads concatenated members, which covers BGZF blocks.
+            with gzip.GzipFile(fileobj=raw, mode='rb') as stream:
+                yield stream, raw
+        else:
+            raw.seek(0)
+            yield raw, raw
+    finally:
+        raw.close()
+
+
+def read_text_head(path: str, lines: int = 50) -> str:
+    """First ``lines`` lines of a possibly compressed text file."""
+    with open_sequence_file(path) as (stream, _):
+        reader = io.TextIOWrapper(stream, encoding='utf-8', errors='ignore')
+        content = []
+        for index, line in enumerate(reader):
+            if index >= lines:
+                break
+            content.append(line.rstrip())
+        return '\n'.join(content)
+
+
+# Counting works on fixed-size slices converted to big integers, so every
+# step is a C-level pass: translate, int.from_bytes, AND and bit_count.
+_SLICE_BYTES = 256 * 1024
+_GC_TABLE = bytes(1 if value in b'GCgc' else 0 for value in range(256))
+_BIT_MASKS: list[int] | None = None
+
+
+def _count_gc(data: bytes) -> int:
+    """Number of G/C bases: map them to 0x01, everything else to 0x00, popcount."""
+    total = 0
+    for start in range(0, len(data), _SLICE_BYTES):
+        mapped = data[start:start + _SLICE_BYTES].translate(_GC_TABLE)
+        total += int.from_bytes(mapped, 'little').bit_count()
+    return total
+
+
+def _byte_sum(data: bytes) -> int:
+    """Sum of the byte values of 7-bit (ASCII) data.
+
+    Bit k of every byte is isolated with a repeating mask and popcounted;
+    each set bit is worth 2**k.
+    """
+    global _BIT_MASKS
+    if _BIT_MASKS is None:
+        _BIT_MASKS = [int.from_bytes(bytes([1 << bit]) * _SLICE_BYTES, 'little') for bit in range(7)]
+    total = 0
+    for start in range(0, len(data), _SLICE_BYTES):
+        value = int.from_bytes(data[start:start + _SLICE_BYTES], 'little')
+        total += sum((value & mask).bit_count() << bit for bit, mask in enumerate(_BIT_MASKS))
+    return total
+
+
+def _length_summary(lengths: Counter, bases: int) -> dict:
+    if not lengths:
+        return {
+            'min_length': 0,
+            'max_length': 0,
+            'mean_length': 0,
+            'n50': 0,
+            'length_histogram': [],
+        }
+    low, high = min(lengths), max(lengths)
+    count = sum(lengths.values())
+
+    n50 = 0
+    running = 0
+    for length in sorted(lengths, reverse=True):
+        running += length * lengths[length]
+        if running * 2 >= bases:
+            n50 = length
+            break
+
+    if len(lengths) <= HISTOGRAM_BINS:
+        histogram = [
+            {'min': length, 'max': length, 'count': lengths[length]}
+            for length in sorted(lengths)
+        ]
+    else:
+        width = -(-(high - low + 1) // HISTOGRAM_BINS)
+        buckets = Counter()
+        for length, occurrences in lengths.items():
+            buckets[(length - low) // width] += occurrences
+        histogram = [
+            {'min': low + bucket * width, 'max': min(high, low + (bucket + 1) * width - 1), 'count': buckets[bucket]}
+            for bucket in sorted(buckets)
+        ]
+
+    return {
+        'min_length': low,
+        'max_length': high,
+        'mean_length': round(bases / count, 2),
+        'n50': n50,
+        'length_histogram': histogram,
+    }
+
+
+class _Scan:
+    def __init__(self, path: str, sequence_format: str, max_bytes: int | None):
+        self.path = path
+        self.format = sequence_format
+        self.max_bytes = default_scan_bytes() if max_bytes is None else max_bytes
+        self.file_size = os.path.getsize(path)
+        self.records = 0
+        self.bases = 0
+        self.gc = 0
+        self.lengths = Counter()
+        self.quality_sum = 0
+        self.quality_bases = 0
+        self.bytes_scanned = 0
+        self.complete = True
+        self.compressed = False
+        self.raw_position = 0
+
+    def blocks(self):
+        block_size = _block_size()
+        with open_sequence_file(self.path) as (stream, raw):
+            self.compressed = stream is not raw
+            while True:
+                block = stream.read(block_size)
+                if not block:
+                    break
+                self.bytes_scanned += len(block)
+                if b'\r' in block:
+                    block = block.replace(b'\r', b'')
+                yield block
+                if self.max_bytes and self.bytes_scanned >= self.max_bytes:
+                    self.raw_position = raw.tell()
+                    self.complete = stream.read(1) == b''
+                    return
+            self.raw_position = self.file_size
+
+    def result(self) -> dict:
+        result = {
+            'format': self.format,
+            'sequence_count': self.records,
+            'total_bases': self.bases,
+            'gc_content': round(self.gc / self.bases * 100, 2) if self.bases else 0,
+            'compressed': self.compressed,
+            'bytes_scanned': self.bytes_scanned,
+            'complete': self.complete,
+        }
+        if self.format == 'FASTQ':
+            result['mean_quality'] = (
+                round(self.quality_sum / self.quality_bases, 2) if self.quality_bases else 0
+            )
+        result.update(_length_summary(self.lengths, self.bases))
+        if not self.complete and self.raw_position:
+            # Extrapolate from how far through the on-disk file the scan got.
+            result['estimated_sequence_count'] = int(self.records * self.file_size / self.raw_position)
+        return result
+
+
+def fastq_stats(path: str, max_bytes: int | None = None) -> dict:
+    """Read count, bases, GC%, mean Phred and read lengths of a FASTQ file.
+
+    Works on fixed-size blocks: each block is split into whole four-line
+    records, and bases, GC and quality sums are counted with C-level byte
+    operations over the joined sequence and quality lines. Memory use is
+    bounded by the block size plus one histogram entry per read length.
+    Scanning stops after ``max_bytes`` uncompressed bytes (default
+    APPAM_SEQ_STATS_MAX_BYTES); ``complete`` is then False and
+    ``estimated_sequence_count`` extrapolates the total.
+    """
+    scan = _Scan(path, 'FASTQ', max_bytes)
+    carry = b''
+    checked = False
+
+    def add_records(lines: list[bytes]) -> None:
+        nonlocal checked
+        if not checked:
+            if lines[0][:1] != b'@':
+                raise ValueError('Not a four-line FASTQ file')
+            checked = True
+        sequences = lines[1::4]
+        qualities = b''.join(lines[3::4])
+        joined = b''.join(sequences)
+        scan.records += len(sequences)
+        scan.bases += len(joined)
+        scan.gc += _count_gc(joined)
+        scan.lengths.update(map(len, sequences))
+        scan.quality_sum += _byte_sum(qualities) - PHRED_OFFSET * len(qualities)
+        scan.quality_bases += len(qualities)
+
+    for block in scan.blocks():
+        lines = (carry + block).split(b'\n')
+        carry = lines.pop()
+        usable = len(lines) - len(lines) % 4
+        if usable < len(lines):
+            carry = b'\n'.join(lines[usable:] + [carry])
+            del lines[usable:]
+        if lines:
+            add_records(lines)
+
+    if scan.complete and carry:
+        lines = carry.split(b'\n')
+        usable = len(lines) - len(lines) % 4
+        if usable:
+            add_records(lines[:usable])
+    return scan.result()
+
+
+def fasta_stats(path: str, max_bytes: int | None = None) -> dict:
+    """Sequence count, bases, GC% and length distribution of a FASTA file.
+
+    Headers are located with ``find`` and sequence spans are measured with
+    ``count`` over block ranges, so sequences are never concatenated and
+    unwrapped multi-megabase contigs stream in constant memory.
+    """
+    scan = _Scan(path, 'FASTA', max_bytes)
+    current = None
+    at_line_start = True
+    in_header = False
+
+    for block in scan.blocks():
+        position = 0
+        size = len(block)
+        while position < size:
+            if in_header:
+                newline = block.find(b'\n', position)
+                if newline < 0:
+                    position = size
+                    break
+                position = newline + 1
+                in_header = False
+                at_line_start = True
+                continue
+            if at_line_start and block[position] == 0x3E:  # '>'
+                if current is not None:
+                    scan.lengths[current] += 1
+                scan.records += 1
+                current = 0
+                in_header = True
+                continue
+            following = block.find(b'\n>', position)
+            end = size if following < 0 else following + 1
+            length = end - position - block.count(b'\n', position, end)
+            scan.bases += length
+            scan.gc += _count_gc(block[position:end])
+            if current is not None:
+                current += length
+            at_line_start = block[end - 1] == 0x0A
+            position = end
+
+    if current is not None:
+        scan.lengths[current] += 1
+    return scan.result()
+
+
+def sequence_stats(path: str, sequence_format: str, max_bytes: int | None = None) -> dict:
+    if sequence_format == 'fastq':
+        return fastq_stats(path, max_bytes=max_bytes)
+    if sequence_format == 'fasta':
+        return fasta_stats(path, max_bytes=max_bytes)
+    raise ValueError(f'Unsupported sequence format: {sequence_format}')
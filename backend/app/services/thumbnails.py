@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from ..paths import get_project_dir, resolve_project_path
+
+
+THUMBNAIL_DIR = '.thumbnails'
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp', '.tif', '.tiff')
+DEFAULT_SIZE = 128
+MIN_SIZE, MAX_SIZE = 16, 1024
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+_PENDING: set[tuple[str, str, int]] = set()
+
+
+def _workers() -> int:
+    try:
+        return max(1, int(os.getenv('APPAM_THUMBNAIL_WORKERS', '2')))
+    except Exception:
+        return 2
+
+
+def _prefetch_limit() -> int:
+    try:
+        return max(0, int(os.getenv('APPAM_THUMBNAIL_PREFETCH_LIMIT', '500')))
+    except Exception:
+        return 500
+
+
+def thumbnail_version(project_id: str, path: str, size: int = DEFAULT_SIZE) -> dict:
+    """Where the thumbnail of ``path`` lives and its ETag, from a single stat of the source.
+
+    The file name carries a hash of the source path and size plus the
+    source's mtime and length, so a changed image gets a new file and
+    an unchanged one is found without decoding anything.
+    """
+    size = min(MAX_SIZE, max(MIN_SIZE, int(size)))
+    source = resolve_project_path(project_id, path)
+    stat_result = source.stat()
+    if not source.is_file():
+        raise FileNotFoundError('File not found')
+    relative = PurePosixPath(source.relative_to(get_project_dir(project_id).resolve())).as_posix()
+    key = hashlib.sha1(relative.encode('utf-8')).hexdigest()[:20]
+    version = f'{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}'
+    return {
+        'source': source,
+        'path': get_project_dir(project_id) / THUMBNAIL_DIR / f'{key}_{size}_{version}.jpg',
+        'prefix': f'{key}_{size}_',
+        'size': size,
+        'etag': f'{key}-{size}-{version}',
+        'last_modified': stat_result.st_mtime,
+    }
+
+
+def _render(source: Path, destination: Path, size: int) -> None:
+    from PIL import Image
+
+    with Image.open(source) as img:
+        # JPEG sources decode at a reduced scale when only a thumbnail is needed.
+        img.draft('RGB', (size, size))
+        img.thumbnail((size, size), Image.LANCZOS)
+        # Convert to RGB if necessary (for PNG with transparency)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(destination, 'JPEG', quality=85)
+
+
+def ensure_thumbnail(project_id: str, path: str, size: int = DEFAULT_SIZE) -> dict:
+    """The cached thumbnail for ``path``, rendering it only if the source changed."""
+    version = thumbnail_version(project_id, path, size)
+    target = version['path']
+    if target.exists():
+        return version
+    target.parent.mkdir(parents=True, exist_ok=True)
+    partial = target.with_name(f'.{uuid.uuid4().hex}.part')
+    try:
+        _render(version['source'], partial, version['size'])
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+    for stale in target.parent.glob(f"{version['prefix']}*.jpg"):
+        if stale != target:
+            stale.unlink(missing_ok=True)
+    return version
+
+
+def _warm(project_id: str, path: str, size: int) -> None:
+    try:
+        ensure_thumbnail(project_id, path, size)
+    except Exception:
+        pass
+    finally:
+        with _EXECUTOR_LOCK:
+            _PENDING.discard((project_id, path, size))
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='appam-thumbnails')
+        return _EXECUTOR
+
+
+def schedule_thumbnail(project_id: str, path: str, size: int = DEFAULT_SIZE) -> bool:
+    """Render the thumbnail of a newly written image on a background thread."""
+    if not path.lower().endswith(IMAGE_SUFFIXES):
+        return False
+    with _EXECUTOR_LOCK:
+        if (project_id, path, size) in _PENDING:
+            return False
+        _PENDING.add((project_id, path, size))
+    _executor().submit(_warm, project_id, path, size)
+    return True
+
+
+def _scan(project_id: str, directories: list[str | None]) -> int:
+    project_dir = get_project_dir(project_id).resolve()
+    limit = _prefetch_limit()
+    queued = 0
+    for directory in directories:
+        if not directory:
+            continue
+        base = Path(directory).resolve()
+        if base != project_dir and project_dir not in base.parents:
+            continue
+        for root, dirnames, filenames in os.walk(base):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for filename in filenames:
+                if queued >= limit:
+                    return queued
+                if filename.lower().endswith(IMAGE_SUFFIXES):
+                    relative = PurePosixPath(Path(root, filename).relative_to(project_dir)).as_posix()
+                    queued += schedule_thumbnail(project_id, relative)
+    return queued
+
+
+def schedule_directory_thumbnails(project_id: str, directories: list[str | None]) -> None:
+    """Queue thumbnails for the images under result directories inside the project.
+
+    The walk itself runs on the pool. At most APPAM_THUMBNAIL_PREFETCH_LIMIT
+    images are queued; those whose thumbnail is current cost only a stat.
+    """
+    _executor().submit(_scan, project_id, list(directories))
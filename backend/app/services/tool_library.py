@@ -294,6 +294,7 @@ ADDITIONAL_TOOLS = [
             {'name': 'raw_data_dir', 'description': 'Project-relative directory containing raw FASTQ files', 'type': 'directory', 'required': True},
             {'name': 'profile', 'description': 'Snakemake execution profile', 'type': 'string', 'options': ['local', 'slurm'], 'default': 'local'},
             {'name': 'cores', 'description': 'Local cores or maximum queued jobs', 'type': 'integer', 'default': 4},
+            {'name': 'mem_mb', 'description': 'Memory budget in MB passed as Snakemake --resources mem_mb (optional)', 'type': 'integer'},
             {'name': 'preprocess_method', 'description': 'Preprocessing backend', 'type': 'string', 'options': ['adapter_removal', 'fastp'], 'default': 'fastp'},
             {'name': 'min_contig_len', 'description': 'Minimum contig length', 'type': 'integer', 'default': 500},
             {'name': 'use_ancient_contigs', 'description': 'Enable ancient-contig-only binning', 'type': 'flag', 'default': True},
@@ -345,6 +346,7 @@ ADDITIONAL_TOOLS = [
             {'name': 'sample_table', 'description': 'Project-relative samples.tsv file for paleoproteomics', 'type': 'file', 'extensions': ['.tsv'], 'required': True},
             {'name': 'fasta_path', 'description': 'Reference FASTA path (project-relative or absolute)', 'type': 'string', 'required': True},
             {'name': 'cores', 'description': 'Snakemake cores', 'type': 'integer', 'default': 4},
+            {'name': 'mem_mb', 'description': 'Memory budget in MB passed as Snakemake --resources mem_mb (optional)', 'type': 'integer'},
             {'name': 'match_between_runs', 'description': 'Enable MaxQuant match between runs', 'type': 'flag', 'default': False},
             {'name': 'include_contaminants', 'description': 'Include contaminants database', 'type': 'flag', 'default': True},
             {'name': 'min_peptide_length', 'description': 'Minimum peptide length', 'type': 'integer', 'default': 7},
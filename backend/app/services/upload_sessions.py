@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import os
+import uuid
+from pathlib import Path, PurePosixPath
+
+from ..database import get_db_connection
+from ..paths import get_project_dir, resolve_project_path
+from .file_metadata import schedule_file_metadata
+from .thumbnails import schedule_thumbnail
+
+
+WRITE_BLOCK_BYTES = 1024 * 1024
+# list_files already hides .tmp_* entries.
+TEMP_PREFIX = '.tmp_upload_'
+
+
+def default_chunk_bytes() -> int:
+    try:
+        return max(256 * 1024, int(os.getenv('APPAM_UPLOAD_CHUNK_BYTES', str(8 * 1024 * 1024))))
+    except Exception:
+        return 8 * 1024 * 1024
+
+
+def max_chunk_bytes() -> int:
+    try:
+        return max(256 * 1024, int(os.getenv('APPAM_UPLOAD_MAX_CHUNK_BYTES', str(64 * 1024 * 1024))))
+    except Exception:
+        return 64 * 1024 * 1024
+
+
+def session_ttl_hours() -> float:
+    try:
+        return max(1.0, float(os.getenv('APPAM_UPLOAD_SESSION_TTL_HOURS', '72')))
+    except Exception:
+        return 72.0
+
+
+def _chunk_is_set(bitmap: bytes, index: int) -> bool:
+    return bool(bitmap[index >> 3] & (1 << (index & 7)))
+
+
+def _missing_chunks(bitmap: bytes, total_chunks: int) -> list[int]:
+    return [index for index in range(total_chunks) if not _chunk_is_set(bitmap, index)]
+
+
+def preallocate_file(path: Path, size: int) -> None:
+    """Create ``path`` at its final size, reserving the blocks where the filesystem allows."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        if size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def _serialize(row) -> dict:
+    bitmap = bytes(row['received'])
+    missing = _missing_chunks(bitmap, row['total_chunks'])
+    return {
+        'id': row['id'],
+        'project_id': row['project_id'],
+        'path': row['path'],
+        'size_bytes': row['size_bytes'],
+        'chunk_size': row['chunk_size'],
+        'total_chunks': row['total_chunks'],
+        'received_chunks': row['received_chunks'],
+        'missing_chunks': missing,
+        'status': row['status'],
+        'created_by': row['created_by'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+
+
+def _load_row(conn, project_id: str, session_id: str):
+    row = conn.execute(
+        'SELECT * FROM upload_sessions WHERE id = ? AND project_id = ?',
+        (session_id, project_id),
+    ).fetchone()
+    if not row:
+        raise FileNotFoundError('Upload session not found')
+    return row
+
+
+def _temp_path(project_id: str, row) -> Path:
+    target = resolve_project_path(project_id, row['path'])
+    return target.parent / f"{TEMP_PREFIX}{row['id']}.part"
+
+
+def expire_upload_sessions() -> int:
+    """Remove unfinished sessions idle for APPAM_UPLOAD_SESSION_TTL_HOURS and their partial files."""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            '''
+            SELECT * FROM upload_sessions
+            WHERE status = 'uploading' AND updated_at < datetime('now', ?)
+            ''',
+            (f'-{session_ttl_hours()} hours',),
+        ).fetchall()
+        for row in rows:
+            try:
+                _temp_path(row['project_id'], row).unlink(missing_ok=True)
+            except (OSError, ValueError):
+                pass
+            conn.execute('DELETE FROM upload_sessions WHERE id = ?', (row['id'],))
+        conn.commit()
+    finally:
+        conn.close()
+    return len(rows)
+
+
+def create_upload_session(
+    project_id: str,
+    path: str,
+    filename: str,
+    size_bytes: int,
+    chunk_size: int | None = None,
+    created_by: str | None = None,
+) -> dict:
+    """Start an upload: preallocate a hidden part file next to the target.
+
+    Chunks may then arrive in any order and in parallel; the file is renamed
+    into place once every chunk has been written.
+    """
+    if not filename or '/' in filename or filename in ('.', '..'):
+        raise ValueError('Invalid file name')
+    size_bytes = int(size_bytes)
+    if size_bytes < 0:
+        raise ValueError('size_bytes must be >= 0')
+    chunk_size = min(max_chunk_bytes(), max(256 * 1024, int(chunk_size or default_chunk_bytes())))
+    target = resolve_project_path(project_id, os.path.join(path or '', filename))
+    if target.is_dir():
+        raise ValueError(f'A directory with that name already exists: {filename}')
+    target.parent.mkdir(parents=True, exist_ok=True)
+    relative = PurePosixPath(target.relative_to(get_project_dir(project_id).resolve())).as_posix()
+    total_chunks = max(1, -(-size_bytes // chunk_size))
+    bitmap = bytes(-(-total_chunks // 8))
+
+    expire_upload_sessions()
+    session_id = uuid.uuid4().hex
+    preallocate_file(target.parent / f'{TEMP_PREFIX}{session_id}.part', size_bytes)
+    conn = get_db_connection()
+    try:
+        conn.execute(
+            '''
+            INSERT INTO upload_sessions (
+                id, project_id, path, size_bytes, chunk_size, total_chunks, received, created_by
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            (session_id, project_id, relative, size_bytes, chunk_size, total_chunks, bitmap, created_by),
+        )
+        conn.commit()
+        return _serialize(_load_row(conn, project_id, session_id))
+    finally:
+        conn.close()
+
+
+def get_upload_session(project_id: str, session_id: str) -> dict:
+    conn = get_db_connection()
+    try:
+        return _serialize(_load_row(conn, project_id, session_id))
+    finally:
+        conn.close()
+
+
+def write_upload_chunk(project_id: str, session_id: str, index: int, stream) -> dict:
+    """Write chunk ``index`` from ``stream`` at its offset and mark it received.
+
+    The body goes to disk with positional writes in WRITE_BLOCK_BYTES
+    pieces, so concurrent chunks never share a file position and nothing
+    is buffered whole. Re-sending a chunk is harmless.
+    """
+    conn = get_db_connection()
+    try:
+        row = _load_row(conn, project_id, session_id)
+    finally:
+        conn.close()
+    if row['status'] != 'uploading':
+        raise ValueError(f"Upload session is {row['status']}")
+    if not 0 <= index < row['total_chunks']:
+        raise ValueError(f'Chunk index out of range: {index}')
+    offset = index * row['chunk_size']
+    expected = min(row['chunk_size'], row['size_bytes'] - offset)
+
+    temp_path = _temp_path(project_id, row)
+    try:
+        fd = os.open(temp_path, os.O_WRONLY)
+    except FileNotFoundError:
+        raise FileNotFoundError('Upload session data is missing; start a new upload')
+    written = 0
+    try:
+        while written <= expected:
+            block = stream.read(min(WRITE_BLOCK_BYTES, expected - written + 1))
+            if not block:
+                break
+            if written + len(block) > expected:
+                raise ValueError(f'Chunk {index} is larger than {expected} bytes')
+            view = memoryview(block)
+            while view:
+                count = os.pwrite(fd, view, offset + written)
+                written += count
+                view = view[count:]
+    finally:
+        os.close(fd)
+    if written != expected:
+        raise ValueError(f'Chunk {index} has {written} bytes, expected {expected}')
+
+    conn = get_db_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        row = _load_row(conn, project_id, session_id)
+        bitmap = bytearray(row['received'])
+        received = row['received_chunks']
+        if not _chunk_is_set(bitmap, index):
+            bitmap[index >> 3] |= 1 << (index & 7)
+            received += 1
+        completing = row['status'] == 'uploading' and received == row['total_chunks']
+        conn.execute(
+            '''
+            UPDATE upload_sessions
+            SET received = ?, received_chunks = ?, status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+            ''',
+            (bytes(bitmap), received, 'finalizing' if completing else row['status'], session_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    if completing:
+        return _finalize(project_id, session_id)
+    return get_upload_session(project_id, session_id)
+
+
+def _finalize(project_id: str, session_id: str) -> dict:
+    conn = get_db_connection()
+    try:
+        row = _load_row(conn, project_id, session_id)
+        try:
+            os.replace(_temp_path(project_id, row), resolve_project_path(project_id, row['path']))
+        except Exception:
+            # Back to 'uploading' so re-sending any chunk retries the move.
+            conn.execute(
+                "UPDATE upload_sessions SET status = 'uploading', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (session_id,),
+            )
+            conn.commit()
+            raise
+        conn.execute(
+            "UPDATE upload_sessions SET status = 'completed', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (session_id,),
+        )
+        conn.commit()
+        session = _serialize(_load_row(conn, project_id, session_id))
+    finally:
+        conn.close()
+    schedule_file_metadata(project_id, session['path'])
+    schedule_thumbnail(project_id, session['path'])
+    return session
+
+
+def abort_upload_session(project_id: str, session_id: str) -> None:
+    conn = get_db_connection()
+    try:
+        row = _load_row(conn, project_id, session_id)
+        if row['status'] != 'completed':
+            _temp_path(project_id, row).unlink(missing_ok=True)
+        conn.execute('DELETE FROM upload_sessions WHERE id = ?', (session_id,))
+        conn.commit()
+    finally:
+        conn.close()
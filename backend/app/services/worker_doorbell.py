@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+import select
+import socket
+import uuid
+from pathlib import Path
+
+from .. import database
+
+
+def doorbell_dir() -> Path:
+    configured = os.getenv('APPAM_WORKER_DOORBELL_DIR', '').strip()
+    if configured:
+        return Path(configured)
+    return Path(os.path.abspath(database.DATABASE_FILE)).parent / '.appam-doorbell'
+
+
+def doorbell_supported() -> bool:
+    return hasattr(socket, 'AF_UNIX') and os.name != 'nt'
+
+
+def ring_doorbells(directory: Path | None = None) -> int:
+    """Wake every worker listening in the doorbell directory.
+
+    Sends a one-byte datagram to each worker socket; sockets whose worker
+    has gone away are removed. Returns the number of workers rung.
+    """
+    if not doorbell_supported():
+        return 0
+    directory = directory or doorbell_dir()
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return 0
+
+    rung = 0
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sender.setblocking(False)
+    try:
+        for entry in entries:
+            if not entry.name.endswith('.sock'):
+                continue
+            try:
+                sender.sendto(b'!', entry.path)
+                rung += 1
+            except BlockingIOError:
+                # The worker's queue is full, so it is already due to wake.
+                rung += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+            except OSError:
+                continue
+    finally:
+        sender.close()
+    return rung
+
+
+class WorkerDoorbell:
+    """UNIX datagram socket a worker blocks on until a job is enqueued.
+
+    Each worker binds its own socket inside the shared doorbell directory,
+    so any process that can see the directory (API servers, other workers,
+    containers sharing the volume) can wake it without an external broker.
+    """
+
+    def __init__(self, directory: Path | None = None):
+        self.directory = directory or doorbell_dir()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f'w-{os.getpid()}-{uuid.uuid4().hex[:8]}.sock'
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(str(self.path))
+
+    def wait(self, timeout: float | None) -> bool:
+        """Block until rung or ``timeout`` elapses; return True when rung."""
+        ready, _, _ = select.select([self._socket], [], [], timeout)
+        if not ready:
+            return False
+        self.drain()
+        return True
+
+    def drain(self) -> None:
+        while True:
+            try:
+                self._socket.recv(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+
+    def wake(self) -> None:
+        try:
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.setblocking(False)
+            try:
+                sender.sendto(b'!', str(self.path))
+            finally:
+                sender.close()
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        try:
+            self._socket.close()
+        finally:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+def open_worker_doorbell() -> WorkerDoorbell | None:
+    """Return a bound doorbell, or None when the platform or path cannot host one."""
+    if not doorbell_supported():
+        return None
+    try:
+        return WorkerDoorbell()
+    except OSError:
+        return None
@@ -6,6 +6,10 @@ RULE_PATTERNS = (
     re.compile(r'(?:^|\n)checkpoint\s+([A-Za-z0-9_:-]+):'),
 )
 
+# Cheap byte-level prefilter: a line can only match RULE_PATTERNS if it
+# contains one of these substrings.
+RULE_LINE_MARKERS = (b'rule', b'checkpoint')
+
 
 WORKFLOW_RUNTIME_DEFINITIONS = {
     'appam-smk': {
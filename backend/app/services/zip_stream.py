@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import os
+import time
+import zipfile
+from typing import Iterable, Iterator
+
+
+# Entries with these suffixes are already compressed; deflating them again
+# costs CPU for no size gain, so they are STORED.
+STORED_SUFFIXES = (
+    '.gz', '.bgz', '.bz2', '.xz', '.zst', '.zip', '.7z',
+    '.bam', '.cram', '.bai', '.csi', '.tbi', '.crai',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.pdf',
+)
+
+
+def _chunk_size() -> int:
+    try:
+        return max(64 * 1024, int(os.getenv('APPAM_ZIP_CHUNK_BYTES', str(1024 * 1024))))
+    except Exception:
+        return 1024 * 1024
+
+
+def compression_for(name: str) -> int:
+    return zipfile.ZIP_STORED if name.lower().endswith(STORED_SUFFIXES) else zipfile.ZIP_DEFLATED
+
+
+class _Sink:
+    """Write-only file object collecting what ZipFile emits until drained.
+
+    It has no ``seek``/``tell``, so ZipFile switches to streaming mode:
+    sizes and CRCs go into data descriptors after each entry instead of
+    being patched into the local headers.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def walk_entries(path: str, arcname: str) -> Iterator[tuple[str, str]]:
+    """(arcname, source path) pairs for a file, or a directory tree in sorted order.
+
+    Directories yield ``(arcname + '/', path)`` so empty ones survive.
+    """
+    if not os.path.isdir(path):
+        yield arcname, path
+        return
+    yield arcname.rstrip('/') + '/', path
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        relative = os.path.relpath(root, path)
+        prefix = arcname.rstrip('/') if relative == '.' else f"{arcname.rstrip('/')}/{relative.replace(os.sep, '/')}"
+        for name in dirs:
+            yield f'{prefix}/{name}/', os.path.join(root, name)
+        for name in sorted(files):
+            yield f'{prefix}/{name}', os.path.join(root, name)
+
+
+def stream_zip(entries: Iterable[tuple[str, str | bytes]]) -> Iterator[bytes]:
+    """Generate a zip64 archive chunk by chunk, without staging anything on disk.
+
+    ``entries`` yields ``(arcname, source)`` where ``source`` is a path on
+    disk (read in APPAM_ZIP_CHUNK_BYTES pieces) or in-memory ``bytes``.
+    Arcnames ending in ``/`` become directory entries. Memory use stays at
+    about one chunk regardless of file or archive size.
+    """
+    sink = _Sink()
+    chunk_size = _chunk_size()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for arcname, source in entries:
+            if isinstance(source, bytes):
+                info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+                info.compress_type = compression_for(arcname)
+                archive.writestr(info, source)
+            elif arcname.endswith('/'):
+                archive.writestr(zipfile.ZipInfo.from_file(source, arcname), b'')
+            else:
+                info = zipfile.ZipInfo.from_file(source, arcname)
+                info.compress_type = compression_for(arcname)
+                # The size is known up front, so ZipFile writes zip64 fields
+                # for files over 4 GiB even though it cannot seek back.
+                with open(source, 'rb') as handle, archive.open(info, 'w') as target:
+                    while True:
+                        block = handle.read(chunk_size)
+                        if not block:
+                            break
+                        target.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
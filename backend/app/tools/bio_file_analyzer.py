@@ -3,6 +3,7 @@ import json
 from typing import Dict, List, Optional, Any
 from .base import BaseTool, ToolResult
 from ..services.file_manager import get_project_path, list_files
+from ..services.file_metadata import get_file_metadata
 
 
 class BioFileAnalyzerTool(BaseTool):
@@ -98,7 +99,7 @@ class BioFileAnalyzerTool(BaseTool):
         # Define extensions for each file type
         file_extensions = {
             'fastq': ['.fastq', '.fq', '.fastq.gz', '.fq.gz'],
-            'fasta': ['.fasta', '.fa', '.fas', '.fna', '.faa', '.ffn'],
+            'fasta': ['.fasta', '.fa', '.fas', '.fna', '.faa', '.ffn', '.fasta.gz', '.fa.gz', '.fna.gz'],
             'vcf': ['.vcf', '.vcf.gz'],
             'gff': ['.gff', '.gff3', '.gtf'],
             'bed': ['.bed'],
@@ -169,9 +170,9 @@ class BioFileAnalyzerTool(BaseTool):
             
             # Type-specific analysis
             if file_type == 'fastq':
-                analysis.update(self._analyze_fastq(abs_path))
+                analysis.update(self._analyze_fastq(project_id, file_path))
             elif file_type == 'fasta':
-                analysis.update(self._analyze_fasta(abs_path))
+                analysis.update(self._analyze_fasta(project_id, file_path))
             elif file_type == 'vcf':
                 analysis.update(self._analyze_vcf(abs_path))
             
@@ -181,97 +182,45 @@ class BioFileAnalyzerTool(BaseTool):
             print(f"Error analyzing file {file_info['name']}: {e}")
             return None
 
-    def _analyze_fastq(self, file_path: str) -> Dict:
-        """Analyze FASTQ file."""
+    def _analyze_fastq(self, project_id: str, file_path: str) -> Dict:
+        """Analyze FASTQ file, answering from the project metadata cache when possible."""
         try:
-            sequence_count = 0
-            total_length = 0
-            gc_count = 0
-            quality_scores = []
-            
-            # For large files, sample first 1000 sequences
-            max_sequences = 1000
-            
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = []
-                for i, line in enumerate(f):
-                    lines.append(line.strip())
-                    if (i + 1) % 4 == 0:  # Every 4 lines is one sequence
-                        if len(lines) >= 4:
-                            sequence_count += 1
-                            seq_line = lines[1]
-                            quality_line = lines[3]
-                            
-                            total_length += len(seq_line)
-                            gc_count += seq_line.upper().count('G') + seq_line.upper().count('C')
-                            
-                            # Calculate average quality for this sequence
-                            if quality_line:
-                                avg_qual = sum(ord(c) - 33 for c in quality_line) / len(quality_line)
-                                quality_scores.append(avg_qual)
-                            
-                            lines = []
-                            
-                            if sequence_count >= max_sequences:
-                                break
-            
-            # Calculate statistics
-            avg_length = total_length / sequence_count if sequence_count > 0 else 0
-            gc_content = (gc_count / total_length * 100) if total_length > 0 else 0
-            avg_quality = sum(quality_scores) / len(quality_scores) if quality_scores else 0
-            
+            metadata = get_file_metadata(project_id, file_path)
+            stats = metadata['stats']
             return {
-                'sequence_count': sequence_count,
-                'avg_sequence_length': round(avg_length, 1),
-                'total_bases': total_length,
-                'gc_content_percent': round(gc_content, 1),
-                'avg_quality_score': round(avg_quality, 1),
+                'sequence_count': stats['sequence_count'],
+                'avg_sequence_length': round(stats['mean_length'], 1),
+                'total_bases': stats['total_bases'],
+                'gc_content_percent': round(stats['gc_content'], 1),
+                'avg_quality_score': round(stats['mean_quality'], 1),
+                'length_histogram': stats['length_histogram'],
                 'format': 'FASTQ',
-                'is_sample': sequence_count >= max_sequences
+                'is_sample': not stats['complete'],
+                'estimated_sequence_count': stats.get('estimated_sequence_count', stats['sequence_count']),
+                'sample_key': metadata['sample_key'],
+                'read_mate': metadata['read_mate']
             }
-            
+
         except Exception as e:
             return {
                 'error': f"Failed to analyze FASTQ file: {str(e)}",
                 'format': 'FASTQ'
             }
 
-    def _analyze_fasta(self, file_path: str) -> Dict:
-        """Analyze FASTA file."""
+    def _analyze_fasta(self, project_id: str, file_path: str) -> Dict:
+        """Analyze FASTA file, answering from the project metadata cache when possible."""
         try:
-            sequence_count = 0
-            total_length = 0
-            gc_count = 0
-            current_seq = ''
-            
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('>'):
-                        if current_seq:
-                            total_length += len(current_seq)
-                            gc_count += current_seq.upper().count('G') + current_seq.upper().count('C')
-                        sequence_count += 1
-                        current_seq = ''
-                    else:
-                        current_seq += line
-                
-                # Process last sequence
-                if current_seq:
-                    total_length += len(current_seq)
-                    gc_count += current_seq.upper().count('G') + current_seq.upper().count('C')
-            
-            avg_length = total_length / sequence_count if sequence_count > 0 else 0
-            gc_content = (gc_count / total_length * 100) if total_length > 0 else 0
-            
+            stats = get_file_metadata(project_id, file_path)['stats']
             return {
-                'sequence_count': sequence_count,
-                'avg_sequence_length': round(avg_length, 1),
-                'total_bases': total_length,
-                'gc_content_percent': round(gc_content, 1),
-                'format': 'FASTA'
+                'sequence_count': stats['sequence_count'],
+                'avg_sequence_length': round(stats['mean_length'], 1),
+                'total_bases': stats['total_bases'],
+                'gc_content_percent': round(stats['gc_content'], 1),
+                'n50': stats['n50'],
+                'format': 'FASTA',
+                'is_sample': not stats['complete']
             }
-            
+
         except Exception as e:
             return {
                 'error': f"Failed to analyze FASTA file: {str(e)}",
@@ -349,11 +298,14 @@ class BioFileAnalyzerTool(BaseTool):
                         summary += f"    • Avg length: {file['avg_sequence_length']} bp\n"
                         summary += f"    • GC content: {file['gc_content_percent']}%\n"
                         summary += f"    • Avg quality: {file['avg_quality_score']}\n"
+                        if file.get('is_sample'):
+                            summary += f"    • Statistics from the start of the file; ~{file['estimated_sequence_count']:,} reads in total\n"
                 elif file_type == 'fasta':
                     if 'sequence_count' in file:
                         summary += f"    • Sequences: {file['sequence_count']:,}\n"
                         summary += f"    • Avg length: {file['avg_sequence_length']} bp\n"
                         summary += f"    • GC content: {file['gc_content_percent']}%\n"
+                        summary += f"    • N50: {file['n50']:,} bp\n"
                 elif file_type == 'vcf':
                     if 'variant_count' in file:
                         summary += f"    • Variants: {file['variant_count']:,}\n"
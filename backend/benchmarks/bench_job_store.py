@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Measure job-store throughput with a writing worker and concurrent readers.
+
+Runs the same workload twice: once with the legacy connection behaviour
+(fresh connection per call, rollback journal) and once with the pooled WAL
+connection layer, then prints operations per second for each role.
+
+    python benchmarks/bench_job_store.py --readers 4 --duration 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+SCENARIOS = {
+    'legacy': {
+        'APPAM_DB_POOL_SIZE': '0',
+        'APPAM_DB_JOURNAL_MODE': 'DELETE',
+        'APPAM_DB_SYNCHRONOUS': 'FULL',
+        'APPAM_DB_CACHE_SIZE_KB': '2000',
+        'APPAM_DB_MMAP_SIZE': '0',
+    },
+    'pooled': {
+        'APPAM_DB_POOL_SIZE': '4',
+        'APPAM_DB_JOURNAL_MODE': 'WAL',
+        'APPAM_DB_SYNCHRONOUS': 'NORMAL',
+    },
+}
+
+
+def _seed(database, job_store, job_count: int) -> tuple[str, list[str], str]:
+    project_id = uuid.uuid4().hex
+    conn = database.get_db_connection()
+    try:
+        conn.execute('INSERT INTO projects (id, name) VALUES (?, ?)', (project_id, 'bench'))
+        conn.commit()
+    finally:
+        conn.close()
+
+    job_ids = []
+    run_id = uuid.uuid4().hex
+    for index in range(job_count):
+        job_id = uuid.uuid4().hex
+        spec = None
+        if index == 0:
+            spec = {
+                'id': run_id,
+                'job_id': job_id,
+                'project_id': project_id,
+                'workflow_id': 'appam-smk',
+                'tool_name': 'APPAM-SMK',
+                'stages': [{'id': 'preprocess', 'title': 'Preprocess', 'order': 0}],
+            }
+        job_store.create_job(
+            job_id,
+            project_id,
+            'bench-tool',
+            'echo bench',
+            log_path=str(Path(tempfile.gettempdir()) / f'missing-{job_id}.log'),
+            status='running' if index == 0 else 'queued',
+            workflow_run_id=run_id if index == 0 else None,
+            workflow_run_spec=spec,
+        )
+        job_ids.append(job_id)
+    return project_id, job_ids, run_id
+
+
+def run_scenario(name: str, readers: int, duration: float, job_count: int) -> dict:
+    os.environ.update(SCENARIOS[name])
+    from app import database
+    from app.services import job_store
+
+    tmp_dir = tempfile.mkdtemp(prefix=f'appam-bench-{name}-')
+    database.DATABASE_FILE = str(Path(tmp_dir) / 'bench.db')
+    database.init_db()
+    project_id, job_ids, run_id = _seed(database, job_store, job_count)
+    running_job = job_ids[0]
+
+    stop = threading.Event()
+    counters = {'writer': 0, 'reader': 0}
+    errors: list[str] = []
+    lock = threading.Lock()
+
+    def writer() -> None:
+        count = 0
+        try:
+            while not stop.is_set():
+                job_store.update_job_heartbeat(running_job)
+                job_store.update_workflow_stage(run_id, 'preprocess', status='running', current_rule=f'rule_{count % 7}')
+                job_store.append_workflow_run_event(run_id, 'rule_started', stage_id='preprocess', rule_name='fastp')
+                count += 3
+        except Exception as exc:  # pragma: no cover - reported in the summary
+            errors.append(f'writer: {exc}')
+        finally:
+            with lock:
+                counters['writer'] += count
+            database.get_db_connection().close()
+
+    def reader(index: int) -> None:
+        count = 0
+        try:
+            while not stop.is_set():
+                job_store.get_job(job_ids[count % len(job_ids)])
+                job_store.is_cancel_requested(running_job)
+                job_store.list_jobs(project_id, limit=20)
+                count += 3
+        except Exception as exc:  # pragma: no cover - reported in the summary
+            errors.append(f'reader-{index}: {exc}')
+        finally:
+            with lock:
+                counters['reader'] += count
+
+    threads = [threading.Thread(target=writer, name='bench-writer')]
+    threads.extend(threading.Thread(target=reader, args=(i,), name=f'bench-reader-{i}') for i in range(readers))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    database.reset_connection_pool()
+
+    return {
+        'scenario': name,
+        'readers': readers,
+        'seconds': round(elapsed, 2),
+        'writer_ops_per_sec': round(counters['writer'] / elapsed, 1),
+        'reader_ops_per_sec': round(counters['reader'] / elapsed, 1),
+        'total_ops_per_sec': round((counters['writer'] + counters['reader']) / elapsed, 1),
+        'errors': errors[:5],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per scenario')
+    parser.add_argument('--jobs', type=int, default=200, help='Jobs seeded into the queue')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), action='append', help='Run only the given scenario(s)')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results')
+    args = parser.parse_args()
+
+    results = [
+        run_scenario(name, args.readers, args.duration, args.jobs)
+        for name in (args.scenario or ['legacy', 'pooled'])
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(
+            f"{result['scenario']:>7}: writer {result['writer_ops_per_sec']:>9} ops/s | "
+            f"readers {result['reader_ops_per_sec']:>9} ops/s | total {result['total_ops_per_sec']:>9} ops/s"
+            + (f" | errors: {result['errors']}" if result['errors'] else '')
+        )
+
+
+if __name__ == '__main__':
+    main()
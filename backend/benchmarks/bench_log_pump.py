@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Replay a synthetic Snakemake log through the job log pump.
+
+A child process streams a generated Snakemake-style log of the requested
+size to its stdout. The legacy line-at-a-time reader (text-mode readline,
+per-line flush and rule detection) and the block-based LogPump both copy
+it into a log file; throughput is reported in MB/s.
+
+    python benchmarks/bench_log_pump.py --size-gb 2
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.log_pump import LineFeed, LogPump, enlarge_pipe  # noqa: E402
+from app.services.workflow_runtime import RULE_LINE_MARKERS, detect_rule_name  # noqa: E402
+
+try:
+    import select
+except ImportError:  # pragma: no cover - Windows fallback
+    select = None
+
+
+GENERATOR = r'''
+import sys
+rules = ['fastp_preprocess', 'megahit', 'bowtie2_align', 'metawrap_binning', 'checkm2', 'prokka_annotation']
+lines = []
+for index in range(12000):
+    if index % 400 == 0:
+        rule = rules[(index // 400) % len(rules)]
+        lines.append(f'[Mon Oct 13 10:{index % 60:02d}:00 2025]')
+        lines.append(f'rule {rule}:')
+        lines.append(f'    input: results/{rule}/sample_{index}.fastq.gz')
+        lines.append(f'    jobid: {index}')
+    else:
+        lines.append(f'{index:>8} reads processed; 0.{index % 97:02d}% aligned; writing chunk {index * 7} of sample_{index % 13}')
+block = ('\n'.join(lines) + '\n').encode()
+remaining = int(sys.argv[1])
+out = sys.stdout.buffer
+while remaining > 0:
+    piece = block if remaining >= len(block) else block[:remaining]
+    out.write(piece)
+    remaining -= len(piece)
+out.flush()
+'''
+
+
+def _spawn(size_bytes: int, text: bool) -> subprocess.Popen:
+    kwargs = {'text': True, 'bufsize': 1} if text else {'bufsize': 0}
+    return subprocess.Popen(
+        [sys.executable, '-c', GENERATOR, str(size_bytes)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        **kwargs,
+    )
+
+
+def run_legacy(size_bytes: int, log_path: str) -> dict:
+    process = _spawn(size_bytes, text=True)
+    rules = 0
+    started = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log_file:
+        while True:
+            if select and os.name != 'nt':
+                ready, _, _ = select.select([process.stdout], [], [], 0.5)
+                if not ready:
+                    if process.poll() is not None:
+                        break
+                    continue
+            output = process.stdout.readline()
+            if output == '' and process.poll() is not None:
+                break
+            if output:
+                line = output.rstrip('\n')
+                log_file.write(line)
+                log_file.write('\n')
+                log_file.flush()
+                if detect_rule_name(line):
+                    rules += 1
+    process.wait()
+    return {'seconds': time.perf_counter() - started, 'rules': rules}
+
+
+def run_pump(size_bytes: int, log_path: str) -> dict:
+    process = _spawn(size_bytes, text=False)
+    detected = []
+
+    def consume(line: str) -> None:
+        if detect_rule_name(line):
+            detected.append(1)
+
+    started = time.perf_counter()
+    feed = LineFeed(consume, name='bench-feed')
+    with open(log_path, 'wb') as log_file:
+        fd = process.stdout.fileno()
+        enlarge_pipe(fd)
+        pump = LogPump(fd, log_file, line_sink=feed.put, line_markers=RULE_LINE_MARKERS)
+        while True:
+            if pump.pump(timeout=0.25) == 0 and (pump.eof or process.poll() is not None):
+                break
+        pump.finish()
+    feed.close()
+    process.wait()
+    return {'seconds': time.perf_counter() - started, 'rules': len(detected)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-gb', type=float, default=2.0, help='Synthetic log size in GiB')
+    parser.add_argument('--log-path', default=None, help='Where to write the copied log (default: temp file, removed afterwards)')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only measure the block-based pump')
+    args = parser.parse_args()
+
+    size_bytes = int(args.size_gb * 1024 ** 3)
+    log_path = args.log_path or str(Path(tempfile.gettempdir()) / 'appam-bench-log-pump.log')
+    modes = [('pump', run_pump)] if args.skip_legacy else [('legacy', run_legacy), ('pump', run_pump)]
+    try:
+        for name, runner in modes:
+            result = runner(size_bytes, log_path)
+            mb_per_sec = size_bytes / (1024 ** 2) / result['seconds']
+            print(f"{name:>6}: {result['seconds']:8.2f}s  {mb_per_sec:9.1f} MB/s  rules detected: {result['rules']}")
+    finally:
+        if not args.log_path and os.path.exists(log_path):
+            os.remove(log_path)
+
+
+if __name__ == '__main__':
+    main()
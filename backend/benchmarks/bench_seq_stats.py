@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Compute FASTQ statistics over a synthetic multi-GB file.
+
+Writes a synthetic FASTQ of the requested size (binned Illumina-style
+qualities, variable read lengths) and, optionally, a gzip copy. The legacy
+per-line analysis (string GC counting and a Python loop over every
+quality character) and the block-based sequence_stats engine both read it;
+throughput is reported in MB/s of uncompressed FASTQ.
+
+    python benchmarks/bench_seq_stats.py --size-gb 2 --gzip
+"""
+
+import argparse
+import gzip
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app.services.sequence_stats import fastq_stats  # noqa: E402
+
+
+def _synthetic_block(records: int = 20000, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    lines = []
+    for index in range(records):
+        length = rng.choice((100, 125, 150, 150, 150, 151))
+        sequence = ''.join(rng.choice('ACGT') for _ in range(length))
+        quality = ''.join(rng.choice('FFFF:,#') for _ in range(length))
+        lines.append(f'@SYNTH:1:FC:{index % 8}:{index}:{index * 3} 1:N:0:ACGT\n{sequence}\n+\n{quality}\n')
+    return ''.join(lines).encode('ascii')
+
+
+def write_fastq(path: str, size_bytes: int) -> int:
+    block = _synthetic_block()
+    written = 0
+    with open(path, 'wb') as handle:
+        while written + len(block) <= max(size_bytes, len(block)):
+            handle.write(block)
+            written += len(block)
+    return written
+
+
+def run_legacy(path: str) -> dict:
+    sequence_count = 0
+    total_length = 0
+    gc_count = 0
+    quality_total = 0
+    started = time.perf_counter()
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='ignore') as handle:
+        lines = []
+        for line in handle:
+            lines.append(line.strip())
+            if len(lines) == 4:
+                sequence_count += 1
+                sequence = lines[1]
+                total_length += len(sequence)
+                gc_count += sequence.upper().count('G') + sequence.upper().count('C')
+                quality_total += sum(ord(char) - 33 for char in lines[3])
+                lines = []
+    return {
+        'seconds': time.perf_counter() - started,
+        'reads': sequence_count,
+        'gc': gc_count / total_length * 100 if total_length else 0,
+        'phred': quality_total / total_length if total_length else 0,
+    }
+
+
+def run_engine(path: str) -> dict:
+    started = time.perf_counter()
+    stats = fastq_stats(path, max_bytes=0)
+    return {
+        'seconds': time.perf_counter() - started,
+        'reads': stats['sequence_count'],
+        'gc': stats['gc_content'],
+        'phred': stats['mean_quality'],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-gb', type=float, default=2.0, help='Synthetic FASTQ size in GiB')
+    parser.add_argument('--gzip', action='store_true', help='Also measure a gzip-compressed copy')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only measure the streaming engine')
+    parser.add_argument('--work-dir', default=None, help='Where to write the synthetic files (default: temp dir, removed afterwards)')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='appam-bench-seqstats-')
+    fastq_path = os.path.join(work_dir, 'synthetic.fastq')
+    try:
+        size_bytes = write_fastq(fastq_path, int(args.size_gb * 1024 ** 3))
+        inputs = [('plain', fastq_path)]
+        if args.gzip:
+            gz_path = fastq_path + '.gz'
+            with open(fastq_path, 'rb') as source, gzip.open(gz_path, 'wb', compresslevel=1) as target:
+                shutil.copyfileobj(source, target, 4 * 1024 * 1024)
+            inputs.append(('gzip', gz_path))
+
+        modes = [('engine', run_engine)] if args.skip_legacy else [('legacy', run_legacy), ('engine', run_engine)]
+        for label, path in inputs:
+            for name, runner in modes:
+                result = runner(path)
+                mb_per_sec = size_bytes / (1024 ** 2) / result['seconds']
+                print(
+                    f"{label:>5} {name:>6}: {result['seconds']:8.2f}s  {mb_per_sec:9.1f} MB/s  "
+                    f"reads: {result['reads']:,}  GC: {result['gc']:.2f}%  mean Phred: {result['phred']:.2f}"
+                )
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
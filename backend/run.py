@@ -15,6 +15,7 @@ if async_mode == 'eventlet':
 
 from app import create_app, socketio
 from app.services.job_queue import start_embedded_worker
+from app.services.download_manager import start_download_supervisor
 
 app = create_app()
 
@@ -24,6 +25,7 @@ if __name__ == '__main__':
     allow_unsafe_werkzeug = os.getenv('APPAM_ALLOW_UNSAFE_WERKZEUG', 'false').lower() in ['true', '1', 'yes']
     if not debug_mode or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
         start_embedded_worker()
+        start_download_supervisor()
     socketio.run(
         app,
         debug=debug_mode,
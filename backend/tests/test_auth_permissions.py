@@ -3,6 +3,7 @@ import os
 import shutil
 import sys
 import tempfile
+import time
 import unittest
 from pathlib import Path
 from unittest import mock
@@ -309,6 +310,18 @@ class AuthPermissionApiTests(unittest.TestCase):
             _, kwargs = enqueue_mock.call_args
             self.assertEqual(kwargs['submitted_by'], editor['id'])
 
+            # Only admins may raise a job's priority; anyone may lower it.
+            enqueue_mock.reset_mock()
+            boosted = editor_client.post(f"/api/pipeline/{project['id']}/run/demo", json={'_priority': 5})
+            self.assertEqual(boosted.status_code, 403, boosted.get_data(as_text=True))
+            enqueue_mock.assert_not_called()
+
+            lowered = editor_client.post(f"/api/pipeline/{project['id']}/run/demo", json={'_priority': -2})
+            self.assertEqual(lowered.status_code, 200, lowered.get_data(as_text=True))
+            enqueue_mock.assert_called_once()
+            _, kwargs = enqueue_mock.call_args
+            self.assertEqual(kwargs['priority'], -2)
+
         editor_job_id = 'job-submit-1'
         from app.services.job_store import create_job, list_process_history
 
@@ -426,6 +439,490 @@ class AuthPermissionApiTests(unittest.TestCase):
         self.assertIn('worker', payload['data'])
         self.assertIn('counts', payload['data'])
 
+    def test_job_log_line_queries(self):
+        from app.services.job_store import create_job, mark_job_finished
+        from app.services.log_index import open_indexed_log
+
+        self.register(self.client, 'logowner')
+        project = self.create_project(self.client, name='Log Project')
+        log_path = self.projects_dir / project['id'] / 'logs' / 'job-log-1.log'
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        create_job('job-log-1', project['id'], 'Demo', 'demo', str(log_path))
+        with open_indexed_log(log_path) as log_file:
+            log_file.write(b'[SYSTEM] Starting command: demo\nrule align:\nreads 1\nreads 2\nrule sort:\nsorted\n')
+        mark_job_finished('job-log-1', 'completed', 0, None, 1)
+
+        def query(**params):
+            response = self.client.get('/api/jobs/job-log-1/logs', query_string=params)
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+            return response.get_json()
+
+        window = query(start_line=3, count=2)
+        self.assertEqual([line['text'] for line in window['lines']], ['reads 1', 'reads 2'])
+        self.assertEqual(window['total_lines'], 6)
+        self.assertEqual([line['text'] for line in query(tail=1)['lines']], ['sorted'])
+        self.assertEqual([line['line'] for line in query(rule='align')['lines']], [2, 3, 4])
+        self.assertEqual([line['line'] for line in query(grep='^reads', regex='true')['lines']], [3, 4])
+        self.assertEqual([line['line'] for line in query(grep='reads 2')['lines']], [4])
+        self.assertEqual(query(grep='^reads')['lines'], [])
+        self.assertEqual([mark['name'] for mark in query(kind='rule')['markers']], ['align', 'sort'])
+        self.assertEqual(query(offset=0)['content'].count('\n'), 6)
+        invalid = self.client.get('/api/jobs/job-log-1/logs', query_string={'grep': '(', 'regex': 'true'})
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(query(grep='(')['lines'], [])
+        # Patterns that backtrack exponentially are refused rather than run.
+        nested = self.client.get('/api/jobs/job-log-1/logs', query_string={'grep': '(a+)+$', 'regex': 'true'})
+        self.assertEqual(nested.status_code, 400)
+
+    def test_download_zip_streams_selected_items(self):
+        import gzip
+        import io
+        import zipfile
+
+        self.register(self.client, 'zipowner')
+        project = self.create_project(self.client, name='Zip Project')
+        project_dir = self.projects_dir / project['id']
+        (project_dir / 'results' / 'empty').mkdir(parents=True)
+        (project_dir / 'results' / 'summary.txt').write_text('reads\t100\n' * 1000, encoding='utf-8')
+        (project_dir / 'results' / 'reads.fq.gz').write_bytes(gzip.compress(b'@r\nACGT\n+\nIIII\n'))
+        (project_dir / 'notes.md').write_text('# Notes\n', encoding='utf-8')
+
+        response = self.client.post(f"/api/filemanager/{project['id']}/download-zip", json={'items': ['results', 'notes.md']})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        archive = zipfile.ZipFile(io.BytesIO(response.get_data()))
+        self.assertIsNone(archive.testzip())
+        entries = {info.filename: info for info in archive.infolist()}
+        self.assertEqual(
+            sorted(entries),
+            ['notes.md', 'results/', 'results/empty/', 'results/reads.fq.gz', 'results/summary.txt'],
+        )
+        self.assertEqual(entries['results/reads.fq.gz'].compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(entries['results/summary.txt'].compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.read('notes.md'), b'# Notes\n')
+
+        form_post = self.client.post(f"/api/filemanager/{project['id']}/download-zip", data={'items': json.dumps(['notes.md'])})
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(form_post.get_data())).namelist(), ['notes.md'])
+        escape = self.client.post(f"/api/filemanager/{project['id']}/download-zip", json={'items': ['../../etc']})
+        self.assertEqual(escape.status_code, 400)
+        self.assertEqual(sorted(path.name for path in project_dir.iterdir()), ['notes.md', 'results'])
+
+    def test_file_operations_run_as_background_tasks(self):
+        import zipfile
+        from app.services import file_tasks
+
+        self.register(self.client, 'taskowner')
+        project = self.create_project(self.client, name='Task Project')
+        project_dir = self.projects_dir / project['id']
+        (project_dir / 'raw' / 'lane1').mkdir(parents=True)
+        (project_dir / 'raw' / 'lane1' / 'r1.fq').write_bytes(b'@r\nACGT\n+\nIIII\n' * 5000)
+        (project_dir / 'raw' / 'link.fq').symlink_to('lane1/r1.fq')
+        (project_dir / 'backup').mkdir()
+        base = f"/api/filemanager/{project['id']}"
+
+        def wait(task):
+            for _ in range(200):
+                task = self.client.get(f"{base}/file-tasks/{task['id']}").get_json()
+                if task['status'] not in ('queued', 'running'):
+                    return task
+                time.sleep(0.02)
+            self.fail(f'task did not finish: {task}')
+
+        response = self.client.post(f'{base}/copy', json={'items': ['raw'], 'destination': 'backup'})
+        self.assertEqual(response.status_code, 202)
+        copied = wait(response.get_json())
+        self.assertEqual(copied['status'], 'completed')
+        self.assertEqual((copied['files_done'], copied['total_files']), (2, 2))
+        self.assertEqual(copied['bytes_done'], copied['total_bytes'])
+        self.assertEqual((project_dir / 'backup' / 'raw' / 'lane1' / 'r1.fq').read_bytes(), (project_dir / 'raw' / 'lane1' / 'r1.fq').read_bytes())
+        self.assertTrue((project_dir / 'backup' / 'raw' / 'link.fq').is_symlink())
+
+        again = wait(self.client.post(f'{base}/copy', json={'items': ['raw'], 'destination': 'backup'}).get_json())
+        self.assertEqual(again['result'], {'copied_items': ['raw_copy_1']})
+        into_itself = self.client.post(f'{base}/copy', json={'items': ['raw'], 'destination': 'raw/lane1'})
+        self.assertEqual(into_itself.status_code, 400)
+
+        archived = wait(self.client.post(f'{base}/file-tasks', json={'kind': 'zip', 'items': ['raw'], 'destination': '', 'name': 'raw'}).get_json())
+        self.assertEqual(archived['result']['archive'], 'raw.zip')
+        self.assertIn('raw/lane1/r1.fq', zipfile.ZipFile(project_dir / 'raw.zip').namelist())
+
+        moved = wait(self.client.post(f'{base}/cut', json={'items': ['backup/raw_copy_1'], 'destination': ''}).get_json())
+        self.assertEqual(moved['result'], {'moved_items': ['raw_copy_1']})
+        self.assertTrue((project_dir / 'raw_copy_1' / 'lane1' / 'r1.fq').is_file())
+
+        deleted = wait(self.client.post(f'{base}/delete', json={'items': ['raw_copy_1', 'backup']}).get_json())
+        self.assertEqual(deleted['status'], 'completed')
+        self.assertEqual(sorted(path.name for path in project_dir.iterdir()), ['raw', 'raw.zip'])
+
+        # A canceled copy leaves nothing half-written behind.
+        with mock.patch.object(file_tasks, 'COPY_RANGE_BYTES', 4096), mock.patch.object(file_tasks, '_clone', return_value=False):
+            original = file_tasks._Progress.advance
+
+            def slow_advance(progress, nbytes=0, files=0):
+                time.sleep(0.01)
+                original(progress, nbytes, files)
+
+            with mock.patch.object(file_tasks._Progress, 'advance', slow_advance):
+                task = self.client.post(f'{base}/copy', json={'items': ['raw'], 'destination': ''}).get_json()
+                canceled = self.client.post(f"{base}/file-tasks/{task['id']}/cancel").get_json()
+                self.assertIn(canceled['status'], ('queued', 'running', 'canceled'))
+                self.assertEqual(wait(task)['status'], 'canceled')
+        self.assertFalse((project_dir / 'raw_copy_1').exists())
+        listing = self.client.get(f'{base}/file-tasks').get_json()['tasks']
+        self.assertEqual(listing[0]['id'], task['id'])
+
+        self.register(self.client, 'taskviewer')
+        self.assertEqual(self.client.post(f'{base}/delete', json={'items': ['raw']}).status_code, 404)
+
+    def test_file_tasks_act_on_a_selected_symlink_not_its_target(self):
+        self.register(self.client, 'linkowner')
+        project = self.create_project(self.client, name='Link Project')
+        project_dir = self.projects_dir / project['id']
+        raw = project_dir / 'raw'
+        (raw / 'lane1').mkdir(parents=True)
+        (raw / 'r1.fq').write_bytes(b'@r\nACGT\n+\nIIII\n')
+        (raw / 'lane1' / 'r2.fq').write_bytes(b'@r\nACGT\n+\nIIII\n')
+        (raw / 'link.fq').symlink_to('r1.fq')
+        (raw / 'lane_link').symlink_to('lane1')
+        (project_dir / 'backup').mkdir()
+        base = f"/api/filemanager/{project['id']}"
+
+        def run(operation, **body):
+            task = self.client.post(f'{base}/{operation}', json=body).get_json()
+            for _ in range(200):
+                task = self.client.get(f"{base}/file-tasks/{task['id']}").get_json()
+                if task['status'] not in ('queued', 'running'):
+                    self.assertEqual(task['status'], 'completed', task)
+                    return task
+                time.sleep(0.02)
+            self.fail(f'task did not finish: {task}')
+
+        copied = run('copy', items=['raw/link.fq'], destination='backup')
+        self.assertEqual(copied['result'], {'copied_items': ['link.fq']})
+        self.assertEqual(os.readlink(project_dir / 'backup' / 'link.fq'), 'r1.fq')
+
+        moved = run('cut', items=['raw/link.fq'], destination='backup')
+        self.assertEqual(moved['result'], {'moved_items': ['link_moved_1.fq']})
+        self.assertTrue((project_dir / 'backup' / 'link_moved_1.fq').is_symlink())
+        self.assertFalse(os.path.lexists(raw / 'link.fq'))
+        self.assertTrue((raw / 'r1.fq').is_file())
+
+        run('delete', items=['raw/lane_link', 'backup/link.fq'])
+        self.assertFalse(os.path.lexists(raw / 'lane_link'))
+        self.assertTrue((raw / 'lane1' / 'r2.fq').is_file())
+        self.assertTrue((raw / 'r1.fq').is_file())
+
+    def test_file_tasks_are_only_recovered_from_dead_workers_and_cancel_across_processes(self):
+        import socket
+        import subprocess
+        from app.services import file_tasks
+
+        self.register(self.client, 'recoverowner')
+        project = self.create_project(self.client, name='Recover Project')
+        host = socket.gethostname()
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        rows = {
+            'live': (f'{host}:{os.getppid()}:abcd1234', 'running', 0),
+            'dead': (f'{host}:{exited.pid}:abcd1234', 'running', 0),
+            'dead-queued': (f'{host}:{exited.pid}:abcd1234', 'queued', 0),
+            'remote-fresh': ('elsewhere:1:abcd1234', 'running', 0),
+            'remote-stale': ('elsewhere:1:abcd1234', 'running', 600),
+        }
+        conn = get_db_connection()
+        try:
+            for task_id, (worker_id, status, age) in rows.items():
+                conn.execute(
+                    '''
+                    INSERT INTO file_tasks (id, project_id, kind, status, items, worker_id, heartbeat_at)
+                    VALUES (?, ?, 'delete', ?, '[]', ?, datetime('now', ?))
+                    ''',
+                    (task_id, project['id'], status, worker_id, f'-{age} seconds'),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.assertEqual(file_tasks.recover_file_tasks(), 3)
+        statuses = {task_id: file_tasks.get_file_task(project['id'], task_id)['status'] for task_id in rows}
+        self.assertEqual(statuses, {
+            'live': 'running',
+            'dead': 'failed',
+            'dead-queued': 'failed',
+            'remote-fresh': 'running',
+            'remote-stale': 'failed',
+        })
+
+        # A cancel sent to another process reaches the task through its row.
+        project_dir = self.projects_dir / project['id']
+        (project_dir / 'raw').mkdir()
+        (project_dir / 'raw' / 'r1.fq').write_bytes(b'@r\nACGT\n+\nIIII\n' * 50000)
+        base = f"/api/filemanager/{project['id']}"
+        with mock.patch.object(file_tasks, 'COPY_RANGE_BYTES', 4096), mock.patch.object(file_tasks, '_clone', return_value=False):
+            original = file_tasks._Progress.advance
+
+            def slow_advance(progress, nbytes=0, files=0):
+                time.sleep(0.01)
+                original(progress, nbytes, files)
+
+            with mock.patch.object(file_tasks._Progress, 'advance', slow_advance):
+                task = self.client.post(f'{base}/copy', json={'items': ['raw'], 'destination': ''}).get_json()
+                for _ in range(200):
+                    if file_tasks.get_file_task(project['id'], task['id'])['status'] == 'running':
+                        break
+                    time.sleep(0.01)
+                with mock.patch.object(file_tasks, '_CANCEL_EVENTS', {}):
+                    self.client.post(f"{base}/file-tasks/{task['id']}/cancel")
+                for _ in range(300):
+                    task = file_tasks.get_file_task(project['id'], task['id'])
+                    if task['status'] not in ('queued', 'running'):
+                        break
+                    time.sleep(0.02)
+        self.assertEqual(task['status'], 'canceled')
+        self.assertFalse((project_dir / 'raw_copy_1').exists())
+
+    def test_directory_listing_pages_sorts_and_filters(self):
+        self.register(self.client, 'listowner')
+        project = self.create_project(self.client, name='Listing Project')
+        folder = self.projects_dir / project['id'] / 'mzml'
+        (folder / 'qc').mkdir(parents=True)
+        for index, size in enumerate((30, 10, 50, 20, 40)):
+            (folder / f'run{index}.mzML').write_bytes(b'x' * size)
+        (folder / 'reads.fq').write_bytes(b'@r\nA\n+\nI\n')
+        (folder / '.tmp_upload_partial.part').write_bytes(b'')
+
+        def listing(**params):
+            response = self.client.get(f"/api/filemanager/{project['id']}/list", query_string={'path': 'mzml', **params})
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+            return response.get_json()
+
+        names, cursor = [], None
+        while True:
+            page = listing(limit=3, **({'cursor': cursor} if cursor else {}))
+            self.assertLessEqual(len(page['items']), 3)
+            names += [item['name'] for item in page['items']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(names, ['qc', 'reads.fq', 'run0.mzML', 'run1.mzML', 'run2.mzML', 'run3.mzML', 'run4.mzML'])
+        self.assertEqual(page['total'], 7)
+
+        by_size = listing(sort='size', order='desc', ext='.mzml', permissions='mode')
+        self.assertEqual([item['size'] for item in by_size['items']], [50, 40, 30, 20, 10])
+        self.assertIn('writable', by_size['items'][0]['permissions'])
+        self.assertEqual([item['name'] for item in listing(type='fastq')['items']], ['reads.fq'])
+        self.assertEqual([item['name'] for item in listing(q='RUN3')['items']], ['run3.mzML'])
+
+        # A cursor names the last entry seen, so removing entries does not shift the next page.
+        first = listing(limit=3)
+        (folder / 'run0.mzML').unlink()
+        self.assertEqual([item['name'] for item in listing(limit=2, cursor=first['next_cursor'])['items']], ['run1.mzML', 'run2.mzML'])
+        invalid = self.client.get(f"/api/filemanager/{project['id']}/list", query_string={'path': 'mzml', 'cursor': 'bogus'})
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_downloads_support_ranges_and_conditional_requests(self):
+        self.register(self.client, 'rangeowner')
+        project = self.create_project(self.client, name='Range Project')
+        payload = bytes(range(256)) * 40
+        (self.projects_dir / project['id'] / 'reads.bam').write_bytes(payload)
+        url = f"/api/filemanager/{project['id']}/download"
+        query = {'path': 'reads.bam'}
+
+        full = self.client.get(url, query_string=query)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full.headers['Accept-Ranges'], 'bytes')
+        etag = full.headers['ETag']
+
+        resumed = self.client.get(url, query_string=query, headers={'Range': 'bytes=10000-', 'If-Range': etag})
+        self.assertEqual(resumed.status_code, 206)
+        self.assertEqual(resumed.get_data(), payload[10000:])
+        stale = self.client.get(url, query_string=query, headers={'Range': 'bytes=10000-', 'If-Range': '"old"'})
+        self.assertEqual((stale.status_code, len(stale.get_data())), (200, len(payload)))
+        self.assertEqual(self.client.get(url, query_string=query, headers={'If-None-Match': etag}).status_code, 304)
+
+        multi = self.client.get(url, query_string=query, headers={'Range': 'bytes=0-9,100-109,105-119,-5'})
+        self.assertEqual(multi.status_code, 206)
+        self.assertTrue(multi.mimetype.startswith('multipart/byteranges'))
+        body = multi.get_data()
+        self.assertEqual(len(body), int(multi.headers['Content-Length']))
+        boundary = multi.mimetype_params['boundary'].encode()
+        parts = [part for part in body.split(b'--' + boundary) if part.strip(b'\r\n-')]
+        ranges = [part.split(b'\r\n\r\n', 1) for part in parts]
+        self.assertEqual(
+            [(head.split(b'Content-Range: ')[1], data[:-2]) for head, data in ranges],
+            [(b'bytes 0-9/10240', payload[0:10]), (b'bytes 100-119/10240', payload[100:120]),
+             (b'bytes 10235-10239/10240', payload[-5:])],
+        )
+        unsatisfiable = self.client.get(url, query_string=query, headers={'Range': 'bytes=20000-20010,30000-'})
+        self.assertEqual(unsatisfiable.status_code, 416)
+        malformed = self.client.get(url, query_string=query, headers={'Range': 'bytes=abc'})
+        self.assertEqual((malformed.status_code, malformed.get_data()), (200, payload))
+
+        with mock.patch.dict(os.environ, {'APPAM_ACCEL_REDIRECT_PREFIX': '/_protected/projects/'}):
+            direct = self.client.get(url, query_string=query)
+            self.assertEqual(direct.get_data(), payload)
+            proxied = self.client.get(url, query_string=query, headers={'X-Sendfile-Type': 'X-Accel-Redirect'})
+        self.assertEqual(proxied.headers['X-Accel-Redirect'], f"/_protected/projects/{project['id']}/reads.bam")
+        self.assertEqual(proxied.get_data(), b'')
+
+    def test_thumbnails_are_rendered_once_and_revalidated(self):
+        from app.services import thumbnails
+
+        self.register(self.client, 'thumbowner')
+        project = self.create_project(self.client, name='Thumbnail Project')
+        plots = self.projects_dir / project['id'] / 'results' / 'plots'
+        plots.mkdir(parents=True)
+        image = plots / 'coverage.png'
+        image.write_bytes(b'png-v1')
+        url = f"/api/filemanager/{project['id']}/thumbnail"
+
+        def render(source, destination, size):
+            Path(destination).write_bytes(b'thumb:' + Path(source).read_bytes())
+
+        with mock.patch.object(thumbnails, '_render', side_effect=render) as rendered:
+            first = self.client.get(url, query_string={'path': 'results/plots/coverage.png'})
+            self.assertEqual(first.status_code, 200, first.get_data(as_text=True))
+            self.assertEqual(first.get_data(), b'thumb:png-v1')
+            etag = first.headers['ETag']
+
+            again = self.client.get(url, query_string={'path': 'results/plots/coverage.png'})
+            self.assertEqual(again.get_data(), b'thumb:png-v1')
+            revalidated = self.client.get(
+                url, query_string={'path': 'results/plots/coverage.png'}, headers={'If-None-Match': etag}
+            )
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(rendered.call_count, 1)
+
+            image.write_bytes(b'png-version-2')
+            changed = self.client.get(
+                url, query_string={'path': 'results/plots/coverage.png'}, headers={'If-None-Match': etag}
+            )
+            self.assertEqual(changed.status_code, 200)
+            self.assertEqual(changed.get_data(), b'thumb:png-version-2')
+            self.assertNotEqual(changed.headers['ETag'], etag)
+            self.assertEqual(rendered.call_count, 2)
+            self.assertEqual(len(list((self.projects_dir / project['id'] / '.thumbnails').glob('*.jpg'))), 1)
+
+            (plots / 'depth.jpg').write_bytes(b'jpg')
+            (plots / 'notes.txt').write_text('not an image')
+            self.assertEqual(thumbnails._scan(project['id'], [str(plots), '/etc']), 2)
+            for _ in range(200):
+                if not thumbnails._PENDING:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(rendered.call_count, 3)
+
+    def test_upload_sessions_accept_out_of_order_chunks_and_resume(self):
+        import io
+        import threading
+        from app.services.upload_sessions import write_upload_chunk
+
+        self.register(self.client, 'uploadowner')
+        project = self.create_project(self.client, name='Upload Project')
+        base = f"/api/filemanager/{project['id']}/upload-sessions"
+        chunk_size = 256 * 1024
+        payload = os.urandom(chunk_size * 5 + 1234)
+        chunks = [payload[start:start + chunk_size] for start in range(0, len(payload), chunk_size)]
+
+        created = self.client.post(base, json={'path': 'raw', 'filename': 'reads.fq', 'size': len(payload), 'chunk_size': chunk_size})
+        self.assertEqual(created.status_code, 201, created.get_data(as_text=True))
+        session = created.get_json()
+        self.assertEqual(session['total_chunks'], 6)
+
+        for index in (4, 1, 1):
+            response = self.client.put(f"{base}/{session['id']}/chunks/{index}", data=chunks[index])
+            self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        short = self.client.put(f"{base}/{session['id']}/chunks/0", data=chunks[0][:-1])
+        self.assertEqual(short.status_code, 400)
+
+        # A client reconnecting asks which chunks are still missing.
+        resumed = self.client.get(f"{base}/{session['id']}").get_json()
+        self.assertEqual(resumed['missing_chunks'], [0, 2, 3, 5])
+        listing = self.client.get(f"/api/filemanager/{project['id']}/list", query_string={'path': 'raw'}).get_json()
+        self.assertEqual(listing['items'], [])
+
+        threads = [
+            threading.Thread(target=write_upload_chunk, args=(project['id'], session['id'], index, io.BytesIO(chunks[index])))
+            for index in resumed['missing_chunks']
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        final = self.client.get(f"{base}/{session['id']}").get_json()
+        self.assertEqual(final['status'], 'completed')
+        target = self.projects_dir / project['id'] / 'raw'
+        self.assertEqual((target / 'reads.fq').read_bytes(), payload)
+        self.assertEqual([path.name for path in target.iterdir()], ['reads.fq'])
+
+        late = self.client.put(f"{base}/{session['id']}/chunks/0", data=chunks[0])
+        self.assertEqual(late.status_code, 400)
+
+    def test_upload_session_retries_a_failed_finalize_on_the_next_chunk(self):
+        self.register(self.client, 'finalizeowner')
+        project = self.create_project(self.client, name='Finalize Project')
+        base = f"/api/filemanager/{project['id']}/upload-sessions"
+        payload = os.urandom(1000)
+
+        session = self.client.post(base, json={'path': 'raw', 'filename': 'reads.fq', 'size': len(payload), 'chunk_size': 1024}).get_json()
+        # A directory in the way makes the final move fail.
+        blocker = self.projects_dir / project['id'] / 'raw' / 'reads.fq'
+        blocker.mkdir(parents=True)
+        (blocker / 'keep').write_text('x')
+
+        failed = self.client.put(f"{base}/{session['id']}/chunks/0", data=payload)
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(self.client.get(f"{base}/{session['id']}").get_json()['status'], 'uploading')
+
+        (blocker / 'keep').unlink()
+        blocker.rmdir()
+        retried = self.client.put(f"{base}/{session['id']}/chunks/0", data=payload)
+        self.assertEqual(retried.status_code, 200, retried.get_data(as_text=True))
+        self.assertEqual(retried.get_json()['status'], 'completed')
+        self.assertEqual(blocker.read_bytes(), payload)
+
+    def test_job_event_subscriptions_are_scoped_to_project_members(self):
+        from app import socketio
+        from app.services.job_events import publish
+
+        self.register(self.client, 'eventowner', display_name='Event Owner')
+        project = self.create_project(self.client, name='Event Project')
+        outsider_client = self.app.test_client()
+        self.logout(self.client)
+        self.register(outsider_client, 'eventoutsider')
+        self.login(self.client, 'eventowner')
+
+        member = socketio.test_client(self.app, namespace='/jobs', flask_test_client=self.client)
+        outsider = socketio.test_client(self.app, namespace='/jobs', flask_test_client=outsider_client)
+        try:
+            member.emit('subscribe', {'project_id': project['id']}, namespace='/jobs')
+            outsider.emit('subscribe', {'project_id': project['id']}, namespace='/jobs')
+            self.assertEqual([item['name'] for item in member.get_received('/jobs')], ['subscribed'])
+            self.assertEqual([item['name'] for item in outsider.get_received('/jobs')], ['job_events_error'])
+
+            publish('job_status', {'job_id': 'job-1', 'status': 'running'}, project_id=project['id'], job_id='job-1')
+            received = member.get_received('/jobs')
+            self.assertEqual([item['name'] for item in received], ['job_status'])
+            self.assertEqual(received[0]['args'][0]['status'], 'running')
+            self.assertEqual(outsider.get_received('/jobs'), [])
+        finally:
+            member.disconnect(namespace='/jobs')
+            outsider.disconnect(namespace='/jobs')
+
+    def test_job_event_connections_are_refused_when_events_are_disabled(self):
+        from app import socketio
+
+        self.register(self.client, 'eventsoff')
+        with mock.patch.dict(os.environ, {'APPAM_JOB_EVENTS': 'false'}):
+            client = socketio.test_client(self.app, namespace='/jobs', flask_test_client=self.client)
+            self.assertFalse(client.is_connected('/jobs'))
+        client = socketio.test_client(self.app, namespace='/jobs', flask_test_client=self.client)
+        try:
+            self.assertTrue(client.is_connected('/jobs'))
+        finally:
+            client.disconnect(namespace='/jobs')
+
     def test_workflow_endpoints_prepare_snakemake_jobs(self):
         owner = self.register(self.client, 'workflowowner', display_name='Workflow Owner')
         project = self.create_project(self.client, name='Workflow Project')
@@ -556,6 +1053,18 @@ class AuthPermissionApiTests(unittest.TestCase):
             self.assertTrue(workflow_runs[0]['stage_states'])
             self.assertIn('manifest.', Path(workflow_runs[0]['manifest_path']).name)
 
+            import io
+            import zipfile
+
+            bundle_response = self.client.get(
+                f"/api/pipeline/{project['id']}/workflow-runs/{smk_payload['workflow_run_id']}/provenance-bundle"
+            )
+            self.assertEqual(bundle_response.status_code, 200)
+            bundle = zipfile.ZipFile(io.BytesIO(bundle_response.get_data()))
+            self.assertIsNone(bundle.testzip())
+            self.assertIn('provenance.json', bundle.namelist())
+            self.assertIn('run/config.yaml', bundle.namelist())
+
             conn = get_db_connection()
             try:
                 conn.execute("UPDATE workflow_runs SET status = 'failed' WHERE id = ?", (smk_payload['workflow_run_id'],))
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / 'backend'
+
+TEST_TEMP_DIR = tempfile.mkdtemp(prefix='appam-db-tests-')
+os.environ.setdefault('APPAM_DB_PATH', str(Path(TEST_TEMP_DIR) / 'app_database.db'))
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import database  # noqa: E402
+from app.database import get_db_connection, init_db, reset_connection_pool  # noqa: E402
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        db_path = Path(database.DATABASE_FILE)
+        if db_path.exists():
+            db_path.unlink()
+        init_db()
+
+    def tearDown(self):
+        reset_connection_pool()
+
+    def test_connections_are_reused_within_a_thread(self):
+        first = get_db_connection()
+        first.close()
+
+        conn = get_db_connection()
+        try:
+            self.assertIs(conn, first)
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0].lower(), 'wal')
+            self.assertEqual(conn.execute('PRAGMA foreign_keys').fetchone()[0], 1)
+        finally:
+            conn.close()
+
+    def test_nested_checkouts_get_distinct_connections(self):
+        outer = get_db_connection()
+        inner = get_db_connection()
+        try:
+            self.assertIsNot(outer, inner)
+        finally:
+            inner.close()
+            outer.close()
+
+    def test_uncommitted_work_is_rolled_back_on_release(self):
+        conn = get_db_connection()
+        conn.execute("INSERT INTO projects (id, name) VALUES ('p1', 'Pending')")
+        conn.close()
+
+        conn = get_db_connection()
+        try:
+            row = conn.execute("SELECT COUNT(*) AS count FROM projects WHERE id = 'p1'").fetchone()
+            self.assertEqual(row['count'], 0)
+            self.assertFalse(conn.in_transaction)
+        finally:
+            conn.close()
+
+    def test_threads_do_not_share_connections(self):
+        main_conn = get_db_connection()
+        main_conn.close()
+        seen = []
+
+        def worker():
+            conn = get_db_connection()
+            seen.append(conn)
+            conn.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], main_conn)
+
+    def test_reset_retires_pooled_connections(self):
+        conn = get_db_connection()
+        conn.close()
+        reset_connection_pool()
+
+        fresh = get_db_connection()
+        try:
+            self.assertIsNot(fresh, conn)
+        finally:
+            fresh.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
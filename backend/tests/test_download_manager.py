@@ -0,0 +1,535 @@
+import gzip
+import hashlib
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / 'backend'
+
+TEST_TEMP_DIR = tempfile.mkdtemp(prefix='appam-download-tests-')
+os.environ.setdefault('APPAM_DB_PATH', str(Path(TEST_TEMP_DIR) / 'app_database.db'))
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import database, paths  # noqa: E402
+from app.database import get_db_connection, init_db  # noqa: E402
+from app.services import download_integrity, download_manager, download_scheduler  # noqa: E402
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Static file with ETag, Accept-Ranges and If-Range, like a typical mirror."""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, head_only):
+        server = self.server
+        if self.path != server.path:
+            body = server.sidecars.get(self.path)
+            self.send_response(200 if body is not None else 404)
+            self.send_header('Content-Length', str(len(body or b'')))
+            self.end_headers()
+            if body and not head_only:
+                self.wfile.write(body)
+            return
+        server.requests.append((self.command, self.headers.get('Range'), self.headers.get('If-Range')))
+        server.client_ports.add(self.client_address[1])
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            self._respond(head_only)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _respond(self, head_only):
+        server = self.server
+        data, etag = server.data, server.etag
+        start, stop, status = 0, len(data), 200
+        requested = self.headers.get('Range')
+        if requested and self.headers.get('If-Range') in (None, etag):
+            first, _, last = requested.split('=', 1)[1].partition('-')
+            start = int(first)
+            stop = min(len(data), int(last) + 1) if last else len(data)
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(stop - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{stop - 1}/{len(data)}')
+        self.end_headers()
+        if head_only:
+            return
+        position = start
+        try:
+            while position < stop:
+                block = data[position:min(stop, position + 16384)]
+                self.wfile.write(block)
+                position += len(block)
+                if server.delay:
+                    time.sleep(server.delay)
+                if start in server.slow_starts:
+                    time.sleep(0.01)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_HEAD(self):
+        self._send(True)
+
+    def do_GET(self):
+        self._send(False)
+
+
+class _FtpHandler(socketserver.StreamRequestHandler):
+    """Just enough of an FTP server (login, SIZE, MDTM, PASV, REST, RETR) for ranged downloads."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        self.reply('220 stand-in ready')
+        rest, listener = 0, None
+        for raw in self.rfile:
+            command, _, argument = raw.decode().strip().partition(' ')
+            command = command.upper()
+            if command in ('SIZE', 'MDTM', 'RETR') and argument != server.path and argument not in server.sidecars:
+                self.reply('550 no such file')
+            elif command == 'RETR' and argument in server.sidecars:
+                self.reply('150 opening data connection')
+                data_conn, _ = listener.accept()
+                listener.close()
+                data_conn.sendall(server.sidecars[argument])
+                data_conn.close()
+                self.reply('226 transfer complete')
+            elif command == 'USER':
+                self.reply('331 password please')
+            elif command == 'PASS':
+                with server.lock:
+                    server.logins += 1
+                self.reply('230 logged in')
+            elif command in ('TYPE', 'NOOP'):
+                self.reply('200 ok')
+            elif command == 'SIZE':
+                self.reply(f'213 {len(server.data)}')
+            elif command == 'MDTM':
+                self.reply(f'213 {server.mtime}')
+            elif command == 'PASV':
+                listener = socket.create_server(('127.0.0.1', 0))
+                port = listener.getsockname()[1]
+                self.reply(f'227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 255})')
+            elif command == 'REST':
+                rest = int(argument)
+                self.reply(f'350 restarting at {rest}')
+            elif command == 'RETR':
+                self.reply('150 opening data connection')
+                data_conn, _ = listener.accept()
+                listener.close()
+                with server.lock:
+                    server.retrievals.append(rest)
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    position = rest
+                    while position < len(server.data):
+                        data_conn.sendall(server.data[position:position + 16384])
+                        position += 16384
+                        if server.delay:
+                            time.sleep(server.delay)
+                    self.reply('226 transfer complete')
+                except OSError:
+                    self.reply('426 connection closed; transfer aborted')
+                finally:
+                    data_conn.close()
+                    with server.lock:
+                        server.active -= 1
+                rest = 0
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+class DownloadManagerTests(unittest.TestCase):
+    def setUp(self):
+        db_path = Path(database.DATABASE_FILE)
+        if db_path.exists():
+            db_path.unlink()
+        init_db()
+        patcher = mock.patch.object(paths, 'PROJECTS_ROOT', Path(tempfile.mkdtemp(prefix='projects-', dir=TEST_TEMP_DIR)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        interval = mock.patch.object(download_manager, 'PROGRESS_INTERVAL_SECONDS', 0.05)
+        interval.start()
+        self.addCleanup(interval.stop)
+        self.project_id = 'download-project'
+        conn = get_db_connection()
+        try:
+            conn.execute('INSERT INTO projects (id, name) VALUES (?, ?)', (self.project_id, 'Downloads'))
+            conn.commit()
+        finally:
+            conn.close()
+        self.project_dir = paths.get_project_dir(self.project_id)
+        (self.project_dir / 'refs').mkdir(parents=True)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _RangeHandler)
+        self.server.data = os.urandom(3 * 1024 * 1024 + 12345)
+        self.server.etag = '"v1"'
+        self.server.delay = 0
+        self.server.slow_starts = set()
+        self.server.requests = []
+        self.server.path = '/db/gtdb.tar.gz'
+        self.server.sidecars = {}
+        self.server.client_ports = set()
+        self.server.lock = threading.Lock()
+        self.server.active = self.server.peak = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}{self.server.path}'
+
+    def start_ftp_server(self):
+        server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _FtpHandler)
+        server.daemon_threads = True
+        server.data = os.urandom(3 * 1024 * 1024 + 4321)
+        server.mtime = '20240102030405'
+        server.delay = 0
+        server.lock = threading.Lock()
+        server.logins = server.active = server.peak = 0
+        server.retrievals = []
+        server.path = '/pub/reads/SRR000001.fastq.gz'
+        server.sidecars = {}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, f'ftp://127.0.0.1:{server.server_address[1]}{server.path}'
+
+    def wait_for(self, task_id, statuses=('completed', 'error'), timeout=20):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            progress = download_manager.get_download_progress(task_id, self.project_id)
+            if progress and progress['status'] in statuses:
+                return progress
+            time.sleep(0.02)
+        self.fail(f'download did not reach {statuses}: {progress}')
+
+    def segments(self, task_id):
+        conn = get_db_connection()
+        try:
+            return conn.execute(
+                'SELECT idx, start_offset, end_offset, done_bytes FROM download_segments WHERE download_id = ? ORDER BY idx',
+                (task_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def simulate_crash(self, task_id):
+        """Stop the worker thread without letting it record anything, as a killed process would."""
+        with download_manager._ACTIVE_LOCK:
+            thread = download_manager._ACTIVE_THREADS[task_id]
+            task = download_manager._ACTIVE_TASKS[task_id]
+        task.abort.set()
+        thread.join(10)
+        conn = get_db_connection()
+        try:
+            conn.execute("UPDATE downloads SET worker_id = 'otherhost:1:dead', heartbeat_at = '2000-01-01 00:00:00' WHERE id = ?", (task_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_segmented_download_is_recorded_and_completes(self):
+        task_id = download_manager.start_download(self.project_id, self.url, '', 'refs', concurrent=True)
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual(progress['filename'], 'gtdb.tar.gz')
+        self.assertEqual(progress['etag'], '"v1"')
+        self.assertEqual((self.project_dir / 'refs' / 'gtdb.tar.gz').read_bytes(), self.server.data)
+        self.assertEqual(sorted(path.name for path in (self.project_dir / 'refs').iterdir()), ['gtdb.tar.gz'])
+
+        segments = self.segments(task_id)
+        self.assertGreaterEqual(len(segments), 3)
+        self.assertEqual(sum(row['done_bytes'] for row in segments), len(self.server.data))
+        ranged = [request for request in self.server.requests if request[0] == 'GET']
+        self.assertTrue(all(rng and if_range == '"v1"' for _, rng, if_range in ranged))
+
+        self.assertEqual([item['task_id'] for item in download_manager.get_all_downloads(self.project_id)], [task_id])
+        self.assertIsNone(download_manager.get_download_progress(task_id, 'another-project'))
+        self.assertEqual(download_manager.cleanup_completed_downloads(self.project_id), 1)
+        self.assertTrue((self.project_dir / 'refs' / 'gtdb.tar.gz').exists())
+
+    def test_download_into_a_new_folder_creates_it(self):
+        task_id = download_manager.start_download(self.project_id, self.url, None, 'newdir/sub')
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual((self.project_dir / 'newdir' / 'sub' / 'gtdb.tar.gz').read_bytes(), self.server.data)
+
+        # A failure before any segment exists is recorded, not left preparing.
+        (self.project_dir / 'refs' / 'blocker').write_text('not a folder')
+        task_id = download_manager.start_download(self.project_id, self.url, None, 'refs/blocker/sub')
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'error')
+        self.assertTrue(progress['error'])
+
+    def test_idle_connections_split_a_lagging_segment_in_place(self):
+        # The connection serving the first range is throttled; the others
+        # finish early and take over halves of what it has left.
+        self.server.slow_starts = {0}
+        split = mock.patch.object(download_manager, 'MIN_SPLIT_BYTES', 128 * 1024)
+        split.start()
+        self.addCleanup(split.stop)
+        task_id = download_manager.start_download(self.project_id, self.url, 'gtdb.tar.gz', 'refs', concurrent=True)
+        part = self.project_dir / 'refs' / f'.tmp_{task_id}.part'
+        deadline = time.time() + 10
+        while time.time() < deadline and not part.exists():
+            time.sleep(0.005)
+        self.assertEqual(part.stat().st_size, len(self.server.data))
+
+        with mock.patch.object(download_manager.os, 'replace', wraps=os.replace) as replace:
+            progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual((self.project_dir / 'refs' / 'gtdb.tar.gz').read_bytes(), self.server.data)
+        self.assertEqual(replace.call_count, 1)
+
+        segments = self.segments(task_id)
+        self.assertGreater(len(segments), 3)
+        first_end = segments[0]['end_offset']
+        self.assertLess(first_end, segments[1]['start_offset'])
+        covered = sorted((row['start_offset'], row['end_offset']) for row in segments)
+        self.assertEqual(covered[0][0], 0)
+        self.assertEqual(covered[-1][1], len(self.server.data))
+        self.assertTrue(all(left[1] == right[0] for left, right in zip(covered, covered[1:])))
+        self.assertTrue(all(row['done_bytes'] == row['end_offset'] - row['start_offset'] for row in segments))
+
+    def test_connections_are_capped_pooled_and_throttled(self):
+        self.server.data = os.urandom(2 * 1024 * 1024)
+        limits = {'APPAM_DOWNLOAD_MAX_CONNECTIONS_PER_HOST': '1', 'APPAM_DOWNLOAD_MAX_BYTES_PER_SECOND': str(2 * 1024 * 1024)}
+        with mock.patch.dict(os.environ, limits), mock.patch.object(_RangeHandler, 'protocol_version', 'HTTP/1.1'):
+            started = time.monotonic()
+            task_id = download_manager.start_download(self.project_id, self.url, 'gtdb.tar.gz', 'refs', concurrent=True)
+            progress = self.wait_for(task_id)
+            elapsed = time.monotonic() - started
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual((self.project_dir / 'refs' / 'gtdb.tar.gz').read_bytes(), self.server.data)
+        self.assertEqual(len(self.segments(task_id)), 2)
+        self.assertEqual(self.server.peak, 1)
+        # HEAD and both ranges went over one kept-alive connection.
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.client_ports), 1)
+        self.assertGreater(elapsed, 0.7)
+        self.assertEqual(download_scheduler.slots.snapshot()['in_use'], 0)
+
+    def test_waiting_connections_are_granted_by_priority(self):
+        slots = download_scheduler.ConnectionSlots()
+        granted = []
+        with mock.patch.dict(os.environ, {'APPAM_DOWNLOAD_MAX_CONNECTIONS': '1'}):
+            self.assertTrue(slots.acquire('host-a'))
+
+            def waiter(name, host, priority):
+                slots.acquire(host, priority)
+                granted.append(name)
+                slots.release(host)
+
+            threads = []
+            for name, host, priority in (('low', 'host-a', 0), ('high', 'host-b', 5)):
+                threads.append(threading.Thread(target=waiter, args=(name, host, priority)))
+                threads[-1].start()
+                while slots.snapshot()['waiting'] < len(threads):
+                    time.sleep(0.005)
+            self.assertFalse(slots.try_acquire('host-c'))
+            slots.release('host-a')
+            for thread in threads:
+                thread.join(5)
+        self.assertEqual(granted, ['high', 'low'])
+        self.assertEqual(slots.snapshot(), {'in_use': 0, 'per_host': {}, 'waiting': 0})
+
+    def test_ftp_downloads_segments_in_parallel_over_reused_logins(self):
+        server, url = self.start_ftp_server()
+        server.delay = 0.001
+        with mock.patch.dict(os.environ, {'APPAM_DOWNLOAD_INITIAL_CONNECTIONS': '3'}):
+            first = download_manager.start_download(self.project_id, url, '', 'refs', concurrent=True)
+            progress = self.wait_for(first)
+            self.assertEqual(progress['status'], 'completed', progress)
+            self.assertEqual(progress['last_modified'], '20240102030405')
+            logins = server.logins
+            second = download_manager.start_download(self.project_id, url, 'copy.fastq.gz', 'refs', concurrent=True)
+            self.assertEqual(self.wait_for(second)['status'], 'completed')
+
+        for name in ('SRR000001.fastq.gz', 'copy.fastq.gz'):
+            self.assertEqual((self.project_dir / 'refs' / name).read_bytes(), server.data)
+        starts = sorted(row['start_offset'] for row in self.segments(first))
+        self.assertEqual(len(starts), 3)
+        self.assertTrue(set(starts) <= set(server.retrievals))
+        self.assertGreater(server.peak, 1)
+        # Each connection logs in once; the second download reuses them all.
+        self.assertLessEqual(logins, 3)
+        self.assertEqual(server.logins, logins)
+
+    def test_interrupted_ftp_download_resumes_with_rest(self):
+        server, url = self.start_ftp_server()
+        server.delay = 0.002
+        digest = hashlib.sha256(server.data).hexdigest()
+        server.sidecars[server.path + '.sha256'] = f'{digest}\n'.encode()
+        task_id = download_manager.start_download(self.project_id, url, 'reads.fastq.gz', 'refs', concurrent=False)
+        deadline = time.time() + 10
+        while time.time() < deadline and not any(row['done_bytes'] for row in self.segments(task_id)):
+            time.sleep(0.01)
+        self.simulate_crash(task_id)
+        recorded = self.segments(task_id)[0]['done_bytes']
+        self.assertGreater(recorded, 0)
+
+        server.delay = 0
+        server.retrievals.clear()
+        self.assertEqual(download_manager.resume_stale_downloads(), 1)
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual(server.retrievals, [recorded])
+        # The prefix fetched before the crash is hashed from the part file.
+        self.assertEqual(progress['checksum'], f'sha256:{digest}')
+        self.assertEqual((self.project_dir / 'refs' / 'reads.fastq.gz').read_bytes(), server.data)
+
+    def test_parallel_download_is_verified_against_sidecar_checksum(self):
+        digest = hashlib.md5(self.server.data).hexdigest()
+        self.server.sidecars['/db/gtdb.tar.gz.md5'] = f'{digest}  gtdb.tar.gz\n'.encode()
+        self.server.slow_starts = {0}
+        task_id = download_manager.start_download(self.project_id, self.url, '', 'refs', concurrent=True)
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual(progress['checksum'], f'md5:{digest}')
+        self.assertIsNone(progress['expected_checksum'])
+
+    def test_checksum_mismatch_fails_and_discards_the_data(self):
+        expected = 'sha256:' + '0' * 64
+        task_id = download_manager.start_download(self.project_id, self.url, '', 'refs', checksum=expected.upper().replace('SHA256:', 'sha256='))
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'error')
+        self.assertIn('Checksum mismatch', progress['error'])
+        self.assertIn(hashlib.sha256(self.server.data).hexdigest(), progress['error'])
+        self.assertEqual(progress['expected_checksum'], expected)
+        self.assertEqual(self.segments(task_id), [])
+        self.assertEqual(list((self.project_dir / 'refs').iterdir()), [])
+        with self.assertRaises(ValueError):
+            download_manager.start_download(self.project_id, self.url, '', 'refs', checksum='md5:xyz')
+
+    def test_gzip_members_are_inflated_while_downloading(self):
+        # BGZF is a series of small gzip members.
+        members = b''.join(gzip.compress(os.urandom(1024) * 60) for _ in range(40))
+        self.server.data = members
+        task_id = download_manager.start_download(self.project_id, self.url, 'reads.fastq.gz', 'refs', check_gzip=True)
+        self.assertEqual(self.wait_for(task_id)['status'], 'completed')
+
+        self.server.data = members[:-100]
+        self.server.etag = '"v2"'
+        task_id = download_manager.start_download(self.project_id, self.url, 'cut.fastq.gz', 'refs', check_gzip=True)
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'error')
+        self.assertIn('truncated', progress['error'])
+
+        corrupt = bytearray(members)
+        corrupt[len(members) // 2:len(members) // 2 + 64] = bytes(64)
+        self.server.data = bytes(corrupt)
+        self.server.etag = '"v3"'
+        task_id = download_manager.start_download(self.project_id, self.url, 'bad.fastq.gz', 'refs', check_gzip=True)
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'error')
+        self.assertIn('corrupt', progress['error'])
+        self.assertFalse((self.project_dir / 'refs' / 'bad.fastq.gz').exists())
+
+    def test_sidecar_lines_are_matched_by_file_name(self):
+        listing = 'a' * 32 + '  other.fastq.gz\n' + 'b' * 32 + ' *SRR1.fastq.gz\n'
+        self.assertEqual(download_integrity.parse_sidecar(listing, 'SRR1.fastq.gz', '.md5'), 'md5:' + 'b' * 32)
+        self.assertIsNone(download_integrity.parse_sidecar(listing, 'SRR2.fastq.gz', '.md5'))
+        self.assertEqual(download_integrity.parse_sidecar('c' * 64 + '\n', 'x.gz', '.sha256'), 'sha256:' + 'c' * 64)
+        self.assertEqual(download_integrity.parse_checksum('D' * 40), 'sha1:' + 'd' * 40)
+
+    def test_interrupted_download_resumes_from_recorded_offsets(self):
+        self.server.delay = 0.002
+        task_id = download_manager.start_download(self.project_id, self.url, 'gtdb.tar.gz', 'refs', concurrent=False)
+        deadline = time.time() + 10
+        while time.time() < deadline and not any(row['done_bytes'] for row in self.segments(task_id)):
+            time.sleep(0.01)
+        self.simulate_crash(task_id)
+        recorded = self.segments(task_id)[0]['done_bytes']
+        self.assertGreater(recorded, 0)
+        self.assertLess(recorded, len(self.server.data))
+        self.assertEqual(download_manager.get_download_progress(task_id)['status'], 'downloading')
+
+        self.server.delay = 0
+        self.server.requests.clear()
+        self.assertEqual(download_manager.resume_stale_downloads(), 1)
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual(self.server.requests[0], ('GET', f'bytes={recorded}-{len(self.server.data) - 1}', '"v1"'))
+        data = (self.project_dir / 'refs' / 'gtdb.tar.gz').read_bytes()
+        self.assertEqual(hashlib.sha256(data).hexdigest(), hashlib.sha256(self.server.data).hexdigest())
+
+    def test_resumed_download_verifies_its_prefix_before_fetching_the_rest(self):
+        self.server.delay = 0.002
+        digest = hashlib.sha256(self.server.data).hexdigest()
+        task_id = download_manager.start_download(self.project_id, self.url, 'gtdb.tar.gz', 'refs', concurrent=False, checksum=f'sha256:{digest}')
+        deadline = time.time() + 10
+        while time.time() < deadline and sum(row['done_bytes'] for row in self.segments(task_id)) < 64 * 1024:
+            time.sleep(0.01)
+        self.simulate_crash(task_id)
+        recorded = self.segments(task_id)[0]['done_bytes']
+        self.assertGreater(recorded, 16 * 1024)
+
+        self.server.delay = 0
+        started = []
+        flushes = []
+        original_http_download = download_manager.http_download
+        original_flush = download_manager.DownloadTask.flush
+
+        def http_download(task):
+            started.append((task.verifier.position, len(flushes)))
+            return original_http_download(task)
+
+        def flush(task, force=False):
+            flushes.append(task.verifier.position)
+            return original_flush(task, force)
+
+        with mock.patch.object(download_manager, 'CATCH_UP_BLOCK_BYTES', 4096), \
+                mock.patch.object(download_manager, 'http_download', http_download), \
+                mock.patch.object(download_manager.DownloadTask, 'flush', flush):
+            self.assertEqual(download_manager.resume_stale_downloads(), 1)
+            progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual(progress['checksum'], f'sha256:{digest}')
+        # The whole prefix was hashed before any request, renewing the heartbeat on the way.
+        position, catch_up_flushes = started[0]
+        self.assertEqual(position, recorded)
+        self.assertGreaterEqual(catch_up_flushes, recorded // 4096)
+
+    def test_changed_remote_file_restarts_instead_of_splicing(self):
+        self.server.delay = 0.002
+        task_id = download_manager.start_download(self.project_id, self.url, 'gtdb.tar.gz', 'refs', concurrent=False)
+        deadline = time.time() + 10
+        while time.time() < deadline and not any(row['done_bytes'] for row in self.segments(task_id)):
+            time.sleep(0.01)
+        self.assertTrue(download_manager.pause_download(task_id, self.project_id))
+        self.assertEqual(self.wait_for(task_id, ('paused',))['status'], 'paused')
+
+        self.server.delay = 0
+        self.server.data = os.urandom(1024 * 1024)
+        self.server.etag = '"v2"'
+        self.assertTrue(download_manager.resume_download(task_id, self.project_id))
+        progress = self.wait_for(task_id)
+        self.assertEqual(progress['status'], 'completed', progress)
+        self.assertEqual(progress['etag'], '"v2"')
+        self.assertEqual((self.project_dir / 'refs' / 'gtdb.tar.gz').read_bytes(), self.server.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,651 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / 'backend'
+
+TEST_TEMP_DIR = tempfile.mkdtemp(prefix='appam-execution-tests-')
+os.environ.setdefault('APPAM_DB_PATH', str(Path(TEST_TEMP_DIR) / 'app_database.db'))
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import database  # noqa: E402
+from app.database import get_db_connection, init_db  # noqa: E402
+from app.services import job_store  # noqa: E402
+from app.services.workflow_runtime import get_workflow_stage_definitions  # noqa: E402
+
+
+class JobExecutionTestCase(unittest.TestCase):
+    def setUp(self):
+        db_path = Path(database.DATABASE_FILE)
+        if db_path.exists():
+            db_path.unlink()
+        init_db()
+        self.work_dir = Path(tempfile.mkdtemp(prefix='appam-job-', dir=TEST_TEMP_DIR))
+        self.project_id = uuid.uuid4().hex
+        conn = get_db_connection()
+        try:
+            conn.execute('INSERT INTO projects (id, name) VALUES (?, ?)', (self.project_id, 'Execution'))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def create_workflow_job(self, workflow_id='appam-smk'):
+        job_id = uuid.uuid4().hex
+        run_id = uuid.uuid4().hex
+        stages = get_workflow_stage_definitions(workflow_id)
+        log_path = str(self.work_dir / f'{job_id}.log')
+        job_store.create_job(
+            job_id,
+            self.project_id,
+            'APPAM-SMK',
+            'snakemake',
+            log_path,
+            workflow_id=workflow_id,
+            workflow_run_id=run_id,
+            workflow_run_spec={
+                'id': run_id,
+                'job_id': job_id,
+                'project_id': self.project_id,
+                'workflow_id': workflow_id,
+                'tool_name': 'APPAM-SMK',
+                'stages': stages,
+            },
+        )
+        context = {'run_id': run_id, 'workflow_id': workflow_id, 'stages': stages}
+        return job_id, run_id, log_path, context
+
+
+class WorkflowProgressBufferTests(JobExecutionTestCase):
+    def test_rule_lines_are_buffered_until_stage_transition(self):
+        from app.services.job_runner import WorkflowExecutionTracker
+
+        _, run_id, _, context = self.create_workflow_job()
+        tracker = WorkflowExecutionTracker(context)
+        tracker.progress.flush_interval = 3600
+
+        tracker.handle_line('rule fastp_preprocess:')
+        initial_events = job_store.list_workflow_run_events(run_id)
+        self.assertEqual(
+            sorted(event['event_type'] for event in initial_events),
+            ['rule_started', 'stage_started'],
+        )
+
+        tracker.handle_line('rule fastqc:')
+        tracker.handle_line('rule adapter_removal:')
+        self.assertEqual(len(job_store.list_workflow_run_events(run_id)), 2)
+
+        tracker.handle_line('rule megahit:')
+        stages = {stage['stage_id']: stage for stage in job_store.list_workflow_stage_states(run_id)}
+        self.assertEqual(stages['qc-trim']['status'], 'completed')
+        self.assertEqual(stages['assembly']['status'], 'running')
+        self.assertEqual(stages['assembly']['current_rule'], 'megahit')
+        event_types = [event['event_type'] for event in job_store.list_workflow_run_events(run_id)]
+        self.assertEqual(event_types.count('rule_started'), 4)
+        self.assertIn('stage_completed', event_types)
+
+        tracker.finalize('completed')
+        run = job_store.get_workflow_run(run_id)
+        self.assertEqual(run['status'], 'completed')
+        self.assertIsNone(run['current_rule'])
+        self.assertFalse(tracker.progress.pending)
+
+    def test_size_threshold_triggers_flush(self):
+        from app.services.job_runner import WorkflowExecutionTracker
+
+        _, run_id, _, context = self.create_workflow_job()
+        tracker = WorkflowExecutionTracker(context)
+        tracker.progress.flush_interval = 3600
+        tracker.progress.batch_size = 4
+
+        tracker.handle_line('rule fastp_preprocess:')
+        for _ in range(4):
+            tracker.handle_line('rule fastqc:')
+        self.assertFalse(tracker.progress.pending)
+        self.assertEqual(len(job_store.list_workflow_run_events(run_id)), 6)
+
+
+class LogPumpRunnerTests(JobExecutionTestCase):
+    def test_runner_pumps_output_and_tracks_rules(self):
+        from app.services.job_runner import run_pipeline_job
+
+        job_id, run_id, log_path, context = self.create_workflow_job()
+        script = (
+            "import sys\n"
+            "for i in range(20000):\n"
+            "    sys.stdout.write(f'progress line {i}\\n')\n"
+            "    if i == 10:\n"
+            "        sys.stdout.write('rule fastp_preprocess:\\n')\n"
+            "    if i == 15000:\n"
+            "        sys.stdout.write('rule megahit:\\n')\n"
+            "sys.stdout.write('tail without newline')\n"
+        )
+        result = run_pipeline_job(
+            job_id,
+            self.project_id,
+            'APPAM-SMK',
+            'snakemake',
+            log_path,
+            command_spec={
+                'argv': [sys.executable, '-c', script],
+                'cwd': str(self.work_dir),
+                'workflow_context': context,
+            },
+        )
+
+        self.assertEqual(result['status'], 'completed')
+        log_text = Path(log_path).read_text(encoding='utf-8')
+        self.assertIn('progress line 19999\n', log_text)
+        self.assertIn('tail without newline\n[SYSTEM] Task', log_text)
+        stages = {stage['stage_id']: stage for stage in job_store.list_workflow_stage_states(run_id)}
+        self.assertEqual(stages['qc-trim']['status'], 'completed')
+        self.assertEqual(stages['assembly']['status'], 'completed')
+        self.assertEqual(job_store.get_job(job_id)['status'], 'completed')
+
+    def test_cancellation_is_detected_by_monitor(self):
+        from app.services.job_runner import run_pipeline_job
+
+        job_id, _, log_path, _ = self.create_workflow_job()
+        timer = threading.Timer(0.5, job_store.request_cancel, args=(job_id,))
+        timer.start()
+        try:
+            with mock.patch.dict(os.environ, {'APPAM_JOB_CANCEL_POLL_SECONDS': '0.1'}):
+                result = run_pipeline_job(
+                    job_id,
+                    self.project_id,
+                    'APPAM-SMK',
+                    'sleep',
+                    log_path,
+                    command_spec={
+                        'argv': [sys.executable, '-c', 'import time; time.sleep(30)'],
+                        'cwd': str(self.work_dir),
+                    },
+                )
+        finally:
+            timer.cancel()
+
+        self.assertEqual(result['status'], 'canceled')
+        self.assertIn('Cancellation requested', Path(log_path).read_text(encoding='utf-8'))
+        self.assertEqual(job_store.get_job(job_id)['status'], 'canceled')
+
+
+class WorkerDoorbellTests(JobExecutionTestCase):
+    def test_ring_wakes_bound_doorbell_and_prunes_dead_sockets(self):
+        import socket
+
+        from app.services.worker_doorbell import WorkerDoorbell, ring_doorbells
+
+        directory = self.work_dir / 'doorbell'
+        doorbell = WorkerDoorbell(directory)
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead_path = directory / 'w-dead.sock'
+        dead.bind(str(dead_path))
+        dead.close()
+        try:
+            self.assertFalse(doorbell.wait(timeout=0.05))
+            self.assertEqual(ring_doorbells(directory), 1)
+            self.assertFalse(dead_path.exists())
+            self.assertTrue(doorbell.wait(timeout=1))
+            self.assertFalse(doorbell.wait(timeout=0.05))
+        finally:
+            doorbell.close()
+        self.assertFalse(doorbell.path.exists())
+
+    def test_idle_worker_is_woken_by_enqueue(self):
+        from app.services import local_executor
+
+        stop = threading.Event()
+        env = {
+            'APPAM_WORKER_DOORBELL_DIR': str(self.work_dir / 'doorbell'),
+            'APPAM_WORKER_IDLE_RECHECK_INTERVAL': '60',
+        }
+        with mock.patch.dict(os.environ, env):
+            worker = threading.Thread(target=local_executor.run_worker_forever, args=(stop,), daemon=True)
+            worker.start()
+            try:
+                deadline = time.monotonic() + 5
+                while local_executor._WORKER_DOORBELL is None and time.monotonic() < deadline:
+                    time.sleep(0.02)
+                self.assertEqual(local_executor._WORKER_STATE['wakeup_mode'], 'doorbell')
+                time.sleep(0.2)
+
+                job_id = uuid.uuid4().hex
+                job_store.create_job(
+                    job_id,
+                    self.project_id,
+                    'echo',
+                    'echo ready',
+                    str(self.work_dir / f'{job_id}.log'),
+                    command_spec={'argv': [sys.executable, '-c', 'print("ready")'], 'cwd': str(self.work_dir)},
+                )
+                local_executor.notify_new_job()
+
+                deadline = time.monotonic() + 10
+                while time.monotonic() < deadline:
+                    if job_store.get_job(job_id)['status'] == 'completed':
+                        break
+                    time.sleep(0.05)
+                self.assertEqual(job_store.get_job(job_id)['status'], 'completed')
+            finally:
+                stop.set()
+                if local_executor._WORKER_DOORBELL:
+                    local_executor._WORKER_DOORBELL.wake()
+                worker.join(timeout=5)
+        self.assertFalse(worker.is_alive())
+
+    def test_stopping_the_worker_waits_for_running_jobs(self):
+        from app.services import local_executor
+
+        job_id = uuid.uuid4().hex
+        job_store.create_job(
+            job_id,
+            self.project_id,
+            'sleep',
+            'sleep',
+            str(self.work_dir / f'{job_id}.log'),
+            command_spec={'argv': [sys.executable, '-c', 'import time; time.sleep(1)'], 'cwd': str(self.work_dir)},
+        )
+        stop = threading.Event()
+        with mock.patch.dict(os.environ, {'APPAM_WORKER_DOORBELL_DIR': str(self.work_dir / 'doorbell')}):
+            worker = threading.Thread(target=local_executor.run_worker_forever, args=(stop,), daemon=True)
+            worker.start()
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and job_store.get_job(job_id)['status'] != 'running':
+                time.sleep(0.02)
+            self.assertEqual(job_store.get_job(job_id)['status'], 'running')
+
+            stop.set()
+            local_executor._WORKER_WAKE.set()
+            if local_executor._WORKER_DOORBELL:
+                local_executor._WORKER_DOORBELL.wake()
+            worker.join(timeout=10)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(job_store.get_job(job_id)['status'], 'completed')
+
+
+class JobEventTests(JobExecutionTestCase):
+    def setUp(self):
+        super().setUp()
+        from app.services import job_events
+
+        previous = (job_events._LOCAL_SINK, job_events._LISTENER_PATH)
+        self.addCleanup(job_events.set_local_sink, previous[0], listener_path=previous[1])
+        self.events = []
+        job_events.set_local_sink(lambda event, payload, rooms: self.events.append((event, payload, rooms)))
+
+    def test_runner_pushes_status_progress_and_contiguous_log_chunks(self):
+        from app.services.job_runner import run_pipeline_job
+
+        job_id, run_id, log_path, context = self.create_workflow_job()
+        script = (
+            "import sys\n"
+            "for i in range(500):\n"
+            "    sys.stdout.write(f'progress line {i}\\n')\n"
+            "    if i == 10:\n"
+            "        sys.stdout.write('rule fastp_preprocess:\\n')\n"
+        )
+        with mock.patch.dict(os.environ, {'APPAM_EVENT_BUS_DIR': str(self.work_dir / 'events')}):
+            result = run_pipeline_job(
+                job_id,
+                self.project_id,
+                'APPAM-SMK',
+                'snakemake',
+                log_path,
+                command_spec={
+                    'argv': [sys.executable, '-c', script],
+                    'cwd': str(self.work_dir),
+                    'workflow_context': context,
+                },
+            )
+        self.assertEqual(result['status'], 'completed')
+
+        statuses = [payload['status'] for event, payload, _ in self.events if event == 'job_status']
+        self.assertEqual(statuses[0], 'queued')
+        self.assertIn('running', statuses)
+        self.assertEqual(statuses[-1], 'completed')
+
+        progress = [payload for event, payload, _ in self.events if event == 'workflow_progress']
+        self.assertTrue(any(item.get('current_rule') == 'fastp_preprocess' for item in progress))
+        self.assertEqual(progress[-1]['run_id'], run_id)
+        self.assertEqual(progress[-1]['status'], 'completed')
+
+        chunks = [payload for event, payload, _ in self.events if event == 'job_log']
+        self.assertTrue(chunks)
+        rooms = {tuple(rooms) for event, _, rooms in self.events if event == 'job_log'}
+        self.assertEqual(rooms, {(f'project:{self.project_id}', f'job:{job_id}')})
+        # Each chunk starts where the previous one ended, so the pushed
+        # content reassembles into the log the runner wrote.
+        for previous, current in zip(chunks, chunks[1:]):
+            self.assertEqual(current['offset'], previous['next_offset'])
+        start = chunks[0]['offset']
+        pushed = ''.join(chunk['content'] for chunk in chunks)
+        self.assertEqual(pushed, Path(log_path).read_text(encoding='utf-8')[start:start + len(pushed)])
+        self.assertIn('progress line 499\n', pushed)
+
+    def test_events_from_other_processes_reach_the_bus_listener(self):
+        import subprocess
+
+        from app.services.job_events import EventBusListener
+
+        received = []
+        directory = self.work_dir / 'events'
+        listener = EventBusListener(lambda event, payload, rooms: received.append((event, payload, rooms)), directory)
+        try:
+            script = (
+                "from app.services.job_events import publish\n"
+                "publish('job_status', {'job_id': 'job-1', 'status': 'running'}, project_id='p1', job_id='job-1')\n"
+            )
+            env = dict(os.environ, APPAM_EVENT_BUS_DIR=str(directory), PYTHONPATH=str(BACKEND_DIR))
+            subprocess.run([sys.executable, '-c', script], env=env, check=True, timeout=30)
+
+            deadline = time.monotonic() + 5
+            while not received and time.monotonic() < deadline:
+                listener.poll(timeout=0.2)
+        finally:
+            listener.close()
+
+        self.assertEqual(received, [('job_status', {'job_id': 'job-1', 'status': 'running'}, ['project:p1', 'job:job-1'])])
+        self.assertFalse(listener.path.exists())
+
+
+class LogIndexTests(JobExecutionTestCase):
+    def write_log(self, log_path, total=20000, chunk_size=777):
+        from app.services.log_index import open_indexed_log
+
+        lines = []
+        for number in range(1, total + 1):
+            if number % 5000 == 1:
+                lines.append(f'rule step_{number // 5000}:')
+            elif number % 4000 == 0:
+                lines.append(f'[SYSTEM] checkpoint {number}')
+            else:
+                lines.append(f'progress line {number}')
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with open_indexed_log(log_path) as log_file:
+            # Odd-sized writes split lines and markers across chunk boundaries.
+            for start in range(0, len(data), chunk_size):
+                log_file.write(data[start:start + chunk_size])
+                log_file.flush()
+        return lines
+
+    def test_line_queries_match_the_written_log(self):
+        from app.services.log_index import LogIndex, index_paths
+
+        log_path = self.work_dir / 'job.log'
+        with mock.patch.dict(os.environ, {'APPAM_LOG_INDEX_SPAN_BYTES': '4096'}):
+            lines = self.write_log(log_path)
+        # Line-range and tail queries never parse the marks sidecar.
+        with mock.patch('app.services.log_index.json.loads', side_effect=AssertionError('marks were read')):
+            index = LogIndex.load(log_path)
+
+            self.assertGreater(len(index.checkpoints), 50)
+            self.assertEqual(index.total_lines, len(lines))
+            window = index.read_lines(12345, 3)
+            self.assertEqual([item['text'] for item in window['lines']], lines[12344:12347])
+            self.assertEqual(window['lines'][0]['line'], 12345)
+            self.assertEqual(window['next_line'], 12348)
+            self.assertEqual([item['text'] for item in index.tail(2)['lines']], lines[-2:])
+
+        rules = index.list_marks(kind='rule')
+        self.assertEqual([mark['name'] for mark in rules], ['step_0', 'step_1', 'step_2', 'step_3'])
+        self.assertEqual(rules[1]['line'], 5001)
+        system = index.list_marks(kind='system')
+        self.assertEqual([mark['text'] for mark in system], [f'[SYSTEM] checkpoint {n}' for n in range(4000, 20001, 4000)])
+
+        with mock.patch.dict(os.environ, {'APPAM_LOG_QUERY_MAX_LINES': '10000'}):
+            section = index.rule_lines('step_1', limit=10000)
+        self.assertEqual(section['sections'], [{'name': 'step_1', 'start_line': 5001, 'end_line': 10000}])
+        self.assertEqual([item['text'] for item in section['lines']], lines[5000:10000])
+        self.assertTrue(index.rule_lines('step_1', limit=10)['truncated'])
+
+        found = index.grep(r'line 1999[0-9]$', limit=3, regex=True)
+        self.assertEqual([item['line'] for item in found['lines']], [19990, 19991, 19992])
+        self.assertEqual(found['next_line'], 19993)
+        scoped = index.grep('checkpoint', rule='step_1')
+        self.assertEqual([item['line'] for item in scoped['lines']], [8000])
+        self.assertEqual(index.grep('line 1999[0-9]$')['lines'], [])
+        for pattern in ('(a+)+$', '(a|aa)*b', '(x(y*))+', r'(a)\1', 'a' * 201):
+            with self.assertRaises(ValueError):
+                index.grep(pattern, regex=True)
+        self.assertEqual(len(index.grep(r'(step_\d+)? line 1999\d', regex=True, limit=5)['lines']), 5)
+
+        # A log written before indexing existed is indexed once and persisted.
+        for sidecar in index_paths(log_path):
+            sidecar.unlink()
+        rebuilt = LogIndex.load(log_path, persist=True)
+        self.assertEqual(rebuilt.read_lines(12345, 3), window)
+        self.assertTrue(all(sidecar.exists() for sidecar in index_paths(log_path)))
+
+    def test_reopened_log_continues_the_index(self):
+        from app.services.log_index import LogIndex, open_indexed_log
+
+        log_path = self.work_dir / 'job.log'
+        with mock.patch.dict(os.environ, {'APPAM_LOG_INDEX_SPAN_BYTES': '4096'}):
+            lines = self.write_log(log_path, total=3000)
+            with open_indexed_log(log_path) as log_file:
+                log_file.write(b'partial ')
+                log_file.flush()
+            with open_indexed_log(log_path) as log_file:
+                log_file.write(b'line\nrule late_rule:\n')
+
+        index = LogIndex.load(log_path)
+        self.assertEqual(index.total_lines, len(lines) + 2)
+        self.assertEqual([item['text'] for item in index.tail(2)['lines']], ['partial line', 'rule late_rule:'])
+        self.assertEqual(index.list_marks(kind='rule', name='late_rule')[0]['line'], len(lines) + 2)
+
+
+class ResourceSlotTests(JobExecutionTestCase):
+    def create_command_job(self, cpus=1, mem_mb=0, seconds=0.0):
+        job_id = uuid.uuid4().hex
+        job_store.create_job(
+            job_id,
+            self.project_id,
+            'sleep',
+            'sleep',
+            str(self.work_dir / f'{job_id}.log'),
+            command_spec={
+                'argv': [sys.executable, '-c', f'import time; time.sleep({seconds})'],
+                'cwd': str(self.work_dir),
+            },
+            resources={'cpus': cpus, 'mem_mb': mem_mb},
+        )
+        return job_id
+
+    def test_claim_skips_jobs_that_do_not_fit(self):
+        large_id = self.create_command_job(cpus=48, mem_mb=1024)
+        small_id = self.create_command_job(cpus=2)
+        conn = get_db_connection()
+        try:
+            conn.execute("UPDATE jobs SET created_at = datetime('now', '-1 hour') WHERE id = ?", (large_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        capacity = {'cpus_total': 96, 'cpus_free': 8, 'mem_mb_total': 4096, 'mem_mb_free': 4096}
+
+        claimed = job_store.claim_next_job('worker', capacity=capacity)
+        self.assertEqual(claimed['id'], small_id)
+        self.assertEqual(job_store.get_job(large_id)['status'], 'queued')
+
+        # Once the large job has waited past the reservation window nothing
+        # else may jump ahead of it.
+        self.create_command_job(cpus=1)
+        reserved = dict(capacity, reserve_after_seconds=0)
+        self.assertIsNone(job_store.claim_next_job('worker', capacity=reserved))
+
+        # Requests above the whole budget are clamped so they can run alone.
+        full = {'cpus_total': 16, 'cpus_free': 16, 'mem_mb_total': 0}
+        self.assertEqual(job_store.claim_next_job('worker', capacity=full)['id'], large_id)
+
+    def test_worker_runs_jobs_concurrently_within_budget(self):
+        from app.services import local_executor
+
+        env = {
+            'APPAM_WORKER_SLOTS': '3',
+            'APPAM_WORKER_CPU_BUDGET': '4',
+            'APPAM_WORKER_MEMORY_BUDGET_MB': '0',
+        }
+        with mock.patch.dict(os.environ, env):
+            first = self.create_command_job(cpus=2, seconds=1.5)
+            second = self.create_command_job(cpus=2, seconds=1.5)
+            self.assertTrue(local_executor.dispatch_once('test-worker'))
+            self.assertTrue(local_executor.dispatch_once('test-worker'))
+
+            third = self.create_command_job(cpus=1, seconds=0)
+            # The CPU budget is used up, so the third job waits despite a free slot.
+            self.assertFalse(local_executor.dispatch_once('test-worker'))
+
+            status = local_executor.get_worker_status()
+            busy = [slot for slot in status['slots'] if slot['state'] == 'busy']
+            self.assertEqual(sorted(slot['job_id'] for slot in busy), sorted([first, second]))
+            self.assertEqual(status['capacity']['cpus_free'], 0)
+            self.assertEqual(len(status['slots']), 3)
+
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not local_executor.dispatch_once('test-worker'):
+                time.sleep(0.05)
+            while time.monotonic() < deadline and job_store.get_job(third)['status'] != 'completed':
+                time.sleep(0.05)
+
+        self.assertEqual(job_store.get_job(third)['status'], 'completed')
+        for job_id in (first, second):
+            self.assertEqual(job_store.get_job(job_id)['status'], 'completed')
+
+
+class SchedulerTests(JobExecutionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_project_id = uuid.uuid4().hex
+        conn = get_db_connection()
+        try:
+            conn.execute('INSERT INTO projects (id, name) VALUES (?, ?)', (self.other_project_id, 'Other'))
+            for user_id in ('alice', 'bob'):
+                conn.execute(
+                    'INSERT INTO users (id, username, password_hash) VALUES (?, ?, ?)',
+                    (user_id, user_id, 'x'),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def enqueue(self, name, project_id=None, submitted_by='alice', **kwargs):
+        job_store.create_job(
+            name,
+            project_id or self.project_id,
+            name,
+            name,
+            str(self.work_dir / f'{name}.log'),
+            submitted_by=submitted_by,
+            **kwargs,
+        )
+        return name
+
+    def claim_order(self):
+        order = []
+        while True:
+            job = job_store.claim_next_job('worker')
+            if not job:
+                return order
+            order.append(job['id'])
+
+    def test_fair_share_interleaves_users_and_projects(self):
+        for index in range(3):
+            self.enqueue(f'alice-{index}')
+        self.enqueue('bob-0', project_id=self.other_project_id, submitted_by='bob')
+
+        self.assertEqual(self.claim_order(), ['alice-0', 'bob-0', 'alice-1', 'alice-2'])
+
+    def test_share_weight_scales_a_users_turns(self):
+        from app.services.job_scheduler import set_share_weight
+
+        set_share_weight('user', 'alice', 2)
+        set_share_weight('project', self.project_id, 2)
+        for index in range(4):
+            self.enqueue(f'alice-{index}')
+        for index in range(2):
+            self.enqueue(f'bob-{index}', project_id=self.other_project_id, submitted_by='bob')
+
+        self.assertEqual(
+            self.claim_order(),
+            ['alice-0', 'bob-0', 'alice-1', 'alice-2', 'bob-1', 'alice-3'],
+        )
+
+    def test_lanes_and_priority_drive_claims_and_queue_positions(self):
+        from app.services.job_queue import get_queue_position
+
+        self.enqueue('normal')
+        self.enqueue('urgent', priority=5)
+        self.enqueue('dry-run', is_dry_run=True)
+        self.enqueue('background', priority=-5)
+
+        expected = ['dry-run', 'urgent', 'normal', 'background']
+        self.assertEqual([get_queue_position(job_id) for job_id in expected], [1, 2, 3, 4])
+        self.assertEqual(job_store.get_job('normal')['queue_position'], 3)
+        self.assertEqual(self.claim_order(), expected)
+        self.assertIsNone(get_queue_position('normal'))
+
+    def test_listing_attaches_queue_positions_with_one_query(self):
+        for index in range(6):
+            self.enqueue(f'job-{index}', priority=index % 3)
+
+        with mock.patch.object(job_store, 'get_queue_positions', wraps=job_store.get_queue_positions) as positions:
+            jobs = job_store.list_jobs(self.project_id, limit=50)
+        positions.assert_called_once()
+        ranked = sorted(jobs, key=lambda job: job['queue_position'])
+        self.assertEqual(
+            [job['id'] for job in ranked],
+            ['job-2', 'job-5', 'job-1', 'job-4', 'job-0', 'job-3'],
+        )
+
+
+class FailureClassificationTests(JobExecutionTestCase):
+    def create_logged_job(self, text):
+        job_id = uuid.uuid4().hex
+        log_path = self.work_dir / f'{job_id}.log'
+        log_path.write_text(text, encoding='utf-8')
+        job_store.create_job(job_id, self.project_id, 'tool', 'tool', str(log_path))
+        job_store.update_job(job_id, status='running')
+        return job_id, log_path
+
+    def test_finished_jobs_are_listed_without_reading_logs(self):
+        from app.services import execution_insights
+
+        job_id, _ = self.create_logged_job('step 3\nERROR: out of memory\n')
+        job_store.mark_job_finished(job_id, 'failed', 137, None, 1.0)
+
+        with mock.patch.object(execution_insights, '_read_log_tail', side_effect=AssertionError('log read')):
+            jobs = job_store.list_jobs(self.project_id)
+        self.assertEqual(jobs[0]['failure_category'], 'resource_limit')
+        self.assertEqual(jobs[0]['failure_label'], 'Resource limit')
+
+    def test_running_job_classification_is_memoized_on_log_changes(self):
+        from app.services import execution_insights
+
+        job_id, log_path = self.create_logged_job('starting\n')
+        reads = []
+        original = execution_insights._read_log_tail
+
+        def counting_read(path, *args, **kwargs):
+            reads.append(path)
+            return original(path, *args, **kwargs)
+
+        with mock.patch.object(execution_insights, '_read_log_tail', side_effect=counting_read):
+            job_store.get_job(job_id)
+            job_store.get_job(job_id)
+            self.assertEqual(len(reads), 1)
+
+            with log_path.open('a', encoding='utf-8') as handle:
+                handle.write('Permission denied\n')
+            self.assertEqual(job_store.get_job(job_id)['failure_category'], 'permissions')
+            self.assertEqual(len(reads), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
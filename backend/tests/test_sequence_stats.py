@@ -0,0 +1,407 @@
+import gzip
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import unittest
+import zlib
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+BACKEND_DIR = REPO_ROOT / 'backend'
+
+TEST_TEMP_DIR = tempfile.mkdtemp(prefix='appam-seqstats-tests-')
+os.environ.setdefault('APPAM_DB_PATH', str(Path(TEST_TEMP_DIR) / 'app_database.db'))
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from app import database, paths  # noqa: E402
+from app.database import get_db_connection, init_db  # noqa: E402
+from app.services import file_metadata, indexed_files, sequence_stats  # noqa: E402
+from app.services.sequence_stats import fasta_stats, fastq_stats  # noqa: E402
+
+
+def _bgzf_block(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    block_size = 18 + len(payload) + 8 - 1
+    header = b'\x1f\x8b\x08\x04' + bytes(4) + b'\x00\xff' + struct.pack('<H2sHH', 6, b'BC', 2, block_size)
+    return header + payload + struct.pack('<II', zlib.crc32(data), len(data))
+
+
+def _reg2bin(begin, end):
+    end -= 1
+    for shift, first_bin in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if begin >> shift == end >> shift:
+            return first_bin + (begin >> shift)
+    return 0
+
+
+def _write_indexed_vcf(path, header, records):
+    """bgzip + tabix by hand: one BGZF block per record so every record has its own virtual offset."""
+    names, bins = [], {}
+    with open(path, 'wb') as handle:
+        handle.write(_bgzf_block(header.encode()))
+        for contig, position, ref in records:
+            if contig not in names:
+                names.append(contig)
+                bins[contig] = {}
+            offset = handle.tell() << 16
+            handle.write(_bgzf_block(f'{contig}\t{position}\t.\t{ref}\tT\t50\tPASS\t.\n'.encode()))
+            bin_id = _reg2bin(position - 1, position - 1 + len(ref))
+            bins[contig].setdefault(bin_id, []).append((offset, handle.tell() << 16))
+        handle.write(_bgzf_block(b''))
+    names_blob = b''.join(name.encode() + b'\0' for name in names)
+    index = b'TBI\x01' + struct.pack('<8i', len(names), 2, 1, 2, 0, ord('#'), 0, len(names_blob)) + names_blob
+    for contig in names:
+        contig_bins = dict(bins[contig])
+        count = sum(len(chunks) for chunks in contig_bins.values())
+        contig_bins[37450] = [(0, 0), (count, 0)]
+        index += struct.pack('<i', len(contig_bins))
+        for bin_id, chunks in contig_bins.items():
+            index += struct.pack('<Ii', bin_id, len(chunks)) + b''.join(struct.pack('<QQ', *chunk) for chunk in chunks)
+        index += struct.pack('<i', 0)
+    Path(f'{path}.tbi').write_bytes(gzip.compress(index))
+
+
+def _gc(sequence):
+    return sequence.count('G') + sequence.count('C')
+
+
+class SequenceStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp(prefix='case-', dir=TEST_TEMP_DIR))
+        # Smallest block size, so records and contigs straddle block boundaries.
+        patcher = mock.patch.dict(os.environ, {'APPAM_SEQ_STATS_BLOCK_BYTES': '65536'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        rng = random.Random(11)
+        self.reads = []
+        for _ in range(4000):
+            length = rng.randint(35, 151)
+            self.reads.append((
+                ''.join(rng.choice('ACGTN') for _ in range(length)),
+                ''.join(rng.choice('#,:F?I') for _ in range(length)),
+            ))
+
+    def fastq_text(self, newline='\n'):
+        return ''.join(
+            f'@read{index}{newline}{sequence}{newline}+{newline}{quality}{newline}'
+            for index, (sequence, quality) in enumerate(self.reads)
+        )
+
+    def test_fastq_plain_gzip_and_bgzf_agree_with_per_read_counts(self):
+        text = self.fastq_text()
+        plain = self.work_dir / 'reads.fastq'
+        plain.write_text(text)
+        gzipped = self.work_dir / 'reads.fastq.gz'
+        with gzip.open(gzipped, 'wt') as handle:
+            handle.write(text)
+        # BGZF-style: the same data as a series of independent gzip members.
+        members = self.work_dir / 'reads.fq.bgz'
+        members.write_bytes(b''.join(gzip.compress(text[start:start + 50000].encode()) for start in range(0, len(text), 50000)))
+        crlf = self.work_dir / 'reads_crlf.fastq'
+        crlf.write_bytes(self.fastq_text('\r\n').encode())
+
+        bases = sum(len(sequence) for sequence, _ in self.reads)
+        expected = {
+            'sequence_count': len(self.reads),
+            'total_bases': bases,
+            'gc_content': round(sum(_gc(sequence) for sequence, _ in self.reads) / bases * 100, 2),
+            'mean_quality': round(sum(ord(char) - 33 for _, quality in self.reads for char in quality) / bases, 2),
+            'min_length': min(len(sequence) for sequence, _ in self.reads),
+            'max_length': max(len(sequence) for sequence, _ in self.reads),
+            'complete': True,
+        }
+        for path, compressed in ((plain, False), (gzipped, True), (members, True), (crlf, False)):
+            stats = fastq_stats(str(path))
+            self.assertEqual({key: stats[key] for key in expected}, expected, path.name)
+            self.assertEqual(stats['compressed'], compressed)
+            self.assertEqual(sum(bucket['count'] for bucket in stats['length_histogram']), len(self.reads))
+            self.assertLessEqual(len(stats['length_histogram']), sequence_stats.HISTOGRAM_BINS)
+
+    def test_fasta_handles_wrapped_and_unwrapped_sequences(self):
+        rng = random.Random(5)
+        sequences = [''.join(rng.choice('ACGT') for _ in range(200000))]
+        sequences += [''.join(rng.choice('ACGTacgt') for _ in range(rng.randint(1, 900))) for _ in range(300)]
+        blocks = []
+        for index, sequence in enumerate(sequences):
+            body = sequence if index % 2 == 0 else '\n'.join(sequence[pos:pos + 60] for pos in range(0, len(sequence), 60))
+            blocks.append(f'>contig_{index} length={len(sequence)}\n{body}\n')
+        path = self.work_dir / 'contigs.fa'
+        path.write_text(''.join(blocks))
+
+        stats = fasta_stats(str(path))
+        bases = sum(map(len, sequences))
+        self.assertEqual(stats['sequence_count'], len(sequences))
+        self.assertEqual(stats['total_bases'], bases)
+        self.assertEqual(stats['gc_content'], round(sum(_gc(sequence.upper()) for sequence in sequences) / bases * 100, 2))
+        self.assertEqual(stats['max_length'], 200000)
+        self.assertEqual(stats['n50'], 200000)
+
+    def test_scan_budget_reports_an_estimate(self):
+        path = self.work_dir / 'reads.fastq'
+        path.write_text(self.fastq_text())
+
+        stats = fastq_stats(str(path), max_bytes=65536)
+        self.assertFalse(stats['complete'])
+        self.assertLess(stats['sequence_count'], len(self.reads))
+        self.assertAlmostEqual(stats['estimated_sequence_count'], len(self.reads), delta=len(self.reads) * 0.1)
+
+    def test_bio_preview_reads_compressed_fastq(self):
+        from app.services.file_manager import analyze_bio_file
+
+        path = self.work_dir / 'reads.fq.gz'
+        with gzip.open(path, 'wt') as handle:
+            handle.write(self.fastq_text())
+
+        preview = analyze_bio_file(str(path), '.fq', path.stat().st_size)
+        self.assertEqual(preview['bio_analysis']['sequence_count'], len(self.reads))
+        self.assertEqual(preview['bio_analysis']['sequence_type'], 'FASTQ')
+        self.assertTrue(preview['content'].startswith('@read0\n'))
+
+
+class FileMetadataCacheTests(unittest.TestCase):
+    def setUp(self):
+        db_path = Path(database.DATABASE_FILE)
+        if db_path.exists():
+            db_path.unlink()
+        init_db()
+        patcher = mock.patch.object(paths, 'PROJECTS_ROOT', Path(tempfile.mkdtemp(prefix='projects-', dir=TEST_TEMP_DIR)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.project_id = 'cache-project'
+        conn = get_db_connection()
+        try:
+            conn.execute('INSERT INTO projects (id, name) VALUES (?, ?)', (self.project_id, 'Cache'))
+            conn.commit()
+        finally:
+            conn.close()
+        self.project_dir = paths.get_project_dir(self.project_id)
+        (self.project_dir / 'raw').mkdir(parents=True)
+        self.reads = self.project_dir / 'raw' / 'liver_S1_L001_R2_001.fastq'
+        self.reads.write_text('@r1\nACGT\n+\nIIII\n@r2\nGG\n+\nII\n')
+
+    def metadata(self, path='raw/liver_S1_L001_R2_001.fastq'):
+        return file_metadata.get_file_metadata(self.project_id, path)
+
+    def test_cached_stats_are_reused_until_the_file_changes(self):
+        first = self.metadata()
+        self.assertEqual(first['file_format'], 'fastq')
+        self.assertEqual((first['sample_key'], first['read_mate']), ('liver_S1_L001', 'R2'))
+        self.assertEqual(first['stats']['sequence_count'], 2)
+
+        with mock.patch.object(file_metadata, 'sequence_stats', side_effect=AssertionError('cache miss')):
+            self.assertEqual(self.metadata()['stats'], first['stats'])
+
+        with self.reads.open('a') as handle:
+            handle.write('@r3\nCCCCC\n+\nIIIII\n')
+        self.assertEqual(self.metadata()['stats']['sequence_count'], 3)
+
+    def test_rows_follow_renames_and_deletes(self):
+        from app.services.file_manager import rename_item
+        from app.services.file_tasks import get_file_task, submit_file_task
+
+        self.metadata()
+        rename_item(self.project_id, 'raw', 'fastq')
+        with mock.patch.object(file_metadata, 'sequence_stats', side_effect=AssertionError('cache miss')):
+            moved = self.metadata('fastq/liver_S1_L001_R2_001.fastq')
+        self.assertEqual(moved['path'], 'fastq/liver_S1_L001_R2_001.fastq')
+        self.assertEqual(moved['stats']['sequence_count'], 2)
+
+        task = submit_file_task(self.project_id, 'delete', ['fastq'])
+        for _ in range(200):
+            if get_file_task(self.project_id, task['id'])['status'] == 'completed':
+                break
+            time.sleep(0.02)
+        conn = get_db_connection()
+        try:
+            remaining = conn.execute('SELECT COUNT(*) FROM file_metadata WHERE project_id = ?', (self.project_id,)).fetchone()[0]
+        finally:
+            conn.close()
+        self.assertEqual(remaining, 0)
+
+    def test_upload_warms_the_cache_in_the_background(self):
+        from app.services.file_manager import preview_file, upload_chunk
+
+        class Chunk:
+            def __init__(self, data):
+                self.data = data
+
+            def save(self, destination):
+                Path(destination).write_bytes(self.data)
+
+        data = gzip.compress(b'@a\nACGT\n+\nIIII\n')
+        with mock.patch.object(file_metadata, '_warm', wraps=file_metadata._warm) as warm:
+            upload_chunk(self.project_id, Chunk(data), 'raw', 'tumor_R1.fq.gz', 1, 1)
+            file_metadata._EXECUTOR.submit(lambda: None).result(timeout=10)
+        warm.assert_called_once_with(self.project_id, os.path.join('raw', 'tumor_R1.fq.gz'))
+
+        with mock.patch.object(file_metadata, 'sequence_stats', side_effect=AssertionError('cache miss')):
+            preview = preview_file(self.project_id, 'raw/tumor_R1.fq.gz')
+        self.assertEqual(preview['bio_analysis']['sequence_count'], 1)
+        self.assertEqual(preview['bio_analysis']['sample_key'], 'tumor')
+        self.assertEqual(preview['bio_analysis']['read_mate'], 'R1')
+
+
+    def test_preview_of_a_large_uncached_file_does_not_wait_for_the_full_scan(self):
+        from app.services import file_manager
+
+        big = self.project_dir / 'raw' / 'lung_R1.fastq'
+        with big.open('w') as handle:
+            for index in range(30000):
+                handle.write(f'@read{index}\n' + 'ACGT' * 20 + '\n+\n' + 'I' * 80 + '\n')
+        self.assertGreater(big.stat().st_size, file_manager.INLINE_STATS_BYTES)
+
+        preview = file_manager.preview_file(self.project_id, 'raw/lung_R1.fastq')
+        analysis = preview['bio_analysis']
+        self.assertTrue(analysis['pending'])
+        self.assertFalse(analysis['complete'])
+        self.assertLess(analysis['bytes_scanned'], big.stat().st_size)
+        self.assertAlmostEqual(analysis['estimated_sequence_count'], 30000, delta=3000)
+        self.assertEqual(analysis['sample_key'], 'lung')
+
+        file_metadata._EXECUTOR.submit(lambda: None).result(timeout=30)
+        cached = file_manager.preview_file(self.project_id, 'raw/lung_R1.fastq')['bio_analysis']
+        self.assertNotIn('pending', cached)
+        self.assertEqual(cached['sequence_count'], 30000)
+
+
+    def test_sampled_preview_reads_whole_records_from_a_few_windows(self):
+        from app.services.file_manager import preview_file_sample
+
+        rng = random.Random(7)
+        big = self.project_dir / 'raw' / 'big.fastq'
+        with big.open('w') as handle:
+            for index in range(20000):
+                length = rng.randint(30, 120)
+                # Quality lines starting with '@' must not be taken for headers.
+                handle.write(f'@read{index}\n' + ('ACGT' * 30)[:length] + '\n+\n')
+                handle.write('@' + ''.join(rng.choice('#FI@') for _ in range(length - 1)) + '\n')
+        size = big.stat().st_size
+
+        for mode in ('spread', 'middle', 'tail'):
+            result = preview_file_sample(self.project_id, 'raw/big.fastq', 50, mode)
+            lines = result['content'].split('\n')
+            self.assertEqual(result['records_count'], 50)
+            self.assertEqual(len(lines), 200)
+            for start in range(0, 200, 4):
+                self.assertTrue(lines[start].startswith('@read'))
+                self.assertEqual(lines[start + 2], '+')
+                self.assertEqual(len(lines[start + 1]), len(lines[start + 3]))
+            self.assertLess(result['bytes_read'], size / 2)
+            self.assertFalse(result['total_lines_exact'])
+            self.assertAlmostEqual(result['total_lines'], 80000, delta=8000)
+        self.assertEqual(lines[-4], '@read19999')
+
+        file_metadata.get_file_metadata(self.project_id, 'raw/big.fastq')
+        cached = preview_file_sample(self.project_id, 'raw/big.fastq', 50)
+        self.assertEqual((cached['total_records'], cached['total_lines']), (20000, 80000))
+        self.assertTrue(cached['total_lines_exact'])
+
+        with self.assertRaises(ValueError):
+            preview_file_sample(self.project_id, 'raw/big.fastq', 50, 'sideways')
+
+    def test_spread_sampling_of_long_contigs_reads_one_window_per_sample(self):
+        from app.services.file_manager import preview_file_sample
+
+        rng = random.Random(3)
+        assembly = self.project_dir / 'raw' / 'assembly.fasta'
+        with assembly.open('w') as handle:
+            for contig in range(5):
+                handle.write(f'>contig{contig}\n')
+                sequence = ''.join(rng.choice('ACGT') for _ in range(400000))
+                handle.write('\n'.join(sequence[i:i + 60] for i in range(0, len(sequence), 60)) + '\n')
+
+        result = preview_file_sample(self.project_id, 'raw/assembly.fasta', 20, 'spread')
+        self.assertEqual(result['records_count'], 20)
+        self.assertLessEqual(result['bytes_read'], 20 * 16384)
+        headers = [line for line in result['content'].split('\n') if line.startswith('>')]
+        self.assertEqual(headers[0], '>contig0')
+        self.assertTrue(any(line.startswith('>(sequence fragment at byte ') for line in headers))
+        self.assertEqual(len(set(result['record_offsets'])), 20)
+
+
+class IndexedFileTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp(dir=TEST_TEMP_DIR))
+
+    def test_tabix_region_query_reads_only_the_blocks_it_needs(self):
+        from app.services.file_manager import analyze_bio_file, preview_file_head
+
+        vcf = self.directory / 'filtered.vcf.gz'
+        header = '##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n'
+        records = [('chr1', position, 'A') for position in range(100, 200001, 100)]
+        records += [('chr2', 5000, 'ACGT'), ('chr2', 40000, 'G')]
+        _write_indexed_vcf(vcf, header, records)
+
+        with mock.patch.object(indexed_files.zlib, 'decompress', wraps=zlib.decompress) as decompress:
+            result = indexed_files.query_region(str(vcf), 'chr1:1,000-1,500')
+        self.assertLess(decompress.call_count, 20)
+        lines = result['content'].split('\n')
+        self.assertTrue(lines[0].startswith('#CHROM'))
+        self.assertEqual([int(line.split('\t')[1]) for line in lines[1:]], [1000, 1100, 1200, 1300, 1400, 1500])
+        self.assertEqual(result['index'], 'tbi')
+
+        # A record starting before the region but overlapping it is included.
+        overlapping = indexed_files.query_region(str(vcf), 'chr2:5002-5002')
+        self.assertEqual(overlapping['records_count'], 1)
+        self.assertEqual(indexed_files.query_region(str(vcf), 'chr1', limit=5)['records_count'], 5)
+        with self.assertRaises(ValueError):
+            indexed_files.query_region(str(vcf), 'chrX:1-10')
+
+        preview = analyze_bio_file(str(vcf), '.vcf', vcf.stat().st_size)
+        self.assertEqual(preview['file_format'], 'vcf')
+        self.assertEqual(preview['bio_analysis']['sequence_count'], len(records))
+        self.assertEqual([contig['name'] for contig in preview['index']['contigs']], ['chr1', 'chr2'])
+        self.assertTrue(preview['content'].startswith('##fileformat=VCFv4.2'))
+        with mock.patch('app.services.file_manager.get_project_path', return_value=str(vcf)):
+            head = preview_file_head('project', 'filtered.vcf.gz', 3)
+        self.assertEqual(head['content'].split('\n')[2], 'chr1\t100\t.\tA\tT\t50\tPASS\t.')
+
+    def test_faidx_region_query_on_plain_and_bgzipped_fasta(self):
+        rng = random.Random(3)
+        sequences = {name: ''.join(rng.choice('ACGT') for _ in range(length)) for name, length in (('ctg1', 250), ('ctg2', 5000))}
+        text, fai = '', ''
+        for name, sequence in sequences.items():
+            text += f'>{name}\n'
+            fai += f'{name}\t{len(sequence)}\t{len(text)}\t60\t61\n'
+            text += ''.join(sequence[start:start + 60] + '\n' for start in range(0, len(sequence), 60))
+        data = text.encode()
+
+        plain = self.directory / 'consensus.fa'
+        plain.write_bytes(data)
+        Path(f'{plain}.fai').write_text(fai)
+
+        packed = self.directory / 'consensus.fa.gz'
+        blocks, gzi = [], []
+        compressed = 0
+        for start in range(0, len(data), 1000):
+            if start:
+                gzi.append((compressed, start))
+            blocks.append(_bgzf_block(data[start:start + 1000]))
+            compressed += len(blocks[-1])
+        packed.write_bytes(b''.join(blocks) + _bgzf_block(b''))
+        Path(f'{packed}.fai').write_text(fai)
+        gzi_blob = struct.pack('<Q', len(gzi)) + b''.join(struct.pack('<QQ', *entry) for entry in gzi)
+
+        with self.assertRaises(ValueError):
+            indexed_files.query_region(str(packed), 'ctg2:1-10')
+        Path(f'{packed}.gzi').write_bytes(gzi_blob)
+
+        for path in (plain, packed):
+            result = indexed_files.query_region(str(path), 'ctg2:1,190-3,000')
+            lines = result['content'].split('\n')
+            self.assertEqual(lines[0], '>ctg2:1190-3000')
+            self.assertEqual(''.join(lines[1:]), sequences['ctg2'][1189:3000])
+            whole = indexed_files.query_region(str(path), 'ctg1')
+            self.assertEqual(''.join(whole['content'].split('\n')[1:]), sequences['ctg1'])
+            self.assertEqual(indexed_files.describe_index(str(path))['contigs'][1], {'name': 'ctg2', 'length': 5000})
+
+
+if __name__ == '__main__':
+    unittest.main()
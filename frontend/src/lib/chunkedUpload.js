@@ -0,0 +1,103 @@
+// Parallel, resumable uploads on top of the upload-session API: the server
+// preallocates the file, chunks are PUT at their index in any order, and the
+// file is renamed into place once every chunk has arrived.
+const RESUME_PREFIX = 'appam-upload:'
+const DEFAULT_CONCURRENCY = 4
+const MAX_ATTEMPTS = 3
+
+const sessionsUrl = (projectId) => `/api/filemanager/${projectId}/upload-sessions`
+
+const resumeKey = (projectId, path, file) =>
+  `${RESUME_PREFIX}${projectId}:${path}/${file.name}:${file.size}:${file.lastModified}`
+
+const readError = async (response) => {
+  try {
+    const data = await response.json()
+    return data.error
+  } catch {
+    return null
+  }
+}
+
+const openSession = async (projectId, path, file, key, chunkSize) => {
+  // A session saved by an interrupted upload of the same file is resumed:
+  // the server reports which chunks it still needs.
+  const savedId = localStorage.getItem(key)
+  if (savedId) {
+    const response = await fetch(`${sessionsUrl(projectId)}/${savedId}`)
+    if (response.ok) {
+      const session = await response.json()
+      if (session.status === 'uploading') {
+        return session
+      }
+    }
+    localStorage.removeItem(key)
+  }
+
+  const response = await fetch(sessionsUrl(projectId), {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ path, filename: file.name, size: file.size, chunk_size: chunkSize }),
+  })
+  if (!response.ok) {
+    throw new Error((await readError(response)) || 'Upload failed')
+  }
+  const session = await response.json()
+  localStorage.setItem(key, session.id)
+  return session
+}
+
+const sendChunk = async (projectId, session, file, index) => {
+  const start = index * session.chunk_size
+  const body = file.slice(start, Math.min(start + session.chunk_size, file.size))
+  for (let attempt = 1; ; attempt++) {
+    let response = null
+    try {
+      response = await fetch(`${sessionsUrl(projectId)}/${session.id}/chunks/${index}`, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/octet-stream' },
+        body,
+      })
+    } catch (error) {
+      if (attempt >= MAX_ATTEMPTS) throw error
+    }
+    if (response?.ok) return
+    if (response && (response.status < 500 || attempt >= MAX_ATTEMPTS)) {
+      throw new Error((await readError(response)) || 'Upload failed')
+    }
+  }
+}
+
+export const uploadFile = async (projectId, path, file, options = {}) => {
+  const { onProgress, isCancelled, concurrency = DEFAULT_CONCURRENCY, chunkSize } = options
+  const key = resumeKey(projectId, path, file)
+  const session = await openSession(projectId, path, file, key, chunkSize)
+  const pending = [...session.missing_chunks]
+  let done = session.total_chunks - pending.length
+  onProgress?.((done / session.total_chunks) * 100)
+
+  let failed = false
+  const worker = async () => {
+    while (pending.length && !failed && !isCancelled?.()) {
+      const index = pending.shift()
+      try {
+        await sendChunk(projectId, session, file, index)
+      } catch (error) {
+        failed = true
+        throw error
+      }
+      done += 1
+      onProgress?.((done / session.total_chunks) * 100)
+    }
+  }
+  // Failed uploads keep their saved session so a retry resumes; cancelled
+  // ones discard the partial file.
+  await Promise.all(Array.from({ length: Math.max(1, Math.min(concurrency, pending.length)) }, worker))
+
+  if (isCancelled?.()) {
+    localStorage.removeItem(key)
+    await fetch(`${sessionsUrl(projectId)}/${session.id}`, { method: 'DELETE' }).catch(() => {})
+    return
+  }
+  localStorage.removeItem(key)
+}
@@ -0,0 +1,54 @@
+import io from 'socket.io-client'
+
+// Server pushes for job status, workflow progress and log chunks.
+// REST polling stays the source of truth; pushes only make it faster.
+let socket = null
+const subscriptions = new Map()
+
+const ensureSocket = () => {
+  if (socket) {
+    return socket
+  }
+  socket = io('/jobs', { withCredentials: true })
+  socket.on('connect', () => {
+    // Rooms are per connection, so rejoin them after every reconnect.
+    subscriptions.forEach(({ target }) => socket.emit('subscribe', target))
+  })
+  ;['job_status', 'workflow_progress', 'job_log'].forEach((eventName) => {
+    socket.on(eventName, (payload) => {
+      subscriptions.forEach(({ handlers }) => {
+        if (handlers[eventName]) {
+          handlers[eventName](payload)
+        }
+      })
+    })
+  })
+  socket.on('job_events_error', (payload) => {
+    console.warn('Job event subscription failed:', payload?.error)
+  })
+  return socket
+}
+
+let nextSubscriptionId = 1
+
+export const isJobEventsConnected = () => Boolean(socket && socket.connected)
+
+export const subscribeJobEvents = (target, handlers = {}) => {
+  const id = nextSubscriptionId++
+  const connection = ensureSocket()
+  subscriptions.set(id, { target, handlers })
+  if (connection.connected) {
+    connection.emit('subscribe', target)
+  }
+
+  return () => {
+    subscriptions.delete(id)
+    if (connection.connected) {
+      connection.emit('unsubscribe', target)
+    }
+    if (subscriptions.size === 0) {
+      connection.disconnect()
+      socket = null
+    }
+  }
+}